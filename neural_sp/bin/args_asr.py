@@ -187,6 +187,8 @@ def build_parser():
                         help='wordpiece model path for the 1st auxiliary task')
     parser.add_argument('--wp_model_sub2', type=str, default=False, nargs='?',
                         help='wordpiece model path for the 2nd auxiliary task')
+    parser.add_argument('--cache_dataset_index', type=strtobool, default=False,
+                        help='cache a compiled index of each tsv file to skip parsing it at startup')
     # features
     parser.add_argument('--input_type', type=str, default='speech',
                         choices=['speech', 'text'],
@@ -197,12 +199,18 @@ def build_parser():
                         help='number of input frames to stack (frame stacking)')
     parser.add_argument('--n_skips', type=int, default=1,
                         help='number of input frames to skip')
+    parser.add_argument('--wav_fbank_dim', type=int, default=80,
+                        help='number of mel bins of log-mel filterbank features extracted from wav files on-the-fly')
+    parser.add_argument('--wav_cmvn', type=str, default='utterance',
+                        help='CMVN for features extracted from wav files (none/utterance/path to Kaldi global cmvn.ark)')
     parser.add_argument('--max_n_frames', type=int, default=2000,
                         help='maximum number of input frames')
     parser.add_argument('--min_n_frames', type=int, default=40,
                         help='minimum number of input frames')
     parser.add_argument('--dynamic_batching', type=strtobool, default=True,
                         help='')
+    parser.add_argument('--n_prefetch', type=int, default=0,
+                        help='number of training mini-batches loaded ahead by background workers (0: load in the main process)')
     parser.add_argument('--input_noise_std', type=float, default=0,
                         help='standard deviation of Gaussian noise to input features')
     parser.add_argument('--weight_noise_std', type=float, default=0,
@@ -449,10 +457,13 @@ def build_parser():
                         help='cache token emebdding')
     parser.add_argument('--recog_ctc_weight', type=float, default=0.0,
                         help='weight of CTC score')
+    parser.add_argument('--recog_ctc_window_margin', type=int, default=0,
+                        help='number of frames around the attention peak (or after the next expected CTC spike) \
+                              for CTC prefix scoring. All frames are scored if 0.')
     parser.add_argument('--recog_lm', type=str, default=False, nargs='?',
-                        help='path to first-pass LM for shallow fusion')
+                        help='path to first-pass LM for shallow fusion (checkpoint or ARPA file)')
     parser.add_argument('--recog_lm_second', type=str, default=False, nargs='?',
-                        help='path to second-pass LM for rescoring')
+                        help='path to second-pass LM for rescoring (checkpoint or ARPA file)')
     parser.add_argument('--recog_lm_bwd', type=str, default=False, nargs='?',
                         help='path to second-pass LM in the reverse direction for rescoring')
     parser.add_argument('--recog_resolving_unk', type=strtobool, default=False,
@@ -470,7 +481,12 @@ def build_parser():
     parser.add_argument('--recog_softmax_smoothing', type=float, default=1.0,
                         help='softmax smoothing (beta) for diverse hypothesis generation')
     parser.add_argument('--recog_wordlm', type=strtobool, default=False,
-                        help='')
+                        help='first-pass LM is a word-level LM applied at word boundaries (CTC only)')
+    parser.add_argument('--recog_lexicon', type=str, default=False, nargs='?',
+                        help='path to a word dictionary to constrain CTC beam search to in-vocabulary words')
+    parser.add_argument('--recog_ctc_alignment_format', type=str, default='txt',
+                        choices=['txt', 'bin'],
+                        help='save CTC forced alignments as a text file per utterance or a single indexed binary file')
     parser.add_argument('--recog_n_average', type=int, default=1,
                         help='number of models for the model averaging of Transformer')
     parser.add_argument('--recog_longform_max_n_frames', type=int, default=0,
@@ -500,4 +516,9 @@ def build_parser():
     parser.add_argument('--recog_rnnt_beam_search_type', type=str, default='time_sync_mono',
                         choices=['time_sync_mono', 'time_sync'],
                         help='beam search algorithm for RNN-T')
+    parser.add_argument('--recog_rnnt_max_symbols_per_frame', type=int, default=1,
+                        help='maximum number of non-blank labels emitted per frame in RNN-T greedy decoding')
+    parser.add_argument('--recog_rnnt_state_cache_size', type=int, default=1000,
+                        help='maximum number of label prefixes whose prediction network states are cached \
+                              in RNN-T beam search (unbounded if 0)')
     return parser
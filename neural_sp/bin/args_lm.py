@@ -108,6 +108,8 @@ def build_parser():
                         help='output unit')
     parser.add_argument('--wp_model', type=str, default=False, nargs='?',
                         help='wordpiece model path')
+    parser.add_argument('--cache_dataset_index', type=strtobool, default=False,
+                        help='cache a compiled index of each tsv file to skip parsing it at startup')
     # features
     parser.add_argument('--min_n_tokens', type=int, default=1,
                         help='minimum number of input tokens')
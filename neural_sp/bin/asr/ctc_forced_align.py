@@ -20,6 +20,7 @@ from neural_sp.bin.train_utils import (
     load_checkpoint,
     set_logger
 )
+from neural_sp.datasets.alignment import CTCAlignmentWriter
 from neural_sp.datasets.asr import build_dataloader
 from neural_sp.models.seq2seq.speech2text import Speech2Text
 from neural_sp.utils import mkdir_join
@@ -77,12 +78,21 @@ def main():
             shutil.rmtree(save_path)
             os.mkdir(save_path)
 
+        writer = None
+        if args.recog_ctc_alignment_format == 'bin':
+            writer = CTCAlignmentWriter(save_path)
+
         pbar = tqdm(total=len(dataloader))
         while True:
             batch, is_new_epoch = dataloader.next()
-            trigger_points = model.ctc_forced_align(batch['xs'], batch['ys'])  # `[B, L]`
+            trigger_points = model.ctc_forced_align(batch['xs'], batch['ys'])  # `[B, L + 1]`
 
             for b in range(len(batch['xs'])):
+                ylen = len(batch['ys'][b])
+                if writer is not None:
+                    writer.add(batch['speakers'][b], batch['utt_ids'][b], trigger_points[b, :ylen + 1])
+                    continue
+
                 save_path_spk = mkdir_join(save_path, batch['speakers'][b])
                 save_path_utt = mkdir_join(save_path_spk, batch['utt_ids'][b] + '.txt')
 
@@ -97,6 +107,8 @@ def main():
             if is_new_epoch:
                 break
 
+        if writer is not None:
+            writer.close()
         pbar.close()
 
 
@@ -29,6 +29,11 @@ from neural_sp.evaluators.word import eval_word
 from neural_sp.evaluators.wordpiece import eval_wordpiece
 from neural_sp.evaluators.wordpiece_bleu import eval_wordpiece_bleu
 from neural_sp.models.lm.build import build_lm
+from neural_sp.models.lm.ngram import (
+    is_arpa_path,
+    NgramLM
+)
+from neural_sp.models.seq2seq.decoders.lexicon import LexiconTrie
 from neural_sp.models.seq2seq.speech2text import Speech2Text
 
 logger = logging.getLogger(__name__)
@@ -85,10 +90,24 @@ def main():
                         model_e.cuda()
                     ensemble_models += [model_e]
 
+            # NOTE: only CTC beam search constrains hypotheses with a lexicon and applies
+            # a word-level LM at word boundaries. Other decoders would silently ignore the
+            # lexicon and apply the word-level LM per token.
+            if (args.recog_lexicon or args.recog_wordlm) and not model.ctc_only_decoding(args):
+                raise ValueError('--recog_lexicon and --recog_wordlm are supported only for CTC-only decoding. '
+                                 'Set --recog_ctc_weight 1 for models trained with CTC.')
+
             # Load LM for shallow fusion
+            lexicon_path = args.recog_lexicon
             if not args.lm_fusion:
                 # first path
-                if args.recog_lm is not None and args.recog_lm_weight > 0:
+                if is_arpa_path(args.recog_lm) and args.recog_lm_weight > 0:
+                    if args.recog_wordlm:
+                        assert lexicon_path, '--recog_lexicon is required for word-level ARPA LM.'
+                        model.lm_fwd = NgramLM(args.recog_lm, lexicon_path)
+                    else:
+                        model.lm_fwd = NgramLM(args.recog_lm, os.path.join(dir_name, 'dict.txt'))
+                elif args.recog_lm is not None and args.recog_lm_weight > 0:
                     conf_lm = load_config(os.path.join(os.path.dirname(args.recog_lm), 'conf.yml'))
                     args_lm = argparse.Namespace()
                     for k, v in conf_lm.items():
@@ -102,9 +121,13 @@ def main():
                         model.lm_bwd = lm
                     else:
                         model.lm_fwd = lm
+                    if args.recog_wordlm and not lexicon_path:
+                        lexicon_path = os.path.join(os.path.dirname(args.recog_lm), 'dict.txt')
 
                 # second path (forward)
-                if args.recog_lm_second is not None and args.recog_lm_second_weight > 0:
+                if is_arpa_path(args.recog_lm_second) and args.recog_lm_second_weight > 0:
+                    model.lm_second = NgramLM(args.recog_lm_second, os.path.join(dir_name, 'dict.txt'))
+                elif args.recog_lm_second is not None and args.recog_lm_second_weight > 0:
                     conf_lm_second = load_config(os.path.join(os.path.dirname(args.recog_lm_second), 'conf.yml'))
                     args_lm_second = argparse.Namespace()
                     for k, v in conf_lm_second.items():
@@ -125,6 +148,10 @@ def main():
                     load_checkpoint(args.recog_lm_bwd, lm_bwd)
                     model.lm_bwd = lm_bwd
 
+            # Lexicon for word-constrained CTC decoding
+            if lexicon_path:
+                model.lexicon = LexiconTrie(lexicon_path, dataloader.idx2token[0])
+
             if not args.recog_unit:
                 args.recog_unit = args.unit
 
@@ -141,9 +168,11 @@ def main():
             logger.info('coverage penalty: %.3f' % args.recog_coverage_penalty)
             logger.info('coverage threshold: %.3f' % args.recog_coverage_threshold)
             logger.info('CTC weight: %.3f' % args.recog_ctc_weight)
+            logger.info('CTC window margin: %d' % args.recog_ctc_window_margin)
             logger.info('fist LM path: %s' % args.recog_lm)
             logger.info('second LM path: %s' % args.recog_lm_second)
             logger.info('backward LM path: %s' % args.recog_lm_bwd)
+            logger.info('lexicon path: %s' % lexicon_path)
             logger.info('LM weight (first-pass): %.3f' % args.recog_lm_weight)
             logger.info('LM weight (second-pass): %.3f' % args.recog_lm_second_weight)
             logger.info('LM weight (backward): %.3f' % args.recog_lm_bwd_weight)
@@ -90,7 +90,8 @@ def main():
                                  num_workers=args.n_gpus,
                                  pin_memory=False,
                                  word_alignment_dir=args.train_word_alignment,
-                                 ctc_alignment_dir=args.train_ctc_alignment)
+                                 ctc_alignment_dir=args.train_ctc_alignment,
+                                 n_prefetch=args.get('n_prefetch', 0))
     dev_set = build_dataloader(args=args,
                                tsv_path=args.dev_set,
                                tsv_path_sub1=args.dev_set_sub1,
@@ -475,6 +476,7 @@ def main():
     duration_train = time.time() - start_time_train
     logger.info('Total time: %.2f hour' % (duration_train / 3600))
 
+    train_set.close()  # terminate prefetch workers
     reporter.tf_writer.close()
     pbar_epoch.close()
 
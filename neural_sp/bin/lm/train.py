@@ -74,7 +74,8 @@ def main():
                         bptt=args.bptt,
                         shuffle=args.shuffle,
                         backward=args.backward,
-                        serialize=args.serialize)
+                        serialize=args.serialize,
+                        cache_index=args.get('cache_dataset_index', False))
     dev_set = Dataset(corpus=args.corpus,
                       tsv_path=args.dev_set,
                       dict_path=args.dict,
@@ -84,7 +85,8 @@ def main():
                       batch_size=batch_size,
                       bptt=args.bptt,
                       backward=args.backward,
-                      serialize=args.serialize)
+                      serialize=args.serialize,
+                      cache_index=args.get('cache_dataset_index', False))
     eval_sets = [Dataset(corpus=args.corpus,
                          tsv_path=s,
                          dict_path=args.dict,
@@ -94,7 +96,8 @@ def main():
                          batch_size=1,
                          bptt=args.bptt,
                          backward=args.backward,
-                         serialize=args.serialize) for s in args.eval_sets]
+                         serialize=args.serialize,
+                         cache_index=args.get('cache_dataset_index', False)) for s in args.eval_sets]
 
     args.vocab = train_set.vocab
 
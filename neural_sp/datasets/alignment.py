@@ -84,9 +84,96 @@ class WordAlignmentConverter(object):
         return np.ceil(np.array(boundaries)).astype(np.int32)
 
 
+CTC_ALIGNMENT_DATA = 'alignments.bin'
+CTC_ALIGNMENT_INDEX = 'alignments.idx'
+
+# alignment_dir -> (sizes and modification times of the files, (index, data))
+_ctc_alignment_indices = {}
+
+
+class CTCAlignmentWriter(object):
+    """Class for writing CTC alignments of all utterances into a single indexed binary file.
+
+    Trigger points are concatenated into `alignments.bin` as int32, and each line of
+    `alignments.idx` holds "speaker utt_id offset length" to locate them.
+
+    Args:
+        alignment_dir (str): path to CTC alignment directory
+
+    """
+
+    def __init__(self, alignment_dir):
+        self.alignment_dir = alignment_dir
+        self.f_data = open(os.path.join(alignment_dir, CTC_ALIGNMENT_DATA), 'wb')
+        self.f_index = codecs.open(os.path.join(alignment_dir, CTC_ALIGNMENT_INDEX), 'w', encoding='utf-8')
+        self.offset = 0
+
+    def add(self, speaker, utt_id, boundaries):
+        """Append CTC alignment of an utterance.
+
+        Args:
+            speaker (str): speaker ID
+            utt_id (str): utterance ID
+            boundaries (np.ndarray): token boundaries including <eos>
+
+        """
+        boundaries = np.asarray(boundaries, dtype=np.int32)
+        boundaries.tofile(self.f_data)
+        self.f_index.write('%s %s %d %d\n' % (speaker, utt_id, self.offset, len(boundaries)))
+        self.offset += len(boundaries)
+
+    def close(self):
+        self.f_data.close()
+        self.f_index.close()
+        # refresh the index cached by load_ctc_alignment
+        _ctc_alignment_indices.pop(self.alignment_dir, None)
+
+
+def _stat_ctc_alignment(alignment_dir):
+    """Return sizes and modification times of the binary CTC alignment files (None if absent)."""
+    try:
+        return tuple((st.st_size, st.st_mtime_ns) for st in
+                     [os.stat(os.path.join(alignment_dir, name))
+                      for name in [CTC_ALIGNMENT_INDEX, CTC_ALIGNMENT_DATA]])
+    except OSError:
+        return None
+
+
+def _load_ctc_alignment_index(alignment_dir):
+    """Load the index of a binary CTC alignment file (None if absent).
+
+    The index is cached per directory and re-read when the files are rewritten.
+    Absent files are not cached so that they are found once written.
+
+    """
+    key = _stat_ctc_alignment(alignment_dir)
+    if key is None:
+        return None
+    cached = _ctc_alignment_indices.get(alignment_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    index_path = os.path.join(alignment_dir, CTC_ALIGNMENT_INDEX)
+    index = {}
+    with codecs.open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            speaker, utt_id, offset, length = line.strip().split(' ')
+            index[(speaker, utt_id)] = (int(offset), int(length))
+    data_path = os.path.join(alignment_dir, CTC_ALIGNMENT_DATA)
+    if os.path.getsize(data_path) == 0:
+        data = np.zeros(0, dtype=np.int32)  # empty files cannot be memory-mapped
+    else:
+        data = np.memmap(data_path, dtype=np.int32, mode='r')
+    _ctc_alignment_indices[alignment_dir] = (key, (index, data))
+    return index, data
+
+
 def load_ctc_alignment(alignment_dir, speaker, utt_id):
     """Load CTC alignment.
 
+    Alignments are read from the indexed binary file written by `CTCAlignmentWriter`
+    if exists, otherwise from a text file per utterance.
+
     Args:
         alignment_dir (str): path to CTC alignment directory
         speaker (str): speaker ID
@@ -95,6 +182,14 @@ def load_ctc_alignment(alignment_dir, speaker, utt_id):
         boundaries (list): token boundaries
 
     """
+    binary = _load_ctc_alignment_index(alignment_dir)
+    if binary is not None:
+        index, data = binary
+        if (speaker, utt_id) not in index:
+            return None
+        offset, length = index[(speaker, utt_id)]
+        return np.array(data[offset:offset + length], dtype=np.int32)
+
     alignment_path = os.path.join(alignment_dir, speaker, utt_id + '.txt')
     if not os.path.isfile(alignment_path):
         return None
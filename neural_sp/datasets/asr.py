@@ -6,7 +6,10 @@
    You can use the multi-GPU version.
 """
 
-import kaldiio
+import atexit
+from collections import deque
+from contextlib import contextmanager
+import multiprocessing
 import numpy as np
 import os
 import pandas as pd
@@ -26,11 +29,20 @@ from neural_sp.datasets.token_converter.wordpiece import Idx2wp
 from neural_sp.datasets.token_converter.wordpiece import Wp2idx
 
 from neural_sp.datasets.alignment import load_ctc_alignment
+from neural_sp.datasets.dataset_index import DatasetIndex
+from neural_sp.datasets.feature_store import load_feat
 from neural_sp.datasets.alignment import WordAlignmentConverter
+from neural_sp.datasets.utils import batch_boundaries
 from neural_sp.datasets.utils import count_vocab_size
 from neural_sp.datasets.utils import discourse_bucketing
+from neural_sp.datasets.utils import longform_bucketing
 from neural_sp.datasets.utils import set_batch_size
 from neural_sp.datasets.utils import shuffle_bucketing
+from neural_sp.models.seq2seq.frontends.fbank import (
+    is_wav_path,
+    load_wav,
+    WavFrontend
+)
 
 random.seed(1)
 np.random.seed(1)
@@ -41,7 +53,13 @@ def build_dataloader(args, tsv_path, batch_size, n_epochs=1e10, is_test=False,
                      tsv_path_sub1=False, tsv_path_sub2=False,
                      num_workers=1, pin_memory=False,
                      first_n_utterances=-1, word_alignment_dir=None, ctc_alignment_dir=None,
-                     longform_max_n_frames=0):
+                     longform_max_n_frames=0, n_prefetch=0):
+
+    # features are extracted from wav files on-the-fly in data-loader workers
+    wav_frontend = None
+    if args.get('wav_fbank_dim', 0) > 0:
+        wav_frontend = WavFrontend(n_mels=args.wav_fbank_dim,
+                                   cmvn=args.get('wav_cmvn', 'utterance'))
 
     dataset = CustomDataset(corpus=args.corpus,
                             tsv_path=tsv_path,
@@ -71,7 +89,9 @@ def build_dataloader(args, tsv_path, batch_size, n_epochs=1e10, is_test=False,
                             first_n_utterances=first_n_utterances,
                             simulate_longform=longform_max_n_frames > 0,
                             word_alignment_dir=word_alignment_dir,
-                            ctc_alignment_dir=ctc_alignment_dir)
+                            ctc_alignment_dir=ctc_alignment_dir,
+                            cache_index=args.get('cache_dataset_index', False),
+                            wav_frontend=wav_frontend)
 
     batch_sampler = CustomBatchSampler(df=dataset.df,  # filtered
                                        df_sub1=dataset.df_sub1,  # filtered
@@ -88,16 +108,30 @@ def build_dataloader(args, tsv_path, batch_size, n_epochs=1e10, is_test=False,
                                   n_epochs=n_epochs,
                                   collate_fn=lambda x: x[0],
                                   num_workers=num_workers,
-                                  pin_memory=pin_memory)
+                                  pin_memory=pin_memory,
+                                  n_prefetch=n_prefetch)
 
     return dataloader
 
 
+# NOTE: set in each prefetch worker process by fork
+_worker_dataset = None
+
+
+def _init_prefetch_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _load_mini_batch(indices):
+    return _worker_dataset.__getitem__(indices)
+
+
 class CustomDataLoader(DataLoader):
 
     def __init__(self, dataset, batch_sampler, n_epochs,
                  num_workers=0, collate_fn=None, pin_memory=False, drop_last=False,
-                 timeout=0, worker_init_fn=None):
+                 timeout=0, worker_init_fn=None, n_prefetch=0):
 
         super().__init__(dataset=dataset,
                          #  batch_size=batch_size,
@@ -126,6 +160,25 @@ class CustomDataLoader(DataLoader):
         self.epoch = 0
         self.n_epochs = n_epochs
         self.is_new_epoch = False
+        self._offset = 0
+
+        # for background prefetching
+        self.n_prefetch = n_prefetch
+        self._planned_epoch = 0  # epochs already sampled (ahead of self.epoch when prefetching)
+        self._batch_size = None  # batch size used for planning mini-batches ahead
+        self._queue = deque()  # (is_new_epoch, offset, AsyncResult)
+        self._pool = None
+        if n_prefetch > 0:
+            # NOTE: the sampler is driven by its own random state so that the batch order
+            # does not depend on how many mini-batches are planned ahead
+            self._rng_state = (random.getstate(), np.random.get_state())
+            # NOTE: workers are forked before the model is built and never touch GPUs
+            self._pool = multiprocessing.get_context('fork').Pool(
+                processes=max(1, num_workers),
+                initializer=_init_prefetch_worker,
+                initargs=(dataset,))
+            # NOTE: terminate workers even when training is interrupted before close()
+            atexit.register(self.close)
 
     def __len__(self):
         return len(self.dataset.df)
@@ -149,11 +202,39 @@ class CustomDataLoader(DataLoader):
         if self.epoch >= self.n_epochs:
             raise StopIteration
 
-        indices, self.is_new_epoch = self.batch_sampler.sample_index(batch_size)
+        if self._pool is not None:
+            assert batch_size == self._batch_size, \
+                'Call reset(batch_size) to change the batch size when prefetching.'
+            self._fill_queue()
+            self.is_new_epoch, self._offset, result = self._queue.popleft()
+            mini_batch = result.get()
+            self._fill_queue()  # keep workers busy while the model consumes this batch
+        else:
+            indices, self.is_new_epoch, self._offset = self._sample_index(batch_size)
+            mini_batch = self.dataset.__getitem__(indices)
 
         if self.is_new_epoch:
+            self.epoch += 1
+
+        return mini_batch, self.is_new_epoch
+
+    def _sample_index(self, batch_size):
+        """Sample indices of the next mini-batch and prepare the next epoch if needed.
+
+        Args:
+            batch_size (int): size of mini-batch
+        Returns:
+            indices (np.ndarray): indices of dataframe in the current mini-batch
+            is_new_epoch (bool): flag for the end of the current epoch
+            offset (int): number of utterances sampled so far in the current epoch
+
+        """
+        indices, is_new_epoch = self.batch_sampler.sample_index(batch_size)
+        offset = self.batch_sampler._offset
+
+        if is_new_epoch:
             # shuffle the whole data per epoch
-            if self.epoch + 1 == self.batch_sampler.sort_stop_epoch:
+            if self._planned_epoch + 1 == self.batch_sampler.sort_stop_epoch:
                 self.batch_sampler.df = self.batch_sampler.df.reindex(
                     np.random.permutation(self.batch_sampler.df.index))
                 for i in range(1, 3):
@@ -164,17 +245,45 @@ class CustomDataLoader(DataLoader):
                 # Re-indexing
                 self.batch_sampler.df = self.batch_sampler.df.reset_index()
 
-            self.reset()
+            self.batch_sampler._reset()
             # calculate iteration again after shuffling
             self.batch_sampler.calculate_iteration()
-            self.epoch += 1
-
-        return self.dataset.__getitem__(indices), self.is_new_epoch
+            self._planned_epoch += 1
+
+        return indices, is_new_epoch, offset
+
+    def _fill_queue(self):
+        """Plan mini-batches ahead and dispatch them to the prefetch workers."""
+        while len(self._queue) < self.n_prefetch and self._planned_epoch < self.n_epochs:
+            with self._sampler_random_state():
+                indices, is_new_epoch, offset = self._sample_index(self._batch_size)
+            self._queue.append((is_new_epoch, offset,
+                                self._pool.apply_async(_load_mini_batch, (indices,))))
+
+    @contextmanager
+    def _sampler_random_state(self):
+        state = (random.getstate(), np.random.get_state())
+        random.setstate(self._rng_state[0])
+        np.random.set_state(self._rng_state[1])
+        try:
+            yield
+        finally:
+            self._rng_state = (random.getstate(), np.random.get_state())
+            random.setstate(state[0])
+            np.random.set_state(state[1])
+
+    def close(self):
+        """Terminate prefetch workers."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+            atexit.unregister(self.close)
+        self._queue.clear()
 
     @property
     def epoch_detail(self):
         """Percentage of the current epoch."""
-        epoch_ratio = self.batch_sampler._offset / len(self.dataset)
+        epoch_ratio = self._offset / len(self.dataset)
         if self.is_new_epoch:
             epoch_ratio = 1.
         return epoch_ratio
@@ -191,6 +300,11 @@ class CustomDataLoader(DataLoader):
                 batch_size (int): size of mini-batch
 
         """
+        # discard mini-batches planned ahead
+        self._queue.clear()
+        self._planned_epoch = self.epoch
+        self._batch_size = batch_size
+        self._offset = 0
         self.batch_sampler._reset(batch_size)
 
 
@@ -205,7 +319,8 @@ class CustomDataset(Dataset):
                  unit_sub1, unit_sub2,
                  wp_model_sub1, wp_model_sub2,
                  discourse_aware=False, simulate_longform=False, first_n_utterances=-1,
-                 word_alignment_dir=None, ctc_alignment_dir=None):
+                 word_alignment_dir=None, ctc_alignment_dir=None, cache_index=False,
+                 wav_frontend=None):
         """Custom Dataset class.
 
         Args:
@@ -230,6 +345,9 @@ class CustomDataset(Dataset):
             first_n_utterances (int): evaluate the first N utterances
             word_alignment_dir (str): path to word alignment directory
             ctc_alignment_dir (str): path to CTC alignment directory
+            cache_index (bool): load a compiled index cached next to the tsv file
+                instead of parsing the tsv file
+            wav_frontend (WavFrontend): feature extractor for wav files in the feat_path column
 
         """
         super(Dataset, self).__init__()
@@ -255,6 +373,7 @@ class CustomDataset(Dataset):
         self.simulate_longform = simulate_longform
 
         self.subsample_factor = subsample_factor
+        self.wav_frontend = wav_frontend
         self.word_alignment_dir = word_alignment_dir
         self.ctc_alignment_dir = ctc_alignment_dir
 
@@ -301,39 +420,38 @@ class CustomDataset(Dataset):
                 setattr(self, '_vocab_sub' + str(i), -1)
 
         # Load dataset tsv file
-        df = pd.read_csv(tsv_path, encoding='utf-8', delimiter='\t')
-        df = df.loc[:, ['utt_id', 'speaker', 'feat_path',
-                        'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
+        self._indices = [None] * 3  # compiled index per task
+        df = self._load_tsv(tsv_path, cache_index, task_idx=0)
         for i in range(1, 3):
             if locals()['tsv_path_sub' + str(i)]:
-                df_sub = pd.read_csv(locals()['tsv_path_sub' + str(i)], encoding='utf-8', delimiter='\t')
-                df_sub = df_sub.loc[:, ['utt_id', 'speaker', 'feat_path',
-                                        'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
+                df_sub = self._load_tsv(locals()['tsv_path_sub' + str(i)], cache_index, task_idx=i)
                 setattr(self, 'df_sub' + str(i), df_sub)
             else:
                 setattr(self, 'df_sub' + str(i), None)
-        self._input_dim = kaldiio.load_mat(df['feat_path'][0]).shape[-1]
+        if self._indices[0] is not None and self._indices[0].input_dim > 0:
+            self._input_dim = self._indices[0].input_dim
+        elif is_wav_path(df['feat_path'][0]):
+            self._input_dim = self.wav_frontend.output_dim
+        else:
+            self._input_dim = load_feat(df['feat_path'][0]).shape[-1]
 
         # Remove inappropriate utterances
         print('Original utterance num: %d' % len(df))
         n_utts = len(df)
         if is_test or discourse_aware:
-            df = df[df.apply(lambda x: x['ylen'] > 0, axis=1)]
+            df = df[df['ylen'] > 0]
             print('Removed %d empty utterances' % (n_utts - len(df)))
             if first_n_utterances > 0:
                 n_utts = len(df)
-                df = df[df.apply(lambda x: x['ylen'] > 0, axis=1)]
                 df = df.truncate(before=0, after=first_n_utterances - 1)
                 print('Select first %d utterances' % len(df))
         else:
-            df = df[df.apply(lambda x: min_n_frames <= x[
-                'xlen'] <= max_n_frames, axis=1)]
-            df = df[df.apply(lambda x: x['ylen'] > 0, axis=1)]
+            df = df[(df['xlen'] >= min_n_frames) & (df['xlen'] <= max_n_frames) & (df['ylen'] > 0)]
             print('Removed %d utterances (threshold)' % (n_utts - len(df)))
 
             if ctc and subsample_factor > 1:
                 n_utts = len(df)
-                df = df[df.apply(lambda x: x['ylen'] <= (x['xlen'] // subsample_factor), axis=1)]
+                df = df[df['ylen'] <= (df['xlen'] // subsample_factor)]
                 print('Removed %d utterances (for CTC)' % (n_utts - len(df)))
 
             for i in range(1, 3):
@@ -342,8 +460,7 @@ class CustomDataset(Dataset):
                 subsample_factor_sub = locals()['subsample_factor_sub' + str(i)]
                 if df_sub is not None:
                     if ctc_sub and subsample_factor_sub > 1:
-                        df_sub = df_sub[df_sub.apply(
-                            lambda x: x['ylen'] <= (x['xlen'] // subsample_factor_sub), axis=1)]
+                        df_sub = df_sub[df_sub['ylen'] <= (df_sub['xlen'] // subsample_factor_sub)]
 
                     if len(df) != len(df_sub):
                         n_utts = len(df)
@@ -357,33 +474,28 @@ class CustomDataset(Dataset):
             # 1. serialize
             # df['session'] = df['speaker'].apply(lambda x: str(x).split('-')[0])
             # 2. not serialize
-            df['session'] = df['speaker'].apply(lambda x: str(x))
+            df['session'] = df['speaker'].astype(str)
         else:
-            df['session'] = df['speaker'].apply(lambda x: str(x))
+            df['session'] = df['speaker'].astype(str)
 
         # Sort tsv records
         if discourse_aware:
             # Sort by onset (start time)
-            df = df.assign(prev_utt='')
-            df = df.assign(line_no=list(range(len(df))))
+            utt_ids = df['utt_id'].astype(str)
             if corpus == 'swbd':
-                df['onset'] = df['utt_id'].apply(lambda x: int(x.split('_')[-1].split('-')[0]))
+                df['onset'] = utt_ids.str.split('_').str[-1].str.split('-').str[0].astype(int)
             elif corpus == 'csj':
-                df['onset'] = df['utt_id'].apply(lambda x: int(x.split('_')[1]))
+                df['onset'] = utt_ids.str.split('_').str[1].astype(int)
             elif corpus == 'tedlium2':
-                df['onset'] = df['utt_id'].apply(lambda x: int(x.split('-')[-2]))
+                df['onset'] = utt_ids.str.split('-').str[-2].astype(int)
             else:
                 raise NotImplementedError(corpus)
             df = df.sort_values(by=['session', 'onset'], ascending=True)
 
-            # Extract previous utterances
-            groups = df.groupby('session').groups
-            df['prev_utt'] = df.apply(
-                lambda x: [df.loc[i, 'line_no']
-                           for i in groups[x['session']] if df.loc[i, 'onset'] < x['onset']], axis=1)
-            df['n_prev_utt'] = df.apply(lambda x: len(x['prev_utt']), axis=1)
-            df['n_utt_in_session'] = df.apply(
-                lambda x: len([i for i in groups[x['session']]]), axis=1)
+            # Count previous utterances (strictly earlier onset) in the same session
+            session_groups = df.groupby('session')
+            df['n_prev_utt'] = (session_groups['onset'].rank(method='min') - 1).astype(int)
+            df['n_utt_in_session'] = session_groups['onset'].transform('size')
             df = df.sort_values(by=['n_utt_in_session'], ascending=short2long)
 
             # NOTE: this is used only when LM is trained with serialize: true
@@ -398,23 +510,23 @@ class CustomDataset(Dataset):
             elif sort_by == 'output':
                 df = df.sort_values(by=['ylen'], ascending=short2long)
             elif sort_by == 'shuffle':
-                df = df.reindex(np.random.permutation(self.df.index))
+                df = df.reindex(np.random.permutation(df.index))
 
         # Fit word alignment to vocabulary
         if word_alignment_dir is not None:
             alignment2boundary = WordAlignmentConverter(dict_path, wp_model)
             n_utts = len(df)
-            df['trigger_points'] = df.apply(lambda x: alignment2boundary(
-                word_alignment_dir, x['speaker'], x['utt_id'], x['text']), axis=1)
+            df['trigger_points'] = [alignment2boundary(word_alignment_dir, speaker, utt_id, text)
+                                    for speaker, utt_id, text in zip(df['speaker'], df['utt_id'], df['text'])]
             # remove utterances which do not have the alignment
-            df = df[df.apply(lambda x: x['trigger_points'] is not None, axis=1)]
+            df = df[df['trigger_points'].notnull()]
             print('Removed %d utterances (for word alignment)' % (n_utts - len(df)))
         elif ctc_alignment_dir is not None:
             n_utts = len(df)
-            df['trigger_points'] = df.apply(lambda x: load_ctc_alignment(
-                ctc_alignment_dir, x['speaker'], x['utt_id']), axis=1)
+            df['trigger_points'] = [load_ctc_alignment(ctc_alignment_dir, speaker, utt_id)
+                                    for speaker, utt_id in zip(df['speaker'], df['utt_id'])]
             # remove utterances which do not have the alignment
-            df = df[df.apply(lambda x: x['trigger_points'] is not None, axis=1)]
+            df = df[df['trigger_points'].notnull()]
             print('Removed %d utterances (for CTC alignment)' % (n_utts - len(df)))
 
         # Re-indexing
@@ -431,6 +543,21 @@ class CustomDataset(Dataset):
                     setattr(self, 'df_sub' + str(i),
                             getattr(self, 'df_sub' + str(i)).reindex(df.index).reset_index())
 
+    def _load_tsv(self, tsv_path, cache_index, task_idx):
+        if cache_index:
+            self._indices[task_idx] = DatasetIndex(tsv_path)
+            return self._indices[task_idx].load_utterances()
+        df = pd.read_csv(tsv_path, encoding='utf-8', delimiter='\t')
+        df = df.loc[:, ['utt_id', 'speaker', 'feat_path',
+                        'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
+        return df
+
+    def _token_ids(self, df, i, task_idx):
+        """Return token IDs of the i-th utterance in df."""
+        if self._indices[task_idx] is not None:
+            return self._indices[task_idx].token_ids_at(df['row'][i])
+        return list(map(int, str(df['token_id'][i]).split()))
+
     def __len__(self):
         return len(self.df)
 
@@ -438,6 +565,14 @@ class CustomDataset(Dataset):
     def n_frames(self):
         return self.df['xlen'].sum()
 
+    def _load_input(self, feat_path):
+        if is_wav_path(feat_path):
+            assert self.wav_frontend is not None
+            wav, sample_rate = load_wav(feat_path)
+            assert sample_rate == self.wav_frontend.sample_rate, (feat_path, sample_rate)
+            return self.wav_frontend.extract(wav)
+        return load_feat(feat_path)
+
     def __getitem__(self, indices):
         """Create mini-batch per step.
 
@@ -456,7 +591,7 @@ class CustomDataset(Dataset):
 
         """
         # inputs
-        xs = [kaldiio.load_mat(self.df['feat_path'][i]) for i in indices]
+        xs = [self._load_input(self.df['feat_path'][i]) for i in indices]
         xlens = [self.df['xlen'][i] for i in indices]
         utt_ids = [self.df['utt_id'][i] for i in indices]
         speakers = [self.df['speaker'][i] for i in indices]
@@ -488,7 +623,7 @@ class CustomDataset(Dataset):
         if self.is_test:
             ys = [self._token2idx[0](self.df['text'][i]) for i in indices]
         else:
-            ys = [list(map(int, str(self.df['token_id'][i]).split())) for i in indices]
+            ys = [self._token_ids(self.df, i, 0) for i in indices]
 
         if self.simulate_longform:
             xs = [np.concatenate(xs, axis=0)]
@@ -502,14 +637,14 @@ class CustomDataset(Dataset):
         # sub1 outputs
         ys_sub1 = []
         if self.df_sub1 is not None:
-            ys_sub1 = [list(map(int, str(self.df_sub1['token_id'][i]).split())) for i in indices]
+            ys_sub1 = [self._token_ids(self.df_sub1, i, 1) for i in indices]
         elif self._vocab_sub1 > 0 and not self.is_test:
             ys_sub1 = [self._token2idx[1](self.df['text'][i]) for i in indices]
 
         # sub2 outputs
         ys_sub2 = []
         if self.df_sub2 is not None:
-            ys_sub2 = [list(map(int, str(self.df_sub2['token_id'][i]).split())) for i in indices]
+            ys_sub2 = [self._token_ids(self.df_sub2, i, 2) for i in indices]
         elif self._vocab_sub2 > 0 and not self.is_test:
             ys_sub2 = [self._token2idx[2](self.df['text'][i]) for i in indices]
 
@@ -566,31 +701,38 @@ class CustomBatchSampler(BatchSampler):
         self.longform_max_n_frames = longform_max_n_frames
 
         self._offset = 0
+        self._bucket_offset = 0  # number of consumed buckets
 
         if discourse_aware:
             self.indices_buckets = discourse_bucketing(self.df, batch_size)
-            self._iteration = len(self.indices_buckets)
         elif longform_max_n_frames > 0:
             self.indices_buckets = longform_bucketing(self.df, batch_size, longform_max_n_frames)
-            self._iteration = len(self.indices_buckets)
         elif shuffle_bucket:
             self.indices_buckets = shuffle_bucketing(self.df, batch_size, self.dynamic_batching)
-            self._iteration = len(self.indices_buckets)
         else:
-            self.indices = list(self.df.index)
-            # calculate #iteration in advance
-            self.calculate_iteration()
+            self._cache_lengths()
+        # calculate #iteration in advance
+        self.calculate_iteration()
 
     def __len__(self):
-        self._iteration
+        return self._iteration
+
+    @property
+    def _use_buckets(self):
+        return self.discourse_aware or self.longform_max_n_frames > 0 or self.shuffle_bucket
+
+    def _cache_lengths(self):
+        """Cache indices and lengths in the current order as arrays for O(1) sampling."""
+        self._utt_indices = self.df.index.values
+        self._xlens = self.df['xlen'].values
+        self._ylens = self.df['ylen'].values
 
     def calculate_iteration(self):
-        self._iteration = 0
-        is_new_epoch = False
-        while not is_new_epoch:
-            _, is_new_epoch = self.sample_index(self.batch_size)
-            self._iteration += 1
-        self._reset()
+        if self._use_buckets:
+            self._iteration = len(self.indices_buckets)
+        else:
+            self._iteration = len(batch_boundaries(self._xlens, self._ylens,
+                                                   self.batch_size, self.dynamic_batching)) - 1
 
     def _reset(self, batch_size=None):
         """Reset data counter and offset.
@@ -609,8 +751,9 @@ class CustomBatchSampler(BatchSampler):
         elif self.shuffle_bucket:
             self.indices_buckets = shuffle_bucketing(self.df, batch_size, self.dynamic_batching)
         else:
-            self.indices = list(self.df.index)
+            self._cache_lengths()
         self._offset = 0
+        self._bucket_offset = 0
 
     def sample_index(self, batch_size):
         """Sample data indices of mini-batch.
@@ -624,10 +767,11 @@ class CustomBatchSampler(BatchSampler):
         """
         is_new_epoch = False
 
-        if self.discourse_aware or self.longform_max_n_frames > 0 or self.shuffle_bucket:
-            indices = self.indices_buckets.pop(0)
+        if self._use_buckets:
+            indices = self.indices_buckets[self._bucket_offset]
+            self._bucket_offset += 1
             self._offset += len(indices)
-            is_new_epoch = (len(self.indices_buckets) == 0)
+            is_new_epoch = (self._bucket_offset == len(self.indices_buckets))
 
             if self.shuffle_bucket:
                 # Shuffle utterances in mini-batch
@@ -637,24 +781,21 @@ class CustomBatchSampler(BatchSampler):
                 batch_size = self.batch_size
 
             # Change batch size dynamically
-            min_xlen = self.df[self._offset:self._offset + 1]['xlen'].values[0]
-            min_ylen = self.df[self._offset:self._offset + 1]['ylen'].values[0]
+            min_xlen = self._xlens[self._offset]
+            min_ylen = self._ylens[self._offset]
             batch_size = set_batch_size(batch_size, min_xlen, min_ylen,
                                         self.dynamic_batching)
 
-            if len(self.indices) > batch_size:
-                indices = list(self.df[self._offset:self._offset + batch_size].index)
+            if len(self._utt_indices) - self._offset > batch_size:
+                indices = self._utt_indices[self._offset:self._offset + batch_size].tolist()
                 self._offset += len(indices)
             else:
                 # Last mini-batch
-                indices = self.indices[:]
-                self._offset = len(self.df)
+                indices = self._utt_indices[self._offset:].tolist()
+                self._offset = len(self._utt_indices)
                 is_new_epoch = True
 
             # Shuffle utterances in mini-batch
             indices = random.sample(indices, len(indices))
 
-            for i in indices:
-                self.indices.remove(i)
-
         return indices, is_new_epoch
@@ -0,0 +1,182 @@
+# Copyright 2021 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Compiled index of a dataset tsv file.
+   The index is built once from the tsv file and reused while the tsv file
+   does not change. The size and modification time of the tsv file are
+   checked first, and the file is hashed only when they differ from the
+   cached ones. Token IDs are stored as a flat int32 array with offsets so
+   that they can be sliced without parsing strings.
+"""
+
+import codecs
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import pandas as pd
+
+from neural_sp.datasets.feature_store import load_feat
+
+INDEX_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Compute SHA-1 hash of a file."""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def stat_file(path):
+    """Return size and modification time of a file, which are cheap to check."""
+    st = os.stat(path)
+    return {'tsv_size': st.st_size, 'tsv_mtime_ns': st.st_mtime_ns}
+
+
+def _write_meta(meta_path, meta):
+    with codecs.open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def build_index(tsv_path, index_dir, tsv_hash=None):
+    """Compile a dataset tsv file into memory-mappable arrays.
+
+    Args:
+        tsv_path (str): path to the dataset tsv file
+        index_dir (str): path to the output directory
+        tsv_hash (str): SHA-1 hash of the tsv file
+
+    """
+    tsv_stat = stat_file(tsv_path)
+    if tsv_hash is None:
+        tsv_hash = hash_file(tsv_path)
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path = os.path.join(index_dir, 'meta.json')
+    if os.path.isfile(meta_path):
+        os.remove(meta_path)  # invalidate the old index first
+
+    df = pd.read_csv(tsv_path, encoding='utf-8', delimiter='\t')
+    df = df.loc[:, ['utt_id', 'speaker', 'feat_path',
+                    'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
+
+    # Flatten token IDs
+    token_strs = df['token_id'].fillna('').astype(str)
+    token_lens = token_strs.str.split().str.len().values.astype(np.int64)
+    token_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    np.cumsum(token_lens, out=token_offsets[1:])
+    token_ids = np.array(' '.join(token_strs).split(), dtype=np.int32)
+    assert len(token_ids) == token_offsets[-1]
+
+    np.save(os.path.join(index_dir, 'token_ids.npy'), token_ids)
+    np.save(os.path.join(index_dir, 'token_offsets.npy'), token_offsets)
+    np.save(os.path.join(index_dir, 'xlens.npy'), df['xlen'].values.astype(np.int32))
+    np.save(os.path.join(index_dir, 'ylens.npy'), df['ylen'].values.astype(np.int32))
+
+    # NOTE: `text` is kept because it is returned with each mini-batch as the reference
+    # for evaluation and converted to targets of sub tasks without their own tsv file.
+    # Its size is comparable to the utterance IDs and feature paths, unlike `token_id`.
+    df = df.drop(columns=['token_id', 'xdim', 'ydim'])
+    df.to_pickle(os.path.join(index_dir, 'utterances.pkl'))
+
+    # Input dimension (empty feat_path for LM datasets, determined by the frontend for wav files)
+    input_dim = 0
+    if len(df) > 0 and isinstance(df['feat_path'][0], str) and df['feat_path'][0] != '' and \
+            not df['feat_path'][0].endswith('.wav'):
+        input_dim = load_feat(df['feat_path'][0]).shape[-1]
+
+    # NOTE: meta.json is written last and marks the index as complete
+    meta = {'version': INDEX_VERSION,
+            'tsv_hash': tsv_hash,
+            'n_utts': len(df),
+            'input_dim': int(input_dim)}
+    meta.update(tsv_stat)
+    _write_meta(meta_path, meta)
+
+
+class DatasetIndex(object):
+    """Memory-mapped index of a dataset tsv file.
+
+    Args:
+        tsv_path (str): path to the dataset tsv file
+        index_dir (str): path to the index directory (default: `<tsv_path>.index`)
+
+    """
+
+    def __init__(self, tsv_path, index_dir=None):
+        if index_dir is None:
+            index_dir = tsv_path + '.index'
+        self.index_dir = index_dir
+
+        tsv_stat = stat_file(tsv_path)
+        meta = self._load_meta()
+        if meta is None or meta['version'] != INDEX_VERSION:
+            logger.info('Build dataset index: %s' % index_dir)
+            build_index(tsv_path, index_dir)
+            meta = self._load_meta()
+        elif any(meta[k] != v for k, v in tsv_stat.items()):
+            # the tsv file may have been touched or copied without changing its contents
+            tsv_hash = hash_file(tsv_path)
+            if meta['tsv_hash'] != tsv_hash:
+                logger.info('Rebuild dataset index: %s' % index_dir)
+                build_index(tsv_path, index_dir, tsv_hash)
+                meta = self._load_meta()
+            else:
+                meta.update(tsv_stat)
+                _write_meta(os.path.join(index_dir, 'meta.json'), meta)
+        self.input_dim = meta['input_dim']
+
+        self.token_ids = np.load(os.path.join(index_dir, 'token_ids.npy'), mmap_mode='r')
+        self.token_offsets = np.load(os.path.join(index_dir, 'token_offsets.npy'), mmap_mode='r')
+        self.xlens = np.load(os.path.join(index_dir, 'xlens.npy'), mmap_mode='r')
+        self.ylens = np.load(os.path.join(index_dir, 'ylens.npy'), mmap_mode='r')
+
+    def _load_meta(self):
+        meta_path = os.path.join(self.index_dir, 'meta.json')
+        if not os.path.isfile(meta_path):
+            return None
+        with codecs.open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def __len__(self):
+        return len(self.token_offsets) - 1
+
+    def load_utterances(self):
+        """Load utterance-level information except for token IDs.
+
+        Returns:
+            df (pandas.DataFrame): dataframe with a `row` column pointing to the index
+
+        """
+        df = pd.read_pickle(os.path.join(self.index_dir, 'utterances.pkl'))
+        df['row'] = np.arange(len(df))
+        return df
+
+    def token_ids_at(self, row):
+        """Return token IDs of the utterance at `row` as a list."""
+        return self.token_ids[self.token_offsets[row]:self.token_offsets[row + 1]].tolist()
+
+    def concat_token_ids(self, rows, sep):
+        """Concatenate token IDs of utterances, inserting `sep` before each utterance and at the end.
+
+        Args:
+            rows (np.ndarray): row indices of utterances in the concatenation order
+            sep (int): index of the separator token
+        Returns:
+            concat_ids (np.ndarray): concatenated token IDs of size `[sum(ylens) + len(rows) + 1]`
+
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.token_offsets[rows]
+        lens = self.token_offsets[rows + 1] - starts
+        cum_lens = np.cumsum(lens) - lens
+        concat_ids = np.full(int(lens.sum()) + len(rows) + 1, sep, dtype=np.int32)
+        rel = np.arange(int(lens.sum())) - np.repeat(cum_lens, lens)
+        dst = np.repeat(cum_lens + np.arange(len(rows)) + 1, lens) + rel
+        concat_ids[dst] = self.token_ids[np.repeat(starts, lens) + rel]
+        return concat_ids
@@ -0,0 +1,119 @@
+# Copyright 2021 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Sharded feature store read through np.memmap.
+   Features of many utterances are concatenated into a few large uncompressed
+   shards. Each utterance is addressed as `<shard_path>:<start>:<end>` (in frames),
+   which can be used in the feat_path column of dataset tsv files in place of
+   Kaldi ark paths.
+"""
+
+import codecs
+import json
+import kaldiio
+import numpy as np
+import os
+
+META_NAME = 'meta.json'
+
+# opened shards in the current process
+_shards = {}
+
+
+def is_store_path(feat_path):
+    """Check whether feat_path points into a feature store."""
+    path = feat_path.rsplit(':', 2)[0]
+    return path.endswith('.bin') and feat_path.count(':') >= 2
+
+
+def _load_shard(shard_path):
+    if shard_path not in _shards:
+        with codecs.open(os.path.join(os.path.dirname(shard_path), META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        shard = np.memmap(shard_path, dtype=meta['dtype'], mode='r')
+        _shards[shard_path] = shard.reshape((-1, meta['dim']))
+    return _shards[shard_path]
+
+
+def load_feat(feat_path):
+    """Load features of a single utterance.
+
+    Args:
+        feat_path (str): path to a Kaldi ark (`<ark_path>:<offset>`) or
+            a feature store (`<shard_path>:<start>:<end>`)
+    Returns:
+        feat (np.ndarray): features of size `[T, input_dim]`.
+            This is a read-only view of the shard for feature store paths.
+
+    """
+    if is_store_path(feat_path):
+        shard_path, start, end = feat_path.rsplit(':', 2)
+        return _load_shard(shard_path)[int(start):int(end)]
+    return kaldiio.load_mat(feat_path)
+
+
+class FeatureStoreWriter(object):
+    """Writer of a sharded feature store.
+
+    Args:
+        store_dir (str): path to the output directory
+        dtype (str): float16 or float32
+        shard_size (int): maximum number of bytes per shard
+
+    """
+
+    def __init__(self, store_dir, dtype='float32', shard_size=1 << 32):
+        assert dtype in ['float16', 'float32']
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = os.path.abspath(store_dir)
+        self.dtype = dtype
+        self.shard_size = shard_size
+
+        self.dim = None
+        self.shard_id = -1
+        self.shard_path = None
+        self.f = None
+        self.n_frames = 0  # in the current shard
+        self.feat_paths = []  # list of (utt_id, feat_path)
+
+    def _open_shard(self):
+        if self.f is not None:
+            self.f.close()
+        self.shard_id += 1
+        self.shard_path = os.path.join(self.store_dir, 'feats.%d.bin' % self.shard_id)
+        self.f = open(self.shard_path, 'wb')
+        self.n_frames = 0
+
+    def write(self, utt_id, feat):
+        """Append features of a single utterance.
+
+        Args:
+            utt_id (str): utterance ID
+            feat (np.ndarray): features of size `[T, input_dim]`
+        Returns:
+            feat_path (str): path to the utterance in the store
+
+        """
+        if self.dim is None:
+            self.dim = feat.shape[-1]
+        assert feat.shape[-1] == self.dim, (utt_id, feat.shape)
+        feat = np.ascontiguousarray(feat, dtype=self.dtype)
+
+        if self.f is None or (self.n_frames > 0 and self.f.tell() + feat.nbytes > self.shard_size):
+            self._open_shard()
+        self.f.write(feat.tobytes())
+        feat_path = '%s:%d:%d' % (self.shard_path, self.n_frames, self.n_frames + len(feat))
+        self.n_frames += len(feat)
+        self.feat_paths.append((utt_id, feat_path))
+        return feat_path
+
+    def close(self):
+        """Close the current shard and write the meta data and the offset index (feats.scp)."""
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        with codecs.open(os.path.join(self.store_dir, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'dtype': self.dtype, 'dim': self.dim, 'n_shards': self.shard_id + 1}, f)
+        with codecs.open(os.path.join(self.store_dir, 'feats.scp'), 'w', encoding='utf-8') as f:
+            for utt_id, feat_path in self.feat_paths:
+                f.write('%s %s\n' % (utt_id, feat_path))
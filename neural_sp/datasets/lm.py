@@ -15,6 +15,7 @@ import os
 import pandas as pd
 import random
 
+from neural_sp.datasets.dataset_index import DatasetIndex
 from neural_sp.datasets.utils import count_vocab_size
 from neural_sp.datasets.token_converter.character import Char2idx
 from neural_sp.datasets.token_converter.character import Idx2char
@@ -37,7 +38,7 @@ class Dataset(object):
                  unit, batch_size, nlsyms=False, n_epochs=1e10,
                  is_test=False, min_n_tokens=1,
                  bptt=2, shuffle=False, backward=False, serialize=False,
-                 wp_model=None, corpus=''):
+                 wp_model=None, corpus='', cache_index=False):
         """A class for loading dataset.
 
         Args:
@@ -55,6 +56,8 @@ class Dataset(object):
             serialize (bool): serialize text according to contexts in dialogue
             wp_model (): path to the word-piece model for sentencepiece
             corpus (str): name of corpus
+            cache_index (bool): load a compiled index cached next to the tsv file
+                instead of parsing the tsv file
 
         """
         super(Dataset, self).__init__()
@@ -96,20 +99,25 @@ class Dataset(object):
             raise ValueError(unit)
 
         # Load dataset tsv file
-        self.df = pd.read_csv(tsv_path, encoding='utf-8', delimiter='\t')
-        self.df = self.df.loc[:, ['utt_id', 'speaker', 'feat_path',
-                                  'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
+        self.index = None
+        if cache_index:
+            self.index = DatasetIndex(tsv_path)
+            self.df = self.index.load_utterances()
+        else:
+            self.df = pd.read_csv(tsv_path, encoding='utf-8', delimiter='\t')
+            self.df = self.df.loc[:, ['utt_id', 'speaker', 'feat_path',
+                                      'xlen', 'xdim', 'text', 'token_id', 'ylen', 'ydim']]
 
         # Remove inappropriate utterances
         if is_test:
             print('Original utterance num: %d' % len(self.df))
             n_utts = len(self.df)
-            self.df = self.df[self.df.apply(lambda x: x['ylen'] > 0, axis=1)]
+            self.df = self.df[self.df['ylen'] > 0]
             print('Removed %d empty utterances' % (n_utts - len(self.df)))
         else:
             print('Original utterance num: %d' % len(self.df))
             n_utts = len(self.df)
-            self.df = self.df[self.df.apply(lambda x: x['ylen'] >= min_n_tokens, axis=1)]
+            self.df = self.df[self.df['ylen'] >= min_n_tokens]
             print('Removed %d utterances (threshold)' % (n_utts - len(self.df)))
 
         # Sort tsv records
@@ -132,11 +140,14 @@ class Dataset(object):
         indices = list(df.index)
         if self.backward:
             indices = indices[::-1]
-        concat_ids = []
-        for i in indices:
-            assert df['token_id'][i] != ''
-            concat_ids += [self.eos] + list(map(int, df['token_id'][i].split()))
-        concat_ids += [self.eos]  # for the last sentence
+        if self.index is not None:
+            concat_ids = self.index.concat_token_ids(df.loc[indices, 'row'].values, self.eos).astype(np.int64)
+        else:
+            concat_ids = []
+            for i in indices:
+                assert df['token_id'][i] != ''
+                concat_ids += [self.eos] + list(map(int, df['token_id'][i].split()))
+            concat_ids += [self.eos]  # for the last sentence
         # NOTE: <sos> and <eos> have the same index
 
         # Reshape
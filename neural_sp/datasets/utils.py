@@ -32,19 +32,34 @@ def set_batch_size(batch_size, min_xlen, min_ylen, dynamic_batching):
     return max(1, batch_size)
 
 
-def shuffle_bucketing(df, batch_size, dynamic_batching):
-    indices_buckets = []  # list of list
-    offset = 0
-    while True:
-        min_xlen = df[offset:offset + 1]['xlen'].values[0]
-        min_ylen = df[offset:offset + 1]['ylen'].values[0]
-        _batch_size = set_batch_size(batch_size, min_xlen, min_ylen,
+def batch_boundaries(xlens, ylens, batch_size, dynamic_batching):
+    """Compute offsets of mini-batches over utterances in the sorted order.
+
+    Args:
+        xlens (np.ndarray): input lengths of size `[N]`
+        ylens (np.ndarray): output lengths of size `[N]`
+        batch_size (int): size of mini-batch
+        dynamic_batching (bool): change batch size dynamically
+    Returns:
+        boundaries (list): start offsets of mini-batches followed by `N`
+
+    """
+    boundaries = [0]
+    n_utts = len(xlens)
+    while boundaries[-1] < n_utts:
+        offset = boundaries[-1]
+        _batch_size = set_batch_size(batch_size, xlens[offset], ylens[offset],
                                      dynamic_batching)
-        indices = list(df[offset:offset + _batch_size].index)
-        indices_buckets.append(indices)
-        offset += len(indices)
-        if offset >= len(df):
-            break
+        boundaries.append(min(offset + _batch_size, n_utts))
+    return boundaries
+
+
+def shuffle_bucketing(df, batch_size, dynamic_batching):
+    indices = df.index.values
+    boundaries = batch_boundaries(df['xlen'].values, df['ylen'].values,
+                                  batch_size, dynamic_batching)
+    indices_buckets = [indices[s:e].tolist()
+                       for s, e in zip(boundaries[:-1], boundaries[1:])]  # list of list
 
     # shuffle buckets
     random.shuffle(indices_buckets)
@@ -80,9 +95,8 @@ def longform_bucketing(df, batch_size, max_n_frames):
 
 def discourse_bucketing(df, batch_size):
     indices_buckets = []  # list of list
-    session_groups = [(k, v) for k, v in df.groupby('n_utt_in_session').groups.items()]
-    for n_utt, ids in session_groups:
-        first_utt_ids = [i for i in ids if df['n_prev_utt'][i] == 0]
+    for n_utt, ids in df.groupby('n_utt_in_session').groups.items():
+        first_utt_ids = ids[df.loc[ids, 'n_prev_utt'].values == 0].tolist()
         for i in range(0, len(first_utt_ids), batch_size):
             first_utt_ids_mb = first_utt_ids[i:i + batch_size]
             for j in range(n_utt):
@@ -145,3 +145,55 @@ def focal_loss(logits, ys, ylens, alpha, gamma):
     loss = -alpha * torch.mul(torch.pow(probs_inv, gamma), log_probs)
     loss_mean = np.sum([loss[b, :ylens[b], :].sum() for b in range(bs)]) / ylens.sum()
     return loss_mean
+
+
+def _logaddexp(x, y):
+    return torch.max(x, y) + torch.log1p(torch.exp(-torch.abs(x - y)))
+
+
+def transducer_loss(log_probs_blank, log_probs_label, elens, ylens):
+    """Compute Transducer loss from log-probabilities of <blank> and reference labels.
+
+    The forward variables are computed along anti-diagonals (t + u = const.) of the
+    output lattice, which can be processed in parallel.
+
+    Args:
+        log_probs_blank (FloatTensor): `[B, T, L+1]`
+        log_probs_label (FloatTensor): `[B, T, L]`
+        elens (IntTensor): `[B]`
+        ylens (IntTensor): `[B]`
+    Returns:
+        loss (FloatTensor): `[B]` (negative log-likelihood per utterance)
+
+    """
+    bs, xmax, ymax = log_probs_label.size()
+    device = log_probs_label.device
+    log0 = -1e10
+
+    # skew log-probabilities so that the n-th anti-diagonal corresponds to `[:, n]`
+    n_diags = xmax + ymax
+    u = torch.arange(ymax + 1, device=device).unsqueeze(0).expand(n_diags, -1)
+    t = torch.arange(n_diags, device=device).unsqueeze(1) - u  # `[n_diags, L+1]`
+    is_valid = (t >= 0) & (t < xmax)
+    t = t.clamp(0, xmax - 1)
+    blank_skew = log_probs_blank[:, t, u].masked_fill(~is_valid, log0)  # `[B, n_diags, L+1]`
+    label_skew = log_probs_label[:, t[:, :-1], u[:, :-1]].masked_fill(~is_valid[:, :-1], log0)  # `[B, n_diags, L]`
+
+    # forward variables alpha(t, u) on the n-th anti-diagonal
+    alpha = log_probs_label.new_full((bs, ymax + 1), log0)
+    alpha[:, 0] = 0
+    alphas = [alpha]
+    for n in range(1, n_diags):
+        from_blank = alpha + blank_skew[:, n - 1]  # alpha(t-1, u) + blank(t-1, u)
+        from_label = alpha[:, :-1] + label_skew[:, n - 1]  # alpha(t, u-1) + y(t, u-1)
+        from_label = torch.cat([alpha.new_full((bs, 1), log0), from_label], dim=1)
+        alpha = _logaddexp(from_blank, from_label)
+        alphas.append(alpha)
+    alphas = torch.stack(alphas, dim=1)  # `[B, n_diags, L+1]`
+
+    # log P(y|x) = alpha(T-1, U) + blank(T-1, U)
+    elens = elens.to(device).long()
+    ylens = ylens.to(device).long()
+    batch_idx = torch.arange(bs, device=device)
+    log_likelihood = alphas[batch_idx, elens - 1 + ylens, ylens] + log_probs_blank[batch_idx, elens - 1, ylens]
+    return -log_likelihood
@@ -197,12 +197,12 @@ class GatedConvLM(LMBase):
 
         """
         if self.embed_cache is None or self.training:
-            ys_emb = self.dropout_emb(self.embed(indices))
+            ys_emb = self.dropout_embed(self.embed(indices))
         else:
             ys_emb = self.embed_cache[indices]
         return ys_emb
 
-    def decode(self, ys, state=None, mems=None, incremental=False):
+    def decode(self, ys, state=None, mems=None, cache=None, incremental=False):
         """Decode function.
 
         Args:
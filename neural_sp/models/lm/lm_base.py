@@ -140,6 +140,62 @@ class LMBase(ModelBase):
             indices = torch.arange(0, self.vocab, 1, dtype=torch.int64).to(device)
             self.embed_cache = self.embed_token_id(indices)
 
+    def zero_state(self, batch_size):
+        """Initialize LM state for ASR decoding.
+
+        Args:
+            batch_size (int): batch size
+        Returns:
+            state: None (empty token history)
+
+        """
+        return None
+
+    def select_state(self, state, index):
+        """Select hypotheses from LM state (reorder/repeat/split).
+
+        Args:
+            state: LM state returned by `predict`
+            index (int or LongTensor): index of a single hypothesis or `[B']`
+        Returns:
+            state: LM state of the selected hypotheses
+
+        """
+        if state is None:
+            return None
+        if isinstance(index, int):
+            return {'ys': state['ys'][index:index + 1],
+                    'cache': [c[index:index + 1] if c is not None else None for c in state['cache']]}
+        return {'ys': state['ys'].index_select(0, index),
+                'cache': [c.index_select(0, index) if c is not None else None for c in state['cache']]}
+
+    def concat_state(self, states):
+        """Concatenate LM states of hypotheses along the batch dimension.
+
+        Args:
+            states (List): LM states of the same length (see `state_length`)
+        Returns:
+            state: LM state of all hypotheses
+
+        """
+        if states[0] is None:
+            assert all([s is None for s in states])
+            return None
+        assert len(set([self.state_length(s) for s in states])) == 1
+        n_layers = len(states[0]['cache'])
+        return {'ys': torch.cat([s['ys'] for s in states], dim=0),
+                'cache': [torch.cat([s['cache'][lth] for s in states], dim=0)
+                          if states[0]['cache'][lth] is not None else None
+                          for lth in range(n_layers)]}
+
+    def state_length(self, state):
+        """Return the number of tokens consumed by the LM state.
+
+        Only states of the same length can be concatenated by `concat_state`.
+
+        """
+        return 0 if state is None else state['ys'].size(1)
+
     def predict(self, ys, state=None, mems=None, cache=None):
         """Precict function for ASR.
 
@@ -149,25 +205,28 @@ class LMBase(ModelBase):
                 - RNNLM => (dict):
                     hxs (FloatTensor): `[n_layers, B, n_units]`
                     cxs (FloatTensor): `[n_layers, B, n_units]`
-                - TransformerLM => (LongTensor): `[B, L]`
-                - TransformerXL => (List): length `n_layers + 1`, each of which contains a tensor`[B, L, d_model]`
+                - TransformerLM/TransformerXL/GatedConvLM => (dict):
+                    ys (LongTensor): `[B, L_prev]` (token history)
+                    cache (List): length `n_layers`, each of which contains a tensor `[B, L_prev, d_model]`
+                  `ys` must be of size `[B, 1]` when state is given.
             mems (List):
             cache (List):
         Returns:
             lmout (FloatTensor): `[B, L, vocab]`, used for LM integration such as cold fusion
-            state:
-                - RNNLM (dict):
-                    hxs (FloatTensor): `[n_layers, B, n_units]`
-                    cxs (FloatTensor): `[n_layers, B, n_units]`
-                - TransformerLM => (LongTensor): `[B, L]`
-                - TransformerXL => (List): length `n_layers + 1`, each of which contains a tensor`[B, L, d_model]`
+            state: LM state after consuming `ys` (the same format as the input)
             log_probs (FloatTensor): `[B, L, vocab]`
 
         """
-        logits, lmout, new_state = self.decode(ys, state, mems=mems, cache=cache,
+        ylen = ys.size(1)
+        if state is not None:
+            assert ylen == 1
+            ys = torch.cat([state['ys'], ys], dim=1)
+            cache = state['cache']
+        logits, lmout, new_cache = self.decode(ys, None, mems=mems, cache=cache,
                                                incremental=True)
-        log_probs = torch.log_softmax(logits, dim=-1)
-        return lmout, new_state, log_probs
+        new_state = {'ys': ys, 'cache': new_cache if new_cache is not None else [None]}
+        log_probs = torch.log_softmax(logits[:, -ylen:], dim=-1)
+        return lmout[:, -ylen:], new_state, log_probs
 
     def plot_attention(self):
         # raise NotImplementedError
@@ -0,0 +1,310 @@
+# Copyright 2020 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Back-off n-gram language model loaded from an ARPA file."""
+
+import codecs
+import gzip
+import logging
+import math
+import numpy as np
+import torch
+
+from neural_sp.models.lm.lm_base import LMBase
+from neural_sp.models.torch_utils import tensor2np
+
+logger = logging.getLogger(__name__)
+
+LOG_0 = -1e10
+LOG_10 = math.log(10.)
+
+
+def is_arpa_path(path):
+    """Check whether a path points to an ARPA file (optionally gzipped)."""
+    return isinstance(path, str) and (path.endswith('.arpa') or path.endswith('.arpa.gz'))
+
+
+def load_arpa(arpa_path):
+    """Load n-grams from an ARPA file.
+
+    Args:
+        arpa_path (str): path to an ARPA file
+    Returns:
+        ngrams (List[List[tuple]]): n-grams of each order, each of which is
+            a tuple of (words, log10 probability, log10 back-off weight)
+
+    """
+    if arpa_path.endswith('.gz'):
+        f = gzip.open(arpa_path, 'rt', encoding='utf-8')
+    else:
+        f = codecs.open(arpa_path, 'r', encoding='utf-8')
+
+    counts, ngrams = [], []
+    n = 0
+    with f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line == '\\data\\':
+                continue
+            if line == '\\end\\':
+                break
+            if line.startswith('ngram ') and n == 0:
+                counts.append(int(line.split('=')[1]))
+            elif line.startswith('\\') and line.endswith('-grams:'):
+                n = int(line[1:].split('-')[0])
+                assert n == len(ngrams) + 1, 'n-grams must be sorted by order.'
+                ngrams.append([])
+            elif n > 0:
+                fields = line.split()
+                bow = float(fields[n + 1]) if len(fields) > n + 1 else 0.
+                ngrams[-1].append((fields[1:n + 1], float(fields[0]), bow))
+
+    for n, count in enumerate(counts):
+        if len(ngrams[n]) != count:
+            raise ValueError('%d %d-grams are declared, but %d are found in %s.' %
+                             (count, n + 1, len(ngrams[n]), arpa_path))
+    return ngrams
+
+
+class NgramLM(LMBase):
+    """Back-off n-gram language model for shallow fusion.
+
+    N-grams are kept in an array-backed trie. Entries of each order are sorted by
+    (index of the context (n-1)-gram, word index), so that all successors of a context
+    occupy a contiguous range of the arrays of the next order. An LM state holds the
+    indices of the suffixes of the token history for all orders (-1 if absent), and
+    next-token log-probabilities over the whole vocabulary are computed by adding the
+    back-off weight of each context and overwriting its explicit successors, from
+    unigrams to the highest order.
+
+    Tokens in the ASR dictionary are mapped to ARPA words by their surface forms.
+    <eos> is predicted as `</s>` and consumed as `<s>` (i.e., it resets the history),
+    and tokens missing in the ARPA file are scored as `<unk>`.
+
+    Args:
+        arpa_path (str): path to an ARPA file (optionally gzipped)
+        dict_path (str): path to the dictionary of the ASR model
+
+    """
+
+    def __init__(self, arpa_path, dict_path):
+
+        super(LMBase, self).__init__()
+        logger.info(self.__class__.__name__)
+
+        self.lm_type = 'ngram'
+        self.unk = 1
+        self.eos = 2
+        self.pad = 3
+
+        ngrams = load_arpa(arpa_path)
+        self.order = len(ngrams)
+
+        words = [ws[0] for ws, _, _ in ngrams[0]]
+        self.n_words = len(words)
+        word2idx = {w: i for i, w in enumerate(words)}
+        if len(word2idx) != self.n_words:
+            raise ValueError('Duplicated unigrams are found in %s.' % arpa_path)
+
+        # arrays of each order (index 0 for unigrams)
+        self.word_ids = [np.arange(self.n_words, dtype=np.int64)]
+        self.logps = [np.array([p for _, p, _ in ngrams[0]], dtype=np.float32) * LOG_10]
+        self.bows = [np.array([b for _, _, b in ngrams[0]], dtype=np.float32) * LOG_10]
+        self.keys = [None]
+        self.child_starts = []
+        for n in range(2, self.order + 1):
+            try:
+                ids = np.array([[word2idx[w] for w in ws] for ws, _, _ in ngrams[n - 1]],
+                               dtype=np.int64).reshape(-1, n)
+            except KeyError as e:
+                raise ValueError('%s in %d-grams is not found in unigrams.' % (e, n))
+            ctx = ids[:, 0]
+            for k in range(1, n - 1):
+                ctx = self._find(k + 1, ctx, ids[:, k])
+            if (ctx < 0).any():
+                raise ValueError('Prefixes of some %d-grams are not found in %s.' % (n, arpa_path))
+            keys = ctx * self.n_words + ids[:, -1]
+            perm = np.argsort(keys, kind='mergesort')
+            self.keys.append(keys[perm])
+            self.word_ids.append(ids[perm, -1])
+            self.logps.append(np.array([p for _, p, _ in ngrams[n - 1]], dtype=np.float32)[perm] * LOG_10)
+            self.bows.append(np.array([b for _, _, b in ngrams[n - 1]], dtype=np.float32)[perm] * LOG_10)
+            # successors of the i-th (n-1)-gram are in [child_starts[i], child_starts[i + 1])
+            n_ctx = self.n_words if n == 2 else len(self.keys[n - 2])
+            self.child_starts.append(np.searchsorted(ctx[perm], np.arange(n_ctx + 1)))
+        for n in range(2, self.order + 1):
+            logger.info('%d-grams: %d' % (n, len(self.keys[n - 1])))
+
+        # ASR token -> ARPA word
+        token2idx = {'<blank>': 0}
+        with codecs.open(dict_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                w, idx = line.strip().split(' ')
+                token2idx[w] = int(idx)
+        self.vocab = max(token2idx.values()) + 1
+        unk_word = word2idx.get('<unk>', -1)
+        token2word = np.full(self.vocab, unk_word, dtype=np.int64)
+        for w, idx in token2idx.items():
+            token2word[idx] = word2idx.get(w, unk_word)
+        token2word[0] = -1
+        token2word[self.pad] = -1
+        token2word[self.eos] = word2idx.get('</s>', -1)
+        # index of n_words is for tokens never predicted by the LM
+        self.register_buffer('vocab2word', torch.from_numpy(
+            np.where(token2word >= 0, token2word, self.n_words)))
+        # <eos> is consumed as <s>
+        token2word[self.eos] = word2idx.get('<s>', -1)
+        self.token2word = token2word
+
+    @property
+    def device(self):
+        return self.vocab2word.device
+
+    def forward(self, ys, state=None, is_eval=False, n_caches=0,
+                ylens=[], predict_last=False):
+        """n-gram LMs are estimated offline and only used for decoding via `predict`."""
+        raise NotImplementedError('NgramLM is inference-only and cannot be trained or evaluated with forward(). '
+                                  'Use predict() for decoding.')
+
+    def cache_embedding(self, device):
+        """No token embedding."""
+        pass
+
+    def _find(self, n, ctx, word_ids):
+        """Look up n-grams in the sorted arrays.
+
+        Args:
+            n (int): order (>= 2)
+            ctx (np.ndarray): indices of the context (n-1)-grams `[B]`
+            word_ids (np.ndarray): indices of the last words `[B]`
+        Returns:
+            ids (np.ndarray): indices of n-grams (-1 if absent) `[B]`
+
+        """
+        keys = self.keys[n - 1]
+        if len(keys) == 0:
+            return np.full_like(ctx, -1)
+        query = ctx * self.n_words + word_ids
+        pos = np.searchsorted(keys, query).clip(max=len(keys) - 1)
+        found = (ctx >= 0) & (word_ids >= 0) & (keys[pos] == query)
+        return np.where(found, pos, -1)
+
+    def transit(self, nodes, word_ids):
+        """Append words to token histories.
+
+        Args:
+            nodes (np.ndarray): indices of the history suffixes of each order `[B, order - 1]`
+            word_ids (np.ndarray): indices of words `[B]`
+        Returns:
+            new_nodes (np.ndarray): `[B, order - 1]`
+
+        """
+        new_nodes = np.full_like(nodes, -1)
+        if self.order > 1:
+            new_nodes[:, 0] = word_ids
+        for k in range(1, self.order - 1):
+            new_nodes[:, k] = self._find(k + 1, nodes[:, k - 1], word_ids)
+        return new_nodes
+
+    def score(self, nodes):
+        """Compute log-probabilities of all words given token histories.
+
+        Args:
+            nodes (np.ndarray): indices of the history suffixes of each order `[B, order - 1]`
+        Returns:
+            scores (np.ndarray): `[B, n_words + 1]`
+
+        """
+        bs = nodes.shape[0]
+        scores = np.empty((bs, self.n_words + 1), dtype=np.float32)
+        scores[:, :-1] = self.logps[0]
+        scores[:, -1] = LOG_0
+        for n in range(2, self.order + 1):
+            rows = np.nonzero(nodes[:, n - 2] >= 0)[0]
+            if len(rows) == 0:
+                continue
+            ctx = nodes[rows, n - 2]
+            # back off from the context
+            scores[rows, :-1] += self.bows[n - 2][ctx][:, None]
+            # overwrite with explicit n-grams
+            starts = self.child_starts[n - 2][ctx]
+            n_children = self.child_starts[n - 2][ctx + 1] - starts
+            offsets = np.repeat(starts - (np.cumsum(n_children) - n_children), n_children)
+            ids = np.arange(n_children.sum()) + offsets
+            scores[np.repeat(rows, n_children), self.word_ids[n - 1][ids]] = self.logps[n - 1][ids]
+        return scores
+
+    def zero_state(self, batch_size):
+        """Initialize LM state with an empty token history.
+
+        Args:
+            batch_size (int): batch size
+        Returns:
+            state (dict):
+                nodes (np.ndarray): `[B, order - 1]`
+
+        """
+        return {'nodes': np.full((batch_size, self.order - 1), -1, dtype=np.int64)}
+
+    def select_state(self, state, index):
+        """Select hypotheses from LM state (reorder/repeat/split).
+
+        Args:
+            state (dict):
+                nodes (np.ndarray): `[B, order - 1]`
+            index (int or LongTensor): index of a single hypothesis or `[B']`
+        Returns:
+            state (dict):
+                nodes (np.ndarray): `[B', order - 1]`
+
+        """
+        if state is None:
+            return None
+        if isinstance(index, int):
+            return {'nodes': state['nodes'][index:index + 1]}
+        return {'nodes': state['nodes'][tensor2np(index)]}
+
+    def concat_state(self, states):
+        """Concatenate LM states of hypotheses along the batch dimension.
+
+        Args:
+            states (List): length `B`, each of which contains a dict of LM state
+        Returns:
+            state (dict):
+                nodes (np.ndarray): `[B, order - 1]`
+
+        """
+        if all([s is None for s in states]):
+            return None
+        states = [s if s is not None else self.zero_state(1) for s in states]
+        return {'nodes': np.concatenate([s['nodes'] for s in states], axis=0)}
+
+    def state_length(self, state):
+        """LM states have a fixed size regardless of the number of consumed tokens."""
+        return 0
+
+    def predict(self, ys, state=None, mems=None, cache=None):
+        """Precict function for ASR.
+
+        Args:
+            ys (LongTensor): `[B, L]`
+            state (dict):
+                nodes (np.ndarray): `[B, order - 1]`
+            mems: dummy interfance for TransformerXL
+            cache: dummy interfance for TransformerLM/TransformerXL
+        Returns:
+            lmout: None (no hidden representation)
+            state (dict):
+                nodes (np.ndarray): `[B, order - 1]`
+            log_probs (FloatTensor): `[B, L, vocab]`
+
+        """
+        bs, ylen = ys.size()
+        nodes = self.zero_state(bs)['nodes'] if state is None else state['nodes']
+        word_ids = self.token2word[tensor2np(ys)]
+        log_probs = np.empty((bs, ylen, self.n_words + 1), dtype=np.float32)
+        for i in range(ylen):
+            nodes = self.transit(nodes, word_ids[:, i])
+            log_probs[:, i] = self.score(nodes)
+        log_probs = torch.from_numpy(log_probs).to(self.device).index_select(2, self.vocab2word)
+        return None, {'nodes': nodes}, log_probs
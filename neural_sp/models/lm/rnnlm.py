@@ -271,3 +271,66 @@ class RNNLM(LMBase):
         if self.rnn_type == 'lstm':
             state['cxs'] = state['cxs'].detach()
         return state
+
+    def select_state(self, state, index):
+        """Select hypotheses from hidden state (reorder/repeat/split).
+
+        Args:
+            state (dict):
+                hxs (FloatTensor): `[n_layers, B, n_units]`
+                cxs (FloatTensor): `[n_layers, B, n_units]`
+            index (int or LongTensor): index of a single hypothesis or `[B']`
+        Returns:
+            state (dict):
+                hxs (FloatTensor): `[n_layers, B', n_units]`
+                cxs (FloatTensor): `[n_layers, B', n_units]`
+
+        """
+        if state is None:
+            return None
+        if isinstance(index, int):
+            return {k: v[:, index:index + 1] if v is not None else None for k, v in state.items()}
+        return {k: v.index_select(1, index) if v is not None else None for k, v in state.items()}
+
+    def concat_state(self, states):
+        """Concatenate hidden states of hypotheses along the batch dimension.
+
+        Args:
+            states (List): length `B`, each of which contains a dict of hidden states
+        Returns:
+            state (dict):
+                hxs (FloatTensor): `[n_layers, B, n_units]`
+                cxs (FloatTensor): `[n_layers, B, n_units]`
+
+        """
+        if all([s is None for s in states]):
+            return None
+        states = [s if s is not None else self.zero_state(1) for s in states]
+        return {k: torch.cat([s[k] for s in states], dim=1) if states[0][k] is not None else None
+                for k in states[0].keys()}
+
+    def state_length(self, state):
+        """Hidden states have a fixed size regardless of the number of consumed tokens."""
+        return 0
+
+    def predict(self, ys, state=None, mems=None, cache=None):
+        """Precict function for ASR.
+
+        Args:
+            ys (LongTensor): `[B, L]`
+            state (dict):
+                hxs (FloatTensor): `[n_layers, B, n_units]`
+                cxs (FloatTensor): `[n_layers, B, n_units]`
+            mems: dummy interfance for TransformerXL
+            cache: dummy interfance for TransformerLM/TransformerXL
+        Returns:
+            lmout (FloatTensor): `[B, L, vocab]`, used for LM integration such as cold fusion
+            state (dict):
+                hxs (FloatTensor): `[n_layers, B, n_units]`
+                cxs (FloatTensor): `[n_layers, B, n_units]`
+            log_probs (FloatTensor): `[B, L, vocab]`
+
+        """
+        logits, lmout, new_state = self.decode(ys, state)
+        log_probs = torch.log_softmax(logits, dim=-1)
+        return lmout, new_state, log_probs
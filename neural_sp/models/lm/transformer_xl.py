@@ -214,8 +214,8 @@ class TransformerXL(LMBase):
                 each of which contains a FloatTensor of size `[B, L-1, d_model]`
             incremental (bool): ASR decoding mode
         Returns:
-            logits (FloatTensor): `[B, L, vocab]`
-            out (FloatTensor): `[B, L, d_model]`
+            logits (FloatTensor): `[B, L, vocab]` (`[B, 1, vocab]` if cache is given)
+            out (FloatTensor): `[B, L, d_model]` (`[B, 1, d_model]` if cache is given)
             new_cache (List): length `n_layers`,
                 each of which contains a FloatTensor of size `[B, L, d_model]`
 
@@ -257,6 +257,8 @@ class TransformerXL(LMBase):
                 # NOTE: outputs from the last layer is not used for memory
             if not self.training and layer.yy_aws is not None:
                 setattr(self, 'yy_aws_layer%d' % lth, tensor2np(layer.yy_aws))
+        if incremental and cache[0] is not None:
+            out = out[:, -1:]
         out = self.norm_out(out)
         if self.adaptive_softmax is None:
             logits = self.output(out)
@@ -174,8 +174,8 @@ class TransformerLM(LMBase):
                 each of which contains a FloatTensor of size `[B, L-1, d_model]`
             incremental (bool): ASR decoding mode
         Returns:
-            logits (FloatTensor): `[B, L, vocab]`
-            out (FloatTensor): `[B, L, d_model]`
+            logits (FloatTensor): `[B, L, vocab]` (`[B, 1, vocab]` if cache is given)
+            out (FloatTensor): `[B, L, d_model]` (`[B, 1, d_model]` if cache is given)
             new_cache (List): length `n_layers`,
                 each of which contains a FloatTensor of size `[B, L, d_model]`
 
@@ -185,17 +185,16 @@ class TransformerLM(LMBase):
             cache = [None] * self.n_layers  # 1-th to L-th layer
 
         bs, ylen = ys.size()[:2]
-        n_hist = 0
         if incremental and cache[0] is not None:
-            n_hist = cache[0].size(1)
-            ylen += n_hist
+            # NOTE: `ys` contains the whole history and only the last position is computed
+            assert cache[0].size(1) == ylen - 1
 
         # Create the self-attention mask
         causal_mask = ys.new_ones(ylen, ylen).byte()
         causal_mask = torch.tril(causal_mask).unsqueeze(0)
         causal_mask = causal_mask.repeat([bs, 1, 1])  # `[B, L, L]`
 
-        out = self.pos_enc(self.embed_token_id(ys), scale=True, offset=max(0, n_hist))  # scaled + dropout
+        out = self.pos_enc(self.embed_token_id(ys), scale=True)  # scaled + dropout
 
         new_cache = [None] * self.n_layers
         hidden_states = [out]
@@ -208,6 +207,8 @@ class TransformerLM(LMBase):
                 # NOTE: outputs from the last layer is not used for cache
             if not self.training and layer.yy_aws is not None:
                 setattr(self, 'yy_aws_layer%d' % lth, tensor2np(layer.yy_aws))
+        if incremental and cache[0] is not None:
+            out = out[:, -1:]
         out = self.norm_out(out)
         if self.adaptive_softmax is None:
             logits = self.output(out)
@@ -60,7 +60,7 @@ class ConvGLUBlock(nn.Module):
                           kernel_size=(kernel_size, 1)), name='weight', dim=0)
             # TODO(hirofumi0810): padding?
             layers['dropout'] = nn.Dropout(p=dropout)
-            layers['glu'] = nn.GLU()
+            layers['glu'] = nn.GLU(dim=1)  # over channels
 
         elif bottlececk_dim > 0:
             layers['conv_in'] = nn.utils.weight_norm(
@@ -70,13 +70,13 @@ class ConvGLUBlock(nn.Module):
             layers['dropout_in'] = nn.Dropout(p=dropout)
             layers['conv_bottleneck'] = nn.utils.weight_norm(
                 nn.Conv2d(in_channels=bottlececk_dim,
-                          out_channels=bottlececk_dim,
+                          out_channels=bottlececk_dim * 2,
                           kernel_size=(kernel_size, 1)), name='weight', dim=0)
             layers['dropout'] = nn.Dropout(p=dropout)
-            layers['glu'] = nn.GLU()
+            layers['glu'] = nn.GLU(dim=1)  # over channels
             layers['conv_out'] = nn.utils.weight_norm(
                 nn.Conv2d(in_channels=bottlececk_dim,
-                          out_channels=out_ch * 2,
+                          out_channels=out_ch,
                           kernel_size=(1, 1)), name='weight', dim=0)
             layers['dropout_out'] = nn.Dropout(p=dropout)
 
@@ -95,6 +95,6 @@ class ConvGLUBlock(nn.Module):
         if self.conv_residual is not None:
             residual = self.dropout_residual(self.conv_residual(residual))
         xs = self.pad_left(xs)  # `[B, embed_dim, T+kernel-1, 1]`
-        xs = self.layers(xs)  # `[B, out_ch * 2, T ,1]`
+        xs = self.layers(xs)  # `[B, out_ch, T, 1]`
         xs = xs + residual
         return xs
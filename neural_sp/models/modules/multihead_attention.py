@@ -97,8 +97,8 @@ class MultiheadAttentionMechanism(nn.Module):
         Args:
             key (FloatTensor): `[B, klen, kdim]`
             value (FloatTensor): `[B, klen, vdim]`
-            query (FloatTensor): `[B, qlen, qdim]`
-            mask (ByteTensor): `[B, qlen, klen]`
+            query (FloatTensor): `[B * n_hyps, qlen, qdim]`
+            mask (ByteTensor): `[B, qlen, klen]` or `[B, 1, klen]`
             aw_prev: dummy interface
             cache (bool): cache key, value, and mask
             mode: dummy interface for MoChA/MMA
@@ -106,39 +106,56 @@ class MultiheadAttentionMechanism(nn.Module):
             eps_wait: dummy interface for MMA
             streaming: dummy interface for streaming attention
         Returns:
-            cv (FloatTensor): `[B, qlen, vdim]`
-            aw (FloatTensor): `[B, H, qlen, klen]`
+            cv (FloatTensor): `[B * n_hyps, qlen, vdim]`
+            aw (FloatTensor): `[B * n_hyps, H, qlen, klen]`
             attn_state (dict): dummy interface
 
         """
-        bs, klen = key.size()[: 2]
         qlen = query.size(1)
         attn_state = {}
 
         # Pre-computation of encoder-side features for computing scores
+        # NOTE: keys/values are stored only when cached, so that non-cached calls
+        # (e.g., by other models in an ensemble) do not overwrite them
         if self.key is None or not cache:
-            self.key = self.w_key(key).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
-            self.value = self.w_value(value).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
+            bs = key.size(0)
+            key_proj = self.w_key(key).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
+            value_proj = self.w_value(value).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
             if mask is not None:
-                self.mask = mask.unsqueeze(3).repeat([1, 1, 1, self.n_heads])
-                mask_size = (bs, qlen, klen, self.n_heads)
-                assert self.mask.size() == mask_size, (self.mask.size(), mask_size)
+                mask_proj = mask.unsqueeze(3).repeat([1, 1, 1, self.n_heads])
+                mask_size = (bs, qlen, key.size(1), self.n_heads)
+                assert mask_proj.size() == mask_size or (cache and mask_proj.size(1) == 1), \
+                    (mask_proj.size(), mask_size)
             else:
-                self.mask = None
+                mask_proj = None
+            if cache:
+                self.key, self.value, self.mask = key_proj, value_proj, mask_proj
+        else:
+            key_proj, value_proj, mask_proj = self.key, self.value, self.mask
+
+        # NOTE: consecutive n_hyps queries (e.g., beam candidates) share keys/values of the same
+        # utterance, so that encoder-side features are projected only once per utterance
+        bs, klen = key_proj.size()[:2]
+        n_hyps = query.size(0) // bs
+        assert query.size(0) == bs * n_hyps, (query.size(), key_proj.size())
 
-        key = self.key
-        query = self.w_query(query).view(bs, -1, self.n_heads, self.d_k)  # `[B, qlen, H, d_k]`
+        key = key_proj
+        query = self.w_query(query).view(bs, n_hyps * qlen, self.n_heads, self.d_k)  # `[B, n_hyps * qlen, H, d_k]`
 
         if self.atype == 'scaled_dot':
             e = torch.einsum("bihd,bjhd->bijh", (query, key)) / self.scale
         elif self.atype == 'add':
-            e = self.v(torch.tanh(key[:, None] + query[:, :, None]).view(bs, qlen, klen, -1))
-        # e: `[B, qlen, klen, H]`
+            e = self.v(torch.tanh(key[:, None] + query[:, :, None]).view(bs, n_hyps * qlen, klen, -1))
+        # e: `[B, n_hyps * qlen, klen, H]`
 
         # Compute attention weights
-        if self.mask is not None:
+        if mask_proj is not None:
             NEG_INF = float(np.finfo(torch.tensor(0, dtype=e.dtype).numpy().dtype).min)
-            e = e.masked_fill_(self.mask == 0, NEG_INF)  # `[B, qlen, klen, H]`
+            if n_hyps > 1 and mask_proj.size(1) > 1:
+                mask = mask_proj.repeat([1, n_hyps, 1, 1])
+            else:
+                mask = mask_proj
+            e = e.masked_fill_(mask == 0, NEG_INF)  # `[B, n_hyps * qlen, klen, H]`
         aw = torch.softmax(e, dim=2)
         aw = self.dropout_attn(aw)
         aw_masked = aw.clone()
@@ -149,9 +166,9 @@ class MultiheadAttentionMechanism(nn.Module):
             aw_masked = headdrop(aw_masked, self.n_heads, self.dropout_head)  # `[B, H, qlen, klen]`
             aw_masked = aw_masked.permute(0, 2, 3, 1)
 
-        cv = torch.einsum("bijh,bjhd->bihd", (aw_masked, self.value))  # `[B, qlen, H, d_k]`
-        cv = cv.contiguous().view(bs, -1, self.n_heads * self.d_k)  # `[B, qlen, H * d_k]`
+        cv = torch.einsum("bijh,bjhd->bihd", (aw_masked, value_proj))  # `[B, n_hyps * qlen, H, d_k]`
+        cv = cv.contiguous().view(bs * n_hyps, qlen, self.n_heads * self.d_k)  # `[B * n_hyps, qlen, H * d_k]`
         cv = self.w_out(cv)
-        aw = aw.permute(0, 3, 1, 2)  # `[B, H, qlen, klen]`
+        aw = aw.view(bs * n_hyps, qlen, klen, self.n_heads).permute(0, 3, 1, 2)  # `[B * n_hyps, H, qlen, klen]`
 
         return cv, aw, attn_state
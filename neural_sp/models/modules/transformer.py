@@ -173,7 +173,8 @@ class TransformerDecoderBlock(nn.Module):
     def forward(self, ys, yy_mask, xs=None, xy_mask=None, cache=None,
                 xy_aws_prev=None,
                 mode='hard', eps_wait=-1, lmout=None,
-                pos_embs=None, memory=None, u_bias=None, v_bias=None):
+                pos_embs=None, memory=None, u_bias=None, v_bias=None,
+                cache_src=False):
         """Transformer decoder forward pass.
 
         Args:
@@ -190,6 +191,9 @@ class TransformerDecoderBlock(nn.Module):
             memory (FloatTensor): `[B, L_prev, d_model]`
             u_bias (FloatTensor): global parameter for TransformerXL
             v_bias (FloatTensor): global parameter for TransformerXL
+            cache_src (bool): project encoder outputs into keys/values only at the first call
+                after `reset()` and reuse them. `xs` (and `xy_mask`) are then given per utterance
+                and broadcast across consecutive hypotheses in `ys`.
         Returns:
             out (FloatTensor): `[B, L, d_model]`
 
@@ -233,7 +237,7 @@ class TransformerDecoderBlock(nn.Module):
             out = self.norm2(out)
             out, self._xy_aws, attn_state = self.src_attn(
                 xs, xs, out, mask=xy_mask,  # k/v/q
-                aw_prev=xy_aws_prev, mode=mode, eps_wait=eps_wait)
+                aw_prev=xy_aws_prev, mode=mode, eps_wait=eps_wait, cache=cache_src)
             out = self.dropout(out) + residual
 
             if attn_state.get('beta', None) is not None:
@@ -3,6 +3,8 @@
 
 """Utility functions for beam search decoding."""
 
+from collections import OrderedDict
+import functools
 import logging
 import numpy as np
 import torch
@@ -15,6 +17,8 @@ from neural_sp.models.torch_utils import (
 
 logger = logging.getLogger(__name__)
 
+NEG_INF = float("-inf")
+
 
 class BeamSearch(object):
     def __init__(self, beam_width, eos, ctc_weight, lm_weight,
@@ -63,22 +67,66 @@ class BeamSearch(object):
         new_ctc_states = new_ctc_states[joint_ids_topk[0].cpu().numpy()]
         return new_ctc_states, total_scores_ctc, total_scores_topk
 
+    def add_ctc_score_batch(self, hyps, topk_ids, ctc_states, total_scores_topk,
+                            ctc_prefix_scorer, utt_ids=None, att_peaks=None):
+        """Add CTC prefix scores of candidates of all hypotheses at once.
+
+        Args:
+            hyps (List[List]): prefix label sequences of `N` hypotheses
+            topk_ids (LongTensor): candidate labels `[N, beam_width]`
+            ctc_states (List[FloatTensor]): CTC states of hypotheses, each of which is `[T, 2]`
+            total_scores_topk (FloatTensor): `[N, beam_width]`
+            ctc_prefix_scorer (CTCPrefixScoreTH): CTC prefix scorer
+            utt_ids (LongTensor): index of the utterance of each hypothesis `[N]`
+            att_peaks (LongTensor): frame indices of the attention peaks for windowed scoring `[N]`
+        Returns:
+            new_ctc_states (FloatTensor): `[N, beam_width, T, 2]`
+            total_scores_ctc (FloatTensor): `[N, beam_width]`
+            total_scores_topk (FloatTensor): `[N, beam_width]`
+
+        NOTE: candidates are not re-sorted so that all outputs are aligned with `topk_ids`.
+
+        """
+        if ctc_prefix_scorer is None:
+            return None, total_scores_topk.new_zeros(topk_ids.size()), total_scores_topk
+
+        total_scores_ctc, new_ctc_states = ctc_prefix_scorer(
+            hyps, topk_ids, torch.stack(ctc_states, dim=0), utt_ids, att_peaks)
+        total_scores_topk = total_scores_topk + total_scores_ctc * self.ctc_weight
+        return new_ctc_states, total_scores_ctc, total_scores_topk
+
     def add_lm_score(self, after_topk=True):
         raise NotImplementedError
 
+    def eos_allowed_batch(self, scores, n_tokens, min_lens, eos_threshold):
+        """Check whether <eos> can be emitted from each hypothesis in batch-mode.
+
+        Args:
+            scores (FloatTensor): `[B * beam_width, vocab]`
+            n_tokens (int): number of tokens emitted so far (excluding <sos>)
+            min_lens (FloatTensor): minimum number of tokens for each row `[B * beam_width]`
+            eos_threshold (float): threshold for emitting <eos>
+        Returns:
+            allowed (BoolTensor): `[B * beam_width]`
+
+        """
+        score_eos = scores[:, self.eos]
+        scores_no_eos = scores.clone()
+        scores_no_eos[:, self.eos] = NEG_INF
+        max_score_no_eos = scores_no_eos.max(1)[0]
+        return (n_tokens >= min_lens) & (score_eos > eos_threshold * max_score_no_eos)
+
     @staticmethod
-    def update_rnnlm_state(lm, hyp, y):
-        """Update RNNLM state for a single utterance.
+    def update_lm_state(lm, hyp, y):
+        """Update LM state for a single utterance.
 
         Args:
-            lm (RNNLM): RNNLM
+            lm (LMBase): LM
             hyp (dict): beam candiate
             y (LongTensor): `[1, 1]`
         Returns:
             lmout (FloatTensor): `[1, 1, lm_n_units]`
-            lmstate (dict):
-                hxs (FloatTensor): `[n_layers, 1, n_units]`
-                cxs (FloatTensor): `[n_layers, 1, n_units]`
+            lmstate: LM state (see `LMBase.predict`)
             scores_lm (FloatTensor): `[1, 1, vocab]`
 
         """
@@ -88,57 +136,134 @@ class BeamSearch(object):
         return lmout, lmstate, scores_lm
 
     @staticmethod
-    def update_rnnlm_state_batch(lm, hyps, y):
-        """Update RNNLM state in batch-mode.
+    def update_lm_state_batch(lm, hyps, y):
+        """Update LM states in batch-mode.
+
+        LM states of hypotheses are concatenated with `lm.concat_state` and forwarded at once.
+        Hypotheses whose states cannot be concatenated (e.g., token histories of different
+        lengths for TransformerLM) are grouped by `lm.state_length` and forwarded per group.
 
         Args:
-            lm (RNNLM): RNNLM
+            lm (LMBase): LM
             hyps (List[dict]): beam candidates
             y (LongTensor): `[B, 1]`
         Returns:
             lmout (FloatTensor): `[B, 1, lm_n_units]`
-            lmstate (dict):
-                hxs (FloatTensor): `[n_layers, B, n_units]`
-                cxs (FloatTensor): `[n_layers, B, n_units]`
+            lmstates (List): length `B`, LM state of each hypothesis
             scores_lm (FloatTensor): `[B, 1, vocab]`
 
         """
-        lmout, lmstate, scores_lm = None, None, None
-        if lm is not None:
-            if hyps[0]['lmstate'] is not None:
-                lm_hxs = torch.cat([beam['lmstate']['hxs'] for beam in hyps], dim=1)
-                lm_cxs = torch.cat([beam['lmstate']['cxs'] for beam in hyps], dim=1)
-                lmstate = {'hxs': lm_hxs, 'cxs': lm_cxs}
-            lmout, lmstate, scores_lm = lm.predict(y, lmstate)
-        return lmout, lmstate, scores_lm
+        if lm is None:
+            return None, None, None
+
+        groups = OrderedDict()
+        for i, beam in enumerate(hyps):
+            key = lm.state_length(beam['lmstate'])
+            if key not in groups:
+                groups[key] = []
+            groups[key].append(i)
+
+        lmouts, scores_lm, lmstates, order = [], [], [], []
+        for ids in groups.values():
+            lmstate = lm.concat_state([hyps[i]['lmstate'] for i in ids])
+            y_g = y if len(groups) == 1 else y[ids]
+            lmout_g, lmstate_g, scores_lm_g = lm.predict(y_g, lmstate)
+            lmouts.append(lmout_g)
+            scores_lm.append(scores_lm_g)
+            lmstates += [lm.select_state(lmstate_g, j) for j in range(len(ids))]
+            order += ids
+        if len(groups) == 1:
+            return lmouts[0], lmstates, scores_lm[0]
+
+        # restore the original order of hypotheses
+        inv = [0] * len(order)
+        for j, i in enumerate(order):
+            inv[i] = j
+        index = torch.tensor(inv, device=y.device)
+        lmout = torch.cat(lmouts, dim=0).index_select(0, index)
+        scores_lm = torch.cat(scores_lm, dim=0).index_select(0, index)
+        lmstates = [lmstates[j] for j in inv]
+        return lmout, lmstates, scores_lm
 
     @staticmethod
-    def lm_rescoring(hyps, lm, lm_weight, reverse=False, length_norm=False, tag=''):
-        if lm is None:
+    def lm_rescoring(hyps, lm, lm_weight, reverse=False, length_norm=False, tag='',
+                     batch_size=100):
+        """Rescore N-best hypotheses with LM in batch-mode.
+
+        Hypotheses are padded into batches of `batch_size` and each batch is forwarded at once.
+
+        Args:
+            hyps (List[dict]): beam candidates
+            lm (LMBase): second-pass LM
+            lm_weight (float): weight of LM score
+            reverse (bool): rescore hypotheses in the reverse direction
+            length_norm (bool): normalize LM scores by hypothesis length
+            tag (str): postfix of the key to store LM scores
+            batch_size (int): maximum number of hypotheses forwarded at once
+        Returns:
+            hyps (List[dict]): beam candidates with updated scores
+
+        """
+        if lm is None or len(hyps) == 0:
             return hyps
-        for i in range(len(hyps)):
-            ys = hyps[i]['hyp']  # include <sos>
-            if reverse:
-                ys = ys[::-1]
-
-            ys = [np2tensor(np.fromiter(ys, dtype=np.int64), lm.device)]
-            ys_in = pad_list([y[:-1] for y in ys], -1)  # `[1, L-1]`
-            ys_out = pad_list([y[1:] for y in ys], -1)  # `[1, L-1]`
-
-            if ys_in.size(1) > 0:
-                _, _, scores_lm = lm.predict(ys_in, None)
-                score_lm = sum([scores_lm[0, t, ys_out[0, t]] for t in range(ys_out.size(1))])
-                if length_norm:
-                    score_lm /= ys_out.size(1)  # normalize by length
-            else:
-                score_lm = 0
 
+        scores_lm = []
+        for s in range(0, len(hyps), batch_size):
+            scores_lm.append(BeamSearch.score_lm_batch(
+                [hyp['hyp'] for hyp in hyps[s:s + batch_size]], lm, reverse, length_norm))
+        scores_lm = tensor2np(torch.cat(scores_lm, dim=0))
+
+        for i, score_lm in enumerate(scores_lm.tolist()):
             hyps[i]['score'] += score_lm * lm_weight
             hyps[i]['score_lm_' + tag] = score_lm
 
         # DO NOT sort here !!!
         return hyps
 
+    @staticmethod
+    def score_lm_batch(ys, lm, reverse=False, length_norm=False):
+        """Compute LM log-probabilities of token sequences with a single forward pass.
+
+        Args:
+            ys (List[List[int]]): length `N`, token sequences including <sos>
+            lm (LMBase): LM
+            reverse (bool): score sequences in the reverse direction
+            length_norm (bool): normalize scores by sequence length
+        Returns:
+            scores_lm (FloatTensor): `[N]`
+
+        """
+        if reverse:
+            ys = [y[::-1] for y in ys]
+        ys = [np2tensor(np.fromiter(y, dtype=np.int64), lm.device) for y in ys]
+        ylens = torch.tensor([len(y) - 1 for y in ys], device=lm.device)  # `[N]`
+        if ylens.max().item() == 0:
+            return torch.zeros(len(ys), device=lm.device)
+
+        ys_in = pad_list([y[:-1] for y in ys], lm.pad)  # `[N, L]`
+        ys_out = pad_list([y[1:] for y in ys], lm.pad)  # `[N, L]`
+        _, _, log_probs = lm.predict(ys_in, None)
+        scores_lm = torch.gather(log_probs, 2, ys_out.unsqueeze(2)).squeeze(2)  # `[N, L]`
+        mask = torch.arange(ys_out.size(1), device=lm.device).unsqueeze(0) < ylens.unsqueeze(1)
+        scores_lm = scores_lm.masked_fill(mask == 0, 0).sum(1)
+        if length_norm:
+            scores_lm = scores_lm / ylens.clamp(min=1).float()  # normalize by length
+        return scores_lm
+
+    @staticmethod
+    def lm_rescoring_batch(nbest_hyps, lm, lm_weight, reverse=False, length_norm=False, tag=''):
+        """Rescore N-best hypotheses of multiple utterances with LM at once.
+
+        Args:
+            nbest_hyps (List[List[dict]]): length `B`, beam candidates of each utterance
+        Returns:
+            nbest_hyps (List[List[dict]]): length `B`, beam candidates with updated scores
+
+        """
+        BeamSearch.lm_rescoring([hyp for hyps in nbest_hyps for hyp in hyps],
+                                lm, lm_weight, reverse, length_norm, tag)
+        return nbest_hyps
+
     @staticmethod
     def verify_lm_eval_mode(lm, lm_weight, cache_emb=True):
         if lm is not None:
@@ -190,18 +315,312 @@ class BeamSearch(object):
         # NOTE: assumming hyps is already sorted
         hyps_merged = {}
         for beam in hyps:
-            hyp_ids_str = beam['hyp_ids_str']
-            if hyp_ids_str not in hyps_merged.keys():
-                hyps_merged[hyp_ids_str] = beam
+            hyp_key = beam['hyp_key']  # see PrefixStateCache
+            if hyp_key not in hyps_merged:
+                hyps_merged[hyp_key] = beam
             else:
                 if merge_prob:
                     for k in ['score', 'score_rnnt']:
-                        hyps_merged[hyp_ids_str][k] = np.logaddexp(hyps_merged[hyp_ids_str][k], beam[k])
+                        hyps_merged[hyp_key][k] = np.logaddexp(hyps_merged[hyp_key][k], beam[k])
                     # NOTE: LM scores should not be merged
 
-                elif beam['score'] > hyps_merged[hyp_ids_str]['score']:
+                elif beam['score'] > hyps_merged[hyp_key]['score']:
                     # Otherwise, pick up a path having higher log-probability
-                    hyps_merged[hyp_ids_str] = beam
+                    hyps_merged[hyp_key] = beam
 
         hyps = [v for v in hyps_merged.values()]
         return hyps
+
+
+class PrefixStateCache(object):
+    """LRU cache of decoder states keyed by rolling hashes of label prefixes.
+
+    A key of a prefix is computed from the key of its parent prefix in O(1),
+    so that hypotheses can be identified without building strings.
+
+    Args:
+        capacity (int): maximum number of cached prefixes (unbounded if 0)
+
+    """
+
+    MOD = (1 << 61) - 1  # Mersenne prime
+    BASE = 1000003
+
+    def __init__(self, capacity=0):
+
+        super(PrefixStateCache, self).__init__()
+
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self._cache = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @classmethod
+    def extend_key(cls, key, token):
+        """Key of the prefix extended with `token`."""
+        return (key * cls.BASE + token + 1) % cls.MOD
+
+    @classmethod
+    def prefix_key(cls, hyp):
+        """Key of the label sequence `hyp`."""
+        key = 0
+        for token in hyp:
+            key = cls.extend_key(key, token)
+        return key
+
+    def get(self, key):
+        """Look up cached states and mark them as recently used.
+
+        Args:
+            key (int): prefix key
+        Returns:
+            states (dict): cached states or None
+
+        """
+        states = self._cache.get(key)
+        if states is None:
+            self.n_misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.n_hits += 1
+        return states
+
+    def put(self, key, states):
+        """Register states, evicting the least recently used ones when full.
+
+        Args:
+            key (int): prefix key
+            states (dict): states to cache
+
+        """
+        self._cache[key] = states
+        self._cache.move_to_end(key)
+        if self.capacity > 0 and len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+
+def _select_rows(x, rows, dim):
+    """Select rows of (nested) decoder states along `dim`."""
+    if x is None:
+        return None
+    if isinstance(x, (list, tuple)):
+        return type(x)(_select_rows(x_i, rows, dim) for x_i in x)
+    if isinstance(x, dict):
+        return {k: _select_rows(v, rows, dim) for k, v in x.items()}
+    return x.index_select(dim, rows)
+
+
+class BeamState(object):
+    """Tensor-backed hypotheses for beam search.
+
+    Hypotheses of `B` utterances are kept in `[B * beam_width]` rows, where rows
+    `[b * beam_width, (b + 1) * beam_width)` belong to the b-th active utterance.
+    Token histories live in a preallocated `[B * beam_width, ymax + 1]` buffer,
+    and decoder/LM states registered with `set_state` are reordered together with
+    the hypotheses by `index_select`. Per-step tensors registered with `record`
+    (e.g., attention weights) are not copied; they are traced back via back-pointers
+    only for hypotheses returned to the caller.
+
+    Args:
+        bs (int): number of utterances
+        beam_width (int): beam width
+        ymax (int): maximum number of output tokens
+        sos (int): index for <sos>
+        device: device for tensors
+
+    """
+
+    def __init__(self, bs, beam_width, ymax, sos, device):
+
+        super(BeamState, self).__init__()
+
+        self.beam_width = beam_width
+        self.device = device
+        self.utt_ids = list(range(bs))  # indices of active utterances
+        self.n_steps = 0
+
+        self.ys = torch.full((bs * beam_width, ymax + 1), sos, dtype=torch.int64, device=device)
+        # Only the first row of each utterance is alive at the first step so that
+        # all candidates are expanded from a single <sos>
+        score = torch.full((bs, beam_width), NEG_INF, device=device)
+        score[:, 0] = 0.
+        self.score = score.view(-1)  # total score for ranking
+        self.score_att = self.score.clone()
+        self.score_lm = torch.zeros(bs * beam_width, device=device)
+
+        self._states = {}
+        self._records = {}
+        self._backptrs = []
+
+    @property
+    def n_rows(self):
+        return self.ys.size(0)
+
+    @property
+    def alive(self):
+        """BoolTensor: `[B * beam_width]`"""
+        return self.score_att != NEG_INF
+
+    def last_tokens(self):
+        """Return the last tokens of hypotheses.
+
+        Returns:
+            y (LongTensor): `[B * beam_width, 1]`
+
+        """
+        return self.ys[:, self.n_steps:self.n_steps + 1]
+
+    def tokens(self):
+        """Return token histories including <sos>.
+
+        Returns:
+            ys (LongTensor): `[B * beam_width, L + 1]`
+
+        """
+        return self.ys[:, :self.n_steps + 1]
+
+    def set_state(self, name, state, dim=0, select_fn=None):
+        """Register (nested) states aligned with the current rows along `dim`.
+
+        `select_fn(state, rows)` overrides row selection for states with their own
+        layout such as LM states (see `LMBase.select_state`).
+
+        """
+        if select_fn is None:
+            select_fn = functools.partial(_select_rows, dim=dim)
+        self._states[name] = (state, select_fn)
+
+    def get_state(self, name):
+        return self._states[name][0] if name in self._states else None
+
+    def state_at(self, name, r):
+        """Return (nested) states of the r-th hypothesis."""
+        if name not in self._states:
+            return None
+        state, select_fn = self._states[name]
+        return select_fn(state, torch.tensor([r], device=self.device))
+
+    def record(self, name, x):
+        """Record a per-step tensor `[B * beam_width, ...]` aligned with the current rows."""
+        if name not in self._records:
+            self._records[name] = []
+        assert len(self._records[name]) == self.n_steps
+        self._records[name].append(x)
+
+    def repeat_rows(self, x, dim=0):
+        """Repeat tensors of size `[B, ...]` for each hypothesis of the active utterances."""
+        rows = torch.tensor(self.utt_ids, device=x.device).repeat_interleave(self.beam_width)
+        return x.index_select(dim, rows)
+
+    def topk(self, total_scores, ids=None):
+        """Select `beam_width` candidates per utterance over flattened candidate scores.
+
+        Args:
+            total_scores (FloatTensor): `[B * beam_width, K]`
+            ids (LongTensor): token IDs of candidates `[B * beam_width, K]`.
+                If None, `K` is the vocabulary size and candidates are token IDs themselves.
+        Returns:
+            scores (FloatTensor): `[B * beam_width]`
+            src_rows (LongTensor): index of the parent hypothesis `[B * beam_width]`
+            cand_ids (LongTensor): flattened index of the selected candidates `[B * beam_width]`
+            tokens (LongTensor): selected token IDs `[B * beam_width]`
+
+        """
+        K = total_scores.size(1)
+        bs = total_scores.size(0) // self.beam_width
+        scores, flat_ids = torch.topk(total_scores.view(bs, -1),
+                                      k=self.beam_width, dim=1, largest=True, sorted=True)
+        offsets = torch.arange(bs, device=flat_ids.device).unsqueeze(1) * (self.beam_width * K)
+        cand_ids = (flat_ids + offsets).view(-1)
+        src_rows = cand_ids // K
+        if ids is None:
+            tokens = cand_ids % K
+        else:
+            tokens = ids.view(-1)[cand_ids]
+        return scores.view(-1), src_rows, cand_ids, tokens
+
+    def advance(self, src_rows, tokens, score, score_att, score_lm=None):
+        """Extend hypotheses by one token and reorder all states.
+
+        Args:
+            src_rows (LongTensor): index of the parent hypothesis `[B * beam_width]`
+            tokens (LongTensor): `[B * beam_width]`
+            score (FloatTensor): `[B * beam_width]`
+            score_att (FloatTensor): `[B * beam_width]`
+            score_lm (FloatTensor): `[B * beam_width]`
+
+        """
+        self.ys = self.ys.index_select(0, src_rows)
+        self.ys[:, self.n_steps + 1] = tokens
+        self.n_steps += 1
+        self.score = score
+        self.score_att = score_att.masked_fill(score == NEG_INF, NEG_INF)
+        if score_lm is not None:
+            self.score_lm = score_lm
+        for name, (state, select_fn) in self._states.items():
+            self._states[name] = (select_fn(state, src_rows), select_fn)
+        self._backptrs.append(src_rows.cpu())
+
+    def kill(self, mask):
+        """Remove hypotheses (e.g., complete ones) from the beam."""
+        self.score = self.score.masked_fill(mask, NEG_INF)
+        self.score_att = self.score_att.masked_fill(mask, NEG_INF)
+
+    def keep_utterances(self, keep):
+        """Drop finished utterances from the active set.
+
+        Args:
+            keep (List[int]): positions of utterances to keep in the active set
+
+        """
+        keep_offsets = torch.tensor(keep, device=self.device).unsqueeze(1) * self.beam_width
+        keep_rows = (keep_offsets + torch.arange(self.beam_width, device=self.device)).view(-1)
+        self.utt_ids = [self.utt_ids[u] for u in keep]
+        self.ys = self.ys.index_select(0, keep_rows)
+        self.score = self.score.index_select(0, keep_rows)
+        self.score_att = self.score_att.index_select(0, keep_rows)
+        self.score_lm = self.score_lm.index_select(0, keep_rows)
+        for name, (state, select_fn) in self._states.items():
+            self._states[name] = (select_fn(state, keep_rows), select_fn)
+        if len(self._backptrs) > 0:
+            self._backptrs[-1] = self._backptrs[-1].index_select(0, keep_rows.cpu())
+        return keep_rows
+
+    def trace(self, name, r):
+        """Trace back per-step tensors recorded for the r-th hypothesis.
+
+        Returns:
+            xs (List[Tensor]): length `[L]`, each of which is of size `[1, ...]`
+
+        """
+        xs = []
+        for t in range(self.n_steps - 1, -1, -1):
+            r = self._backptrs[t][r].item()
+            xs.append(self._records[name][t][r:r + 1])
+        return xs[::-1]
+
+    def to_hyp(self, r, score=None, **kwargs):
+        """Convert the r-th row into a beam candidate.
+
+        Args:
+            r (int): row index
+            score (float): total score (normalized by length if needed)
+        Returns:
+            hyp (dict): beam candiate
+
+        """
+        hyp = {'hyp': self.ys[r, :self.n_steps + 1].tolist(),
+               'score': self.score[r].item() if score is None else score,
+               'score_att': self.score_att[r].item(),
+               'score_ctc': 0.,
+               'score_lm': self.score_lm[r].item()}
+        for name in self._records.keys():
+            hyp[name] = self.trace(name, r)
+        hyp.update(kwargs)
+        return hyp
@@ -83,7 +83,9 @@ def build_decoder(args, special_symbols, enc_n_units, vocab,
             external_lm=external_lm if args.lm_init else None,
             global_weight=global_weight,
             mtl_per_batch=args.mtl_per_batch,
-            param_init=args.param_init)
+            param_init=args.param_init,
+            loss_impl=args.transducer_loss_impl,
+            loss_chunk_size=args.transducer_loss_chunk_size)
 
     else:
         from neural_sp.models.seq2seq.decoders.las import RNNDecoder
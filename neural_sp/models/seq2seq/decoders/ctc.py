@@ -5,7 +5,6 @@
 
 from collections import OrderedDict
 from distutils.version import LooseVersion
-from itertools import groupby
 import logging
 import numpy as np
 import random
@@ -14,7 +13,11 @@ import torch.nn as nn
 
 from neural_sp.models.criterion import kldiv_lsm_ctc
 from neural_sp.models.lm.rnnlm import RNNLM
-from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.beam_search import (
+    BeamSearch,
+    NEG_INF,
+    PrefixStateCache
+)
 from neural_sp.models.seq2seq.decoders.decoder_base import DecoderBase
 from neural_sp.models.torch_utils import (
     make_pad_mask,
@@ -29,6 +32,10 @@ random.seed(1)
 LOG_0 = -1e10
 LOG_1 = 0
 
+# moduli/bases of two rolling hashes identifying prefixes in tensor-backed beam search
+HASH_MOD = (1 << 31) - 1
+HASH_BASES = (1000003, 1000033)
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,8 +74,6 @@ class CTC(DecoderBase):
         self.lsm_prob = lsm_prob
         self.bwd = backward
 
-        self.space = -1  # TODO(hirofumi): fix later
-
         # for cache
         self.prev_spk = ''
         self.lmstate_final = None
@@ -156,40 +161,15 @@ class CTC(DecoderBase):
             trigger_points_pred (IntTensor): `[B, L]`
 
         """
-        bs, xmax, _ = eouts.size()
+        bs = eouts.size(0)
         log_probs = torch.log_softmax(self.output(eouts), dim=-1)
-        best_paths = log_probs.argmax(-1)  # `[B, L]`
-
-        hyps = []
-        for b in range(bs):
-            indices = [best_paths[b, t].item() for t in range(elens[b])]
-
-            # Step 1. Collapse repeated labels
-            collapsed_indices = [x[0] for x in groupby(indices)]
-
-            # Step 2. Remove all blank labels
-            best_hyp = [x for x in filter(lambda x: x != self.blank, collapsed_indices)]
-            hyps.append(best_hyp)
-
-        ymax = max([len(h) for h in hyps])
-
-        # pick up trigger points
-        trigger_points_pred = log_probs.new_zeros((bs, ymax + 1), dtype=torch.int32)  # +1 for <eos>
-        for b in range(bs):
-            n_triggers = 0
-            for t in range(elens[b]):
-                token_idx = best_paths[b, t]
-
-                if token_idx == self.blank:
-                    continue
-                if not (t == 0 or token_idx != best_paths[b, t - 1]):
-                    continue
-
-                # NOTE: select the most left trigger points
-                trigger_points_pred[b, n_triggers] = t
-                n_triggers += 1
+        best_paths = log_probs.argmax(-1)  # `[B, T]`
 
-        return trigger_points_pred
+        # NOTE: select the most left trigger points
+        _, trigger_points_pred, _ = collapse_best_paths(best_paths, elens, self.blank)
+        trigger_points_pred = torch.cat([trigger_points_pred,
+                                         trigger_points_pred.new_zeros(bs, 1)], dim=1)  # +1 for <eos>
+        return trigger_points_pred.int()
 
     def probs(self, eouts, temperature=1.):
         """Get CTC probabilities.
@@ -224,37 +204,41 @@ class CTC(DecoderBase):
 
         """
         log_probs = torch.log_softmax(self.output(eouts), dim=-1)
-        best_paths = log_probs.argmax(-1)  # `[B, L]`
-
-        hyps = []
-        for b in range(eouts.size(0)):
-            indices = [best_paths[b, t].item() for t in range(elens[b])]
-
-            # Step 1. Collapse repeated labels
-            collapsed_indices = [x[0] for x in groupby(indices)]
-
-            # Step 2. Remove all blank labels
-            best_hyp = [x for x in filter(lambda x: x != self.blank, collapsed_indices)]
-            hyps.append([best_hyp])
+        best_paths = log_probs.argmax(-1)  # `[B, T]`
 
+        hyps_pad, _, ylens = collapse_best_paths(best_paths, elens, self.blank)
+        hyps = [[hyp[:ylen]] for hyp, ylen in zip(hyps_pad.tolist(), ylens.tolist())]
         return hyps
 
-    def initialize_beam(self, hyp, lmstate):
+    def initialize_beam(self, hyp, lmstate, wordlm=None):
         """Initialize beam."""
+        wordlmstate, next_scores_wordlm = None, None
+        if wordlm is not None:
+            y = torch.tensor([hyp], dtype=torch.int64, device=wordlm.device)
+            _, wordlmstate, next_scores_wordlm = wordlm.predict(y, wordlm.zero_state(1))
         hyps = [{'hyp': hyp,
                  'hyp_ids_str': '',
                  'p_b': LOG_1,
                  'p_nb': LOG_0,
                  'score_lm': LOG_1,
                  'lmstate': lmstate,
-                 'update_lm': True}]
+                 'update_lm': True,
+                 'lex_node': 0,  # root of the lexicon
+                 'wordlmstate': wordlmstate,
+                 'next_scores_wordlm': next_scores_wordlm}]
         return hyps
 
     def beam_search(self, eouts, elens, params, idx2token,
                     lm=None, lm_second=None, lm_second_bwd=None,
-                    nbest=1, refs_id=None, utt_ids=None, speakers=None):
+                    nbest=1, refs_id=None, utt_ids=None, speakers=None,
+                    lexicon=None):
         """Beam search decoding.
 
+        When `lexicon` is given, hypotheses are extended only by tokens following
+        their partial words in the prefix tree. If `params['recog_wordlm']` is True,
+        `lm` is a word-level LM over the words of `lexicon` and its scores are added
+        whenever words are completed.
+
         Args:
             eouts (FloatTensor): `[B, T, enc_n_units]`
             elens (List): length `[B]`
@@ -267,6 +251,7 @@ class CTC(DecoderBase):
             refs_id (List): reference list
             utt_ids (List): utterance id list
             speakers (List): speaker list
+            lexicon (LexiconTrie): prefix tree of words
         Returns:
             nbest_hyps_idx (List[List[List]]): Best path hypothesis
 
@@ -284,36 +269,43 @@ class CTC(DecoderBase):
 
         helper = BeamSearch(beam_width, self.eos, 1.0, lm_weight, eouts.device)
         lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
-        if lm is not None:
-            assert isinstance(lm, RNNLM)
         lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
         lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
 
+        wordlm = None
+        if params.get('recog_wordlm') and lm is not None:
+            assert lexicon is not None, 'Word-level LM requires a lexicon.'
+            wordlm, lm = lm, None
+
         log_probs = torch.log_softmax(self.output(eouts) * softmax_smoothing, dim=-1)
 
         nbest_hyps_idx = []
         for b in range(bs):
             # Initialization per utterance
-            lmstate = {'hxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units),
-                       'cxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units)} if lm is not None else None
+            lmstate = lm.zero_state(1) if lm is not None else None
 
             if speakers is not None:
                 if speakers[b] == self.prev_spk:
-                    if lm_state_CO:
+                    if lm_state_CO and isinstance(lm, RNNLM):
                         lmstate = self.lmstate_final
                 self.prev_spk = speakers[b]
 
-            hyps = self.initialize_beam([self.eos], lmstate)
+            hyps = self.initialize_beam([self.eos], lmstate, wordlm)
             self.state_cache = OrderedDict()
+            self.wordlm_cache = {}
 
             hyps, new_hyps_sorted = self._beam_search(hyps, helper, log_probs[b], lm,
-                                                      lp_weight)
+                                                      lp_weight, lexicon, wordlm)
 
             # Global pruning
             end_hyps = hyps[:]
             if len(end_hyps) < nbest and nbest > 1:
                 end_hyps.extend(new_hyps_sorted[:nbest - len(end_hyps)])
 
+            # Complete the last words
+            if lexicon is not None:
+                self._complete_words(end_hyps, helper, lexicon, wordlm)
+
             # forward/backward second-pass LM rescoring
             end_hyps = helper.lm_rescoring(end_hyps, lm_second, lm_weight_second, tag='second')
             end_hyps = helper.lm_rescoring(end_hyps, lm_second_bwd, lm_weight_second_bwd, tag='second_bwd')
@@ -333,7 +325,7 @@ class CTC(DecoderBase):
                     logger.info('log prob (hyp): %.7f' % end_hyps[k]['score'])
                     logger.info('log prob (hyp, ctc): %.7f' % (end_hyps[k]['score_ctc']))
                     logger.info('log prob (hyp, lp): %.7f' % (end_hyps[k]['score_lp'] * lp_weight))
-                    if lm is not None:
+                    if lm is not None or wordlm is not None:
                         logger.info('log prob (hyp, first-pass lm): %.7f' %
                                     (end_hyps[k]['score_lm'] * lm_weight))
                     if lm_second is not None:
@@ -353,7 +345,7 @@ class CTC(DecoderBase):
 
         return nbest_hyps_idx
 
-    def _beam_search(self, hyps, helper, scores_ctc, lm, lp_weight):
+    def _beam_search(self, hyps, helper, scores_ctc, lm, lp_weight, lexicon=None, wordlm=None):
         beam_width = helper.beam_width
         lm_weight = helper.lm_weight
         merge_prob = True
@@ -365,6 +357,8 @@ class CTC(DecoderBase):
                 scores_ctc[t, 1:],  # exclude blank
                 k=min(beam_width, self.vocab), dim=-1, largest=True, sorted=True)
             topk_ids += 1  # index:0 is for blank
+            if lexicon is not None:
+                scores_ctc_t = scores_ctc[t].cpu()
 
             # bachfy all hypotheses (not in the cache, non-blank) for LM
             batch_hyps = [beam for beam in hyps if beam['update_lm']]
@@ -374,13 +368,12 @@ class CTC(DecoderBase):
                     ys[i] = beam['hyp'][-1]
 
                 # Update LM states for shallow fusion
-                _, lmstates, scores_lm = helper.update_rnnlm_state_batch(lm, batch_hyps, ys)
+                _, lmstates, scores_lm = helper.update_lm_state_batch(lm, batch_hyps, ys)
 
                 hyp_ids_strs = [beam['hyp_ids_str'] for beam in hyps]
 
                 for i, beam in enumerate(batch_hyps):
-                    lmstate = {'hxs': lmstates['hxs'][:, i:i + 1],
-                               'cxs': lmstates['cxs'][:, i:i + 1]} if lmstates is not None else None
+                    lmstate = lmstates[i] if lmstates is not None else None
                     index = hyp_ids_strs.index(beam['hyp_ids_str'])
 
                     hyps[index]['lmstate'] = lmstate
@@ -423,34 +416,49 @@ class CTC(DecoderBase):
                                  'score_lp': total_score_lp,
                                  'next_scores_lm': beam['next_scores_lm'],
                                  'lmstate': beam['lmstate'],
-                                 'update_lm': False})
+                                 'update_lm': False,
+                                 'lex_node': beam['lex_node'],
+                                 'wordlmstate': beam['wordlmstate'],
+                                 'next_scores_wordlm': beam['next_scores_wordlm']})
 
                 # case 2. hyp is extended
                 new_p_b = LOG_0
-                for k in range(beam_width):
-                    idx = topk_ids[k].item()
+                if lexicon is None:
+                    cand_ids = topk_ids.tolist()
+                else:
+                    # only tokens following the partial word in the lexicon
+                    cand_ids, next_nodes, word_ids = self._lexicon_successors(
+                        lexicon, beam['lex_node'], scores_ctc_t, beam_width)
+                for k, idx in enumerate(cand_ids):
                     p_t = scores_ctc[t, idx].item()
 
                     c_prev = beam['hyp'][-1] if len(beam['hyp']) > 1 else None
                     if idx == c_prev:
                         new_p_nb = p_b + p_t
-                        # TODO(hirofumi): apply character LM here
                     else:
                         new_p_nb = np.logaddexp(p_b + p_t, p_nb + p_t)
-                        # TODO(hirofumi): apply character LM here
-                        if idx == self.space:
-                            pass
-                            # TODO(hirofumi): apply word LM here
+
+                    hyp_ids = beam['hyp'] + [idx]
+                    hyp_ids_str = ' '.join(list(map(str, hyp_ids)))
 
                     total_score_ctc = np.logaddexp(new_p_b, new_p_nb)
                     total_score_lp = (len(beam['hyp'][1:]) + 1) * lp_weight
                     total_score = total_score_ctc + total_score_lp
+                    # token-level LM is applied per extension
+                    total_score_lm = beam['score_lm']
                     if lm is not None:
                         total_score_lm += beam['next_scores_lm'][0, 0, idx].item()
+                    # word-level LM is applied when a word is completed
+                    lex_node = beam['lex_node']
+                    wordlmstate, next_scores_wordlm = beam['wordlmstate'], beam['next_scores_wordlm']
+                    if lexicon is not None:
+                        lex_node = next_nodes[k]
+                        if wordlm is not None and word_ids[k] >= 0:
+                            total_score_lm += next_scores_wordlm[0, -1, word_ids[k]].item()
+                            wordlmstate, next_scores_wordlm = self._update_wordlm_state(
+                                helper, wordlm, beam, word_ids[k], hyp_ids_str)
                     total_score += total_score_lm * lm_weight
 
-                    hyp_ids = beam['hyp'] + [idx]
-                    hyp_ids_str = ' '.join(list(map(str, hyp_ids)))
                     exist_cache = hyp_ids_str in self.state_cache.keys()
                     if exist_cache:
                         # from cache
@@ -471,7 +479,10 @@ class CTC(DecoderBase):
                                      'score_lp': total_score_lp,
                                      'next_scores_lm': scores_lm,
                                      'lmstate': lmstate,
-                                     'update_lm': not exist_cache})
+                                     'update_lm': not exist_cache,
+                                     'lex_node': lex_node,
+                                     'wordlmstate': wordlmstate,
+                                     'next_scores_wordlm': next_scores_wordlm})
 
             # Pruning
             new_hyps_sorted = sorted(new_hyps, key=lambda x: x['score'], reverse=True)
@@ -480,6 +491,284 @@ class CTC(DecoderBase):
 
         return hyps, new_hyps_sorted
 
+    @staticmethod
+    def _lexicon_successors(lexicon, node, scores_ctc_t, beam_width):
+        """Pick up top-k tokens following a partial word in the lexicon.
+
+        Args:
+            lexicon (LexiconTrie): prefix tree of words
+            node (int): node of the partial word
+            scores_ctc_t (FloatTensor): `[vocab]`
+            beam_width (int): beam width
+        Returns:
+            token_ids (List): length `[<= beam_width]`
+            next_nodes (List): length `[<= beam_width]`
+            word_ids (List): length `[<= beam_width]`, index of completed words (-1 if not completed)
+
+        """
+        token_ids, next_nodes, word_ids = lexicon.successors(node)
+        if len(token_ids) <= beam_width:
+            return token_ids.tolist(), next_nodes, word_ids
+        topk = torch.topk(scores_ctc_t.index_select(0, token_ids), k=beam_width)[1].tolist()
+        return token_ids[topk].tolist(), [next_nodes[i] for i in topk], [word_ids[i] for i in topk]
+
+    def _update_wordlm_state(self, helper, wordlm, beam, word_id, hyp_ids_str):
+        """Update word-level LM state after completing a word (cached per prefix)."""
+        if hyp_ids_str not in self.wordlm_cache:
+            y = torch.tensor([[word_id]], dtype=torch.int64, device=wordlm.device)
+            _, wordlmstate, next_scores_wordlm = helper.update_lm_state(
+                wordlm, {'lmstate': beam['wordlmstate']}, y)
+            self.wordlm_cache[hyp_ids_str] = (wordlmstate, next_scores_wordlm)
+        return self.wordlm_cache[hyp_ids_str]
+
+    def _complete_words(self, hyps, helper, lexicon, wordlm):
+        """Complete the last words of finished hypotheses in-place.
+
+        Hypotheses ending with a partial word are pushed to the bottom of the N-best
+        list. The word-level LM scores of the last word and <eos> are added otherwise.
+
+        """
+        lm_weight = helper.lm_weight
+        for beam in hyps:
+            if not lexicon.is_word_end(beam['lex_node']):
+                beam['score'] += LOG_0
+                continue
+            if wordlm is None:
+                continue
+            score_wordlm = 0.
+            next_scores_wordlm = beam['next_scores_wordlm']
+            w = lexicon.word_id(beam['lex_node'])
+            if w >= 0:
+                score_wordlm += next_scores_wordlm[0, -1, w].item()
+                _, next_scores_wordlm = self._update_wordlm_state(
+                    helper, wordlm, beam, w, beam['hyp_ids_str'] + ' ' + str(self.eos))
+            score_wordlm += next_scores_wordlm[0, -1, wordlm.eos].item()
+            beam['score_lm'] += score_wordlm
+            beam['score'] += score_wordlm * lm_weight
+
+    def batch_beam_search_available(self, params, speakers=None, lexicon=None):
+        """Check whether hypotheses can be decoded with tensor-backed `batch_beam_search`."""
+        if speakers is not None and params.get('recog_lm_state_carry_over'):
+            return False
+        if lexicon is not None or params.get('recog_wordlm'):
+            # lexicon constraint is supported by `beam_search` only
+            return False
+        return True
+
+    def batch_beam_search(self, eouts, elens, params, idx2token=None,
+                          lm=None, lm_second=None, lm_second_bwd=None,
+                          nbest=1, refs_id=None, utt_ids=None, speakers=None):
+        """CTC prefix beam search of all utterances in a mini-batch at once.
+
+        Prefix probabilities ending with blank (p_b) and non-blank (p_nb) of `beam_width`
+        hypotheses per utterance are kept in `[B * beam_width]` tensors. At each frame,
+        every hypothesis is expanded to itself and top-k labels, candidates sharing the same
+        prefix (identified by rolling hashes) are merged by logsumexp, and `beam_width`
+        candidates are selected per utterance. LM states of extended hypotheses are updated
+        in batch-mode and cached per prefix.
+
+        Args:
+            eouts (FloatTensor): `[B, T, enc_n_units]`
+            elens (IntTensor): `[B]`
+            params (dict): decoding hyperparameters
+            idx2token (): converter from index to token
+            lm (torch.nn.module): firsh-pass LM
+            lm_second (torch.nn.module): second-pass LM
+            lm_second_bwd (torch.nn.module): second-pass backward LM
+            nbest (int): number of N-best list
+            refs_id (List): reference list
+            utt_ids (List): utterance id list
+            speakers (List): speaker list
+        Returns:
+            nbest_hyps_idx (List[List[np.ndarray]]): Best path hypothesis
+
+        """
+        bs, xmax = eouts.size()[:2]
+        device = eouts.device
+
+        beam_width = params.get('recog_beam_width')
+        assert 1 <= nbest <= beam_width
+        lp_weight = params.get('recog_length_penalty')
+        cache_emb = params.get('recog_cache_embedding')
+        lm_weight = params.get('recog_lm_weight')
+        lm_weight_second = params.get('recog_lm_second_weight')
+        lm_weight_second_bwd = params.get('recog_lm_bwd_weight')
+        softmax_smoothing = params.get('recog_softmax_smoothing')
+
+        helper = BeamSearch(beam_width, self.eos, 1.0, lm_weight, device)
+        lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
+        lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
+        lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
+
+        log_probs = torch.log_softmax(self.output(eouts) * softmax_smoothing, dim=-1)
+        # NOTE: padded frames always emit <blank> so that hypotheses of shorter utterances are kept
+        elens = torch.as_tensor(elens).to(device)
+        is_pad = torch.arange(xmax, device=device).unsqueeze(0) >= elens.unsqueeze(1)  # `[B, T]`
+        log_probs = log_probs.masked_fill(is_pad.unsqueeze(2), LOG_0)
+        log_probs[:, :, self.blank] = log_probs[:, :, self.blank].masked_fill(is_pad, LOG_1)
+
+        W = beam_width
+        K = min(beam_width, self.vocab - 1)  # number of labels to extend
+        n_rows = bs * W
+        utt_rows = torch.arange(bs, device=device).repeat_interleave(W)  # `[B * W]`
+        arange_rows = torch.arange(n_rows, device=device)
+        # candidates earlier than each candidate in the same utterance
+        n_cands = W * (K + 1)
+        cand_ids = torch.arange(n_cands, device=device)
+        is_earlier = cand_ids.unsqueeze(0) < cand_ids.unsqueeze(1)  # `[C, C]`
+        hash_bases = torch.tensor(HASH_BASES, device=device)
+
+        def to_cands(x_stay, x_ext):
+            """Arrange candidates of each utterance into `[B, (K + 1) * W, ...]` (not-extended ones first)."""
+            x = torch.cat([x_stay.unsqueeze(1), x_ext], dim=1)  # `[B * W, K + 1, ...]`
+            x = x.view(bs, W, K + 1, *x.size()[2:]).transpose(1, 2).contiguous()
+            return x.view(bs, n_cands, *x.size()[3:])
+
+        # Only the first row of each utterance is alive at the beginning
+        ys = torch.full((n_rows, xmax + 1), self.eos, dtype=torch.int64, device=device)
+        ylens = torch.zeros(n_rows, dtype=torch.int64, device=device)
+        p_b = torch.full((n_rows,), LOG_0, device=device)
+        p_b[::W] = LOG_1
+        p_nb = torch.full((n_rows,), LOG_0, device=device)
+        score_lm = torch.zeros(n_rows, device=device)
+        keys = torch.zeros((n_rows, 2), dtype=torch.int64, device=device)
+        lmstates, next_scores_lm = None, None
+        if lm is not None:
+            _, lmstates, scores_lm = helper.update_lm_state_batch(
+                lm, [{'lmstate': lm.zero_state(1)} for _ in range(n_rows)], ys[:, :1])
+            next_scores_lm = scores_lm[:, -1]  # `[B * W, vocab]`
+            state_cache = PrefixStateCache(n_rows * (K + 1))
+
+        for t in range(elens.max().item()):
+            lp = log_probs[:, t]  # `[B, vocab]`
+            lp_rows = lp.index_select(0, utt_rows)  # `[B * W, vocab]`
+            lp_blank = lp_rows[:, self.blank]
+            last = ys.gather(1, ylens.unsqueeze(1)).squeeze(1)
+            p_total = _logaddexp(p_b, p_nb)
+
+            # case 1. hyp is not extended
+            p_b_stay = p_total + lp_blank
+            p_nb_stay = (p_nb + lp_rows.gather(1, last.unsqueeze(1)).squeeze(1)).masked_fill(ylens == 0, LOG_0)
+
+            # case 2. hyp is extended by the top-k labels (excluding blank)
+            lp_nonblank = lp.clone()
+            lp_nonblank[:, self.blank] = NEG_INF
+            cs = torch.topk(lp_nonblank, k=K, dim=-1)[1].index_select(0, utt_rows)  # `[B * W, K]`
+            p_cs = lp_rows.gather(1, cs)
+            is_repeat = (cs == last.unsqueeze(1)) & (ylens > 0).unsqueeze(1)
+            p_nb_ext = torch.where(is_repeat, p_b.unsqueeze(1), p_total.unsqueeze(1)) + p_cs
+            keys_ext = (keys.unsqueeze(1) * hash_bases + cs.unsqueeze(2) + 1) % HASH_MOD  # `[B * W, K, 2]`
+
+            cand_p_b = to_cands(p_b_stay, p_b_stay.new_full((n_rows, K), LOG_0))
+            cand_p_nb = to_cands(p_nb_stay, p_nb_ext)
+            cand_keys = to_cands(keys, keys_ext)  # `[B, C, 2]`
+            cand_ylens = to_cands(ylens, (ylens + 1).unsqueeze(1).expand(-1, K))
+            if lm is not None:
+                cand_score_lm = to_cands(score_lm, score_lm.unsqueeze(1) + next_scores_lm.gather(1, cs))
+            else:
+                cand_score_lm = torch.zeros_like(cand_p_b)
+
+            # Merge candidates of the same prefix into the earliest one
+            is_same = (cand_keys.unsqueeze(2) == cand_keys.unsqueeze(1)).sum(3) == 2  # `[B, C, C]`
+            cand_p_b = torch.logsumexp(cand_p_b.unsqueeze(1).masked_fill(is_same == 0, LOG_0), dim=2)
+            cand_p_nb = torch.logsumexp(cand_p_nb.unsqueeze(1).masked_fill(is_same == 0, LOG_0), dim=2)
+            is_merged = (is_same & is_earlier.unsqueeze(0)).sum(2) > 0
+            total_scores = _logaddexp(cand_p_b, cand_p_nb) + cand_score_lm * lm_weight + cand_ylens.float() * lp_weight
+            total_scores = total_scores.masked_fill(is_merged, NEG_INF)
+            # merged duplicates may still be selected when the beam is wider than
+            # the number of distinct prefixes, so remove their probability mass
+            cand_p_b = cand_p_b.masked_fill(is_merged, LOG_0)
+            cand_p_nb = cand_p_nb.masked_fill(is_merged, LOG_0)
+
+            # Pruning
+            _, topk_cands = torch.topk(total_scores, k=W, dim=1)  # `[B, W]`
+            slots = (topk_cands // W).view(-1)  # 0 for not-extended hypotheses
+            src_rows = (torch.arange(bs, device=device).unsqueeze(1) * W + topk_cands % W).view(-1)
+            is_ext = slots > 0
+            tokens = cs[src_rows, (slots - 1).clamp(min=0)]
+
+            p_b = cand_p_b.gather(1, topk_cands).view(-1)
+            p_nb = cand_p_nb.gather(1, topk_cands).view(-1)
+            score_lm = cand_score_lm.gather(1, topk_cands).view(-1)
+            keys = cand_keys.gather(1, topk_cands.unsqueeze(2).expand(-1, -1, 2)).view(-1, 2)
+            ylens = cand_ylens.gather(1, topk_cands).view(-1)
+            ys = ys.index_select(0, src_rows)
+            ys[arange_rows, ylens] = torch.where(is_ext, tokens, ys[arange_rows, ylens])
+
+            # Update LM states of extended hypotheses in batch-mode
+            if lm is not None:
+                lmstates = [lmstates[r] for r in src_rows.tolist()]
+                next_scores_lm = next_scores_lm.index_select(0, src_rows)
+                ext_rows = is_ext.nonzero()[:, 0].tolist()
+                ext_keys = [(h1 << 31) | h2 for h1, h2 in keys[ext_rows].tolist()]
+                hit_rows, hit_scores, miss_rows, miss_keys = [], [], [], []
+                for r, key in zip(ext_rows, ext_keys):
+                    cached = state_cache.get(key)
+                    if cached is None:
+                        miss_rows.append(r)
+                        miss_keys.append(key)
+                    else:
+                        lmstates[r] = cached['lmstate']
+                        hit_rows.append(r)
+                        hit_scores.append(cached['next_scores_lm'])
+                if len(hit_rows) > 0:
+                    next_scores_lm[hit_rows] = torch.cat(hit_scores, dim=0)
+                if len(miss_rows) > 0:
+                    _, lmstates_miss, scores_lm = helper.update_lm_state_batch(
+                        lm, [{'lmstate': lmstates[r]} for r in miss_rows], tokens[miss_rows].unsqueeze(1))
+                    next_scores_lm[miss_rows] = scores_lm[:, -1]
+                    for j, (r, key) in enumerate(zip(miss_rows, miss_keys)):
+                        lmstates[r] = lmstates_miss[j]
+                        state_cache.put(key, {'lmstate': lmstates_miss[j],
+                                              'next_scores_lm': scores_lm[j:j + 1, -1]})
+
+        score_ctc = _logaddexp(p_b, p_nb)
+        scores = score_ctc + score_lm * lm_weight + ylens.float() * lp_weight
+        ys = ys[:, :ylens.max().item() + 1].tolist()
+        ylens, scores, score_ctc, score_lm = ylens.tolist(), scores.tolist(), score_ctc.tolist(), score_lm.tolist()
+        end_hyps = [[{'hyp': ys[r][:ylens[r] + 1],
+                      'score': scores[r],
+                      'score_ctc': score_ctc[r],
+                      'score_lm': score_lm[r],
+                      'score_lp': ylens[r]} for r in range(b * W, (b + 1) * W)] for b in range(bs)]
+
+        # forward/backward second-pass LM rescoring of all utterances at once
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second, lm_weight_second, tag='second')
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second_bwd, lm_weight_second_bwd, tag='second_bwd')
+
+        nbest_hyps_idx = []
+        for b in range(bs):
+            # Normalize by length
+            end_hyps_b = sorted(end_hyps[b], key=lambda x: x['score'] / max(len(x['hyp'][1:]), 1), reverse=True)
+
+            if idx2token is not None:
+                if utt_ids is not None:
+                    logger.info('Utt-id: %s' % utt_ids[b])
+                assert self.vocab == idx2token.vocab
+                logger.info('=' * 200)
+                for k in range(len(end_hyps_b)):
+                    if refs_id is not None:
+                        logger.info('Ref: %s' % idx2token(refs_id[b]))
+                    logger.info('Hyp: %s' % idx2token(end_hyps_b[k]['hyp'][1:]))
+                    logger.info('log prob (hyp): %.7f' % end_hyps_b[k]['score'])
+                    logger.info('log prob (hyp, ctc): %.7f' % (end_hyps_b[k]['score_ctc']))
+                    logger.info('log prob (hyp, lp): %.7f' % (end_hyps_b[k]['score_lp'] * lp_weight))
+                    if lm is not None:
+                        logger.info('log prob (hyp, first-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm'] * lm_weight))
+                    if lm_second is not None:
+                        logger.info('log prob (hyp, second-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second'] * lm_weight_second))
+                    if lm_second_bwd is not None:
+                        logger.info('log prob (hyp, second-pass lm, reverse): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second_bwd'] * lm_weight_second_bwd))
+                    logger.info('-' * 50)
+
+            # N-best list (exclude <eos>)
+            nbest_hyps_idx += [[np.array(end_hyps_b[n]['hyp'][1:]) for n in range(nbest)]]
+
+        return nbest_hyps_idx
+
     def beam_search_block_sync(self, eouts, params, helper, idx2token,
                                hyps, lm, state_carry_over=False):
         assert eouts.size(0) == 1
@@ -492,8 +781,7 @@ class CTC(DecoderBase):
         end_hyps = []
         if hyps is None:
             # Initialization per utterance
-            lmstate = {'hxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units),
-                       'cxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units)} if lm is not None else None
+            lmstate = lm.zero_state(1) if lm is not None else None
 
             if state_carry_over:
                 lmstate = self.lmstate_final
@@ -537,74 +825,39 @@ def _label_to_path(labels, blank):
     return path
 
 
-def _flip_path(path, path_lens):
-    """Flips label sequence.
-    This function rotates a label sequence and flips it.
-    ``path[b, t]`` stores a label at time ``t`` in ``b``-th batch.
-    The rotated matrix ``r`` is defined as
-    ``r[b, t] = path[b, t + path_lens[b]]``
-    .. ::
-       a b c d .     . a b c d    d c b a .
-       e f . . .  -> . . . e f -> f e . . .
-       g h i j k     g h i j k    k j i h g
+def collapse_best_paths(best_paths, elens, blank):
+    """Collapse repeated labels and remove blank labels of best paths in a mini-batch at once.
 
     Args:
-        path (FloatTensor): `[B, 2*L+1]`
-        path_lens (LongTensor): `[B]`
-    Returns:
-        FloatTensor: `[B, 2*L+1]`
-
-    """
-    bs = path.size(0)
-    max_path_len = path.size(1)
-    rotate = (torch.arange(max_path_len) + path_lens[:, None]) % max_path_len
-    return torch.flip(path[torch.arange(bs, dtype=torch.int64)[:, None], rotate], dims=[1])
-
-
-def _flip_label_probability(log_probs, xlens):
-    """Flips a label probability matrix.
-    This function rotates a label probability matrix and flips it.
-    ``log_probs[i, b, l]`` stores log probability of label ``l`` at ``i``-th
-    input in ``b``-th batch.
-    The rotated matrix ``r`` is defined as
-    ``r[i, b, l] = log_probs[i + xlens[b], b, l]``
-
-    Args:
-        cum_log_prob (FloatTensor): `[T, B, vocab]`
-        xlens (LongTensor): `[B]`
+        best_paths (LongTensor): `[B, T]`
+        elens (IntTensor or np.ndarray): `[B]`
+        blank (int): index for <blank>
     Returns:
-        FloatTensor: `[T, B, vocab]`
+        hyps (LongTensor): `[B, L]` (padded with blank)
+        trigger_points (LongTensor): `[B, L]`, the first frame of each label (padded with 0)
+        ylens (LongTensor): `[B]`
 
     """
-    xmax, bs, vocab = log_probs.size()
-    rotate = (torch.arange(xmax, dtype=torch.int64)[:, None] + xlens) % xmax
-    return torch.flip(log_probs[rotate[:, :, None],
-                                torch.arange(bs, dtype=torch.int64)[None, :, None],
-                                torch.arange(vocab, dtype=torch.int64)[None, None, :]], dims=[0])
+    bs, xmax = best_paths.size()
+    device = best_paths.device
+    elens = torch.as_tensor(elens).to(device)
 
+    # Step 1. Remove all blank labels
+    mask = best_paths != blank
+    # Step 2. Collapse repeated labels (keep the first frame of each label)
+    mask[:, 1:] &= best_paths[:, 1:] != best_paths[:, :-1]
+    mask &= torch.arange(xmax, device=device).unsqueeze(0) < elens.unsqueeze(1)
 
-def _flip_path_probability(cum_log_prob, xlens, path_lens):
-    """Flips a path probability matrix.
-    This function returns a path probability matrix and flips it.
-    ``cum_log_prob[i, b, t]`` stores log probability at ``i``-th input and
-    at time ``t`` in a output sequence in ``b``-th batch.
-    The rotated matrix ``r`` is defined as
-    ``r[i, j, k] = cum_log_prob[i + xlens[j], j, k + path_lens[j]]``
-
-    Args:
-        cum_log_prob (FloatTensor): `[T, B, 2*L+1]`
-        xlens (LongTensor): `[B]`
-        path_lens (LongTensor): `[B]`
-    Returns:
-        FloatTensor: `[T, B, 2*L+1]`
+    ylens = mask.long().sum(1)
+    ymax = ylens.max().item() if bs > 0 else 0
+    positions = (mask.long().cumsum(1) - 1)[mask]
+    batch_ids, frames = mask.nonzero().t()
 
-    """
-    xmax, bs, max_path_len = cum_log_prob.size()
-    rotate_input = ((torch.arange(xmax, dtype=torch.int64)[:, None] + xlens) % xmax)
-    rotate_label = ((torch.arange(max_path_len, dtype=torch.int64) + path_lens[:, None]) % max_path_len)
-    return torch.flip(cum_log_prob[rotate_input[:, :, None],
-                                   torch.arange(bs, dtype=torch.int64)[None, :, None],
-                                   rotate_label], dims=[0, 2])
+    hyps = best_paths.new_full((bs, ymax), blank)
+    trigger_points = best_paths.new_zeros((bs, ymax))
+    hyps[batch_ids, positions] = best_paths[mask]
+    trigger_points[batch_ids, positions] = frames
+    return hyps, trigger_points, ylens
 
 
 class CTCForcedAligner(object):
@@ -621,7 +874,7 @@ class CTCForcedAligner(object):
             ys (List): length `[B]`, each of which contains a list of size `[L]`
             ylens (List): length `[B]`
         Returns:
-            trigger_points (IntTensor): `[B, L]`
+            trigger_points (IntTensor): `[B, L + 1]`
 
         """
         with torch.no_grad():
@@ -637,113 +890,86 @@ class CTCForcedAligner(object):
             trigger_points = self.align(log_probs, elens, ys_in_pad, ylens)
         return trigger_points
 
-    def _computes_transition(self, prev_log_prob, path, path_lens, cum_log_prob, y, skip_accum=False):
-        bs, max_path_len = path.size()
-        mat = prev_log_prob.new_zeros(3, bs, max_path_len).fill_(self.log0)
-        mat[0, :, :] = prev_log_prob
-        mat[1, :, 1:] = prev_log_prob[:, :-1]
-        mat[2, :, 2:] = prev_log_prob[:, :-2]
-        # disable transition between the same symbols
-        # (including blank-to-blank)
-        same_transition = (path[:, :-2] == path[:, 2:])
-        mat[2, :, 2:][same_transition] = self.log0
-        log_prob = torch.logsumexp(mat, dim=0)
-        outside = torch.arange(max_path_len, dtype=torch.int64) >= path_lens.unsqueeze(1)
-        log_prob[outside] = self.log0
-        if not skip_accum:
-            cum_log_prob += log_prob
-        batch_index = torch.arange(bs, dtype=torch.int64).unsqueeze(1)
-        log_prob += y[batch_index, path]
-        return log_prob
-
     def align(self, log_probs, elens, ys, ylens, add_eos=True):
-        """Calculte the best CTC alignment with the forward-backward algorithm.
+        """Calculate the best CTC alignment with the Viterbi algorithm.
+
+        Back-pointers of all utterances in a mini-batch are kept as a `[T, B, 2*L+1]`
+        tensor of offsets on the CTC paths (0: stay, 1: previous symbol, 2: skip a blank),
+        and the best paths are traced back for all utterances at once.
+
         Args:
             log_probs (FloatTensor): `[T, B, vocab]`
-            elens (FloatTensor): `[B]`
-            ys (FloatTensor): `[B, L]`
-            ylens (FloatTensor): `[B]`
+            elens (IntTensor): `[B]`
+            ys (LongTensor): `[B, L]`
+            ylens (IntTensor): `[B]`
             add_eos (bool): Use the last time index as a boundary corresponding to <eos>
         Returns:
-            trigger_points (IntTensor): `[B, L]`
+            trigger_points (IntTensor): `[B, L + 1]`
 
         """
         xmax, bs, vocab = log_probs.size()
+        device = log_probs.device
+        elens = elens.to(device).long()
+        ylens = ylens.to(device).long()
 
         path = _label_to_path(ys, self.blank)
-        path_lens = 2 * ylens.long() + 1
+        path_lens = 2 * ylens + 1
 
         ymax = ys.size(1)
         max_path_len = path.size(1)
         assert ys.size() == (bs, ymax), ys.size()
         assert path.size() == (bs, ymax * 2 + 1)
 
-        alpha = log_probs.new_zeros(bs, max_path_len).fill_(self.log0)
-        alpha[:, 0] = LOG_1
-        beta = alpha.clone()
-        gamma = alpha.clone()
-
-        batch_index = torch.arange(bs, dtype=torch.int64).unsqueeze(1)
-        seq_index = torch.arange(xmax, dtype=torch.int64).unsqueeze(1).unsqueeze(2)
-        log_probs_fwd_bwd = log_probs[seq_index, batch_index, path]
-
-        # forward algorithm
-        for t in range(xmax):
-            alpha = self._computes_transition(alpha, path, path_lens, log_probs_fwd_bwd[t], log_probs[t])
-
-        # backward algorithm
-        r_path = _flip_path(path, path_lens)
-        log_probs_inv = _flip_label_probability(log_probs, elens.long())  # `[T, B, vocab]`
-        log_probs_fwd_bwd = _flip_path_probability(log_probs_fwd_bwd, elens.long(), path_lens)  # `[T, B, 2*L+1]`
-        for t in range(xmax):
-            beta = self._computes_transition(beta, r_path, path_lens, log_probs_fwd_bwd[t], log_probs_inv[t])
-
-        # pick up the best CTC path
-        best_aligns = log_probs.new_zeros((bs, xmax), dtype=torch.int64)
-
-        # forward algorithm
-        log_probs_fwd_bwd = _flip_path_probability(log_probs_fwd_bwd, elens.long(), path_lens)
-        for t in range(xmax):
-            gamma = self._computes_transition(gamma, path, path_lens, log_probs_fwd_bwd[t], log_probs[t],
-                                              skip_accum=True)
-
-            # select paths where gamma is valid
-            log_probs_fwd_bwd[t] = log_probs_fwd_bwd[t].masked_fill_(gamma == self.log0, self.log0)
-
-            # pick up the best alignment
-            offsets = log_probs_fwd_bwd[t].argmax(1)
-            for b in range(bs):
-                if t <= elens[b] - 1:
-                    token_idx = path[b, offsets[b]]
-                    best_aligns[b, t] = token_idx
-
-            # remove the rest of paths
-            gamma = log_probs.new_zeros(bs, max_path_len).fill_(self.log0)
-            for b in range(bs):
-                gamma[b, offsets[b]] = LOG_1
-
-        # pick up trigger points
-        trigger_aligns = torch.zeros((bs, xmax), dtype=torch.int64)
+        batch_index = torch.arange(bs, dtype=torch.int64, device=device)
+        log_probs_path = log_probs.gather(2, path.unsqueeze(0).expand(xmax, bs, max_path_len))  # `[T, B, 2*L+1]`
+        outside = torch.arange(max_path_len, dtype=torch.int64, device=device).unsqueeze(0) >= path_lens.unsqueeze(1)
+        # disable transition between the same symbols (including blank-to-blank)
+        skip_penalty = log_probs.new_zeros(bs, max_path_len).fill_(self.log0)
+        skip_penalty[:, 2:].masked_fill_(path[:, 2:] != path[:, :-2], 0)
+
+        # Viterbi algorithm
+        delta = log_probs.new_zeros(bs, max_path_len).fill_(self.log0)
+        delta[:, :2] = log_probs_path[0, :, :2]
+        delta.masked_fill_(outside, self.log0)
+        back_pointers = path.new_zeros((xmax, bs, max_path_len), dtype=torch.int8)
+        cands = log_probs.new_zeros(3, bs, max_path_len).fill_(self.log0)
+        for t in range(1, xmax):
+            cands[0] = delta
+            cands[1, :, 1:] = delta[:, :-1]
+            cands[2, :, 2:] = delta[:, :-2] + skip_penalty[:, 2:]
+            delta_t, offsets = cands.max(0)
+            delta_t = (delta_t + log_probs_path[t]).masked_fill_(outside, self.log0)
+            # keep scores of finished utterances
+            active = (elens > t).unsqueeze(1).expand_as(delta)
+            delta = torch.where(active, delta_t, delta)
+            back_pointers[t] = offsets.to(torch.int8)
+
+        # the best paths end with the last label or the trailing blank
+        pos_last = path_lens - 1
+        pos_label = (path_lens - 2).clamp(min=0)
+        pos = torch.where(delta[batch_index, pos_label] > delta[batch_index, pos_last], pos_label, pos_last)
+
+        # backtrace
+        best_paths = path.new_zeros(bs, xmax)  # positions on the CTC paths
+        for t in range(xmax - 1, -1, -1):
+            best_paths[:, t] = pos
+            if t > 0:
+                prev_pos = pos - back_pointers[t, batch_index, pos].long()
+                pos = torch.where(elens > t, prev_pos, pos)
+
+        # pick up trigger points (the most left frame of each label)
+        mask = (best_paths % 2 == 1) & (torch.arange(xmax, device=device).unsqueeze(0) < elens.unsqueeze(1))
+        mask[:, 1:] &= best_paths[:, 1:] != best_paths[:, :-1]
+        assert ylens.sum().item() == mask.long().sum().item()
+        positions = (mask.long().cumsum(1) - 1)[mask]
+        batch_ids, frames = mask.nonzero().t()
+
         trigger_points = log_probs.new_zeros((bs, ymax + 1), dtype=torch.int32)  # +1 for <eos>
-        for b in range(bs):
-            n_triggers = 0
-            if add_eos:
-                trigger_points[b, ylens[b]] = elens[b] - 1
-                # NOTE: use the last time index as a boundary corresponding to <eos>
-                # Otherwise, index: 0 is used for <eos>
-            for t in range(elens[b]):
-                token_idx = best_aligns[b, t]
-                if token_idx == self.blank:
-                    continue
-                if not (t == 0 or token_idx != best_aligns[b, t - 1]):
-                    continue
-
-                # NOTE: select the most left trigger points
-                trigger_aligns[b, t] = token_idx
-                trigger_points[b, n_triggers] = t
-                n_triggers += 1
-
-        assert ylens.sum() == (trigger_aligns != 0).sum()
+        trigger_points[batch_ids, positions] = frames.int()
+        if add_eos:
+            # NOTE: use the last time index as a boundary corresponding to <eos>
+            # Otherwise, index: 0 is used for <eos>
+            trigger_points[batch_index, ylens] = (elens - 1).int()
         return trigger_points
 
 
@@ -863,3 +1089,151 @@ class CTCPrefixScore(object):
         # return the log prefix probability and CTC states, where the label axis
         # of the CTC states is moved to the first axis to slice it easily
         return log_psi, np.rollaxis(r, 2)
+
+
+def _logaddexp(x, y):
+    """Numerically stable log(exp(x) + exp(y)) for tensors of the same size."""
+    return torch.max(x, y) + torch.log1p(torch.exp(-torch.abs(x - y)))
+
+
+class CTCPrefixScoreTH(object):
+    """Compute CTC label sequence scores in batch-mode.
+
+    This is a tensorized version of CTCPrefixScore. Prefix scores of all candidate
+    labels of all hypotheses (of multiple utterances) are computed at once, and only
+    the forward recursion over time is iterated.
+    When `margin` > 0, the recursion is restricted to frames around the current attention
+    peak, and only <blank> is assumed to be emitted after them. Without attention peaks,
+    the window spans from `margin` frames before the previous CTC spike to `margin` frames
+    after the onset of the next segment where <blank> is not dominant, so that it grows
+    across silence.
+
+    [Reference]:
+        https://github.com/espnet/espnet
+    """
+
+    def __init__(self, log_probs, blank, eos, xlens=None, margin=0):
+        """
+        Args:
+            log_probs (FloatTensor): `[B, T, vocab]`
+            blank (int): index of <blank>
+            eos (int): index of <eos>
+            xlens (IntTensor): `[B]`
+            margin (int): number of frames scored before/after the peak (0: all frames)
+
+        """
+        self.blank = blank
+        self.eos = eos
+        self.xlen = log_probs.size(1)
+        self.log0 = LOG_0
+        self.margin = margin
+
+        self.log_probs = log_probs.float().clone()
+        if xlens is not None:
+            # NOTE: padded frames always emit <blank> so that the forward probabilities
+            # at the last frame are equal to those at the last valid frame
+            is_pad = torch.arange(self.xlen, device=log_probs.device).unsqueeze(0) >= \
+                xlens.to(log_probs.device).unsqueeze(1)  # `[B, T]`
+            self.log_probs.masked_fill_(is_pad.unsqueeze(2), self.log0)
+            self.log_probs[:, :, blank].masked_fill_(is_pad, LOG_1)
+        # number of onsets of segments where <blank> is not dominant until each frame `[B, T]`
+        is_nonblank = (self.log_probs[:, :, blank].exp() < 0.5).long()
+        onsets = is_nonblank.clone()
+        onsets[:, 1:] = (is_nonblank[:, 1:] - is_nonblank[:, :-1]).clamp(min=0)
+        self.n_onsets = torch.cumsum(onsets, dim=1)
+
+    def initial_state(self):
+        """Obtain initial CTC states of all utterances.
+
+        Returns:
+            ctc_states (FloatTensor): `[B, T, 2]`
+
+        """
+        r = self.log_probs.new_full((self.log_probs.size(0), self.xlen, 2), self.log0)
+        r[:, :, 1] = torch.cumsum(self.log_probs[:, :, self.blank], dim=1)
+        return r
+
+    def __call__(self, hyps, cs, r_prev, utt_ids=None, att_peaks=None):
+        """Compute CTC prefix scores for next labels of all hypotheses.
+
+        Args:
+            hyps (List[List]): prefix label sequences of `N` hypotheses
+            cs (LongTensor): next labels `[N, K]`
+            r_prev (FloatTensor): previous CTC states `[N, T, 2]`
+            utt_ids (LongTensor): index of the utterance of each hypothesis `[N]`
+            att_peaks (LongTensor): frame indices of the current attention peaks `[N]`.
+                The window is determined from the previous CTC spikes if not given.
+        Returns:
+            log_psi (FloatTensor): `[N, K]`
+            ctc_states (FloatTensor): `[N, K, T, 2]`
+
+        """
+        n_hyps, K = cs.size()
+        if utt_ids is None:
+            assert self.log_probs.size(0) == 1
+            log_probs = self.log_probs.expand(n_hyps, -1, -1)
+        else:
+            log_probs = self.log_probs.index_select(0, utt_ids.to(cs.device))
+        xs = torch.gather(log_probs, 2, cs.unsqueeze(1).expand(-1, self.xlen, -1))
+        xs = xs.transpose(0, 1)  # `[T, N, K]`
+        xs_blank = log_probs[:, :, self.blank].t().unsqueeze(2)  # `[T, N, 1]`
+
+        # initialize CTC states, which are prepared as a frame x (n or b) x hyp x label tensor
+        ylens = cs.new_tensor([len(hyp) - 1 for hyp in hyps])  # ignore sos
+        r = xs.new_full((self.xlen, 2, n_hyps, K), self.log0)
+        is_first = ylens == 0
+        r[0, 0, is_first] = xs[0, is_first]
+
+        # prepare forward probabilities for the last label
+        r_sum = _logaddexp(r_prev[:, :, 0], r_prev[:, :, 1])  # `[N, T]`
+        log_phi = r_sum.t().unsqueeze(2).repeat([1, 1, K])  # `[T, N, K]`
+        last = cs.new_tensor([hyp[-1] for hyp in hyps])
+        is_repeat = (cs == last.unsqueeze(1)) & (ylens > 0).unsqueeze(1)  # `[N, K]`
+        if is_repeat.any():
+            log_phi[:, is_repeat] = r_prev[is_repeat.nonzero()[:, 0], :, 1].t()
+
+        # compute forward probabilities log(r_t^n(h)), log(r_t^b(h)),
+        # and log prefix probabilities log(psi)
+        start = ylens.clamp(min=1)
+        start_min, start_max = start.min().item(), start.max().item()
+        log_psi = r[start - 1, 0, torch.arange(n_hyps, device=cs.device)]  # `[N, K]`
+        t_begin, t_end = start_min, self.xlen
+        if self.margin > 0 and att_peaks is not None:
+            t_begin = max(start_min, att_peaks.min().item() - self.margin)
+            t_end = max(t_begin, min(self.xlen, att_peaks.max().item() + self.margin + 1))
+        elif self.margin > 0:
+            # NOTE: a window around the previous CTC spike misses the next label after
+            # a silence longer than `margin`. Instead, the window is extended to `margin`
+            # frames after the next onset of non-blank frames.
+            if utt_ids is None:
+                n_onsets = self.n_onsets.expand(n_hyps, -1)
+            else:
+                n_onsets = self.n_onsets.index_select(0, utt_ids.to(cs.device))
+            spikes = r_prev[:, :, 0].argmax(1).masked_fill(is_first, 0)
+            n_onsets_prev = n_onsets.gather(1, spikes.unsqueeze(1)).squeeze(1)
+            n_onsets_prev = n_onsets_prev.masked_fill(is_first, 0)
+            next_spikes = (n_onsets <= n_onsets_prev.unsqueeze(1)).sum(1)
+            t_begin = max(start_min, spikes.min().item() - self.margin)
+            t_end = max(t_begin, min(self.xlen, next_spikes.max().item() + self.margin + 1))
+        for t in range(t_begin, t_end):
+            r_t = _logaddexp(r[t - 1, 0].unsqueeze(0).expand(2, -1, -1),
+                             torch.stack([log_phi[t - 1], r[t - 1, 1]]))
+            r_t = r_t + torch.stack([xs[t], xs_blank[t].expand(-1, K)])
+            log_psi_t = _logaddexp(log_psi, log_phi[t - 1] + xs[t])
+            if t < start_max:
+                is_active = (start <= t).unsqueeze(1)
+                r_t = torch.where(is_active.unsqueeze(0), r_t, r[t])
+                log_psi_t = torch.where(is_active, log_psi_t, log_psi)
+            r[t] = r_t
+            log_psi = log_psi_t
+
+        # only <blank> is emitted after the window
+        if t_end < self.xlen:
+            r_last = _logaddexp(r[t_end - 1, 0], r[t_end - 1, 1])  # `[N, K]`
+            r[t_end:, 1] = r_last.unsqueeze(0) + torch.cumsum(xs_blank[t_end:], dim=0)
+
+        # get P(...eos|X) that ends with the prefix itself
+        log_psi = torch.where(cs == self.eos, r_sum[:, -1:].expand(-1, K), log_psi)
+
+        # move the hypothesis and label axes of the CTC states to the first axes to slice them easily
+        return log_psi, r.permute(2, 3, 0, 1)
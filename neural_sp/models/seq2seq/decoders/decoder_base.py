@@ -19,6 +19,9 @@ logger = logging.getLogger(__name__)
 class DecoderBase(ModelBase):
     """Base class for decoders."""
 
+    # attributes carried over between blocks in block-synchronous decoding
+    streaming_state_keys = ['n_frames', 'chunk_size', 'state_cache', 'dstates_final', 'lmstate_final']
+
     def __init__(self):
 
         super(ModelBase, self).__init__()
@@ -34,6 +37,41 @@ class DecoderBase(ModelBase):
     def trigger_quantity_loss(self):
         self._quantity_loss_weight = getattr(self, 'quantity_loss_weight', 0)
 
+    def get_streaming_state(self):
+        """Get decoder states for block-synchronous decoding of the current stream.
+
+        Returns:
+            state (dict): attribute (dotted) path -> value
+
+        """
+        state = {}
+        for key in self.streaming_state_keys:
+            module, name = self._resolve_streaming_state_key(key)
+            if module is not None and hasattr(module, name):
+                state[key] = getattr(module, name)
+        return state
+
+    def set_streaming_state(self, state):
+        """Restore decoder states obtained by `get_streaming_state`.
+
+        Args:
+            state (dict): attribute (dotted) path -> value
+
+        """
+        for key, value in state.items():
+            module, name = self._resolve_streaming_state_key(key)
+            if module is not None:
+                setattr(module, name, value)
+
+    def _resolve_streaming_state_key(self, key):
+        module = self
+        names = key.split('.')
+        for name in names[:-1]:
+            module = getattr(module, name, None)
+            if module is None:
+                break
+        return module, names[-1]
+
     def greedy(self, eouts, elens, max_len_ratio):
         raise NotImplementedError
 
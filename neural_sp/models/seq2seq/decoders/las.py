@@ -24,10 +24,15 @@ from neural_sp.models.modules.gmm_attention import GMMAttention
 from neural_sp.models.modules.initialization import init_with_uniform
 from neural_sp.models.modules.mocha.mocha import MoChA
 from neural_sp.models.modules.multihead_attention import MultiheadAttentionMechanism
-from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.beam_search import (
+    BeamSearch,
+    BeamState,
+    NEG_INF
+)
 from neural_sp.models.seq2seq.decoders.ctc import (
     CTC,
-    CTCPrefixScore
+    CTCPrefixScore,
+    CTCPrefixScoreTH
 )
 from neural_sp.models.seq2seq.decoders.decoder_base import DecoderBase
 from neural_sp.models.torch_utils import (
@@ -107,6 +112,9 @@ class RNNDecoder(DecoderBase):
 
     """
 
+    streaming_state_keys = DecoderBase.streaming_state_keys + [
+        'ctc_prefix_scorer', 'score.key_prev_tail', 'score.key_cur_tail', 'score.bd_L_prev']
+
     def __init__(self, special_symbols,
                  enc_n_units, attn_type, rnn_type, n_units, n_projs, n_layers,
                  bottleneck_dim, emb_dim, vocab, tie_embedding,
@@ -1089,11 +1097,19 @@ class RNNDecoder(DecoderBase):
             scores (List[List[np.array]]): sequence-level scores
 
         """
+        # hypotheses are kept in tensors unless unsupported features are used
+        if self.batch_beam_search_available(params, ctc_log_probs, ensmbl_decs, speakers):
+            return self.batch_beam_search(eouts, elens, params, idx2token,
+                                          lm, lm_second, lm_second_bwd,
+                                          nbest, exclude_eos, refs_id, utt_ids, speakers,
+                                          store_aws=True)
+
         bs, xmax, _ = eouts.size()
 
         beam_width = params.get('recog_beam_width')
         assert 1 <= nbest <= beam_width
         ctc_weight = params.get('recog_ctc_weight')
+        ctc_window_margin = params.get('recog_ctc_window_margin', 0)
         max_len_ratio = params.get('recog_max_len_ratio')
         min_len_ratio = params.get('recog_min_len_ratio')
         lp_weight = params.get('recog_length_penalty')
@@ -1112,8 +1128,6 @@ class RNNDecoder(DecoderBase):
 
         helper = BeamSearch(beam_width, self.eos, ctc_weight, lm_weight, eouts.device)
         lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
-        if lm is not None:
-            assert isinstance(lm, RNNLM)
         lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
         lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
 
@@ -1123,7 +1137,6 @@ class RNNDecoder(DecoderBase):
 
         if ctc_log_probs is not None:
             assert ctc_weight > 0
-            ctc_log_probs = tensor2np(ctc_log_probs)
 
         nbest_hyps_idx, aws, scores = [], [], []
         eos_flags = []
@@ -1138,17 +1151,18 @@ class RNNDecoder(DecoderBase):
             # For joint CTC-Attention decoding
             ctc_prefix_scorer = None
             if ctc_log_probs is not None:
+                ctc_log_probs_b = ctc_log_probs[b:b + 1, :elens[b]]
                 if self.bwd:
-                    ctc_prefix_scorer = CTCPrefixScore(ctc_log_probs[b][::-1], self.blank, self.eos)
-                else:
-                    ctc_prefix_scorer = CTCPrefixScore(ctc_log_probs[b], self.blank, self.eos)
-                ctc_state = ctc_prefix_scorer.initial_state()
+                    ctc_log_probs_b = ctc_log_probs_b.flip(1)
+                ctc_prefix_scorer = CTCPrefixScoreTH(ctc_log_probs_b, self.blank, self.eos,
+                                                     margin=ctc_window_margin)
+                ctc_state = ctc_prefix_scorer.initial_state()[0]
 
             if speakers is not None:
                 if speakers[b] == self.prev_spk:
                     if asr_state_CO:
                         dstates = self.dstates_final
-                    if lm_state_CO:
+                    if lm_state_CO and isinstance(lm, RNNLM):
                         lmstate = self.lmstate_final
                 else:
                     self.dstates_final = None  # reset
@@ -1181,16 +1195,9 @@ class RNNDecoder(DecoderBase):
                 dstates = {'dstate': (hxs, cxs)}
 
                 # Update LM states for LM fusion
-                lmout, lmstate, scores_lm = None, None, None
-                if lm is not None or self.lm is not None:
-                    if i > 0:
-                        lmstate = {'hxs': torch.cat([beam['lmstate']['hxs'] for beam in hyps], dim=1),
-                                   'cxs': torch.cat([beam['lmstate']['cxs'] for beam in hyps], dim=1)}
-
-                    if self.lm is not None:  # cold/deep fusion
-                        lmout, lmstate, scores_lm = self.lm.predict(y, lmstate)
-                    elif lm is not None:  # shallow fusion
-                        lmout, lmstate, scores_lm = lm.predict(y, lmstate)
+                # NOTE: self.lm is used for cold/deep fusion while lm is used for shallow fusion
+                lmout, lmstates, scores_lm = helper.update_lm_state_batch(
+                    self.lm if self.lm is not None else lm, hyps, y)
 
                 # for the main model
                 y_emb = self.embed_token_id(y)
@@ -1221,38 +1228,39 @@ class RNNDecoder(DecoderBase):
                 # Ensemble
                 scores_att = torch.log(probs / (len(ensmbl_decs) + 1))
 
-                new_hyps = []
-                for j, beam in enumerate(hyps):
-                    # Attention scores
-                    total_scores_att = beam['score_att'] + scores_att[j:j + 1]
-                    total_scores = total_scores_att * (1 - ctc_weight)
-                    total_scores_topk, topk_ids = torch.topk(
-                        total_scores, k=beam_width, dim=1, largest=True, sorted=True)
+                # Attention scores
+                total_scores_att = scores_att + eouts.new_tensor([beam['score_att'] for beam in hyps]).unsqueeze(1)
+                total_scores = total_scores_att * (1 - ctc_weight)
+                total_scores_topk, topk_ids = torch.topk(
+                    total_scores, k=beam_width, dim=1, largest=True, sorted=True)
 
-                    # Add LM score <after> top-K selection
-                    if lm is not None:
-                        total_scores_lm = beam['score_lm'] + scores_lm[j, -1, topk_ids[0]]
-                        total_scores_topk += total_scores_lm * lm_weight
-                    else:
-                        total_scores_lm = eouts.new_zeros(beam_width)
+                # Add LM score <after> top-K selection
+                if lm is not None:
+                    total_scores_lm = torch.gather(scores_lm[:, -1], 1, topk_ids)
+                    total_scores_lm += eouts.new_tensor([beam['score_lm'] for beam in hyps]).unsqueeze(1)
+                    total_scores_topk += total_scores_lm * lm_weight
+                else:
+                    total_scores_lm = eouts.new_zeros(len(hyps), beam_width)
 
-                    # Add length penalty
-                    if lp_weight > 0:
-                        if gnmt_decoding:
-                            lp = math.pow(6 + len(beam['hyp'][1:]), lp_weight) / math.pow(6, lp_weight)
-                            total_scores_topk /= lp
-                        else:
-                            total_scores_topk += (len(beam['hyp'][1:]) + 1) * lp_weight
+                # Add length penalty
+                # NOTE: all hypotheses have the same length (i + 1) including <sos>
+                if lp_weight > 0:
+                    if gnmt_decoding:
+                        lp = math.pow(6 + i, lp_weight) / math.pow(6, lp_weight)
+                        total_scores_topk /= lp
+                    else:
+                        total_scores_topk += (i + 1) * lp_weight
 
-                    # Add coverage penalty
-                    if cp_weight > 0:
+                # Add coverage penalty
+                cps = [0.] * len(hyps)
+                if cp_weight > 0:
+                    for j, beam in enumerate(hyps):
                         aw_mat = torch.cat(beam['aws'][1:] + [aw[j:j + 1]], dim=2)  # `[B, H, L, T]`
                         aw_mat = aw_mat[:, 0, :, :]  # `[B, L, T]`
                         if gnmt_decoding:
                             aw_mat = torch.log(aw_mat.sum(-1))
                             cp = torch.where(aw_mat < 0, aw_mat, aw_mat.new_zeros(aw_mat.size())).sum()
                             # TODO(hirofumi): mask by elens[b]
-                            total_scores_topk += cp * cp_weight
                         else:
                             # Recompute coverage penalty at each step
                             if cp_threshold == 0:
@@ -1260,19 +1268,20 @@ class RNNDecoder(DecoderBase):
                             else:
                                 cp = torch.where(aw_mat > cp_threshold, aw_mat,
                                                  aw_mat.new_zeros(aw_mat.size())).sum() / self.score.n_heads
-                            total_scores_topk += cp * cp_weight
-                    else:
-                        cp = 0.
+                        total_scores_topk[j] += cp * cp_weight
+                        cps[j] = cp
 
-                    # Add CTC score
-                    new_ctc_states, total_scores_ctc, total_scores_topk = helper.add_ctc_score(
-                        beam['hyp'], topk_ids, beam['ctc_state'],
-                        total_scores_topk, ctc_prefix_scorer)
+                # Add CTC scores of all hypotheses at once
+                new_ctc_states, total_scores_ctc, total_scores_topk = helper.add_ctc_score_batch(
+                    [beam['hyp'] for beam in hyps], topk_ids, [beam['ctc_state'] for beam in hyps],
+                    total_scores_topk, ctc_prefix_scorer, att_peaks=aw[:, :, -1].sum(1).argmax(-1))
 
+                new_hyps = []
+                for j, beam in enumerate(hyps):
                     for k in range(beam_width):
-                        idx = topk_ids[0, k].item()
+                        idx = topk_ids[j, k].item()
                         length_norm_factor = len(beam['hyp'][1:]) + 1 if length_norm else 1
-                        total_score = total_scores_topk[0, k].item() / length_norm_factor
+                        total_score = total_scores_topk[j, k].item() / length_norm_factor
 
                         if idx == self.eos:
                             # Exclude short hypotheses
@@ -1302,25 +1311,20 @@ class RNNDecoder(DecoderBase):
                             if beam['streamable'] and not streamable_global:
                                 streaming_failed_point = i
 
-                        new_lmstate = None
-                        if lmstate is not None:
-                            new_lmstate = {'hxs': lmstate['hxs'][:, j:j + 1],
-                                           'cxs': lmstate['cxs'][:, j:j + 1]}
-
                         new_hyps.append(
                             {'hyp': beam['hyp'] + [idx],
                              'score': total_score,
-                             'score_att': total_scores_att[0, idx].item(),
-                             'score_cp': cp,
-                             'score_ctc': total_scores_ctc[k].item(),
-                             'score_lm': total_scores_lm[k].item(),
+                             'score_att': total_scores_att[j, idx].item(),
+                             'score_cp': cps[j],
+                             'score_ctc': total_scores_ctc[j, k].item(),
+                             'score_lm': total_scores_lm[j, k].item(),
                              'dstates': {'dstate': (dstates['dstate'][0][:, j:j + 1],
                                                     dstates['dstate'][1][:, j:j + 1])},
                              'cv': cv[j:j + 1],
                              'aws': beam['aws'] + [aw[j:j + 1]],
                              'myu': attn_state['myu'][j:j + 1] if self.attn_type in ['gmm', 'sagmm'] else None,
-                             'lmstate': new_lmstate,
-                             'ctc_state': new_ctc_states[k] if ctc_prefix_scorer is not None else None,
+                             'lmstate': lmstates[j] if lmstates is not None else None,
+                             'ctc_state': new_ctc_states[j, k] if ctc_prefix_scorer is not None else None,
                              'ensmbl_dstate': ensmbl_dstate,
                              'ensmbl_cv': ensmbl_cv,
                              'ensmbl_aws': ensmbl_aws,
@@ -1437,6 +1441,269 @@ class RNNDecoder(DecoderBase):
 
         return nbest_hyps_idx, aws, scores
 
+    def batch_beam_search_available(self, params, ctc_log_probs=None, ensmbl_decs=[], speakers=None):
+        """Check whether hypotheses can be decoded with tensor-backed `batch_beam_search`."""
+        if ctc_log_probs is not None or len(ensmbl_decs) > 0 or self.replace_sos:
+            return False
+        if params.get('recog_coverage_penalty', 0) > 0:
+            return False
+        if self.attn_type in ['mocha', 'gmm', 'sagmm', 'triggered_attention']:
+            return False
+        carry_over = params.get('recog_asr_state_carry_over') or params.get('recog_lm_state_carry_over')
+        if speakers is not None and carry_over:
+            return False
+        return True
+
+    def batch_beam_search(self, eouts, elens, params, idx2token=None,
+                          lm=None, lm_second=None, lm_second_bwd=None,
+                          nbest=1, exclude_eos=False,
+                          refs_id=None, utt_ids=None, speakers=None,
+                          store_aws=False):
+        """Beam search decoding of all utterances in a mini-batch at once.
+
+        Hypotheses of all utterances are kept in a tensor-backed `BeamState` of size
+        `[B * beam_width]` and fed to each decoder step together. Utterances are removed
+        from the active set as soon as they are finished.
+
+        Args:
+            eouts (FloatTensor): `[B, T, enc_n_units]`
+            elens (IntTensor): `[B]`
+            params (dict): decoding hyperparameters
+            idx2token (): converter from index to token
+            lm (torch.nn.module): firsh-pass LM
+            lm_second (torch.nn.module): second-pass LM
+            lm_second_bwd (torch.nn.module): second-pass backward LM
+            nbest (int): number of N-best list
+            exclude_eos (bool): exclude <eos> from hypothesis
+            refs_id (List): reference list
+            utt_ids (List): utterance id list
+            speakers (List): speaker list
+            store_aws (bool): return attention weights of N-best hypotheses
+        Returns:
+            nbest_hyps_idx (List[List[np.array]]): length `[B]`, each of which contains a list of hypotheses of size `[nbest]`,
+                each of which containts a list of arrays of size `[L]`
+            aws (List[List[[np.array]]]): length `[B]`, each of which contains a list of attention weights of size `[nbest]`,
+                each of which containts a list of arrays of size `[H, L, T]` (list of None if store_aws is False)
+            scores (List[List[np.array]]): sequence-level scores
+
+        """
+        bs = eouts.size(0)
+
+        beam_width = params.get('recog_beam_width')
+        assert 1 <= nbest <= beam_width
+        assert params.get('recog_ctc_weight') == 0, 'CTC scores are not supported in batch-mode.'
+        assert params.get('recog_coverage_penalty') == 0, 'Coverage penalty is not supported in batch-mode.'
+        assert self.attn_type not in ['mocha', 'gmm', 'sagmm', 'triggered_attention'], \
+            '%s attention is not supported in batch-mode.' % self.attn_type
+        assert not self.replace_sos
+        max_len_ratio = params.get('recog_max_len_ratio')
+        min_len_ratio = params.get('recog_min_len_ratio')
+        lp_weight = params.get('recog_length_penalty')
+        length_norm = params.get('recog_length_norm')
+        cache_emb = params.get('recog_cache_embedding')
+        lm_weight = params.get('recog_lm_weight')
+        lm_weight_second = params.get('recog_lm_second_weight')
+        lm_weight_second_bwd = params.get('recog_lm_bwd_weight')
+        gnmt_decoding = params.get('recog_gnmt_decoding')
+        eos_threshold = params.get('recog_eos_threshold')
+        softmax_smoothing = params.get('recog_softmax_smoothing')
+
+        helper = BeamSearch(beam_width, self.eos, 0., lm_weight, eouts.device)
+        lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
+        lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
+        lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
+
+        # cache token embeddings
+        if cache_emb:
+            self.cache_embedding(eouts.device)
+
+        elens = elens.to(eouts.device)
+        src_mask_all = make_pad_mask(elens).unsqueeze(1)  # `[B, 1, T]`
+        eouts = eouts[:, :src_mask_all.size(-1)]
+        ymax = [math.ceil(elens[b].item() * max_len_ratio) for b in range(bs)]
+
+        self.score.reset()
+        state = BeamState(bs, beam_width, max(ymax), self.eos, eouts.device)
+        eouts_a = state.repeat_rows(eouts)
+        src_mask = state.repeat_rows(src_mask_all)
+        min_lens = state.repeat_rows(elens.float()) * min_len_ratio
+        state.set_state('dstate', self.zero_state(state.n_rows)['dstate'], dim=1)
+        state.set_state('cv', eouts.new_zeros(state.n_rows, 1, self.enc_n_units))
+        end_hyps = [[] for _ in range(bs)]
+        hyps = [[] for _ in range(bs)]
+        for i in range(max(ymax)):
+            y = state.last_tokens()
+
+            # Update LM states for LM fusion
+            lmout, scores_lm = None, None
+            lm_i = self.lm if self.lm is not None else lm  # cold/deep fusion or shallow fusion
+            if lm_i is not None:
+                lmout, lmstate, scores_lm = lm_i.predict(y, state.get_state('lmstate'))
+                state.set_state('lmstate', lmstate, select_fn=lm_i.select_state)
+
+            # for the main model
+            dstates, cv, aw, _, attn_v = self.decode_step(
+                eouts_a, {'dstate': state.get_state('dstate')}, state.get_state('cv'),
+                self.embed_token_id(y), src_mask, state.get_state('aw'), lmout)
+            state.set_state('dstate', dstates['dstate'], dim=1)
+            state.set_state('cv', cv)
+            state.set_state('aw', aw)
+            if store_aws:
+                state.record('aws', aw)
+            scores_att = torch.log_softmax(self.output(attn_v).squeeze(1) * softmax_smoothing, dim=1)
+
+            # Attention scores
+            total_scores_att = state.score_att.unsqueeze(1) + scores_att
+            total_scores_topk, topk_ids = torch.topk(
+                total_scores_att, k=beam_width, dim=1, largest=True, sorted=True)
+
+            # Add LM score <after> top-K selection
+            if lm is not None:
+                total_scores_lm = state.score_lm.unsqueeze(1) + scores_lm[:, -1].gather(1, topk_ids)
+                total_scores_topk += total_scores_lm * lm_weight
+
+            # Add length penalty
+            if lp_weight > 0:
+                if gnmt_decoding:
+                    lp = math.pow(6 + i, lp_weight) / math.pow(6, lp_weight)
+                    total_scores_topk /= lp
+                else:
+                    total_scores_topk += (i + 1) * lp_weight
+
+            # Exclude short hypotheses and apply EOS threshold
+            eos_allowed = helper.eos_allowed_batch(scores_att, i, min_lens, eos_threshold)
+            total_scores_topk = total_scores_topk.masked_fill(
+                (topk_ids == self.eos) & ~eos_allowed.unsqueeze(1), NEG_INF)
+
+            # Local pruning over beam_width x beam_width candidates
+            total_scores_topk, src_rows, cand_ids, tokens = state.topk(total_scores_topk, topk_ids)
+            length_norm_factor = i + 1 if length_norm else 1
+            state.advance(src_rows, tokens,
+                          score=total_scores_topk / length_norm_factor,
+                          score_att=total_scores_att[src_rows, tokens],
+                          score_lm=total_scores_lm.view(-1)[cand_ids] if lm is not None else None)
+
+            # Remove complete hypotheses
+            is_eos = (tokens == self.eos) & state.alive
+            for r in is_eos.nonzero()[:, 0].tolist():
+                end_hyps[state.utt_ids[r // beam_width]].append(
+                    state.to_hyp(r, score_cp=0.,
+                                 dstates={'dstate': state.state_at('dstate', r)},
+                                 lmstate=state.state_at('lmstate', r)))
+            state.kill(is_eos)
+
+            # Remove finished utterances from the active set
+            alive_rows = state.alive.tolist()
+            keep = []
+            for u, b in enumerate(state.utt_ids):
+                rows = range(u * beam_width, (u + 1) * beam_width)
+                if len(end_hyps[b]) < beam_width and i < ymax[b] - 1 and any(alive_rows[r] for r in rows):
+                    keep.append(u)
+                    continue
+                hyps[b] = [state.to_hyp(r, score_cp=0.,
+                                        dstates={'dstate': state.state_at('dstate', r)},
+                                        lmstate=state.state_at('lmstate', r))
+                           for r in rows if alive_rows[r]]
+            if len(keep) == 0:
+                break
+            if len(keep) < len(state.utt_ids):
+                state.keep_utterances(keep)
+                eouts_a = state.repeat_rows(eouts)
+                src_mask = state.repeat_rows(src_mask_all)
+                min_lens = state.repeat_rows(elens.float()) * min_len_ratio
+                self.score.reset()  # re-compute the cached key for the remaining utterances
+
+        for b in range(bs):
+            end_hyps[b] = end_hyps[b][:beam_width]
+
+            # Global pruning
+            if len(end_hyps[b]) == 0:
+                end_hyps[b] = hyps[b][:]
+            elif len(end_hyps[b]) < nbest and nbest > 1:
+                end_hyps[b].extend(hyps[b][:nbest - len(end_hyps[b])])
+
+        # forward/backward second-pass LM rescoring of all utterances at once
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second, lm_weight_second,
+                                             length_norm=length_norm, tag='second')
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second_bwd, lm_weight_second_bwd,
+                                             length_norm=length_norm, tag='second_bwd')
+
+        nbest_hyps_idx, aws, scores = [], [], []
+        eos_flags = []
+        for b in range(bs):
+            # Sort by score
+            end_hyps_b = sorted(end_hyps[b], key=lambda x: x['score'], reverse=True)
+
+            if idx2token is not None:
+                if utt_ids is not None:
+                    logger.info('Utt-id: %s' % utt_ids[b])
+                assert self.vocab == idx2token.vocab
+                logger.info('=' * 200)
+                for k in range(len(end_hyps_b)):
+                    if refs_id is not None:
+                        logger.info('Ref: %s' % idx2token(refs_id[b]))
+                    logger.info('Hyp: %s' % idx2token(
+                        end_hyps_b[k]['hyp'][1:][::-1] if self.bwd else end_hyps_b[k]['hyp'][1:]))
+                    logger.info('num tokens (hyp): %d' % len(end_hyps_b[k]['hyp'][1:]))
+                    logger.info('log prob (hyp): %.7f' % end_hyps_b[k]['score'])
+                    logger.info('log prob (hyp, att): %.7f' % end_hyps_b[k]['score_att'])
+                    if lm is not None:
+                        logger.info('log prob (hyp, first-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm'] * lm_weight))
+                    if lm_second is not None:
+                        logger.info('log prob (hyp, second-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second'] * lm_weight_second))
+                    if lm_second_bwd is not None:
+                        logger.info('log prob (hyp, second-pass lm, reverse): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second_bwd'] * lm_weight_second_bwd))
+                    logger.info('-' * 50)
+
+            # N-best list
+            if self.bwd:
+                # Reverse the order
+                nbest_hyps_idx += [[np.array(end_hyps_b[n]['hyp'][1:][::-1]) for n in range(nbest)]]
+            else:
+                nbest_hyps_idx += [[np.array(end_hyps_b[n]['hyp'][1:]) for n in range(nbest)]]
+            if store_aws:
+                aws_b = [end_hyps_b[n]['aws'][::-1] if self.bwd else end_hyps_b[n]['aws'] for n in range(nbest)]
+                aws += [[tensor2np(torch.cat(aws_b[n], dim=2).squeeze(0)[:, :, :elens[b]]) for n in range(nbest)]]
+            else:
+                aws += [[None] * nbest]
+            if length_norm:
+                scores += [[end_hyps_b[n]['score_att'] / len(end_hyps_b[n]['hyp'][1:]) for n in range(nbest)]]
+            else:
+                scores += [[end_hyps_b[n]['score_att'] for n in range(nbest)]]
+
+            # Check <eos>
+            eos_flags.append([(end_hyps_b[n]['hyp'][-1] == self.eos) for n in range(nbest)])
+
+        # Exclude <eos> (<sos> in case of backward decoder)
+        if exclude_eos:
+            if self.bwd:
+                nbest_hyps_idx = [[nbest_hyps_idx[b][n][1:] if eos_flags[b][n]
+                                   else nbest_hyps_idx[b][n] for n in range(nbest)] for b in range(bs)]
+                if store_aws:
+                    aws = [[aws[b][n][:, 1:] if eos_flags[b][n] else aws[b][n]
+                            for n in range(nbest)] for b in range(bs)]
+            else:
+                nbest_hyps_idx = [[nbest_hyps_idx[b][n][:-1] if eos_flags[b][n]
+                                   else nbest_hyps_idx[b][n] for n in range(nbest)] for b in range(bs)]
+                if store_aws:
+                    aws = [[aws[b][n][:, :-1] if eos_flags[b][n] else aws[b][n]
+                            for n in range(nbest)] for b in range(bs)]
+
+        # metrics for streaming infernece
+        self.streamable = True
+        self.quantity_rate = 1.
+        self.last_success_frame_ratio = None
+
+        # Store ASR/LM state
+        if bs == 1:
+            self.dstates_final = end_hyps_b[0]['dstates']
+            self.lmstate_final = end_hyps_b[0]['lmstate']
+
+        return nbest_hyps_idx, aws, scores
+
     def beam_search_block_sync(self, eouts, params, helper, idx2token,
                                hyps, lm, ctc_log_probs=None,
                                state_carry_over=False):
@@ -1518,7 +1785,7 @@ class RNNDecoder(DecoderBase):
             dstates = {'dstate': (hxs, cxs)}
 
             # Update LM states for LM fusion
-            lmout, lmstate, scores_lm = helper.update_rnnlm_state_batch(
+            lmout, lmstates, scores_lm = helper.update_lm_state_batch(
                 self.lm if self.lm is not None else lm, hyps, y)
 
             y_emb = self.embed_token_id(y)
@@ -1588,8 +1855,7 @@ class RNNDecoder(DecoderBase):
                                                 dstates['dstate'][1][:, j:j + 1])},
                          'cv': cv[j:j + 1],
                          'aws': beam['aws'] + [aw[j:j + 1]],
-                         'lmstate': {'hxs': lmstate['hxs'][:, j:j + 1],
-                                     'cxs': lmstate['cxs'][:, j:j + 1]} if lmstate is not None else None,
+                         'lmstate': lmstates[j] if lmstates is not None else None,
                          'ctc_state': new_ctc_states[k] if self.ctc_prefix_scorer is not None else None,
                          'boundary': beam['boundary'] + [cp] if not no_boundary else beam['boundary'],
                          'no_boundary': no_boundary})
@@ -0,0 +1,117 @@
+# Copyright 2020 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Lexicon prefix tree for word-constrained decoding."""
+
+import codecs
+import logging
+import torch
+
+from neural_sp.datasets.token_converter.character import Idx2char
+from neural_sp.datasets.token_converter.wordpiece import Idx2wp
+
+logger = logging.getLogger(__name__)
+
+
+class LexiconTrie(object):
+    """Prefix tree of in-vocabulary words spelled with ASR tokens.
+
+    Words in a word dictionary are spelled with characters or word-pieces of the
+    ASR model, and shared prefixes are merged into the same node. A hypothesis keeps
+    the node of its partial word, and only tokens returned by `successors` can extend
+    it. A word is completed by `<space>` for character models and by the next
+    word-initial piece (starting with "▁") for word-piece models.
+
+    Args:
+        dict_path (str): path to a word dictionary (the same format as dict.txt)
+        idx2token (Idx2char or Idx2wp): token converter of the ASR model
+
+    """
+
+    root = 0
+
+    def __init__(self, dict_path, idx2token):
+
+        token2idx = {token: idx for idx, token in idx2token.idx2token.items()}
+        if isinstance(idx2token, Idx2char):
+            if '<space>' not in token2idx:
+                raise ValueError('<space> is required to detect word boundaries.')
+            self.space = token2idx['<space>']
+
+            def spell(word):
+                return list(word)
+        elif isinstance(idx2token, Idx2wp):
+            self.space = -1
+
+            def spell(word):
+                return idx2token.sp.EncodeAsPieces(word)
+        else:
+            raise NotImplementedError(idx2token.__class__.__name__)
+
+        self.children = [{}]  # token index -> node index
+        self.word_ids = [-1]  # index of the word ending at each node
+        self.n_words = 0
+        n_oovs = 0
+        with codecs.open(dict_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                w, idx = line.strip().split(' ')
+                if w[0] == '<' and w[-1] == '>':
+                    continue  # special symbols
+                token_ids = [token2idx.get(token, -1) for token in spell(w)]
+                if len(token_ids) == 0 or -1 in token_ids:
+                    n_oovs += 1
+                    continue
+                node = self.root
+                for token_id in token_ids:
+                    if token_id not in self.children[node]:
+                        self.children[node][token_id] = len(self.children)
+                        self.children.append({})
+                        self.word_ids.append(-1)
+                    node = self.children[node][token_id]
+                self.word_ids[node] = int(idx)
+                self.n_words += 1
+        logger.info('Lexicon: %d words (%d nodes), %d words cannot be spelled' %
+                    (self.n_words, len(self.children), n_oovs))
+
+        self._successors = {}
+
+    def __len__(self):
+        return len(self.children)
+
+    def word_id(self, node):
+        """Return the index of the word ending at the node (-1 if none)."""
+        return self.word_ids[node] if node != self.root else -1
+
+    def is_word_end(self, node):
+        """Check whether a hypothesis can be finished at the node."""
+        return node == self.root or self.word_ids[node] >= 0
+
+    def successors(self, node):
+        """Return tokens that can follow a partial word.
+
+        Args:
+            node (int): node of the partial word
+        Returns:
+            token_ids (LongTensor): `[N]`
+            next_nodes (List): length `N`, nodes after each token
+            word_ids (List): length `N`, index of the word completed by each token (-1 if not completed)
+
+        """
+        if node not in self._successors:
+            token_ids = list(self.children[node].keys())
+            next_nodes = list(self.children[node].values())
+            word_ids = [-1] * len(token_ids)
+            w = self.word_id(node)
+            if w >= 0:
+                if self.space >= 0:
+                    boundary = {self.space: self.root}
+                else:
+                    boundary = self.children[self.root]
+                for token_id, next_node in boundary.items():
+                    if token_id in self.children[node]:
+                        continue
+                    token_ids.append(token_id)
+                    next_nodes.append(next_node)
+                    word_ids.append(w)
+            self._successors[node] = (torch.LongTensor(token_ids), next_nodes, word_ids)
+        return self._successors[node]
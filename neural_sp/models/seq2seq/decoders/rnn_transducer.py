@@ -3,21 +3,27 @@
 
 """RNN transducer."""
 
-from collections import OrderedDict
+from distutils.version import LooseVersion
 import logging
 import numpy as np
 import random
 import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
 
+from neural_sp.models.criterion import transducer_loss
 from neural_sp.models.lm.rnnlm import RNNLM
-from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.beam_search import (
+    BeamSearch,
+    PrefixStateCache
+)
 from neural_sp.models.seq2seq.decoders.ctc import CTC
 from neural_sp.models.seq2seq.decoders.decoder_base import DecoderBase
 from neural_sp.models.torch_utils import (
     np2tensor,
     pad_list,
     repeat,
+    tensor2np,
     tensor2scalar
 )
 
@@ -26,6 +32,9 @@ random.seed(1)
 LOG_0 = float(np.finfo(np.float32).min)
 LOG_1 = 0
 
+# NOTE: non-reentrant checkpointing must be requested explicitly since 1.11
+checkpoint_kwargs = {'use_reentrant': False} if LooseVersion(torch.__version__) >= LooseVersion("1.11") else {}
+
 logger = logging.getLogger(__name__)
 
 
@@ -55,6 +64,8 @@ class RNNTransducer(DecoderBase):
         global_weight (float): global loss weight for multi-task learning
         mtl_per_batch (bool): change mini-batch per task for multi-task training
         param_init (float): parameter initialization method
+        loss_impl (str): implementation of Transducer loss (warp/native)
+        loss_chunk_size (int): number of frames per chunk of the joint network in the native loss
 
     """
 
@@ -63,7 +74,8 @@ class RNNTransducer(DecoderBase):
                  bottleneck_dim, emb_dim, vocab,
                  dropout, dropout_emb,
                  ctc_weight, ctc_lsm_prob, ctc_fc_list,
-                 external_lm, global_weight, mtl_per_batch, param_init):
+                 external_lm, global_weight, mtl_per_batch, param_init,
+                 loss_impl='warp', loss_chunk_size=16):
 
         super(RNNTransducer, self).__init__()
 
@@ -81,6 +93,9 @@ class RNNTransducer(DecoderBase):
         self.rnnt_weight = global_weight - ctc_weight
         self.ctc_weight = ctc_weight
         self.mtl_per_batch = mtl_per_batch
+        assert loss_impl in ['warp', 'native']
+        self.loss_impl = loss_impl
+        self.loss_chunk_size = loss_chunk_size
 
         # for cache
         self.prev_spk = ''
@@ -149,6 +164,13 @@ class RNNTransducer(DecoderBase):
                                help='number of dimensions of the bottleneck layer before the softmax layer')
             group.add_argument('--emb_dim', type=int, default=512,
                                help='number of dimensions in the embedding layer')
+        # RNN-T specific
+        group.add_argument('--transducer_loss_impl', type=str, default='warp',
+                           choices=['warp', 'native'],
+                           help='implementation of Transducer loss. \
+                                 "native" does not require warp-rnnt/warprnnt_pytorch.')
+        group.add_argument('--transducer_loss_chunk_size', type=int, default=16,
+                           help='number of frames per chunk of the joint network in the native Transducer loss')
         return parser
 
     @staticmethod
@@ -239,6 +261,12 @@ class RNNTransducer(DecoderBase):
         # Update prediction network
         dout, _ = self.recurrency(self.embed_token_id(ys_in), None)
 
+        if self.loss_impl == 'native':
+            ys_out = ys_out.to(eouts.device)
+            log_probs_blank, log_probs_label = self.joint_gather(eouts, dout, ys_out)
+            loss = transducer_loss(log_probs_blank, log_probs_label, elens, ylens).mean()
+            return loss
+
         # Compute output distribution
         logits = self.joint(eouts, dout)  # `[B, T, L+1, vocab]`
 
@@ -279,6 +307,43 @@ class RNNTransducer(DecoderBase):
         out = self.output(out)
         return out
 
+    def joint_gather(self, eouts, douts, ys_out):
+        """Compute log-probabilities of <blank> and reference labels chunk by chunk.
+
+        The full output distribution is materialized only for `loss_chunk_size` frames
+        at a time and recomputed in the backward pass.
+
+        Args:
+            eouts (FloatTensor): `[B, T, enc_n_units]`
+            douts (FloatTensor): `[B, L+1, dec_n_units]`
+            ys_out (LongTensor): `[B, L]`
+        Returns:
+            log_probs_blank (FloatTensor): `[B, T, L+1]`
+            log_probs_label (FloatTensor): `[B, T, L]`
+
+        """
+        eouts = self.w_enc(eouts)
+        douts = self.w_dec(douts)
+        chunk_size = self.loss_chunk_size if self.loss_chunk_size > 0 else eouts.size(1)
+        log_probs_blank, log_probs_label = [], []
+        for t in range(0, eouts.size(1), chunk_size):
+            if torch.is_grad_enabled():
+                lp_blank, lp_label = checkpoint(self._joint_gather_chunk, eouts[:, t:t + chunk_size], douts, ys_out,
+                                                **checkpoint_kwargs)
+            else:
+                lp_blank, lp_label = self._joint_gather_chunk(eouts[:, t:t + chunk_size], douts, ys_out)
+            log_probs_blank.append(lp_blank)
+            log_probs_label.append(lp_label)
+        return torch.cat(log_probs_blank, dim=1), torch.cat(log_probs_label, dim=1)
+
+    def _joint_gather_chunk(self, eouts, douts, ys_out):
+        log_probs = torch.log_softmax(self.output(torch.tanh(eouts.unsqueeze(2) + douts.unsqueeze(1))), dim=-1)
+        # NOTE: copy so that the output does not keep the whole chunk alive as a view
+        log_probs_blank = log_probs[:, :, :, self.blank].clone()  # `[B, T_chunk, L+1]`
+        index = ys_out[:, None, :, None].expand(-1, eouts.size(1), -1, -1)
+        log_probs_label = torch.gather(log_probs[:, :, :-1], 3, index).squeeze(3)  # `[B, T_chunk, L]`
+        return log_probs_blank, log_probs_label
+
     def recurrency(self, ys_emb, dstate):
         """Update prediction network.
 
@@ -338,8 +403,8 @@ class RNNTransducer(DecoderBase):
 
     def greedy(self, eouts, elens, max_len_ratio, idx2token,
                exclude_eos=False, refs_id=None, utt_ids=None, speakers=None,
-               trigger_points=None, teacher_force=False):
-        """Greedy decoding.
+               trigger_points=None, teacher_force=False, max_symbols_per_frame=1):
+        """Greedy decoding in batch-mode.
 
         Args:
             eouts (FloatTensor): `[B, T, enc_units]`
@@ -352,32 +417,46 @@ class RNNTransducer(DecoderBase):
             speakers (List): speaker list
             trigger_points: dummy
             teacher_force: dummy
+            max_symbols_per_frame (int): maximum number of non-blank labels emitted per frame
         Returns:
             hyps (List): length `[B]`, each of which contains arrays of size `[L]`
             aw: dummy
 
         """
-        bs = eouts.size(0)
-
-        hyps = []
-        for b in range(bs):
-            hyp_b = []
-            # Initialization
-            y = eouts.new_zeros((1, 1), dtype=torch.int64).fill_(self.eos)
-            dout, dstate = self.recurrency(self.embed_token_id(y), None)
-
-            for t in range(elens[b]):
-                # Pick up 1-best per frame
-                out = self.joint(eouts[b:b + 1, t:t + 1], dout)
-                y = out.squeeze(2).argmax(-1)
-                idx = y[0].item()
-
-                # Update prediction network only when predicting non-blank labels
-                if idx != self.blank:
-                    hyp_b += [idx]
-                    dout, dstate = self.recurrency(self.embed_token_id(y), dstate)
-
-            hyps += [hyp_b]
+        bs, xmax = eouts.size()[:2]
+        elens = elens.to(eouts.device)
+
+        # Project encoder outputs in the joint network once for all frames
+        eouts_proj = self.w_enc(eouts)  # `[B, T, bottleneck_dim]`
+
+        # Initialization
+        y = eouts.new_zeros((bs, 1), dtype=torch.int64).fill_(self.eos)
+        dout, dstate = self.recurrency(self.embed_token_id(y), None)
+        dout_proj = self.w_dec(dout[:, 0])  # `[B, bottleneck_dim]`
+
+        ys_emitted = []
+        for t in range(xmax):
+            is_active = t < elens  # `[B]`
+            for _ in range(max_symbols_per_frame):
+                # Pick up 1-best per frame for all utterances
+                out = self.output(torch.tanh(eouts_proj[:, t] + dout_proj))
+                y = out.argmax(-1)  # `[B]`
+                is_emitted = (y != self.blank) & is_active
+                if not is_emitted.any():
+                    break
+                ys_emitted.append(y.masked_fill(~is_emitted, self.blank))
+
+                # Update prediction network only for utterances predicting non-blank labels
+                dout, new_dstate = self.recurrency(self.embed_token_id(y.unsqueeze(1)), dstate)
+                dout_proj = torch.where(is_emitted.unsqueeze(1), self.w_dec(dout[:, 0]), dout_proj)
+                for k in ['hxs', 'cxs']:
+                    if dstate[k] is not None:
+                        dstate[k] = torch.where(is_emitted.view(1, -1, 1), new_dstate[k], dstate[k])
+
+        hyps = [[] for _ in range(bs)]
+        if len(ys_emitted) > 0:
+            ys_emitted = tensor2np(torch.stack(ys_emitted, dim=1))  # `[B, n_steps]`
+            hyps = [ys_emitted[b][ys_emitted[b] != self.blank].tolist() for b in range(bs)]
 
         if idx2token is not None:
             for b in range(bs):
@@ -414,7 +493,7 @@ class RNNTransducer(DecoderBase):
     def initialize_beam(self, hyp, dstate, lmstate):
         """Initialize beam."""
         hyps = [{'hyp': hyp,
-                 'hyp_ids_str': '',
+                 'hyp_key': PrefixStateCache.prefix_key(hyp),
                  'score': 0.,
                  'score_rnnt': 0.,
                  'score_lm': 0.,
@@ -469,11 +548,10 @@ class RNNTransducer(DecoderBase):
         lm_state_CO = params.get('recog_lm_state_carry_over')
         softmax_smoothing = params.get('recog_softmax_smoothing')
         beam_search_type = params.get('recog_rnnt_beam_search_type')
+        state_cache_size = params.get('recog_rnnt_state_cache_size', 1000)
 
         helper = BeamSearch(beam_width, self.eos, ctc_weight, lm_weight, eouts.device)
         lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
-        if lm is not None:
-            assert isinstance(lm, RNNLM)
         lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
         lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
 
@@ -486,18 +564,17 @@ class RNNTransducer(DecoderBase):
             # Initialization per utterance
             dstate = {'hxs': eouts.new_zeros(self.n_layers, 1, self.dec_n_units),
                       'cxs': eouts.new_zeros(self.n_layers, 1, self.dec_n_units)}
-            lmstate = {'hxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units),
-                       'cxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units)} if lm is not None else None
+            lmstate = lm.zero_state(1) if lm is not None else None
 
             if speakers is not None:
                 if speakers[b] == self.prev_spk:
-                    if lm_state_CO:
+                    if lm_state_CO and isinstance(lm, RNNLM):
                         lmstate = self.lmstate_final
                 self.prev_spk = speakers[b]
 
             end_hyps = []
             hyps = self.initialize_beam([self.eos], dstate, lmstate)
-            self.state_cache = OrderedDict()
+            self.state_cache = PrefixStateCache(state_cache_size)
 
             if beam_search_type == 'time_sync_mono':
                 hyps, new_hyps_sorted = self._time_sync_mono(
@@ -507,6 +584,7 @@ class RNNTransducer(DecoderBase):
                     hyps, helper, eouts[b:b + 1, :elens[b]], softmax_smoothing, lm)
             else:
                 raise NotImplementedError(beam_search_type)
+            logger.debug('Prefix cache: %d hits / %d misses' % (self.state_cache.n_hits, self.state_cache.n_misses))
 
             # Global pruning
             end_hyps = hyps[:]
@@ -568,34 +646,30 @@ class RNNTransducer(DecoderBase):
         douts, dstates = self.recurrency(self.embed_token_id(ys), dstates_prev)
 
         # Update LM states for shallow fusion
-        _, lmstates, scores_lm = helper.update_rnnlm_state_batch(lm, batch_hyps, ys)
-
-        hyp_ids_strs = [beam['hyp_ids_str'] for beam in hyps]
+        _, lmstates, scores_lm = helper.update_lm_state_batch(lm, batch_hyps, ys)
 
         for i, beam in enumerate(batch_hyps):
             dstate = {'hxs': dstates['hxs'][:, i:i + 1],
                       'cxs': dstates['cxs'][:, i:i + 1]}
-            lmstate = {'hxs': lmstates['hxs'][:, i:i + 1],
-                       'cxs': lmstates['cxs'][:, i:i + 1]} if lmstates is not None else None
-            index = hyp_ids_strs.index(beam['hyp_ids_str'])
+            lmstate = lmstates[i] if lmstates is not None else None
 
-            hyps[index]['dout'] = douts[i:i + 1]
-            hyps[index]['dstate'] = dstate
-            hyps[index]['lmstate'] = lmstate
+            # NOTE: beam is updated in-place
+            beam['dout'] = douts[i:i + 1]
+            beam['dstate'] = dstate
+            beam['lmstate'] = lmstate
             if lm is not None:
-                hyps[index]['next_scores_lm'] = scores_lm[i:i + 1]
+                beam['next_scores_lm'] = scores_lm[i:i + 1]
             else:
-                hyps[index]['next_scores_lm'] = None
-            assert hyps[index]['update_pred_net']
-            hyps[index]['update_pred_net'] = False
+                beam['next_scores_lm'] = None
+            beam['update_pred_net'] = False
 
             # register to cache
-            cache[beam['hyp_ids_str']] = {
+            cache.put(beam['hyp_key'], {
                 'dout': douts[i:i + 1],
                 'dstate': dstate,
-                'next_scores_lm': hyps[index]['next_scores_lm'],
+                'next_scores_lm': beam['next_scores_lm'],
                 'lmstate': lmstate,
-            }
+            })
         return hyps, cache
 
     def _time_sync_mono(self, hyps, helper, eout, softmax_smoothing, lm, merge_prob=True):
@@ -638,14 +712,15 @@ class RNNTransducer(DecoderBase):
                         total_score += total_score_lm * lm_weight
 
                     hyp_ids = beam['hyp'] + [idx]
-                    hyp_ids_str = ' '.join(list(map(str, hyp_ids)))
-                    exist_cache = hyp_ids_str in self.state_cache.keys()
+                    hyp_key = self.state_cache.extend_key(beam['hyp_key'], idx)
+                    cached = self.state_cache.get(hyp_key)
+                    exist_cache = cached is not None
                     if exist_cache:
                         # from cache
-                        dout = self.state_cache[hyp_ids_str]['dout']
-                        dstate = self.state_cache[hyp_ids_str]['dstate']
-                        scores_lm = self.state_cache[hyp_ids_str]['next_scores_lm']
-                        lmstate = self.state_cache[hyp_ids_str]['lmstate']
+                        dout = cached['dout']
+                        dstate = cached['dstate']
+                        scores_lm = cached['next_scores_lm']
+                        lmstate = cached['lmstate']
                     else:
                         # prediction network and LM will be updated later
                         dout = None
@@ -654,7 +729,7 @@ class RNNTransducer(DecoderBase):
                         lmstate = beam['lmstate']
 
                     new_hyps.append({'hyp': hyp_ids,
-                                     'hyp_ids_str': hyp_ids_str,
+                                     'hyp_key': hyp_key,
                                      'score': total_score,
                                      'score_rnnt': total_score_rnnt,
                                      'score_lm': total_score_lm,
@@ -692,15 +767,15 @@ class RNNTransducer(DecoderBase):
                 logits *= softmax_smoothing
                 scores_rnnt = torch.log_softmax(logits.squeeze(2).squeeze(1), dim=-1)  # `[B, vocab]`
 
-                new_hyp_ids_strs = [beam['hyp_ids_str'] for beam in new_hyps]
+                new_hyp_keys = [beam['hyp_key'] for beam in new_hyps]
                 new_hyps_v = []  # D
 
                 # blank expansion
                 for j, beam in enumerate(hyps_v):
                     blank_score = scores_rnnt[j, self.blank].item()
-                    if beam['hyp_ids_str'] in new_hyp_ids_strs and False:
+                    if beam['hyp_key'] in new_hyp_keys and False:
                         # merge
-                        index = new_hyp_ids_strs.index(beam['hyp_ids_str'])
+                        index = new_hyp_keys.index(beam['hyp_key'])
                         new_hyps[index]['score'] = np.logaddexp(new_hyps[index]['score'],
                                                                 beam['score'] + blank_score)
                         new_hyps[index]['score_rnnt'] = np.logaddexp(new_hyps[index]['score_rnnt'],
@@ -733,14 +808,15 @@ class RNNTransducer(DecoderBase):
 
                             # Update prediction network
                             hyp_ids = beam['hyp'] + [idx]
-                            hyp_ids_str = ' '.join(list(map(str, hyp_ids)))
-                            exist_cache = hyp_ids_str in self.state_cache.keys()
+                            hyp_key = self.state_cache.extend_key(beam['hyp_key'], idx)
+                            cached = self.state_cache.get(hyp_key)
+                            exist_cache = cached is not None
                             if exist_cache:
                                 # from cache
-                                dout = self.state_cache[hyp_ids_str]['dout']
-                                dstate = self.state_cache[hyp_ids_str]['dstate']
-                                scores_lm = self.state_cache[hyp_ids_str]['next_scores_lm']
-                                lmstate = self.state_cache[hyp_ids_str]['lmstate']
+                                dout = cached['dout']
+                                dstate = cached['dstate']
+                                scores_lm = cached['next_scores_lm']
+                                lmstate = cached['lmstate']
                             else:
                                 # prediction network and LM will be updated later
                                 dout = None
@@ -749,7 +825,7 @@ class RNNTransducer(DecoderBase):
                                 lmstate = beam['lmstate']
 
                             new_hyps_v.append({'hyp': hyp_ids,
-                                               'hyp_ids_str': hyp_ids_str,
+                                               'hyp_key': hyp_key,
                                                'score': total_score,
                                                'score_rnnt': total_score_rnnt,
                                                'score_lm': total_score_lm,
@@ -786,8 +862,7 @@ class RNNTransducer(DecoderBase):
             # Initialization per utterance
             dstate = {'hxs': eouts.new_zeros(self.n_layers, 1, self.dec_n_units),
                       'cxs': eouts.new_zeros(self.n_layers, 1, self.dec_n_units)}
-            lmstate = {'hxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units),
-                       'cxs': eouts.new_zeros(lm.n_layers, 1, lm.n_units)} if lm is not None else None
+            lmstate = lm.zero_state(1) if lm is not None else None
 
             if state_carry_over:
                 dstate = self.dstates_final
@@ -796,7 +871,7 @@ class RNNTransducer(DecoderBase):
             self.n_frames = 0
             self.chunk_size = eouts.size(1)
             hyps = self.initialize_beam([self.eos], dstate, lmstate)
-            self.state_cache = OrderedDict()
+            self.state_cache = PrefixStateCache(params.get('recog_rnnt_state_cache_size', 1000))
 
         if beam_search_type == 'time_sync_mono':
             hyps, new_hyps_sorted = self._time_sync_mono(
@@ -17,10 +17,14 @@ from neural_sp.models.criterion import cross_entropy_lsm
 from neural_sp.models.lm.rnnlm import RNNLM
 from neural_sp.models.modules.positional_embedding import PositionalEncoding
 from neural_sp.models.modules.transformer import TransformerDecoderBlock
-from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.beam_search import (
+    BeamSearch,
+    BeamState,
+    NEG_INF
+)
 from neural_sp.models.seq2seq.decoders.ctc import (
     CTC,
-    CTCPrefixScore
+    CTCPrefixScoreTH
 )
 from neural_sp.models.seq2seq.decoders.decoder_base import DecoderBase
 from neural_sp.models.torch_utils import (
@@ -129,6 +133,8 @@ class TransformerDecoder(DecoderBase):
         self.prev_spk = ''
         self.lmstate_final = None
         self.embed_cache = None
+        # project encoder outputs into keys/values of source-target attention once per utterance
+        self.cache_src = attn_type != 'mocha'
 
         # for attention plot
         self.aws_dict = {}
@@ -503,7 +509,8 @@ class TransformerDecoder(DecoderBase):
             xy_aws_layers = []
             out = self.pos_enc(self.embed_token_id(ys), scale=True)  # scaled + dropout
             for lth, layer in enumerate(self.layers):
-                out = layer(out, causal_mask, eouts, None, cache=cache[lth])
+                out = layer(out, causal_mask, eouts, None, cache=cache[lth],
+                            cache_src=self.cache_src)
                 new_cache[lth] = out
                 if layer.xy_aws is not None:
                     xy_aws_layers.append(layer.xy_aws[:, :, -1:])
@@ -622,12 +629,20 @@ class TransformerDecoder(DecoderBase):
             scores (List):
 
         """
+        # hypotheses are kept in tensors unless unsupported features are used
+        if self.batch_beam_search_available(params, ctc_log_probs, ensmbl_decs, speakers):
+            return self.batch_beam_search(eouts, elens, params, idx2token,
+                                          lm, lm_second, lm_second_bwd,
+                                          nbest, exclude_eos, refs_id, utt_ids, speakers,
+                                          cache_states=cache_states, store_aws=True)
+
         bs, xmax, _ = eouts.size()
         n_models = len(ensmbl_decs) + 1
 
         beam_width = params.get('recog_beam_width')
         assert 1 <= nbest <= beam_width
         ctc_weight = params.get('recog_ctc_weight')
+        ctc_window_margin = params.get('recog_ctc_window_margin', 0)
         max_len_ratio = params.get('recog_max_len_ratio')
         min_len_ratio = params.get('recog_min_len_ratio')
         lp_weight = params.get('recog_length_penalty')
@@ -652,7 +667,6 @@ class TransformerDecoder(DecoderBase):
 
         if ctc_log_probs is not None:
             assert ctc_weight > 0
-            ctc_log_probs = tensor2np(ctc_log_probs)
 
         nbest_hyps_idx, aws, scores = [], [], []
         eos_flags = []
@@ -666,10 +680,11 @@ class TransformerDecoder(DecoderBase):
             # For joint CTC-Attention decoding
             ctc_prefix_scorer = None
             if ctc_log_probs is not None:
+                ctc_log_probs_b = ctc_log_probs[b:b + 1, :elens[b]]
                 if self.bwd:
-                    ctc_prefix_scorer = CTCPrefixScore(ctc_log_probs[b][::-1], self.blank, self.eos)
-                else:
-                    ctc_prefix_scorer = CTCPrefixScore(ctc_log_probs[b], self.blank, self.eos)
+                    ctc_log_probs_b = ctc_log_probs_b.flip(1)
+                ctc_prefix_scorer = CTCPrefixScoreTH(ctc_log_probs_b, self.blank, self.eos,
+                                                     margin=ctc_window_margin)
 
             if speakers is not None:
                 if speakers[b] == self.prev_spk:
@@ -688,7 +703,7 @@ class TransformerDecoder(DecoderBase):
                      'aws': [None],
                      'lmstate': lmstate,
                      'ensmbl_cache': [[None] * dec.n_layers for dec in ensmbl_decs] if n_models > 1 else None,
-                     'ctc_state': ctc_prefix_scorer.initial_state() if ctc_prefix_scorer is not None else None,
+                     'ctc_state': ctc_prefix_scorer.initial_state()[0] if ctc_prefix_scorer is not None else None,
                      'quantity_rate': 1.,
                      'streamable': True,
                      'streaming_failed_point': 1000}]
@@ -710,7 +725,7 @@ class TransformerDecoder(DecoderBase):
 
                 # Update LM states for shallow fusion
                 y_lm = ys[:, -1:].clone()  # NOTE: this is important
-                _, lmstate, scores_lm = helper.update_rnnlm_state_batch(lm, hyps, y_lm)
+                _, lmstates, scores_lm = helper.update_lm_state_batch(lm, hyps, y_lm)
 
                 # for the main model
                 causal_mask = eouts.new_ones(i + 1, i + 1, dtype=torch.uint8)
@@ -721,7 +736,9 @@ class TransformerDecoder(DecoderBase):
                 out = self.pos_enc(self.embed_token_id(ys), scale=True)  # scaled + dropout
 
                 n_heads_total = 0
-                eouts_b = eouts[b:b + 1, :elens[b]].repeat([ys.size(0), 1, 1])
+                eouts_b = eouts[b:b + 1, :elens[b]]
+                if not self.cache_src:
+                    eouts_b = eouts_b.repeat([ys.size(0), 1, 1])
                 new_cache = [None] * self.n_layers
                 xy_aws_layers = []
                 xy_aws = None
@@ -731,7 +748,8 @@ class TransformerDecoder(DecoderBase):
                         out, causal_mask, eouts_b, None,
                         cache=cache[lth],
                         xy_aws_prev=xy_aws_prev[:, lth - lth_s] if lth >= lth_s and i > 0 else None,
-                        eps_wait=eps_wait)
+                        eps_wait=eps_wait,
+                        cache_src=self.cache_src)
                     xy_aws = layer.xy_aws
 
                     new_cache[lth] = out
@@ -765,39 +783,40 @@ class TransformerDecoder(DecoderBase):
                 # Ensemble
                 scores_att = torch.log(probs / n_models)
 
-                new_hyps = []
-                for j, beam in enumerate(hyps):
-                    # Attention scores
-                    total_scores_att = beam['score_att'] + scores_att[j:j + 1]
-                    total_scores = total_scores_att * (1 - ctc_weight)
+                # Attention scores
+                total_scores_att = scores_att + eouts.new_tensor([beam['score_att'] for beam in hyps]).unsqueeze(1)
+                total_scores = total_scores_att * (1 - ctc_weight)
 
-                    # Add LM score <before> top-K selection
-                    if lm is not None:
-                        total_scores_lm = beam['score_lm'] + scores_lm[j:j + 1, -1]
-                        total_scores += total_scores_lm * lm_weight
-                    else:
-                        total_scores_lm = eouts.new_zeros(1, self.vocab)
+                # Add LM score <before> top-K selection
+                if lm is not None:
+                    total_scores_lm = scores_lm[:, -1] + eouts.new_tensor([beam['score_lm'] for beam in hyps]).unsqueeze(1)
+                    total_scores += total_scores_lm * lm_weight
+                else:
+                    total_scores_lm = eouts.new_zeros(len(hyps), self.vocab)
 
-                    total_scores_topk, topk_ids = torch.topk(
-                        total_scores, k=beam_width, dim=1, largest=True, sorted=True)
+                total_scores_topk, topk_ids = torch.topk(
+                    total_scores, k=beam_width, dim=1, largest=True, sorted=True)
 
-                    # Add length penalty
-                    if lp_weight > 0:
-                        total_scores_topk += (len(beam['hyp'][1:]) + 1) * lp_weight
+                # Add length penalty
+                # NOTE: all hypotheses have the same length (i + 1) including <sos>
+                if lp_weight > 0:
+                    total_scores_topk += (i + 1) * lp_weight
 
-                    # Add CTC score
-                    new_ctc_states, total_scores_ctc, total_scores_topk = helper.add_ctc_score(
-                        beam['hyp'], topk_ids, beam['ctc_state'],
-                        total_scores_topk, ctc_prefix_scorer)
+                # Add CTC scores of all hypotheses at once
+                new_ctc_states, total_scores_ctc, total_scores_topk = helper.add_ctc_score_batch(
+                    [beam['hyp'] for beam in hyps], topk_ids, [beam['ctc_state'] for beam in hyps],
+                    total_scores_topk, ctc_prefix_scorer)
 
+                new_hyps = []
+                for j, beam in enumerate(hyps):
                     new_aws = beam['aws'] + [xy_aws_layers[j:j + 1, :, :, -1:]]
                     aws_j = torch.cat(new_aws[1:], dim=3)  # `[1, H, n_layers, L, T]`
 
                     # forward direction
                     for k in range(beam_width):
-                        idx = topk_ids[0, k].item()
+                        idx = topk_ids[j, k].item()
                         length_norm_factor = len(beam['hyp'][1:]) + 1 if length_norm else 1
-                        total_score = total_scores_topk[0, k].item() / length_norm_factor
+                        total_score = total_scores_topk[j, k].item() / length_norm_factor
 
                         if idx == self.eos:
                             # Exclude short hypotheses
@@ -835,13 +854,12 @@ class TransformerDecoder(DecoderBase):
                              'ys': torch.cat([beam['ys'], eouts.new_zeros((1, 1), dtype=torch.int64).fill_(idx)], dim=-1),
                              'cache': [new_cache_l[j:j + 1] for new_cache_l in new_cache] if cache_states else cache,
                              'score': total_score,
-                             'score_att': total_scores_att[0, idx].item(),
-                             'score_ctc': total_scores_ctc[k].item(),
-                             'score_lm': total_scores_lm[0, idx].item(),
+                             'score_att': total_scores_att[j, idx].item(),
+                             'score_ctc': total_scores_ctc[j, k].item(),
+                             'score_lm': total_scores_lm[j, idx].item(),
                              'aws': new_aws,
-                             'lmstate': {'hxs': lmstate['hxs'][:, j:j + 1],
-                                         'cxs': lmstate['cxs'][:, j:j + 1]} if lmstate is not None else None,
-                             'ctc_state': new_ctc_states[k] if ctc_prefix_scorer is not None else None,
+                             'lmstate': lmstates[j] if lmstates is not None else None,
+                             'ctc_state': new_ctc_states[j, k] if ctc_prefix_scorer is not None else None,
                              'ensmbl_cache': [[new_cache_e_l[j:j + 1] for new_cache_e_l in new_cache_e]
                                               for new_cache_e in ensmbl_new_cache] if cache_states else None,
                              'streamable': streamable_global,
@@ -953,3 +971,271 @@ class TransformerDecoder(DecoderBase):
             self.lmstate_final = end_hyps[0]['lmstate']
 
         return nbest_hyps_idx, aws, scores
+
+    def batch_beam_search_available(self, params, ctc_log_probs=None, ensmbl_decs=[], speakers=None):
+        """Check whether hypotheses can be decoded with tensor-backed `batch_beam_search`."""
+        if ctc_log_probs is not None or len(ensmbl_decs) > 0 or self.attn_type == 'mocha':
+            return False
+        if speakers is not None and params.get('recog_lm_state_carry_over'):
+            return False
+        return True
+
+    def batch_beam_search(self, eouts, elens, params, idx2token=None,
+                          lm=None, lm_second=None, lm_second_bwd=None,
+                          nbest=1, exclude_eos=False,
+                          refs_id=None, utt_ids=None, speakers=None,
+                          cache_states=True, store_aws=False):
+        """Beam search decoding of all utterances in a mini-batch at once.
+
+        Hypotheses of all utterances are kept in a tensor-backed `BeamState` of size
+        `[B * beam_width]` and fed to each decoder step together. Utterances are removed
+        from the active set as soon as they are finished.
+
+        Args:
+            eouts (FloatTensor): `[B, T, d_model]`
+            elens (IntTensor): `[B]`
+            params (dict): decoding hyperparameters
+            idx2token (): converter from index to token
+            lm (torch.nn.module): firsh-pass LM
+            lm_second (torch.nn.module): second-pass LM
+            lm_second_bwd (torch.nn.module): secoding-pass backward LM
+            nbest (int): number of N-best list
+            exclude_eos (bool): exclude <eos> from hypothesis
+            refs_id (List): reference list
+            utt_ids (List): utterance id list
+            speakers (List): speaker list
+            cache_states (bool): cache decoder states for fast decoding
+            store_aws (bool): return attention weights of N-best hypotheses
+        Returns:
+            nbest_hyps_idx (List): length `[B]`, each of which contains list of N hypotheses
+            aws (List): length `[B]`, each of which contains arrays of size `[H, L, T]`
+                (list of None if store_aws is False)
+            scores (List):
+
+        """
+        bs = eouts.size(0)
+
+        beam_width = params.get('recog_beam_width')
+        assert 1 <= nbest <= beam_width
+        assert params.get('recog_ctc_weight') == 0, 'CTC scores are not supported in batch-mode.'
+        assert self.attn_type != 'mocha', 'MoChA is not supported in batch-mode.'
+        max_len_ratio = params.get('recog_max_len_ratio')
+        min_len_ratio = params.get('recog_min_len_ratio')
+        lp_weight = params.get('recog_length_penalty')
+        length_norm = params.get('recog_length_norm')
+        cache_emb = params.get('recog_cache_embedding')
+        lm_weight = params.get('recog_lm_weight')
+        lm_weight_second = params.get('recog_lm_second_weight')
+        lm_weight_second_bwd = params.get('recog_lm_bwd_weight')
+        eos_threshold = params.get('recog_eos_threshold')
+        softmax_smoothing = params.get('recog_softmax_smoothing')
+
+        helper = BeamSearch(beam_width, self.eos, 0., lm_weight, eouts.device)
+        lm = helper.verify_lm_eval_mode(lm, lm_weight, cache_emb)
+        lm_second = helper.verify_lm_eval_mode(lm_second, lm_weight_second, cache_emb)
+        lm_second_bwd = helper.verify_lm_eval_mode(lm_second_bwd, lm_weight_second_bwd, cache_emb)
+
+        # cache token embeddings
+        if cache_emb:
+            self.cache_embedding(eouts.device)
+
+        for layer in self.layers:
+            layer.reset()
+
+        elens = elens.to(eouts.device)
+        src_mask_all = make_pad_mask(elens).unsqueeze(1)  # `[B, 1, T]`
+        eouts = eouts[:, :src_mask_all.size(-1)]
+        ymax = [math.ceil(elens[b].item() * max_len_ratio) for b in range(bs)]
+
+        state = BeamState(bs, beam_width, max(ymax), self.eos, eouts.device)
+        if self.cache_src:
+            # encoder outputs are broadcast across hypotheses in source-target attention
+            eouts_a, src_mask = eouts, src_mask_all
+        else:
+            eouts_a = state.repeat_rows(eouts)
+            src_mask = state.repeat_rows(src_mask_all)
+        min_lens = state.repeat_rows(elens.float()) * min_len_ratio
+        end_hyps = [[] for _ in range(bs)]
+        hyps = [[] for _ in range(bs)]
+        for i in range(max(ymax)):
+            n_rows = state.n_rows
+            cache = state.get_state('cache')
+            if cache is None:
+                cache = [None] * self.n_layers
+            causal_mask = eouts.new_ones(i + 1, i + 1, dtype=torch.uint8)
+            if torch_12_plus:
+                causal_mask = causal_mask.byte()
+            causal_mask = torch.tril(causal_mask).unsqueeze(0).repeat([n_rows, 1, 1])
+            xy_mask = src_mask
+            if cache[0] is None and not self.cache_src:
+                xy_mask = src_mask.repeat([1, i + 1, 1])
+
+            # Update LM states for shallow fusion
+            if lm is not None:
+                _, lmstate, scores_lm = lm.predict(state.last_tokens(), state.get_state('lmstate'))
+                state.set_state('lmstate', lmstate, select_fn=lm.select_state)
+
+            out = self.pos_enc(self.embed_token_id(state.tokens()), scale=True)  # scaled + dropout
+            new_cache = [None] * self.n_layers
+            xy_aws_layers = []
+            for lth, layer in enumerate(self.layers):
+                out = layer(out, causal_mask, eouts_a, xy_mask, cache=cache[lth],
+                            cache_src=self.cache_src)
+                new_cache[lth] = out
+                if store_aws and layer.xy_aws is not None:
+                    xy_aws_layers.append(layer.xy_aws[:, :, -1:])
+            if cache_states:
+                state.set_state('cache', new_cache)
+            if store_aws:
+                xy_aws_layers = torch.stack(xy_aws_layers, dim=1)  # `[B, n_layers, H, 1, T]`
+                state.record('aws', xy_aws_layers.view(n_rows, -1, 1, xy_aws_layers.size(-1)))
+            logits = self.output(self.norm_out(out[:, -1]))
+            scores_att = torch.log_softmax(logits * softmax_smoothing, dim=1)
+
+            # Attention scores
+            total_scores_att = state.score_att.unsqueeze(1) + scores_att
+            total_scores = total_scores_att
+
+            # Add LM score <before> top-K selection
+            if lm is not None:
+                total_scores_lm = state.score_lm.unsqueeze(1) + scores_lm[:, -1]
+                total_scores = total_scores + total_scores_lm * lm_weight
+
+            total_scores_topk, topk_ids = torch.topk(
+                total_scores, k=beam_width, dim=1, largest=True, sorted=True)
+
+            # Add length penalty
+            if lp_weight > 0:
+                total_scores_topk += (i + 1) * lp_weight
+
+            # Exclude short hypotheses and apply EOS threshold
+            eos_allowed = helper.eos_allowed_batch(scores_att, i, min_lens, eos_threshold)
+            total_scores_topk = total_scores_topk.masked_fill(
+                (topk_ids == self.eos) & ~eos_allowed.unsqueeze(1), NEG_INF)
+
+            # Local pruning over beam_width x beam_width candidates
+            total_scores_topk, src_rows, _, tokens = state.topk(total_scores_topk, topk_ids)
+            length_norm_factor = i + 1 if length_norm else 1
+            state.advance(src_rows, tokens,
+                          score=total_scores_topk / length_norm_factor,
+                          score_att=total_scores_att[src_rows, tokens],
+                          score_lm=total_scores_lm[src_rows, tokens] if lm is not None else None)
+
+            # Remove complete hypotheses
+            is_eos = (tokens == self.eos) & state.alive
+            for r in is_eos.nonzero()[:, 0].tolist():
+                end_hyps[state.utt_ids[r // beam_width]].append(
+                    state.to_hyp(r, lmstate=state.state_at('lmstate', r)))
+            state.kill(is_eos)
+
+            # Remove finished utterances from the active set
+            alive_rows = state.alive.tolist()
+            keep = []
+            for u, b in enumerate(state.utt_ids):
+                rows = range(u * beam_width, (u + 1) * beam_width)
+                if len(end_hyps[b]) < beam_width and i < ymax[b] - 1 and any(alive_rows[r] for r in rows):
+                    keep.append(u)
+                    continue
+                hyps[b] = [state.to_hyp(r, lmstate=state.state_at('lmstate', r))
+                           for r in rows if alive_rows[r]]
+            if len(keep) == 0:
+                break
+            if len(keep) < len(state.utt_ids):
+                state.keep_utterances(keep)
+                if self.cache_src:
+                    utt_ids_a = torch.tensor(state.utt_ids, device=eouts.device)
+                    eouts_a = eouts.index_select(0, utt_ids_a)
+                    src_mask = src_mask_all.index_select(0, utt_ids_a)
+                    for layer in self.layers:
+                        layer.reset()  # re-project encoder outputs of the remaining utterances
+                else:
+                    eouts_a = state.repeat_rows(eouts)
+                    src_mask = state.repeat_rows(src_mask_all)
+                min_lens = state.repeat_rows(elens.float()) * min_len_ratio
+
+        for b in range(bs):
+            end_hyps[b] = end_hyps[b][:beam_width]
+
+            # Global pruning
+            if len(end_hyps[b]) == 0:
+                end_hyps[b] = hyps[b][:]
+            elif len(end_hyps[b]) < nbest and nbest > 1:
+                end_hyps[b].extend(hyps[b][:nbest - len(end_hyps[b])])
+
+        # forward/backward second-pass LM rescoring of all utterances at once
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second, lm_weight_second,
+                                             length_norm=length_norm, tag='second')
+        end_hyps = helper.lm_rescoring_batch(end_hyps, lm_second_bwd, lm_weight_second_bwd,
+                                             length_norm=length_norm, tag='second_bwd')
+
+        nbest_hyps_idx, aws, scores = [], [], []
+        eos_flags = []
+        for b in range(bs):
+            # Sort by score
+            end_hyps_b = sorted(end_hyps[b], key=lambda x: x['score'], reverse=True)
+
+            if idx2token is not None:
+                if utt_ids is not None:
+                    logger.info('Utt-id: %s' % utt_ids[b])
+                assert self.vocab == idx2token.vocab
+                logger.info('=' * 200)
+                for k in range(len(end_hyps_b)):
+                    if refs_id is not None:
+                        logger.info('Ref: %s' % idx2token(refs_id[b]))
+                    logger.info('Hyp: %s' % idx2token(
+                        end_hyps_b[k]['hyp'][1:][::-1] if self.bwd else end_hyps_b[k]['hyp'][1:]))
+                    logger.info('num tokens (hyp): %d' % len(end_hyps_b[k]['hyp'][1:]))
+                    logger.info('log prob (hyp): %.7f' % end_hyps_b[k]['score'])
+                    logger.info('log prob (hyp, att): %.7f' % end_hyps_b[k]['score_att'])
+                    if lm is not None:
+                        logger.info('log prob (hyp, first-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm'] * lm_weight))
+                    if lm_second is not None:
+                        logger.info('log prob (hyp, second-pass lm): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second'] * lm_weight_second))
+                    if lm_second_bwd is not None:
+                        logger.info('log prob (hyp, second-pass lm, reverse): %.7f' %
+                                    (end_hyps_b[k]['score_lm_second_bwd'] * lm_weight_second_bwd))
+                    logger.info('-' * 50)
+
+            # N-best list
+            if self.bwd:
+                # Reverse the order
+                nbest_hyps_idx += [[np.array(end_hyps_b[n]['hyp'][1:][::-1]) for n in range(nbest)]]
+            else:
+                nbest_hyps_idx += [[np.array(end_hyps_b[n]['hyp'][1:]) for n in range(nbest)]]
+            if store_aws:
+                aws_b = [end_hyps_b[n]['aws'][::-1] if self.bwd else end_hyps_b[n]['aws'] for n in range(nbest)]
+                aws += [[tensor2np(torch.cat(aws_b[n], dim=2).squeeze(0)[:, :, :elens[b]]) for n in range(nbest)]]
+            else:
+                aws += [[None] * nbest]
+            scores += [[end_hyps_b[n]['score_att'] for n in range(nbest)]]
+
+            # Check <eos>
+            eos_flags.append([(end_hyps_b[n]['hyp'][-1] == self.eos) for n in range(nbest)])
+
+        # Exclude <eos> (<sos> in case of the backward decoder)
+        if exclude_eos:
+            if self.bwd:
+                nbest_hyps_idx = [[nbest_hyps_idx[b][n][1:] if eos_flags[b][n]
+                                   else nbest_hyps_idx[b][n] for n in range(nbest)] for b in range(bs)]
+                if store_aws:
+                    aws = [[aws[b][n][:, 1:] if eos_flags[b][n] else aws[b][n]
+                            for n in range(nbest)] for b in range(bs)]
+            else:
+                nbest_hyps_idx = [[nbest_hyps_idx[b][n][:-1] if eos_flags[b][n]
+                                   else nbest_hyps_idx[b][n] for n in range(nbest)] for b in range(bs)]
+                if store_aws:
+                    aws = [[aws[b][n][:, :-1] if eos_flags[b][n] else aws[b][n]
+                            for n in range(nbest)] for b in range(bs)]
+
+        # metrics for streaming infernece
+        self.streamable = True
+        self.quantity_rate = 1.
+        self.last_success_frame_ratio = None
+
+        # Store ASR/LM state
+        if bs == 1:
+            self.lmstate_final = end_hyps_b[0]['lmstate']
+
+        return nbest_hyps_idx, aws, scores
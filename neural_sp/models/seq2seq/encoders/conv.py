@@ -431,18 +431,14 @@ def update_lens_1d(seq_lens, layer):
         return seq_lens
     assert isinstance(seq_lens, torch.IntTensor)
     assert type(layer) in [nn.Conv1d, nn.MaxPool1d]
-    seq_lens = [_update_1d(seq_len, layer) for seq_len in seq_lens]
-    seq_lens = torch.IntTensor(seq_lens)
-    return seq_lens
+    return _update_1d(seq_lens, layer).int()
 
 
 def _update_1d(seq_len, layer):
     if type(layer) == nn.MaxPool1d and layer.ceil_mode:
-        return math.ceil(
-            (seq_len + 1 + 2 * layer.padding - (layer.kernel_size - 1) - 1) // layer.stride + 1)
+        return (seq_len + 2 * layer.padding - layer.kernel_size + layer.stride - 1) // layer.stride + 1
     else:
-        return math.floor(
-            (seq_len + 2 * layer.padding[0] - (layer.kernel_size[0] - 1) - 1) // layer.stride[0] + 1)
+        return (seq_len + 2 * layer.padding[0] - (layer.kernel_size[0] - 1) - 1) // layer.stride[0] + 1
 
 
 def update_lens_2d(seq_lens, layer, dim=0):
@@ -19,6 +19,10 @@ logger = logging.getLogger(__name__)
 class EncoderBase(ModelBase):
     """Base class for encoders."""
 
+    # attributes carried over between blocks in streaming encoding
+    cache_keys = []
+    cache_batch_dim = 0
+
     def __init__(self):
 
         super(ModelBase, self).__init__()
@@ -54,6 +58,44 @@ class EncoderBase(ModelBase):
     def reset_cache(self):
         raise NotImplementedError
 
+    def get_cache(self):
+        """Get encoder caches of the current stream for streaming encoding."""
+        return {key: getattr(self, key) for key in self.cache_keys}
+
+    def set_cache(self, cache):
+        """Restore encoder caches obtained by `get_cache`."""
+        for key in self.cache_keys:
+            setattr(self, key, cache[key])
+
+    def concat_cache(self, caches):
+        """Concatenate encoder caches of multiple streams along the batch dimension.
+
+        Args:
+            caches (List[dict]): caches obtained by `get_cache`
+        Returns:
+            cache (dict): batched cache
+
+        """
+        return _concat_cache(caches, self.cache_batch_dim)
+
+    def select_cache(self, cache, index):
+        """Select an encoder cache of a single stream from the batched cache.
+
+        Args:
+            cache (dict): batched cache
+            index (int): index in the batch
+        Returns:
+            cache (dict): cache of the `index`-th stream
+
+        """
+        return _select_cache(cache, index, self.cache_batch_dim)
+
+    def cache_signature(self, cache):
+        """Shapes of caches except for the batch dimension.
+        Caches of multiple streams can be batched only when their signatures match.
+        """
+        return _cache_signature(cache, self.cache_batch_dim)
+
     def turn_on_ceil_mode(self, encoder):
         if isinstance(encoder, torch.nn.Module):
             for name, module in encoder.named_children():
@@ -110,3 +152,41 @@ class EncoderBase(ModelBase):
             if save_path is not None:
                 fig.savefig(os.path.join(save_path, '%s.png' % k))
             plt.close()
+
+
+def _concat_cache(caches, dim):
+    cache = caches[0]
+    if cache is None:
+        assert all([c is None for c in caches])
+        return None
+    if isinstance(cache, torch.Tensor):
+        return torch.cat(caches, dim=dim)
+    if isinstance(cache, dict):
+        return {k: _concat_cache([c[k] for c in caches], dim) for k in cache.keys()}
+    if isinstance(cache, (list, tuple)):
+        return type(cache)([_concat_cache(list(c), dim) for c in zip(*caches)])
+    raise NotImplementedError(type(cache))
+
+
+def _select_cache(cache, index, dim):
+    if cache is None:
+        return None
+    if isinstance(cache, torch.Tensor):
+        return cache.narrow(dim, index, 1)
+    if isinstance(cache, dict):
+        return {k: _select_cache(v, index, dim) for k, v in cache.items()}
+    if isinstance(cache, (list, tuple)):
+        return type(cache)([_select_cache(c, index, dim) for c in cache])
+    raise NotImplementedError(type(cache))
+
+
+def _cache_signature(cache, dim):
+    if cache is None:
+        return None
+    if isinstance(cache, torch.Tensor):
+        return tuple(s for i, s in enumerate(cache.size()) if i != dim)
+    if isinstance(cache, dict):
+        return tuple((k, _cache_signature(cache[k], dim)) for k in sorted(cache.keys()))
+    if isinstance(cache, (list, tuple)):
+        return tuple(_cache_signature(c, dim) for c in cache)
+    raise NotImplementedError(type(cache))
@@ -68,6 +68,9 @@ class RNNEncoder(EncoderBase):
 
     """
 
+    cache_keys = ['hx_fwd']
+    cache_batch_dim = 1  # `[n_layers * n_dirs, B, n_units]`
+
     def __init__(self, input_dim, enc_type, n_units, n_projs, last_proj_dim,
                  n_layers, n_layers_sub1, n_layers_sub2,
                  dropout_in, dropout,
@@ -320,7 +323,8 @@ class RNNEncoder(EncoderBase):
 
         # Sort by lengths in the descending order for pack_padded_sequence
         perm_ids_unsort = None
-        if not self.lc_bidir:
+        if not self.lc_bidir and not streaming:
+            # NOTE: cached states of multiple streams are aligned with inputs in the streaming mode
             xlens, perm_ids = torch.IntTensor(xlens).sort(0, descending=True)
             xs = xs[perm_ids]
             _, perm_ids_unsort = perm_ids.sort()
@@ -3,7 +3,6 @@
 
 """Subsampling layers."""
 
-import math
 import torch
 import torch.nn as nn
 
@@ -35,20 +34,19 @@ class ConcatSubsampler(nn.Module):
         if self.factor == 1:
             return xs, xlens
 
-        if batch_first:
-            xs = xs.transpose(1, 0).contiguous()
-
-        xs = [torch.cat([xs[t - r:t - r + 1] for r in range(self.factor - 1, -1, -1)], dim=-1)
-              for t in range(xs.size(0)) if (t + 1) % self.factor == 0]
-        xs = torch.cat(xs, dim=0)
         # NOTE: Exclude the last frames if the length is not divisible
-        xs = torch.relu(self.proj(xs))
-
         if batch_first:
-            xs = xs.transpose(1, 0)
+            bs, xmax, idim = xs.size()
+            xmax = xmax // self.factor
+            xs = xs[:, :xmax * self.factor].contiguous().view(bs, xmax, idim * self.factor)
+        else:
+            xmax, bs, idim = xs.size()
+            xmax = xmax // self.factor
+            xs = xs[:xmax * self.factor].contiguous().view(xmax, self.factor, bs, idim).transpose(2, 1)
+            xs = xs.contiguous().view(xmax, bs, idim * self.factor)
+        xs = torch.relu(self.proj(xs))
 
-        xlens = [max(1, i.item() // self.factor) for i in xlens]
-        xlens = torch.IntTensor(xlens)
+        xlens = (xlens // self.factor).clamp(min=1)
         return xs, xlens
 
 
@@ -124,8 +122,7 @@ class DropSubsampler(nn.Module):
         else:
             xs = xs[::self.factor]
 
-        xlens = [max(1, math.ceil(i.item() / self.factor)) for i in xlens]
-        xlens = torch.IntTensor(xlens)
+        xlens = ((xlens + self.factor - 1) // self.factor).clamp(min=1)
         return xs, xlens
 
 
@@ -153,25 +150,19 @@ class AddSubsampler(nn.Module):
         if self.factor == 1:
             return xs, xlens
 
+        # NOTE: the last frame is added to zeros if the length is odd
         if batch_first:
             bs, xmax, idim = xs.size()
-            xs_even = xs[:, ::self.factor]
-            if xmax % 2 == 0:
-                xs_odd = xs[:, 1::self.factor]
-            else:
-                xs_odd = torch.cat([xs, xs.new_zeros(bs, 1, idim)], dim=1)[:, 1::self.factor]
+            if xmax % 2 == 1:
+                xs = torch.cat([xs, xs.new_zeros(bs, 1, idim)], dim=1)
+            xs = xs.contiguous().view(bs, -1, self.factor, idim).sum(2)
         else:
             xmax, bs, idim = xs.size()
-            xs_even = xs[::self.factor]
-            if xmax % 2 == 0:
-                xs_odd = xs[1::self.factor]
-            else:
-                xs_odd = torch.cat([xs, xs.new_zeros(1, bs, idim)], dim=0)[1::self.factor]
-
-        xs = xs_odd + xs_even
+            if xmax % 2 == 1:
+                xs = torch.cat([xs, xs.new_zeros(1, bs, idim)], dim=0)
+            xs = xs.contiguous().view(-1, self.factor, bs, idim).sum(1)
 
-        xlens = [max(1, math.ceil(i.item() / self.factor)) for i in xlens]
-        xlens = torch.IntTensor(xlens)
+        xlens = ((xlens + self.factor - 1) // self.factor).clamp(min=1)
         return xs, xlens
 
 
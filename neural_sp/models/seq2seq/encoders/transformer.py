@@ -85,6 +85,8 @@ class TransformerEncoder(EncoderBase):
 
     """
 
+    cache_keys = ['frontend_cache', 'cache']
+
     def __init__(self, input_dim, enc_type, n_heads,
                  n_layers, n_layers_sub1, n_layers_sub2,
                  d_model, d_ff, ffn_bottleneck_dim, ffn_activation,
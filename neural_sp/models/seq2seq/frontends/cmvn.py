@@ -0,0 +1,106 @@
+# Copyright 2021 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Cepstral mean and variance normalization (CMVN)."""
+
+import kaldiio
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class CMVN(nn.Module):
+    """Cepstral mean and variance normalization.
+
+    Global statistics are compatible with those of Kaldi `compute-cmvn-stats`,
+    i.e., a `[2, dim + 1]` matrix of the sum and the sum of squares with the frame count.
+
+    Args:
+        dim (int): feature dimension
+        norm_means (bool): normalize means
+        norm_vars (bool): normalize variances
+        utterance (bool): normalize with statistics of each utterance
+            instead of global statistics
+
+    """
+
+    def __init__(self, dim, norm_means=True, norm_vars=True, utterance=False):
+
+        super(CMVN, self).__init__()
+
+        assert norm_means or not norm_vars, 'norm_vars requires norm_means as in Kaldi.'
+        self.dim = dim
+        self.norm_means = norm_means
+        self.norm_vars = norm_vars
+        self.utterance = utterance
+
+        self.register_buffer('mean', torch.zeros(dim))
+        self.register_buffer('inv_std', torch.ones(dim))
+
+    @staticmethod
+    def compute_stats(xs):
+        """Accumulate statistics in the Kaldi format.
+
+        Args:
+            xs (List[np.ndarray]): features of size `[T, dim]`
+        Returns:
+            stats (np.ndarray): `[2, dim + 1]`
+
+        """
+        dim = xs[0].shape[-1]
+        stats = np.zeros((2, dim + 1), dtype=np.float64)
+        for x in xs:
+            x = x.astype(np.float64)
+            stats[0, :dim] += x.sum(0)
+            stats[1, :dim] += (x ** 2).sum(0)
+            stats[0, dim] += len(x)
+        return stats
+
+    def set_stats(self, stats):
+        """Set global statistics.
+
+        Args:
+            stats (np.ndarray): `[2, dim + 1]`
+
+        """
+        assert stats.shape == (2, self.dim + 1), stats.shape
+        count = stats[0, -1]
+        mean = stats[0, :-1] / count
+        var = np.maximum(stats[1, :-1] / count - mean ** 2, 1e-20)
+        self.mean.copy_(torch.from_numpy(mean).float())
+        self.inv_std.copy_(torch.from_numpy(1. / np.sqrt(var)).float())
+
+    def load_kaldi_stats(self, cmvn_path):
+        """Load global statistics computed by Kaldi `compute-cmvn-stats`."""
+        self.set_stats(kaldiio.load_mat(cmvn_path))
+
+    def forward(self, xs, xlens=None):
+        """Normalize features.
+
+        Args:
+            xs (FloatTensor): `[B, T, dim]`
+            xlens (IntTensor): `[B]` (for utterance CMVN)
+        Returns:
+            xs (FloatTensor): `[B, T, dim]`
+
+        """
+        if self.utterance:
+            if xlens is None:
+                mask = xs.new_ones(xs.size(0), xs.size(1), 1)
+            else:
+                mask = (torch.arange(xs.size(1)).unsqueeze(0) < xlens.unsqueeze(1)).unsqueeze(2)
+                mask = mask.to(xs.device).float()
+            count = mask.sum(1).clamp(min=1)  # `[B, 1]`
+            mean = (xs * mask).sum(1) / count  # `[B, dim]`
+            mean = mean.unsqueeze(1)
+            # NOTE: E[x^2] - mean^2 suffers from cancellation in float32
+            var = (((xs - mean) * mask) ** 2).sum(1) / count
+            inv_std = var.clamp(min=1e-20).rsqrt().unsqueeze(1)
+        else:
+            mean, inv_std = self.mean, self.inv_std
+
+        if self.norm_means:
+            xs = xs - mean
+        if self.norm_vars:
+            xs = xs * inv_std
+        return xs
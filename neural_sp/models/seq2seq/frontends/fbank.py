@@ -0,0 +1,290 @@
+# Copyright 2021 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Log-mel filterbank features computed from raw waveforms.
+   Framing, windowing and mel filters follow Kaldi `compute-fbank-feats`
+   (snip_edges=true, without the energy term) so that features can replace
+   those dumped by Kaldi.
+"""
+
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+import wave
+
+from neural_sp.models.seq2seq.frontends.cmvn import CMVN
+from neural_sp.models.torch_utils import (
+    np2tensor,
+    tensor2np
+)
+
+EPSILON = float(np.finfo(np.float32).eps)
+
+
+def is_wav_path(path):
+    """Check whether path points to a wav file (instead of features)."""
+    return isinstance(path, str) and path.endswith('.wav')
+
+
+def load_wav(wav_path):
+    """Load a 16-bit PCM wav file.
+
+    Args:
+        wav_path (str): path to a wav file
+    Returns:
+        wav (np.ndarray): `[n_samples]` in the 16-bit integer scale as in Kaldi
+        sample_rate (int): sampling rate
+
+    """
+    with wave.open(wav_path, 'rb') as f:
+        assert f.getsampwidth() == 2, 'Only 16-bit PCM is supported.'
+        n_channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        wav = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+    if n_channels > 1:
+        wav = wav.reshape(-1, n_channels)[:, 0]  # the first channel as in Kaldi
+    return wav.astype(np.float32), sample_rate
+
+
+def wav_n_samples(wav_path):
+    """Number of samples in a wav file (read from the header only)."""
+    with wave.open(wav_path, 'rb') as f:
+        return f.getnframes()
+
+
+def mel_scale(freq):
+    return 1127. * np.log(1. + freq / 700.)
+
+
+def mel_banks(n_mels, n_fft, sample_rate, low_freq=20., high_freq=0.):
+    """Triangular mel filters as in Kaldi.
+
+    Args:
+        n_mels (int): number of mel bins
+        n_fft (int): FFT size
+        sample_rate (int): sampling rate
+        low_freq (float): low cutoff frequency
+        high_freq (float): high cutoff frequency (if <= 0, offset from the Nyquist frequency)
+    Returns:
+        banks (np.ndarray): `[n_fft // 2 + 1, n_mels]`
+
+    """
+    nyquist = sample_rate / 2
+    if high_freq <= 0:
+        high_freq += nyquist
+    assert 0 <= low_freq < high_freq <= nyquist
+
+    mel_low = mel_scale(low_freq)
+    mel_delta = (mel_scale(high_freq) - mel_low) / (n_mels + 1)
+    left = mel_low + np.arange(n_mels) * mel_delta  # `[n_mels]`
+    center = left + mel_delta
+    right = center + mel_delta
+
+    mel = mel_scale(np.arange(n_fft // 2) * sample_rate / n_fft)[:, None]  # `[n_fft // 2, 1]`
+    up = (mel - left) / (center - left)
+    down = (right - mel) / (right - center)
+    banks = np.maximum(0., np.minimum(up, down))
+    # NOTE: the Nyquist bin is not used in Kaldi
+    banks = np.concatenate([banks, np.zeros((1, n_mels))], axis=0)
+    return banks.astype(np.float32)
+
+
+class LogMelFbank(nn.Module):
+    """Log-mel filterbank feature extractor.
+
+    The power spectrum is computed by multiplying frames with a windowed DFT matrix,
+    which is fast enough for short frames and runs on any device in mini-batches.
+
+    Args:
+        n_mels (int): number of mel bins
+        sample_rate (int): sampling rate
+        frame_length (float): frame length [ms]
+        frame_shift (float): frame shift [ms]
+        preemphasis (float): coefficient for pre-emphasis
+        dither (float): dithering constant (only in the training mode)
+        remove_dc_offset (bool): subtract the mean of each frame
+        window_type (str): povey/hamming/hanning
+        low_freq (float): low cutoff frequency
+        high_freq (float): high cutoff frequency
+
+    """
+
+    def __init__(self, n_mels=80, sample_rate=16000, frame_length=25., frame_shift=10.,
+                 preemphasis=0.97, dither=0., remove_dc_offset=True, window_type='povey',
+                 low_freq=20., high_freq=0.):
+
+        super(LogMelFbank, self).__init__()
+
+        self.n_mels = n_mels
+        self.sample_rate = sample_rate
+        self.win_length = int(sample_rate * frame_length / 1000)
+        self.hop_length = int(sample_rate * frame_shift / 1000)
+        self.n_fft = 2 ** math.ceil(math.log2(self.win_length))
+        self.preemphasis = preemphasis
+        self.dither = dither
+        self.remove_dc_offset = remove_dc_offset
+
+        n = np.arange(self.win_length)
+        if window_type == 'povey':
+            window = (0.5 - 0.5 * np.cos(2 * np.pi * n / (self.win_length - 1))) ** 0.85
+        elif window_type == 'hamming':
+            window = 0.54 - 0.46 * np.cos(2 * np.pi * n / (self.win_length - 1))
+        elif window_type == 'hanning':
+            window = 0.5 - 0.5 * np.cos(2 * np.pi * n / (self.win_length - 1))
+        else:
+            raise NotImplementedError(window_type)
+
+        # windowed DFT matrix for frames zero-padded to n_fft
+        phase = 2 * np.pi * np.outer(n, np.arange(self.n_fft // 2 + 1)) / self.n_fft
+        self.register_buffer('dft_real', torch.from_numpy(window[:, None] * np.cos(phase)).float())
+        self.register_buffer('dft_imag', torch.from_numpy(window[:, None] * -np.sin(phase)).float())
+        self.register_buffer('mel_banks', torch.from_numpy(
+            mel_banks(n_mels, self.n_fft, sample_rate, low_freq, high_freq)))
+
+    def n_frames(self, n_samples):
+        """Number of frames extracted from n_samples samples."""
+        if n_samples < self.win_length:
+            return 0
+        return 1 + (n_samples - self.win_length) // self.hop_length
+
+    def forward(self, xs, xlens=None):
+        """Extract log-mel filterbank features.
+
+        Args:
+            xs (FloatTensor): `[B, n_samples]` in the 16-bit integer scale
+            xlens (IntTensor): `[B]` (number of samples)
+        Returns:
+            xs (FloatTensor): `[B, T, n_mels]`
+            xlens (IntTensor): `[B]` (number of frames)
+
+        """
+        bs, n_samples = xs.size()
+        if xlens is None:
+            xlens = torch.IntTensor([n_samples] * bs)
+        xlens = torch.IntTensor([self.n_frames(xlen) for xlen in xlens.tolist()])
+        if n_samples < self.win_length:
+            return xs.new_zeros(bs, 0, self.n_mels), xlens
+
+        frames = xs.unfold(1, self.win_length, self.hop_length)  # `[B, T, win_length]`
+        if self.dither > 0 and self.training:
+            frames = frames + torch.randn_like(frames) * self.dither
+        if self.remove_dc_offset:
+            frames = frames - frames.mean(dim=-1, keepdim=True)
+        if self.preemphasis > 0:
+            frames = torch.cat([frames[:, :, :1] * (1 - self.preemphasis),
+                                frames[:, :, 1:] - self.preemphasis * frames[:, :, :-1]], dim=-1)
+
+        power = torch.matmul(frames, self.dft_real) ** 2 + torch.matmul(frames, self.dft_imag) ** 2
+        xs = torch.log(torch.matmul(power, self.mel_banks).clamp(min=EPSILON))
+        return xs, xlens
+
+
+class WavFrontend(nn.Module):
+    """Waveform frontend: log-mel filterbank features followed by CMVN.
+
+    Args:
+        n_mels (int): number of mel bins
+        cmvn (str): none/utterance or path to global statistics computed by Kaldi `compute-cmvn-stats`
+        kwargs: arguments for LogMelFbank
+
+    """
+
+    def __init__(self, n_mels=80, cmvn='utterance', **kwargs):
+
+        super(WavFrontend, self).__init__()
+
+        self.fbank = LogMelFbank(n_mels, **kwargs)
+        self.cmvn = None
+        if cmvn == 'utterance':
+            self.cmvn = CMVN(n_mels, utterance=True)
+        elif cmvn and cmvn != 'none':
+            self.cmvn = CMVN(n_mels)
+            self.cmvn.load_kaldi_stats(cmvn)
+
+    @property
+    def output_dim(self):
+        return self.fbank.n_mels
+
+    @property
+    def sample_rate(self):
+        return self.fbank.sample_rate
+
+    def n_frames(self, n_samples):
+        return self.fbank.n_frames(n_samples)
+
+    def forward(self, xs, xlens=None):
+        """Extract normalized features.
+
+        Args:
+            xs (FloatTensor): `[B, n_samples]`
+            xlens (IntTensor): `[B]` (number of samples)
+        Returns:
+            xs (FloatTensor): `[B, T, n_mels]`
+            xlens (IntTensor): `[B]` (number of frames)
+
+        """
+        xs, xlens = self.fbank(xs, xlens)
+        if self.cmvn is not None:
+            xs = self.cmvn(xs, xlens)
+        return xs, xlens
+
+    def extract(self, wav):
+        """Extract normalized features of a single utterance (e.g., in data-loader workers).
+
+        Args:
+            wav (np.ndarray): `[n_samples]`
+        Returns:
+            x (np.ndarray): `[T, n_mels]`
+
+        """
+        with torch.no_grad():
+            xs, _ = self.forward(np2tensor(wav, self.fbank.mel_banks.device).float().unsqueeze(0))
+        return tensor2np(xs[0])
+
+
+class StreamingFbank(object):
+    """Streaming log-mel filterbank feature extractor.
+
+    Samples overlapping with the next frame are kept between chunks,
+    so that features are identical to those extracted from the whole waveform.
+
+    Args:
+        frontend (WavFrontend or LogMelFbank): feature extractor.
+            Utterance CMVN is not available in the streaming mode.
+
+    """
+
+    def __init__(self, frontend):
+
+        super(StreamingFbank, self).__init__()
+
+        if isinstance(frontend, WavFrontend):
+            assert frontend.cmvn is None or not frontend.cmvn.utterance
+        self.frontend = frontend
+        self.fbank = getattr(frontend, 'fbank', frontend)
+        self.reset()
+
+    def reset(self):
+        self._wav = np.zeros(0, dtype=np.float32)
+
+    def __call__(self, wav):
+        """Extract features of all frames completed by a new chunk.
+
+        Args:
+            wav (np.ndarray): `[n_samples]`
+        Returns:
+            x (np.ndarray): `[T, n_mels]`
+
+        """
+        wav = np.concatenate([self._wav, wav.astype(np.float32)], axis=0)
+        n_frames = self.fbank.n_frames(len(wav))
+        if n_frames == 0:
+            self._wav = wav
+            return np.zeros((0, self.fbank.n_mels), dtype=np.float32)
+
+        n_samples = (n_frames - 1) * self.fbank.hop_length + self.fbank.win_length
+        with torch.no_grad():
+            xs, _ = self.frontend(np2tensor(wav[:n_samples], self.fbank.mel_banks.device).unsqueeze(0))
+        self._wav = wav[n_frames * self.fbank.hop_length:]
+        return tensor2np(xs[0])
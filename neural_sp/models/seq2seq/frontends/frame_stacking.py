@@ -4,6 +4,21 @@
 """Frame stacking."""
 
 import numpy as np
+import torch
+
+
+def n_stacked_frames(T, n_stacks, n_skips):
+    """Number of frames after frame stacking.
+
+    Args:
+        T (int): number of input frames
+        n_stacks (int): the number of frames to stack
+        n_skips (int): the number of frames to skip
+    Returns:
+        T_new (int): number of output frames
+
+    """
+    return T // n_skips if T % n_stacks == 0 else (T // n_skips) + 1
 
 
 def stack_frame(x, n_stacks, n_skips, dtype=np.float32):
@@ -14,6 +29,9 @@ def stack_frame(x, n_stacks, n_skips, dtype=np.float32):
            "Fast and accurate recurrent neural network acoustic models for speech recognition."
            arXiv preprint arXiv:1507.06947 (2015).
 
+    The t-th output frame is the concatenation of input frames [t * n_skips, t * n_skips + n_stacks),
+    where frames beyond the end of the utterance are filled with zeros.
+
     Args:
         x (np.ndarray): `[T, input_dim]`
         n_stacks (int): the number of frames to stack
@@ -30,39 +48,44 @@ def stack_frame(x, n_stacks, n_skips, dtype=np.float32):
     assert isinstance(x, np.ndarray), 'x should be np.ndarray.'
 
     T, input_dim = x.shape
-    T_new = T // n_skips if T % n_stacks == 0 else (T // n_skips) + 1
-
-    stacked_feat = np.zeros((T_new, input_dim * n_stacks), dtype=dtype)
-    stack_count = 0
-    stack = []
-    for t, frame_t in enumerate(x):
-        if t == len(x) - 1:  # final frame
-            # Stack the final frame
-            stack.append(frame_t)
-
-            while stack_count != int(T_new):
-                # Concatenate stacked frames
-                for i in range(len(stack)):
-                    stacked_feat[stack_count][input_dim * i:input_dim * (i + 1)] = stack[i]
-                stack_count += 1
-
-                # Delete some frames to skip
-                for _ in range(n_skips):
-                    if len(stack) != 0:
-                        stack.pop(0)
-
-        elif len(stack) < n_stacks:  # first & middle frames
-            # Stack some frames until stack is filled
-            stack.append(frame_t)
-
-        if len(stack) == n_stacks:
-            # Concatenate stacked frames
-            for i in range(n_stacks):
-                stacked_feat[stack_count][input_dim * i:input_dim * (i + 1)] = stack[i]
-            stack_count += 1
-
-            # Delete some frames to skip
-            for _ in range(n_skips):
-                stack.pop(0)
-
-    return stacked_feat
+    T_new = n_stacked_frames(T, n_stacks, n_skips)
+
+    x_pad = np.zeros((T_new * n_skips + n_stacks, input_dim), dtype=dtype)
+    x_pad[:T] = x
+    indices = np.arange(T_new)[:, None] * n_skips + np.arange(n_stacks)  # `[T_new, n_stacks]`
+    return x_pad[indices].reshape(T_new, input_dim * n_stacks)
+
+
+def stack_frame_batch(xs, xlens, n_stacks, n_skips):
+    """Stack & skip some frames of padded utterances at once (see stack_frame).
+
+    Args:
+        xs (FloatTensor): `[B, T, input_dim]`
+        xlens (IntTensor): `[B]`
+        n_stacks (int): the number of frames to stack
+        n_skips (int): the number of frames to skip
+    Returns:
+        xs (FloatTensor): `[B, T_new, input_dim * n_stacks]`
+        xlens (IntTensor): `[B]`
+
+    """
+    if n_stacks == 1 and n_skips == 1:
+        return xs, xlens
+    if n_stacks < n_skips:
+        raise ValueError('n_skips must be less than n_stacks.')
+
+    bs, xmax, input_dim = xs.size()
+    device = xs.device
+    xlens_new = torch.IntTensor([n_stacked_frames(xlen, n_stacks, n_skips) for xlen in xlens.tolist()])
+    T_new = max(xlens_new.tolist() + [0])
+
+    # zero out padded frames, which are stacked to the last frames of shorter utterances
+    mask = torch.arange(xmax, device=device).unsqueeze(0) < xlens.to(device).unsqueeze(1)
+    xs = xs.masked_fill(~mask.unsqueeze(2), 0)
+
+    xs = torch.cat([xs, xs.new_zeros(bs, max(0, T_new * n_skips + n_stacks - xmax), input_dim)], dim=1)
+    xs = xs.unfold(1, n_stacks, n_skips)[:, :T_new]  # `[B, T_new, input_dim, n_stacks]`
+    xs = xs.transpose(2, 3).contiguous().view(bs, T_new, input_dim * n_stacks)
+    mask = torch.arange(T_new, device=device).unsqueeze(0) < xlens_new.to(device).unsqueeze(1)
+    xs = xs.masked_fill(~mask.unsqueeze(2), 0)
+    return xs, xlens_new
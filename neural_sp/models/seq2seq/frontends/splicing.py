@@ -4,6 +4,31 @@
 """Splice data."""
 
 import numpy as np
+import torch
+
+
+def _splice_indices(n_splices, n_stacks):
+    """Source of each spliced frame.
+
+    Args:
+        n_splices (int): frames to n_splices
+        n_stacks (int): the number of stacked frames in frame stacking
+    Returns:
+        splice_ids (np.ndarray): `[n_splices * n_stacks]`, relative time index (+ n_splices)
+        stack_ids (np.ndarray): `[n_splices * n_stacks]`, index of the stacked frame
+        valid (np.ndarray): `[n_splices * n_stacks]`, False for zero-filled frames
+
+    """
+    j = np.arange(n_splices * n_stacks)
+    splice_ids = np.minimum(j, n_splices - 1)
+    stack_ids = j - splice_ids
+    valid = stack_ids < n_stacks
+    stack_ids = np.minimum(stack_ids, n_stacks - 1)
+    return splice_ids, stack_ids, valid
+
+
+def _n_deltas(input_dim, n_stacks):
+    return 3 if (input_dim // n_stacks) % 3 == 0 else 1
 
 
 def splice(x, n_splices=1, n_stacks=1, dtype=np.float32):
@@ -26,37 +51,56 @@ def splice(x, n_splices=1, n_stacks=1, dtype=np.float32):
         return x
     assert isinstance(x, np.ndarray), 'x should be np.ndarray.'
     assert len(x.shape) == 2, 'x must be 2 dimension.'
-    is_delta = ((x.shape[-1] // n_stacks) % 3 == 0)
-    n_delta = 3 if is_delta else 1
+    n_delta = _n_deltas(x.shape[-1], n_stacks)
 
-    print(x.shape)
     T, input_dim = x.shape
     F = (input_dim // n_delta) // n_stacks
-    feat_splice = np.zeros((T, F * (n_splices * n_stacks) * n_delta), dtype=dtype)
 
-    for i_time in range(T):
-        spliced_frames = np.zeros((n_splices * n_stacks, F, n_delta))
-        for i_splice in range(0, n_splices, 1):
-            if i_time <= n_splices - 1 and i_splice < n_splices - i_time:
-                # copy the first frame to left side (padding left frames)
-                copy_frame = x[0]
-            elif T - n_splices <= i_time and i_time + (i_splice - n_splices) > T - 1:
-                # copy the last frame to right side (padding right frames)
-                copy_frame = x[-1]
-            else:
-                copy_frame = x[i_time + (i_splice - n_splices)]
+    splice_ids, stack_ids, valid = _splice_indices(n_splices, n_stacks)
+    # frames before the beginning are padded with the first frame
+    time_ids = np.clip(np.arange(T)[:, None] + splice_ids - n_splices, 0, max(T - 1, 0))  # `[T, n_splices * n_stacks]`
+
+    # `[T, F * n_delta * n_stacks]` -> `[T, F, n_delta, n_stacks]`
+    x = x.reshape((T, F, n_delta, n_stacks))
+    # `[T, n_splices * n_stacks, F, n_delta]`
+    spliced_frames = x[time_ids, :, :, stack_ids]
+    spliced_frames[:, ~valid] = 0
 
-            # `[F * n_delta * n_stacks]` -> `[F, n_delta, n_stacks]`
-            copy_frame = copy_frame.reshape((F, n_delta, n_stacks))
+    # `[T, n_splices * n_stacks, F, n_delta] -> `[T, F, n_splices * n_stacks, n_delta]`
+    spliced_frames = np.transpose(spliced_frames, (0, 2, 1, 3))
+    return spliced_frames.reshape((T, F * (n_splices * n_stacks) * n_delta)).astype(dtype)
 
-            # `[F, n_delta, n_stacks]` -> `[n_stacks, F, n_delta]`
-            copy_frame = np.transpose(copy_frame, (2, 0, 1))
 
-            spliced_frames[i_splice: i_splice + n_stacks] = copy_frame
+def splice_batch(xs, xlens, n_splices=1, n_stacks=1):
+    """Splice padded utterances at once (see splice).
 
-        # `[n_splices * n_stacks, F, n_delta] -> `[F, n_splices * n_stacks, n_delta]`
-        spliced_frames = np.transpose(spliced_frames, (1, 0, 2))
+    Args:
+        xs (FloatTensor): `[B, T, input_dim (F * 3 * n_stacks)]`
+        xlens (IntTensor): `[B]`
+        n_splices (int): frames to n_splices
+        n_stacks (int): the number of stacked frames in frame stacking
+    Returns:
+        xs (FloatTensor): `[B, T, F * (n_splices * n_stacks) * 3 (static + Δ + ΔΔ)]`
+
+    """
+    if n_splices == 1:
+        return xs
+    bs, xmax, input_dim = xs.size()
+    device = xs.device
+    n_delta = _n_deltas(input_dim, n_stacks)
+    F = (input_dim // n_delta) // n_stacks
 
-        feat_splice[i_time] = spliced_frames.reshape((F * (n_splices * n_stacks) * n_delta))
+    splice_ids, stack_ids, valid = [torch.from_numpy(v).to(device)
+                                    for v in _splice_indices(n_splices, n_stacks)]
+    xlens = xlens.to(device).long()
+    time_ids = torch.arange(xmax, device=device).view(1, xmax, 1) + splice_ids - n_splices
+    # each utterance is padded with its own first and last frames
+    time_ids = torch.min(time_ids.clamp(min=0), (xlens - 1).clamp(min=0).view(bs, 1, 1))  # `[B, T, n_splices * n_stacks]`
+    batch_ids = torch.arange(bs, device=device).view(bs, 1, 1)
 
-    return feat_splice
+    xs = xs.view(bs, xmax, F, n_delta, n_stacks)
+    xs = xs[batch_ids, time_ids, :, :, stack_ids]  # `[B, T, n_splices * n_stacks, F, n_delta]`
+    xs = xs.masked_fill(~valid.view(1, 1, -1, 1, 1), 0)
+    xs = xs.transpose(2, 3).contiguous().view(bs, xmax, F * (n_splices * n_stacks) * n_delta)
+    mask = torch.arange(xmax, device=device).unsqueeze(0) < xlens.unsqueeze(1)
+    return xs.masked_fill(~mask.unsqueeze(2), 0)
@@ -10,20 +10,23 @@ import torch
 class Streaming(object):
     """Streaming encoding interface."""
 
-    def __init__(self, x_whole, params, encoder, idx2token=None):
+    def __init__(self, x_whole, params, encoder, idx2token=None, is_finished=True):
         """
         Args:
             x_whole (FloatTensor): `[T, input_dim]`
             params (dict): decoding hyperparameters
             encoder (torch.nn.module): encoder module
             idx2token (): converter from index to token
+            is_finished (bool): if False, features are appended later with `append_feature`
+                until `finish` is called (online mode)
 
         """
         super(Streaming, self).__init__()
 
         self.x_whole = x_whole
-        self.xmax_whole = len(x_whole)
-        # TODO: implement wav input
+        self._n_dropped = 0  # number of frames dropped from the head of x_whole (online mode)
+        self._is_finished = is_finished
+        # NOTE: waveforms are converted into features in advance (see StreamingSession.push_wav)
         self.input_dim = x_whole.shape[1]
         self.enc_type = encoder.enc_type
         self.idx2token = idx2token
@@ -75,6 +78,14 @@ class Streaming(object):
         # for test
         self._eout_blocks = []
 
+    @property
+    def xmax_whole(self):
+        return self._n_dropped + len(self.x_whole)
+
+    @property
+    def is_finished(self):
+        return self._is_finished
+
     @property
     def offset(self):
         return self._offset
@@ -111,6 +122,55 @@ class Streaming(object):
     def next_block(self):
         self._offset += self.N_c
 
+    def append_feature(self, x):
+        """Append acoustic features arriving in the online mode.
+
+        Args:
+            x (np.array): `[T, input_dim]`
+
+        """
+        assert not self._is_finished
+        # NOTE: the next block never starts before the current offset
+        n_drop = max(0, self._offset - self.N_c - self.conv_context - self.N_l - self._n_dropped)
+        self.x_whole = np.concatenate([self.x_whole[n_drop:], x], axis=0)
+        self._n_dropped += n_drop
+
+    def finish(self):
+        """Notify the end of input features in the online mode."""
+        self._is_finished = True
+
+    def block_ready(self):
+        """Check whether the next block can be extracted.
+
+        In the online mode, the next block is extracted only after all frames including
+        the right context (and one more frame) arrive so that blocks are identical to
+        those extracted from the whole input.
+
+        """
+        if self._is_finished:
+            return True
+        end = self._offset + (self.N_c + self.N_r + self.conv_context)
+        return self.xmax_whole > end
+
+    def state_dict(self):
+        """Return the states to resume streaming later."""
+        return {'x_whole': self.x_whole,
+                'n_dropped': self._n_dropped,
+                'is_finished': self._is_finished,
+                'offset': self._offset,
+                'n_blanks': self._n_blanks,
+                'n_accum_frames': self._n_accum_frames,
+                'bd_offset': self._bd_offset}
+
+    def load_state_dict(self, state):
+        self.x_whole = state['x_whole']
+        self._n_dropped = state['n_dropped']
+        self._is_finished = state['is_finished']
+        self._offset = state['offset']
+        self._n_blanks = state['n_blanks']
+        self._n_accum_frames = state['n_accum_frames']
+        self._bd_offset = state['bd_offset']
+
     def extract_feature(self):
         """Slice acoustic features.
 
@@ -128,7 +188,7 @@ class Streaming(object):
         # Encode input features block by block
         start = j - (self.conv_context + N_l)
         end = j + (N_c + N_r + self.conv_context)
-        x_block = self.x_whole[max(0, start):end]
+        x_block = self.x_whole[max(0, start) - self._n_dropped:end - self._n_dropped]
 
         is_last_block = (j + N_c) >= self.xmax_whole
         cnn_lookback = self.streaming_type != 'reshape' and start >= 0
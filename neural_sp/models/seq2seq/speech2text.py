@@ -5,7 +5,6 @@
 
 import copy
 import logging
-import math
 import numpy as np
 import random
 import torch
@@ -14,19 +13,17 @@ import torch.nn as nn
 from neural_sp.bin.train_utils import load_checkpoint
 from neural_sp.models.base import ModelBase
 from neural_sp.models.lm.rnnlm import RNNLM
-from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
 from neural_sp.models.seq2seq.decoders.build import build_decoder
 from neural_sp.models.seq2seq.decoders.fwd_bwd_attention import fwd_bwd_attention
-from neural_sp.models.seq2seq.decoders.las import RNNDecoder
 from neural_sp.models.seq2seq.decoders.rnn_transducer import RNNTransducer as RNNT
-from neural_sp.models.seq2seq.decoders.transformer import TransformerDecoder
 from neural_sp.models.seq2seq.encoders.build import build_encoder
-from neural_sp.models.seq2seq.frontends.frame_stacking import stack_frame
+from neural_sp.models.seq2seq.frontends.frame_stacking import stack_frame_batch
 from neural_sp.models.seq2seq.frontends.input_noise import add_input_noise
 from neural_sp.models.seq2seq.frontends.sequence_summary import SequenceSummaryNetwork
 from neural_sp.models.seq2seq.frontends.spec_augment import SpecAugment
-from neural_sp.models.seq2seq.frontends.splicing import splice
+from neural_sp.models.seq2seq.frontends.splicing import splice_batch
 from neural_sp.models.seq2seq.frontends.streaming import Streaming
+from neural_sp.models.seq2seq.streaming_session import StreamingSession
 from neural_sp.models.torch_utils import (
     np2tensor,
     tensor2np,
@@ -375,24 +372,25 @@ class Speech2Text(ModelBase):
             cnn_lookback (bool): truncate leftmost frames for lookback in CNN context
             cnn_lookahead (bool): truncate rightmost frames for lookahead in CNN context
             xlen_block (int): input length in a block in the streaming mode
+                (shared by all streams in a mini-batch)
         Returns:
             eout_dict (dict):
 
         """
         if self.input_type == 'speech':
+            xlens = torch.IntTensor([len(x) for x in xs])
+            xs = pad_list([np2tensor(x, self.device).float() for x in xs], 0.)
+
             # Frame stacking
             if self.n_stacks > 1:
-                xs = [stack_frame(x, self.n_stacks, self.n_skips) for x in xs]
+                xs, xlens = stack_frame_batch(xs, xlens, self.n_stacks, self.n_skips)
 
             # Splicing
             if self.n_splices > 1:
-                xs = [splice(x, self.n_splices, self.n_stacks) for x in xs]
+                xs = splice_batch(xs, xlens, self.n_splices, self.n_stacks)
 
             if streaming:
-                xlens = torch.IntTensor([xlen_block])
-            else:
-                xlens = torch.IntTensor([len(x) for x in xs])
-            xs = pad_list([np2tensor(x, self.device).float() for x in xs], 0.)
+                xlens = torch.IntTensor([xlen_block] * len(xs))
 
             # SpecAugment
             if self.specaug is not None and self.training:
@@ -472,7 +470,7 @@ class Speech2Text(ModelBase):
             xs (FloatTensor): `[B, T, idim]`
             ys (List): length `B`, each of which contains a list of size `[L]`
         Returns:
-            trigger_points (np.ndarray): `[B, L]`
+            trigger_points (np.ndarray): `[B, L + 1]`
 
         """
         self.eval()
@@ -482,7 +480,7 @@ class Speech2Text(ModelBase):
             ctc = getattr(self, 'dec_fwd').ctc
             logits = ctc.output(eout_dict[task]['xs'])
             ylens = np2tensor(np.fromiter([len(y) for y in ys], dtype=np.int32))
-            trigger_points = ctc.forced_align(logits, eout_dict[task]['xlens'], ys, ylens)
+            trigger_points = ctc.forced_aligner(logits, eout_dict[task]['xlens'], ys, ylens)
 
         return tensor2np(trigger_points)
 
@@ -544,134 +542,14 @@ class Speech2Text(ModelBase):
 
     def decode_streaming(self, xs, params, idx2token, exclude_eos=False, task='ys'):
         """Simulate streaming encoding+decoding. Both encoding and decoding are performed in the online mode."""
-        block_size = params.get('recog_block_sync_size')  # before subsampling
-        cache_emb = params.get('recog_cache_embedding')
-        ctc_weight = params.get('recog_ctc_weight')
-
-        assert task == 'ys'
-        assert self.input_type == 'speech'
-        assert self.ctc_weight > 0
-        assert self.fwd_weight > 0 or self.ctc_weight == 1.0
         assert len(xs) == 1  # batch size
-        assert params.get('recog_block_sync')
-        # assert params.get('recog_length_norm')
-
-        streaming = Streaming(xs[0], params, self.enc)
-        factor = self.enc.subsampling_factor
-        block_size //= factor
-        assert block_size >= 1, "block_size is too small."
-
-        hyps = None
-        best_hyp_id_stream = []
-        is_reset = True  # for the first block
-
-        stdout = False
-
-        self.eval()
-        helper = BeamSearch(params.get('recog_beam_width'),
-                            self.eos,
-                            params.get('recog_ctc_weight'),
-                            params.get('recog_lm_weight'),
-                            self.device)
-        lm = getattr(self, 'lm_fwd', None)
-        lm_second = getattr(self, 'lm_second', None)
-        lm = helper.verify_lm_eval_mode(lm, params.get('recog_lm_weight'), cache_emb)
-        if lm is not None:
-            assert isinstance(lm, RNNLM)
-        lm_second = helper.verify_lm_eval_mode(lm_second, params.get('recog_lm_second_weight'), cache_emb)
-
-        # cache token embeddings
-        if cache_emb and self.fwd_weight > 0:
-            self.dec_fwd.cache_embedding(self.device)
-
-        while True:
-            # Encode input features block by block
-            x_block, is_last_block, cnn_lookback, cnn_lookahead, xlen_block = streaming.extract_feature()
-            if is_reset:
-                self.enc.reset_cache()
-            eout_block_dict = self.encode([x_block], 'all',
-                                          streaming=True,
-                                          cnn_lookback=cnn_lookback,
-                                          cnn_lookahead=cnn_lookahead,
-                                          xlen_block=xlen_block)
-            eout_block = eout_block_dict[task]['xs']
-            is_reset = False  # detect the first boundary in the same block
-
-            # CTC-based VAD
-            if streaming.is_ctc_vad:
-                if self.ctc_weight_sub1 > 0:
-                    ctc_probs_block = self.dec_fwd_sub1.ctc.probs(eout_block_dict['ys_sub1']['xs'])
-                    # TODO: consider subsampling
-                else:
-                    ctc_probs_block = self.dec_fwd.ctc.probs(eout_block)
-                is_reset = streaming.ctc_vad(ctc_probs_block, stdout=stdout)
-
-            # Truncate the most right frames
-            if is_reset and not is_last_block and streaming.bd_offset >= 0:
-                eout_block = eout_block[:, :streaming.bd_offset]
-            streaming.cache_eout(eout_block)
-
-            # Block-synchronous decoding
-            if ctc_weight == 1 or self.ctc_weight == 1:
-                end_hyps, hyps = self.dec_fwd.ctc.beam_search_block_sync(
-                    eout_block, params, helper, idx2token, hyps, lm)
-            elif isinstance(self.dec_fwd, RNNT):
-                end_hyps, hyps = self.dec_fwd.beam_search_block_sync(
-                    eout_block, params, helper, idx2token, hyps, lm)
-            elif isinstance(self.dec_fwd, RNNDecoder):
-                for i in range(math.ceil(eout_block.size(1) / block_size)):
-                    eout_block_i = eout_block[:, i * block_size:(i + 1) * block_size]
-                    end_hyps, hyps, _ = self.dec_fwd.beam_search_block_sync(
-                        eout_block_i, params, helper, idx2token, hyps, lm)
-            elif isinstance(self.dec_fwd, TransformerDecoder):
-                raise NotImplementedError
-            else:
-                raise NotImplementedError(self.dec_fwd)
-
-            merged_hyps = sorted(end_hyps + hyps, key=lambda x: x['score'], reverse=True)
-            if len(merged_hyps) > 0:
-                best_hyp_id_prefix = np.array(merged_hyps[0]['hyp'][1:])
-
-                if len(hyps) == 0 or (len(best_hyp_id_prefix) > 0 and best_hyp_id_prefix[-1] == self.eos):
-                    # reset beam if <eos> is generated from the best hypothesis
-                    best_hyp_id_prefix = best_hyp_id_prefix[:-1]  # exclude <eos>
-                    # Segmentation strategy 2:
-                    # If <eos> is emitted from the decoder (not CTC),
-                    # the current block is segmented.
-                    if not is_reset:
-                        streaming._bd_offset = eout_block.size(1) - 1  # TODO: fix later
-                        is_reset = True
-
-                if len(best_hyp_id_prefix) > 0:
-                    n_frames = self.dec_fwd.ctc.n_frames if ctc_weight == 1 or self.ctc_weight == 1 else self.dec_fwd.n_frames
-                    print('\rStreaming (T:%d [10ms], offset:%d [10ms], blank:%d [10ms]): %s' %
-                          (streaming.offset + eout_block.size(1) * factor,
-                           n_frames * factor,
-                           streaming.n_blanks * factor,
-                           idx2token(best_hyp_id_prefix)))
-
-            if is_reset:
-
-                # pick up the best hyp from ended and active hypotheses
-                if len(best_hyp_id_prefix) > 0:
-                    best_hyp_id_stream.extend(best_hyp_id_prefix)
-
-                # reset
-                streaming.reset(stdout=stdout)
-                hyps = None
-
-            streaming.next_block()
-            if is_last_block:
-                break
-            # next block will start from the frame next to the boundary
-            streaming.backoff(x_block, self.dec_fwd, stdout=stdout)
-
-        # pick up the best hyp
-        if not is_reset and len(best_hyp_id_prefix) > 0:
-            best_hyp_id_stream.extend(best_hyp_id_prefix)
+        session = StreamingSession(self, params, idx2token, task, verbose=True)
+        session.push(xs[0])
+        session.finish()
 
+        best_hyp_id_stream = session.result()
         if len(best_hyp_id_stream) > 0:
-            return [[np.stack(best_hyp_id_stream, axis=0)]], [None]
+            return [[best_hyp_id_stream]], [None]
         else:
             return [[[]]], [None]
 
@@ -684,6 +562,20 @@ class Speech2Text(ModelBase):
     def last_success_frame_ratio(self):
         return getattr(self.dec_fwd, 'last_success_frame_ratio', 0)
 
+    def ctc_only_decoding(self, params):
+        """Check whether the main task is decoded with CTC only (lexicon and word LM are supported)."""
+        return (self.fwd_weight == 0 and self.bwd_weight == 0) or \
+            (self.ctc_weight > 0 and params['recog_ctc_weight'] == 1)
+
+    def _batch_beam_search_available(self, params, dir, ensemble_models=[], speakers=None):
+        """Check whether all utterances in a mini-batch can be decoded at once with beam search."""
+        dec = getattr(self, 'dec_' + dir)
+        if params['recog_batch_size'] == 1 or not hasattr(dec, 'batch_beam_search'):
+            return False
+        if params['recog_fwd_bwd_attention'] or len(ensemble_models) > 0 or params['recog_ctc_weight'] > 0:
+            return False
+        return dec.batch_beam_search_available(params, speakers=speakers)
+
     def decode(self, xs, params, idx2token, exclude_eos=False,
                refs_id=None, refs=None, utt_ids=None, speakers=None,
                task='ys', ensemble_models=[], trigger_points=None, teacher_force=False):
@@ -732,27 +624,50 @@ class Speech2Text(ModelBase):
                 elens = eout_dict[task]['xlens']
 
             # CTC
-            if (self.fwd_weight == 0 and self.bwd_weight == 0) or (self.ctc_weight > 0 and params['recog_ctc_weight'] == 1):
+            if self.ctc_only_decoding(params):
                 lm = getattr(self, 'lm_' + dir, None)
                 lm_second = getattr(self, 'lm_second', None)
                 lm_second_bwd = None  # TODO
 
+                lexicon = getattr(self, 'lexicon', None)
+
+                ctc = getattr(self, 'dec_' + dir).ctc
                 if params.get('recog_beam_width') == 1:
-                    nbest_hyps_id = getattr(self, 'dec_' + dir).ctc.greedy(
-                        eouts, elens)
-                else:
-                    nbest_hyps_id = getattr(self, 'dec_' + dir).ctc.beam_search(
+                    nbest_hyps_id = ctc.greedy(eouts, elens)
+                elif params['recog_batch_size'] > 1 and ctc.batch_beam_search_available(params, speakers, lexicon):
+                    # prefix beam search over all utterances in the mini-batch
+                    nbest_hyps_id = ctc.batch_beam_search(
                         eouts, elens, params, idx2token,
                         lm, lm_second, lm_second_bwd,
                         1, refs_id, utt_ids, speakers)
+                else:
+                    nbest_hyps_id = ctc.beam_search(
+                        eouts, elens, params, idx2token,
+                        lm, lm_second, lm_second_bwd,
+                        1, refs_id, utt_ids, speakers, lexicon)
                 return nbest_hyps_id, None
 
             # Attention/RNN-T
             elif params['recog_beam_width'] == 1 and not params['recog_fwd_bwd_attention']:
-                best_hyps_id, aws = getattr(self, 'dec_' + dir).greedy(
+                dec = getattr(self, 'dec_' + dir)
+                greedy_kwargs = {}
+                if isinstance(dec, RNNT):
+                    greedy_kwargs['max_symbols_per_frame'] = params.get('recog_rnnt_max_symbols_per_frame', 1)
+                best_hyps_id, aws = dec.greedy(
                     eouts, elens, params['recog_max_len_ratio'], idx2token,
-                    exclude_eos, refs_id, utt_ids, speakers)
+                    exclude_eos, refs_id, utt_ids, speakers, **greedy_kwargs)
                 nbest_hyps_id = [[hyp] for hyp in best_hyps_id]
+            elif self._batch_beam_search_available(params, dir, ensemble_models, speakers):
+                # batch beam search over all utterances in the mini-batch
+                lm = getattr(self, 'lm_' + dir, None)
+                lm_second = getattr(self, 'lm_second', None)
+                lm_bwd = getattr(self, 'lm_bwd', None)
+
+                nbest_hyps_id, aws, _ = getattr(self, 'dec_' + dir).batch_beam_search(
+                    eouts, elens, params, idx2token,
+                    lm, lm_second, lm_bwd,
+                    params['recog_beam_width'], exclude_eos, refs_id, utt_ids, speakers,
+                    store_aws=params.get('recog_resolving_unk', False))
             else:
                 assert params['recog_batch_size'] == 1
 
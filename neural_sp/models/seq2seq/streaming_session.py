@@ -0,0 +1,501 @@
+# Copyright 2020 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Incremental streaming recognition session."""
+
+from collections import OrderedDict
+import math
+import numpy as np
+import time
+import torch
+
+from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.las import RNNDecoder
+from neural_sp.models.seq2seq.decoders.rnn_transducer import RNNTransducer as RNNT
+from neural_sp.models.seq2seq.decoders.transformer import TransformerDecoder
+from neural_sp.models.seq2seq.frontends.fbank import StreamingFbank
+from neural_sp.models.seq2seq.frontends.streaming import Streaming
+
+
+class StreamingSession(object):
+    """Incremental streaming recognition session.
+
+    Acoustic features are pushed chunk by chunk, and each block is encoded and
+    decoded as soon as all frames including its right context arrive.
+    Encoder caches and decoder states of each session are kept outside the model,
+    so that a single model can serve multiple sessions alternately.
+
+    Args:
+        model (Speech2Text): ASR model
+        params (dict): decoding hyperparameters
+        idx2token (): converter from index to token
+        task (str): task to evaluate
+        verbose (bool): print partial hypotheses
+        wav_frontend (WavFrontend): feature extractor for waveform inputs
+
+    """
+
+    def __init__(self, model, params, idx2token=None, task='ys', verbose=False,
+                 wav_frontend=None):
+
+        assert task == 'ys'
+        assert model.input_type == 'speech'
+        assert model.ctc_weight > 0
+        assert model.fwd_weight > 0 or model.ctc_weight == 1.0
+        assert params.get('recog_block_sync')
+
+        self.model = model
+        self.params = params
+        self.idx2token = idx2token
+        self.task = task
+        self.verbose = verbose
+
+        self.factor = model.enc.subsampling_factor
+        self.block_size = params.get('recog_block_sync_size') // self.factor  # after subsampling
+        assert self.block_size >= 1, "block_size is too small."
+        self.ctc_only = params.get('recog_ctc_weight') == 1 or model.ctc_weight == 1
+
+        model.eval()
+        self.helper = BeamSearch(params.get('recog_beam_width'),
+                                 model.eos,
+                                 params.get('recog_ctc_weight'),
+                                 params.get('recog_lm_weight'),
+                                 model.device)
+        cache_emb = params.get('recog_cache_embedding')
+        self.lm = self.helper.verify_lm_eval_mode(getattr(model, 'lm_fwd', None),
+                                                  params.get('recog_lm_weight'), cache_emb)
+        # cache token embeddings
+        if cache_emb and model.fwd_weight > 0:
+            model.dec_fwd.cache_embedding(model.device)
+
+        self.streaming = Streaming(np.zeros((0, model.input_dim), dtype=np.float32),
+                                   params, model.enc, is_finished=False)
+        self.fbank = StreamingFbank(wav_frontend) if wav_frontend is not None else None
+
+        self._hyps = None
+        self._is_reset = True  # for the first block
+        self._is_done = False
+        self._best_hyp_id_stream = []
+        self._best_hyp_id_prefix = []
+        self._enc_cache = None
+        self._dec_state = None
+        self.latencies = []  # processing time of each block [sec]
+
+    @property
+    def is_done(self):
+        return self._is_done
+
+    @property
+    def decoders(self):
+        """Decoders whose states are carried over between blocks."""
+        decoders = [self.model.dec_fwd]
+        if getattr(self.model.dec_fwd, 'ctc', None) is not None:
+            decoders.append(self.model.dec_fwd.ctc)
+        return decoders
+
+    def append_feature(self, x):
+        """Append acoustic features without decoding.
+
+        Args:
+            x (np.array): `[T, input_dim]`
+
+        """
+        assert not self._is_done
+        self.streaming.append_feature(x)
+
+    def append_wav(self, wav):
+        """Append waveform samples without decoding.
+
+        Args:
+            wav (np.array): `[n_samples]`
+
+        """
+        assert self.fbank is not None
+        self.append_feature(self.fbank(wav))
+
+    def finish_input(self):
+        """Notify the end of acoustic features without decoding."""
+        self.streaming.finish()
+        if self.streaming.xmax_whole == 0:
+            self._is_done = True
+
+    def ready(self):
+        """Check whether the next block can be processed."""
+        return not self._is_done and self.streaming.block_ready()
+
+    def push(self, x):
+        """Push acoustic features and decode all blocks ready for processing.
+
+        Args:
+            x (np.array): `[T, input_dim]`
+        Returns:
+            results (List[dict]): result for each processed block
+
+        """
+        self.append_feature(x)
+        return self._process_ready_blocks()
+
+    def push_wav(self, wav):
+        """Push waveform samples and decode all blocks ready for processing.
+
+        Args:
+            wav (np.array): `[n_samples]`
+        Returns:
+            results (List[dict]): result for each processed block
+
+        """
+        self.append_wav(wav)
+        return self._process_ready_blocks()
+
+    def finish(self):
+        """Decode the remaining blocks after the end of input features.
+
+        Returns:
+            results (List[dict]): result for each processed block
+
+        """
+        self.finish_input()
+        return self._process_ready_blocks()
+
+    def result(self):
+        """Get the best hypothesis of the whole stream so far.
+
+        Returns:
+            best_hyp_id (np.array): `[L]`
+
+        """
+        best_hyp_id = list(self._best_hyp_id_stream)
+        if not self._is_reset:
+            best_hyp_id.extend(self._best_hyp_id_prefix)
+        return np.array(best_hyp_id, dtype=np.int64)
+
+    def _process_ready_blocks(self):
+        results = []
+        while self.ready():
+            results.append(self._process_block())
+        return results
+
+    def _batch_key(self, block):
+        """Blocks of streams with the same key can be encoded in a mini-batch."""
+        x_block, _, cnn_lookback, cnn_lookahead, xlen_block = block
+        cache_signature = None if self._is_reset else self.model.enc.cache_signature(self._enc_cache)
+        return (x_block.shape, cnn_lookback, cnn_lookahead, xlen_block, self._is_reset, cache_signature)
+
+    def _swap_in_decoder(self):
+        if self._dec_state is not None:
+            for dec, state in zip(self.decoders, self._dec_state):
+                dec.set_streaming_state(state)
+
+    def _swap_out_decoder(self):
+        self._dec_state = [dec.get_streaming_state() for dec in self.decoders]
+
+    def _process_block(self):
+        """Encode and decode the next block."""
+        tbegin = time.perf_counter()
+        block = self.streaming.extract_feature()
+        eout_block_dict = _encode_blocks(self.model, [self], [block])[0]
+        return self._decode_block(block, eout_block_dict, tbegin)
+
+    def _decode_block(self, block, eout_block_dict, tbegin):
+        """Decode the encoded block.
+
+        Args:
+            block (tuple): output of `Streaming.extract_feature`
+            eout_block_dict (dict): encoder outputs of the block
+            tbegin (float): time when processing of the block began
+        Returns:
+            result (dict):
+                hyp (np.array): best hypothesis of the whole stream so far
+                is_final (bool): the current segment is finalized
+                start (int): start frame of the block (before subsampling)
+                end (int): end frame of the block (before subsampling)
+                latency (float): processing time of the block [sec]
+
+        """
+        model = self.model
+        streaming = self.streaming
+        params = self.params
+        x_block, is_last_block = block[:2]
+
+        with torch.no_grad():
+            self._swap_in_decoder()
+
+            eout_block = eout_block_dict[self.task]['xs']
+            is_reset = False  # detect the first boundary in the same block
+
+            # CTC-based VAD
+            if streaming.is_ctc_vad:
+                if model.ctc_weight_sub1 > 0:
+                    ctc_probs_block = model.dec_fwd_sub1.ctc.probs(eout_block_dict['ys_sub1']['xs'])
+                    # TODO: consider subsampling
+                else:
+                    ctc_probs_block = model.dec_fwd.ctc.probs(eout_block)
+                is_reset = streaming.ctc_vad(ctc_probs_block)
+
+            # Truncate the most right frames
+            if is_reset and not is_last_block and streaming.bd_offset >= 0:
+                eout_block = eout_block[:, :streaming.bd_offset]
+
+            # Block-synchronous decoding
+            hyps = self._hyps
+            if self.ctc_only:
+                end_hyps, hyps = model.dec_fwd.ctc.beam_search_block_sync(
+                    eout_block, params, self.helper, self.idx2token, hyps, self.lm)
+            elif isinstance(model.dec_fwd, RNNT):
+                end_hyps, hyps = model.dec_fwd.beam_search_block_sync(
+                    eout_block, params, self.helper, self.idx2token, hyps, self.lm)
+            elif isinstance(model.dec_fwd, RNNDecoder):
+                for i in range(math.ceil(eout_block.size(1) / self.block_size)):
+                    eout_block_i = eout_block[:, i * self.block_size:(i + 1) * self.block_size]
+                    end_hyps, hyps, _ = model.dec_fwd.beam_search_block_sync(
+                        eout_block_i, params, self.helper, self.idx2token, hyps, self.lm)
+            elif isinstance(model.dec_fwd, TransformerDecoder):
+                raise NotImplementedError
+            else:
+                raise NotImplementedError(model.dec_fwd)
+
+            merged_hyps = sorted(end_hyps + hyps, key=lambda x: x['score'], reverse=True)
+            if len(merged_hyps) > 0:
+                self._best_hyp_id_prefix = np.array(merged_hyps[0]['hyp'][1:])
+
+                if len(hyps) == 0 or (len(self._best_hyp_id_prefix) > 0 and self._best_hyp_id_prefix[-1] == model.eos):
+                    # reset beam if <eos> is generated from the best hypothesis
+                    self._best_hyp_id_prefix = self._best_hyp_id_prefix[:-1]  # exclude <eos>
+                    # Segmentation strategy 2:
+                    # If <eos> is emitted from the decoder (not CTC),
+                    # the current block is segmented.
+                    if not is_reset:
+                        streaming._bd_offset = eout_block.size(1) - 1  # TODO: fix later
+                        is_reset = True
+
+                if self.verbose and len(self._best_hyp_id_prefix) > 0 and self.idx2token is not None:
+                    n_frames = model.dec_fwd.ctc.n_frames if self.ctc_only else model.dec_fwd.n_frames
+                    print('\rStreaming (T:%d [10ms], offset:%d [10ms], blank:%d [10ms]): %s' %
+                          (streaming.offset + eout_block.size(1) * self.factor,
+                           n_frames * self.factor,
+                           streaming.n_blanks * self.factor,
+                           self.idx2token(self._best_hyp_id_prefix)))
+
+            result = {'start': streaming.offset,
+                      'end': streaming.offset + eout_block.size(1) * self.factor,
+                      'is_final': is_reset}
+
+            if is_reset:
+                # pick up the best hyp from ended and active hypotheses
+                self._best_hyp_id_stream.extend(self._best_hyp_id_prefix)
+
+                # reset
+                streaming.reset()
+                hyps = None
+
+            self._hyps = hyps
+            self._is_reset = is_reset
+
+            streaming.next_block()
+            if is_last_block:
+                self._is_done = True
+            else:
+                # next block will start from the frame next to the boundary
+                streaming.backoff(x_block, model.dec_fwd)
+
+            self._swap_out_decoder()
+
+        result['hyp'] = self.result()
+        result['latency'] = time.perf_counter() - tbegin
+        self.latencies.append(result['latency'])
+        return result
+
+    def state_dict(self):
+        """Return the session states, which can be saved with `torch.save` to resume later."""
+        return {'streaming': self.streaming.state_dict(),
+                'hyps': self._hyps,
+                'is_reset': self._is_reset,
+                'is_done': self._is_done,
+                'best_hyp_id_stream': list(self._best_hyp_id_stream),
+                'best_hyp_id_prefix': self._best_hyp_id_prefix,
+                'enc_cache': self._enc_cache,
+                'dec_state': self._dec_state,
+                'latencies': list(self.latencies)}
+
+    def load_state_dict(self, state):
+        self.streaming.load_state_dict(state['streaming'])
+        self._hyps = state['hyps']
+        self._is_reset = state['is_reset']
+        self._is_done = state['is_done']
+        self._best_hyp_id_stream = list(state['best_hyp_id_stream'])
+        self._best_hyp_id_prefix = state['best_hyp_id_prefix']
+        self._enc_cache = state['enc_cache']
+        self._dec_state = state['dec_state']
+        self.latencies = list(state['latencies'])
+
+
+class StreamingScheduler(object):
+    """Scheduler to decode multiple streams concurrently with a single model.
+
+    At each step, the current blocks of all streams ready for processing are gathered
+    and encoded in mini-batches. Streams whose blocks or encoder caches have different
+    shapes (e.g., the first and last blocks, or blocks just after a reset by CTC-VAD)
+    are encoded in separate mini-batches. Block-synchronous decoding is then performed
+    with the beam of each stream.
+
+    Args:
+        model (Speech2Text): ASR model
+        params (dict): decoding hyperparameters
+        idx2token (): converter from index to token
+        task (str): task to evaluate
+        max_batch_size (int): maximum number of streams encoded at once
+        wav_frontend (WavFrontend): feature extractor for waveform inputs
+
+    """
+
+    def __init__(self, model, params, idx2token=None, task='ys', max_batch_size=100,
+                 wav_frontend=None):
+
+        self.model = model
+        self.params = params
+        self.idx2token = idx2token
+        self.task = task
+        self.max_batch_size = max_batch_size
+        self.wav_frontend = wav_frontend
+
+        self.sessions = OrderedDict()
+        self._n_opened = 0
+
+    @property
+    def n_active(self):
+        return len(self.sessions)
+
+    def open(self):
+        """Open a new stream.
+
+        Returns:
+            session_id (int): stream index
+
+        """
+        session_id = self._n_opened
+        self.sessions[session_id] = StreamingSession(self.model, self.params, self.idx2token, self.task,
+                                                     wav_frontend=self.wav_frontend)
+        self._n_opened += 1
+        return session_id
+
+    def push(self, session_id, x):
+        """Append acoustic features to a stream. Decoding is performed in `step`.
+
+        Args:
+            session_id (int): stream index
+            x (np.array): `[T, input_dim]`
+
+        """
+        self.sessions[session_id].append_feature(x)
+
+    def push_wav(self, session_id, wav):
+        """Append waveform samples to a stream. Decoding is performed in `step`.
+
+        Args:
+            session_id (int): stream index
+            wav (np.array): `[n_samples]`
+
+        """
+        self.sessions[session_id].append_wav(wav)
+
+    def finish(self, session_id):
+        """Notify the end of acoustic features of a stream."""
+        self.sessions[session_id].finish_input()
+
+    def close(self, session_id):
+        """Close a stream.
+
+        Returns:
+            best_hyp_id (np.array): `[L]`
+
+        """
+        return self.sessions.pop(session_id).result()
+
+    def step(self):
+        """Process the next block of every stream ready for processing.
+
+        Returns:
+            results (OrderedDict): stream index -> result of the processed block
+
+        """
+        tbegin = time.perf_counter()
+
+        # gather blocks that can be encoded together
+        groups = OrderedDict()
+        for session_id, session in self.sessions.items():
+            if not session.ready():
+                continue
+            block = session.streaming.extract_feature()
+            key = session._batch_key(block)
+            if key not in groups:
+                groups[key] = []
+            groups[key].append((session_id, block))
+
+        # batched encoding
+        eout_block_dicts = {}
+        for members in groups.values():
+            for i in range(0, len(members), self.max_batch_size):
+                session_ids, blocks = zip(*members[i:i + self.max_batch_size])
+                sessions = [self.sessions[session_id] for session_id in session_ids]
+                eout_block_dicts_i = _encode_blocks(self.model, sessions, blocks)
+                eout_block_dicts.update(zip(session_ids, zip(blocks, eout_block_dicts_i)))
+
+        # block-synchronous decoding for each stream
+        results = OrderedDict()
+        for session_id, session in self.sessions.items():
+            if session_id in eout_block_dicts:
+                block, eout_block_dict = eout_block_dicts[session_id]
+                results[session_id] = session._decode_block(block, eout_block_dict, tbegin)
+        return results
+
+    def run(self):
+        """Process blocks until no stream is ready.
+
+        Returns:
+            results (OrderedDict): stream index -> list of results of processed blocks
+
+        """
+        results = OrderedDict([(session_id, []) for session_id in self.sessions.keys()])
+        while True:
+            results_step = self.step()
+            if len(results_step) == 0:
+                break
+            for session_id, result in results_step.items():
+                results[session_id].append(result)
+        return results
+
+
+def _encode_blocks(model, sessions, blocks):
+    """Encode the current blocks of multiple streams at once.
+
+    Args:
+        model (Speech2Text): ASR model
+        sessions (List[StreamingSession]): streams sharing the same batch key
+        blocks (List[tuple]): outputs of `Streaming.extract_feature` for each stream
+    Returns:
+        eout_block_dicts (List[dict]): encoder outputs for each stream
+
+    """
+    enc = model.enc
+    _, _, cnn_lookback, cnn_lookahead, xlen_block = blocks[0]
+    assert all([block[2:] == blocks[0][2:] for block in blocks])
+
+    with torch.no_grad():
+        if sessions[0]._is_reset:
+            assert all([session._is_reset for session in sessions])
+            enc.reset_cache()
+        else:
+            enc.set_cache(enc.concat_cache([session._enc_cache for session in sessions]))
+        eout_dict = model.encode([block[0] for block in blocks], 'all',
+                                 streaming=True,
+                                 cnn_lookback=cnn_lookback,
+                                 cnn_lookahead=cnn_lookahead,
+                                 xlen_block=xlen_block)
+        cache = enc.get_cache()
+
+    eout_block_dicts = []
+    for b, session in enumerate(sessions):
+        session._enc_cache = enc.select_cache(cache, b)
+        eout_block_dicts.append({task: {k: v[b:b + 1] if v is not None else None for k, v in eout.items()}
+                                 for task, eout in eout_dict.items()})
+    return eout_block_dicts
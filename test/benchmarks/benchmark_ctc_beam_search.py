@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for CTC prefix beam search: per-utterance Python loops vs. tensor-backed batch search."""
+
+import argparse
+import numpy as np
+import time
+import torch
+
+from neural_sp.models.lm.rnnlm import RNNLM
+from neural_sp.models.seq2seq.decoders.ctc import CTC
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--batch_sizes', type=int, default=[1, 10], nargs='+',
+                    help='number of utterances decoded at once')
+parser.add_argument('--beam_widths', type=int, default=[4, 10], nargs='+',
+                    help='beam widths')
+parser.add_argument('--xmax', type=int, default=200,
+                    help='number of encoder frames')
+parser.add_argument('--vocab', type=int, default=1000,
+                    help='vocabulary size')
+parser.add_argument('--lm_weight', type=float, default=0.3,
+                    help='weight of RNNLM for shallow fusion (disabled if 0)')
+parser.add_argument('--device', type=str, default='cpu',
+                    help='device')
+args = parser.parse_args()
+
+ENC_N_UNITS = 256
+
+
+def make_lm():
+    lm_args = argparse.Namespace(
+        lm_type='lstm', n_units=512, n_projs=0, n_layers=2, residual=False, use_glu=False,
+        n_units_null_context=0, bottleneck_dim=512, emb_dim=512, vocab=args.vocab,
+        dropout_in=0., dropout_hidden=0., lsm_prob=0., param_init=0.1,
+        adaptive_softmax=False, tie_embedding=False)
+    return RNNLM(lm_args).to(args.device)
+
+
+def main():
+    torch.manual_seed(1)
+    ctc = CTC(eos=2, blank=0, enc_n_units=ENC_N_UNITS, vocab=args.vocab).to(args.device)
+    ctc.eval()
+    lm = make_lm() if args.lm_weight > 0 else None
+
+    for bs in args.batch_sizes:
+        # peaky posteriors as in trained CTC models
+        eouts = torch.randn(bs, args.xmax, ENC_N_UNITS, device=args.device) * 3
+        elens = torch.IntTensor([args.xmax] * bs)
+        for beam_width in args.beam_widths:
+            params = {'recog_beam_width': beam_width,
+                      'recog_length_penalty': 0.,
+                      'recog_cache_embedding': True,
+                      'recog_lm_weight': args.lm_weight,
+                      'recog_lm_second_weight': 0.,
+                      'recog_lm_bwd_weight': 0.,
+                      'recog_lm_state_carry_over': False,
+                      'recog_softmax_smoothing': 1.}
+            elapsed_times = []
+            hyps = []
+            with torch.no_grad():
+                for decode in [ctc.beam_search, ctc.batch_beam_search]:
+                    start_time = time.time()
+                    hyps.append(decode(eouts, elens, params, None, lm=lm, nbest=1))
+                    elapsed_times.append(time.time() - start_time)
+            n_same = sum([np.array_equal(h1[0], h2[0]) for h1, h2 in zip(*hyps)])
+            print('B: %d / beam: %d / loop: %.3f sec / batch: %.3f sec (x%.2f) / same 1-best: %d/%d' % (
+                bs, beam_width, elapsed_times[0], elapsed_times[1],
+                elapsed_times[0] / elapsed_times[1], n_same, bs))
+
+
+if __name__ == '__main__':
+    main()
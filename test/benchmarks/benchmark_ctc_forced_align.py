@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for CTC forced alignment and loading of the alignments."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import torch
+
+from neural_sp.datasets.alignment import (
+    CTCAlignmentWriter,
+    load_ctc_alignment
+)
+from neural_sp.models.seq2seq.decoders.ctc import CTCForcedAligner
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--n_utts', type=int, default=64,
+                    help='number of utterances to align')
+parser.add_argument('--batch_sizes', type=int, default=[1, 16, 64], nargs='+',
+                    help='number of utterances aligned at once')
+parser.add_argument('--xmax', type=int, default=500,
+                    help='number of encoder frames')
+parser.add_argument('--ymax', type=int, default=100,
+                    help='number of tokens')
+parser.add_argument('--vocab', type=int, default=1000,
+                    help='vocabulary size')
+parser.add_argument('--n_utts_load', type=int, default=10000,
+                    help='number of utterances to save and load')
+parser.add_argument('--device', type=str, default='cpu',
+                    help='device')
+args = parser.parse_args()
+
+
+def main():
+    torch.manual_seed(1)
+    aligner = CTCForcedAligner()
+    logits = torch.randn(args.n_utts, args.xmax, args.vocab, device=args.device)
+    elens = torch.IntTensor([args.xmax] * args.n_utts)
+    ys = torch.randint(4, args.vocab, (args.n_utts, args.ymax)).tolist()
+    ylens = torch.IntTensor([args.ymax] * args.n_utts)
+
+    for bs in args.batch_sizes:
+        if args.device != 'cpu':
+            torch.cuda.synchronize()
+        start_time = time.time()
+        for i in range(0, args.n_utts, bs):
+            aligner(logits[i:i + bs].clone(), elens[i:i + bs], ys[i:i + bs], ylens[i:i + bs])
+        if args.device != 'cpu':
+            torch.cuda.synchronize()
+        elapsed = time.time() - start_time
+        print('B: %d / alignment: %.1f utterances/sec' % (bs, args.n_utts / elapsed))
+
+    # save and load alignments
+    tmp_dir = tempfile.mkdtemp()
+    keys = [('spk%d' % (i % 100), 'utt%d' % i) for i in range(args.n_utts_load)]
+    boundaries = list(range(args.ymax + 1))
+    txt_dir = os.path.join(tmp_dir, 'txt')
+    for speaker, utt_id in keys:
+        os.makedirs(os.path.join(txt_dir, speaker), exist_ok=True)
+        with open(os.path.join(txt_dir, speaker, utt_id + '.txt'), 'w') as f:
+            for p in boundaries:
+                f.write('a %d\n' % p)
+    bin_dir = os.path.join(tmp_dir, 'bin')
+    os.mkdir(bin_dir)
+    writer = CTCAlignmentWriter(bin_dir)
+    for speaker, utt_id in keys:
+        writer.add(speaker, utt_id, boundaries)
+    writer.close()
+
+    for name, alignment_dir in [('txt', txt_dir), ('bin', bin_dir)]:
+        start_time = time.time()
+        for speaker, utt_id in keys:
+            load_ctc_alignment(alignment_dir, speaker, utt_id)
+        elapsed = time.time() - start_time
+        print('%s: loading %.1f utterances/sec' % (name, len(keys) / elapsed))
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
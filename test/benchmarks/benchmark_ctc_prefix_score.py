@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for windowed CTC prefix scoring."""
+
+import argparse
+import time
+import torch
+
+from neural_sp.models.seq2seq.decoders.ctc import CTCPrefixScoreTH
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--xlens', type=int, default=[500, 2000, 8000], nargs='+',
+                    help='number of frames of synthetic CTC posteriors')
+parser.add_argument('--margins', type=int, default=[0, 10, 20, 50], nargs='+',
+                    help='frame margins for windowed scoring (0: all frames)')
+parser.add_argument('--beam_width', type=int, default=10,
+                    help='number of hypotheses and candidates per hypothesis')
+parser.add_argument('--vocab', type=int, default=100,
+                    help='vocabulary size')
+parser.add_argument('--frames_per_token', type=int, default=8,
+                    help='average number of frames per token')
+parser.add_argument('--blank_logit', type=float, default=10.,
+                    help='logit added to <blank> at all frames (smaller for less peaky posteriors)')
+parser.add_argument('--spike_logit', type=float, default=15.,
+                    help='logit added to reference labels at their spikes')
+parser.add_argument('--pause_frames', type=int, default=60,
+                    help='number of silent frames at the beginning and at each pause')
+parser.add_argument('--pause_interval', type=int, default=20,
+                    help='number of tokens between pauses')
+args = parser.parse_args()
+
+BLANK = 0
+EOS = 2
+
+
+def make_log_probs(xlen):
+    """Make peaky CTC posteriors of a random token sequence with leading silence and pauses."""
+    logits = torch.randn(1, xlen, args.vocab)
+    logits[:, :, BLANK] += args.blank_logit
+    n_tokens = (xlen - args.pause_frames) // args.frames_per_token
+    n_tokens -= (n_tokens // args.pause_interval) * args.pause_frames // args.frames_per_token
+    ys = torch.randint(3, args.vocab, (n_tokens,))
+    spikes = torch.arange(n_tokens) * args.frames_per_token + args.frames_per_token // 2
+    spikes += (torch.arange(n_tokens) // args.pause_interval + 1) * args.pause_frames
+    logits[0, spikes, ys] += args.spike_logit
+    return torch.log_softmax(logits, dim=-1), ys.tolist()
+
+
+def score(log_probs, ys, margin):
+    """Score the reference prefixes together with competing labels.
+
+    Returns:
+        log_psis (FloatTensor): prefix scores of the reference labels `[L, beam_width]`
+        n_errors (int): number of candidate sets where a competing label is scored best
+
+    """
+    scorer = CTCPrefixScoreTH(log_probs, BLANK, EOS, margin=margin)
+    hyps = [[EOS]] * args.beam_width
+    states = scorer.initial_state().repeat([args.beam_width, 1, 1])
+    log_psis = []
+    n_errors = 0
+    for y in ys:
+        cs = torch.randint(3, args.vocab, (args.beam_width, args.beam_width))
+        cs[:, 0] = y
+        log_psi, new_states = scorer(hyps, cs, states)
+        log_psis.append(log_psi[:, 0])
+        n_errors += (cs.gather(1, log_psi.argmax(1, keepdim=True)) != y).sum().item()
+        hyps = [hyp + [y] for hyp in hyps]
+        states = new_states[:, 0]
+    return torch.stack(log_psis), n_errors
+
+
+def main():
+    torch.manual_seed(1)
+    for xlen in args.xlens:
+        log_probs, ys = make_log_probs(xlen)
+        log_psis_full = None
+        for margin in sorted(args.margins):
+            torch.manual_seed(2)  # the same competing labels for all margins
+            start_time = time.time()
+            with torch.no_grad():
+                log_psis, n_errors = score(log_probs, ys, margin)
+            elapsed_time = time.time() - start_time
+            if log_psis_full is None:
+                log_psis_full = log_psis
+            diff = (log_psis - log_psis_full).abs()
+            print('T: %d / margin: %d / %.3f sec / abs. diff of prefix scores: mean %.4f, max %.4f / '
+                  'label error rate: %.2f %%' % (
+                      xlen, margin, elapsed_time, diff.mean().item(), diff.max().item(),
+                      n_errors * 100 / log_psis.numel()))
+
+
+if __name__ == '__main__':
+    main()
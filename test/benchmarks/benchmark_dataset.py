@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for building CustomDataset from a tsv file."""
+
+import argparse
+import codecs
+import kaldiio
+import numpy as np
+import os
+import tempfile
+import time
+
+from neural_sp.datasets.asr import CustomDataset
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--n_utts', type=int, default=[10000, 100000, 1000000], nargs='+',
+                    help='number of utterances in the synthetic tsv file')
+parser.add_argument('--n_utts_per_session', type=int, default=50,
+                    help='number of utterances per session for discourse-aware training')
+parser.add_argument('--discourse_aware', action='store_true',
+                    help='benchmark discourse-aware sorting')
+args = parser.parse_args()
+
+
+def make_corpus(data_dir, n_utts, n_utts_per_session):
+    dict_path = os.path.join(data_dir, 'dict.txt')
+    with codecs.open(dict_path, 'w', encoding='utf-8') as f:
+        for i, token in enumerate(['<unk>', '<eos>', '<pad>', '<space>', 'a', 'b']):
+            f.write('%s %d\n' % (token, i + 1))
+
+    # all utterances share the same feature matrix
+    ark_path = os.path.join(data_dir, 'feats.ark')
+    scp_path = os.path.join(data_dir, 'feats.scp')
+    kaldiio.save_ark(ark_path, {'utt': np.zeros((100, 80), dtype=np.float32)}, scp=scp_path)
+    with codecs.open(scp_path, 'r', encoding='utf-8') as f:
+        feat_path = f.readline().strip().split(' ')[1]
+
+    tsv_path = os.path.join(data_dir, 'train.tsv')
+    xlens = np.random.randint(10, 3000, size=n_utts)
+    ylens = np.random.randint(0, 100, size=n_utts)
+    with codecs.open(tsv_path, 'w', encoding='utf-8') as f:
+        f.write('utt_id\tspeaker\tfeat_path\txlen\txdim\ttext\ttoken_id\tylen\tydim\n')
+        for i in range(n_utts):
+            session = 'spk%d' % (i // n_utts_per_session)
+            onset = (i % n_utts_per_session) * 1000
+            utt_id = '%s-%07d-%07d' % (session, onset, onset + 1000)
+            text = 'ab' * ylens[i]
+            token_id = ' '.join(['5', '6'] * ylens[i])
+            f.write('%s\t%s\t%s\t%d\t80\t%s\t%s\t%d\t7\n' % (
+                utt_id, session, feat_path, xlens[i], text, token_id, ylens[i] * 2))
+    return tsv_path, dict_path
+
+
+def main():
+    for n_utts in args.n_utts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            tsv_path, dict_path = make_corpus(data_dir, n_utts, args.n_utts_per_session)
+            start_time = time.time()
+            dataset = CustomDataset(corpus='tedlium2', tsv_path=tsv_path, dict_path=dict_path,
+                                    unit='char', nlsyms=False, wp_model=None,
+                                    is_test=False, min_n_frames=40, max_n_frames=2000,
+                                    sort_by='input', short2long=True,
+                                    tsv_path_sub1=False, tsv_path_sub2=False,
+                                    ctc=True, ctc_sub1=False, ctc_sub2=False,
+                                    subsample_factor=4, subsample_factor_sub1=1, subsample_factor_sub2=1,
+                                    dict_path_sub1=False, dict_path_sub2=False,
+                                    unit_sub1=False, unit_sub2=False,
+                                    wp_model_sub1=None, wp_model_sub2=None,
+                                    discourse_aware=args.discourse_aware)
+            elapsed_time = time.time() - start_time
+        print('#utterances: %d (%d after filtering) / %.3f sec' % (n_utts, len(dataset), elapsed_time))
+
+
+if __name__ == '__main__':
+    main()
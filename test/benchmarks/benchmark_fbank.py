@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for loading dumped features vs. on-the-fly fbank extraction from waveforms."""
+
+import argparse
+import kaldiio
+import numpy as np
+import os
+import tempfile
+import time
+import torch
+import wave
+
+from neural_sp.datasets.feature_store import load_feat
+from neural_sp.models.seq2seq.frontends.fbank import (
+    load_wav,
+    WavFrontend
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--n_utts', type=int, default=200,
+                    help='number of synthetic utterances')
+parser.add_argument('--duration', type=float, default=5.,
+                    help='duration of each utterance [sec]')
+parser.add_argument('--n_mels', type=int, default=80,
+                    help='number of mel bins')
+parser.add_argument('--batch_size', type=int, default=32,
+                    help='batch size for batched extraction')
+args = parser.parse_args()
+
+SAMPLE_RATE = 16000
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    np.random.seed(1)
+    torch.set_num_threads(1)  # as in each data-loader worker
+    frontend = WavFrontend(args.n_mels, cmvn='utterance')
+    n_samples = int(SAMPLE_RATE * args.duration)
+
+    with tempfile.TemporaryDirectory() as wav_dir, tempfile.TemporaryDirectory() as feat_dir:
+        wav_paths = []
+        for i in range(args.n_utts):
+            wav_path = os.path.join(wav_dir, 'utt%d.wav' % i)
+            with wave.open(wav_path, 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(SAMPLE_RATE)
+                f.writeframes((np.random.randn(n_samples) * 3000).astype('<i2').tobytes())
+            wav_paths.append(wav_path)
+
+        # dump features as in dump_feat.sh
+        ark_path = os.path.join(feat_dir, 'feats.ark')
+        with kaldiio.WriteHelper('ark,scp:%s,%s' % (ark_path, ark_path.replace('.ark', '.scp')),
+                                 compression_method=2) as writer:
+            for i, wav_path in enumerate(wav_paths):
+                writer('utt%d' % i, frontend.extract(load_wav(wav_path)[0]))
+        feat_paths = [line.split()[1] for line in open(ark_path.replace('.ark', '.scp'))]
+
+        audio_sec = args.n_utts * args.duration
+
+        start_time = time.time()
+        for feat_path in feat_paths:
+            load_feat(feat_path)
+        elapsed_load = time.time() - start_time
+
+        start_time = time.time()
+        for wav_path in wav_paths:
+            frontend.extract(load_wav(wav_path)[0])
+        elapsed_extract = time.time() - start_time
+
+        start_time = time.time()
+        with torch.no_grad():
+            for i in range(0, args.n_utts, args.batch_size):
+                wavs = [load_wav(wav_path)[0] for wav_path in wav_paths[i:i + args.batch_size]]
+                frontend(torch.from_numpy(np.stack(wavs, axis=0)))
+        elapsed_batch = time.time() - start_time
+
+        print('load dumped features : %.3f sec (%.1f x real time)' % (elapsed_load, audio_sec / elapsed_load))
+        print('on-the-fly (per utt) : %.3f sec (%.1f x real time)' % (elapsed_extract, audio_sec / elapsed_extract))
+        print('on-the-fly (batched) : %.3f sec (%.1f x real time)' % (elapsed_batch, audio_sec / elapsed_batch))
+        print('storage: features %.1f MB / wav %.1f MB' % (dir_size(feat_dir) / 1e6, dir_size(wav_dir) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for next-token lookups of n-gram LM (vs. dictionary-based back-off and RNNLM)."""
+
+import argparse
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+import torch
+
+from neural_sp.models.lm.ngram import (
+    load_arpa,
+    NgramLM
+)
+from neural_sp.models.lm.rnnlm import RNNLM
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--arpa', type=str, default='',
+                    help='path to an ARPA file (a random LM is generated if not given)')
+parser.add_argument('--dict', type=str, default='',
+                    help='path to the dictionary corresponding to --arpa')
+parser.add_argument('--vocab', type=int, default=5000,
+                    help='vocabulary size of the random LM')
+parser.add_argument('--order', type=int, default=4,
+                    help='order of the random LM')
+parser.add_argument('--n_ngrams', type=int, default=200000,
+                    help='number of n-grams per order (>= 2) of the random LM')
+parser.add_argument('--batch_sizes', type=int, default=[1, 10, 100], nargs='+',
+                    help='number of token histories looked up at once')
+parser.add_argument('--n_steps', type=int, default=50,
+                    help='number of tokens consumed per history')
+parser.add_argument('--n_steps_reference', type=int, default=5,
+                    help='number of tokens consumed for dictionary-based back-off')
+parser.add_argument('--rnnlm', action='store_true',
+                    help='compare with a single step of RNNLM')
+args = parser.parse_args()
+
+
+def make_random_lm(tmp_dir):
+    """Write a random ARPA file and a dictionary, where all prefixes of n-grams exist."""
+    rng = np.random.RandomState(1)
+    tokens = ['w%d' % i for i in range(args.vocab - 4)]
+    words = ['<unk>', '<s>', '</s>'] + tokens
+    ngrams = [[(w,) for w in words]]
+    for n in range(2, args.order + 1):
+        prefixes = [ws for ws in ngrams[-1] if ws[-1] != '</s>']
+        selected = set()
+        while len(selected) < args.n_ngrams:
+            selected.add(prefixes[rng.randint(len(prefixes))] + (words[rng.randint(2, len(words))],))
+        ngrams.append(sorted(selected))
+
+    arpa_path = os.path.join(tmp_dir, 'lm.arpa')
+    with open(arpa_path, 'w') as f:
+        f.write('\\data\\\n')
+        for n in range(args.order):
+            f.write('ngram %d=%d\n' % (n + 1, len(ngrams[n])))
+        for n in range(args.order):
+            f.write('\n\\%d-grams:\n' % (n + 1))
+            for ws in ngrams[n]:
+                f.write('%.4f\t%s' % (rng.uniform(-4, -0.5), ' '.join(ws)))
+                if n < args.order - 1:
+                    f.write('\t%.4f' % rng.uniform(-1, 0))
+                f.write('\n')
+        f.write('\n\\end\\\n')
+
+    dict_path = os.path.join(tmp_dir, 'dict.txt')
+    with open(dict_path, 'w') as f:
+        for idx, token in enumerate(['<unk>', '<eos>', '<pad>'] + tokens):
+            f.write('%s %d\n' % (token, idx + 1))
+    return arpa_path, dict_path
+
+
+def make_dictionary_lm(arpa_path, dict_path):
+    """Back-off lookup with dictionaries of n-grams, one token at a time."""
+    ngrams = load_arpa(arpa_path)
+    logps = {tuple(ws): p for n in range(len(ngrams)) for ws, p, _ in ngrams[n]}
+    bows = {tuple(ws): b for n in range(len(ngrams)) for ws, _, b in ngrams[n]}
+    vocab = [w for w, _ in (line.split(' ') for line in open(dict_path))]
+    words = ['</s>' if w == '<eos>' else w if (w,) in logps else '<unk>' for w in vocab]
+
+    def backoff(history, w):
+        if history + (w,) in logps:
+            return logps[history + (w,)]
+        return bows.get(history, 0.) + backoff(history[1:], w)
+
+    def score(history):
+        history = tuple(history[-(len(ngrams) - 1):])
+        return [backoff(history, w) for w in words]
+    return score, words
+
+
+def main():
+    tmp_dir = None
+    arpa_path, dict_path = args.arpa, args.dict
+    if not arpa_path:
+        tmp_dir = tempfile.mkdtemp()
+        arpa_path, dict_path = make_random_lm(tmp_dir)
+
+    start_time = time.time()
+    lm = NgramLM(arpa_path, dict_path)
+    print('order: %d / vocab: %d / loading: %.3f sec' % (lm.order, lm.vocab, time.time() - start_time))
+
+    torch.manual_seed(1)
+    for bs in args.batch_sizes:
+        ys = torch.randint(4, lm.vocab, (bs, args.n_steps), dtype=torch.int64)
+        ys[:, 0] = lm.eos
+        state = None
+        start_time = time.time()
+        for i in range(args.n_steps):
+            _, state, _ = lm.predict(ys[:, i:i + 1], state)
+        elapsed = time.time() - start_time
+        n_lookups = bs * args.n_steps
+        print('B: %d / vectorized: %.1f lookups/sec (%.3e token scores/sec)' % (
+            bs, n_lookups / elapsed, n_lookups * lm.vocab / elapsed))
+
+    score, words = make_dictionary_lm(arpa_path, dict_path)
+    ys = torch.randint(4, lm.vocab, (args.n_steps_reference,)).tolist()
+    history = ['<s>']
+    start_time = time.time()
+    for y in ys:
+        history.append(words[y - 1])
+        score(history)
+    elapsed = time.time() - start_time
+    print('B: 1 / dictionary: %.1f lookups/sec' % (len(ys) / elapsed))
+
+    if args.rnnlm:
+        rnnlm = RNNLM(argparse.Namespace(
+            lm_type='lstm', n_units=1024, n_projs=0, n_layers=2, residual=False, use_glu=False,
+            n_units_null_context=0, bottleneck_dim=1024, emb_dim=1024, vocab=lm.vocab,
+            dropout_in=0., dropout_hidden=0., lsm_prob=0., param_init=0.1,
+            adaptive_softmax=False, tie_embedding=False))
+        rnnlm.eval()
+        for bs in args.batch_sizes:
+            ys = torch.randint(4, lm.vocab, (bs, args.n_steps), dtype=torch.int64)
+            state = None
+            with torch.no_grad():
+                start_time = time.time()
+                for i in range(args.n_steps):
+                    _, state, _ = rnnlm.predict(ys[:, i:i + 1], state)
+                elapsed = time.time() - start_time
+            print('B: %d / RNNLM: %.1f lookups/sec' % (bs, bs * args.n_steps / elapsed))
+
+    if tmp_dir is not None:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for decoding concurrent streams with batched streaming encoding."""
+
+import argparse
+import numpy as np
+import time
+import torch
+
+from neural_sp.bin.args_asr import (
+    build_parser,
+    register_args_decoder,
+    register_args_encoder
+)
+from neural_sp.models.seq2seq.speech2text import Speech2Text
+from neural_sp.models.seq2seq.streaming_session import (
+    StreamingScheduler,
+    StreamingSession
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--n_streams', type=int, default=[1, 10, 50, 100], nargs='+',
+                    help='number of concurrent streams')
+parser.add_argument('--xlen', type=int, default=800,
+                    help='number of frames of each synthetic utterance')
+parser.add_argument('--push_size', type=int, default=10,
+                    help='number of frames pushed to each stream at once')
+parser.add_argument('--enc_type', type=str, default='lstm',
+                    choices=['lstm', 'conv_lstm', 'blstm', 'conv_uni_transformer'],
+                    help='type of encoder')
+parser.add_argument('--beam_width', type=int, default=4,
+                    help='beam width')
+parser.add_argument('--vocab', type=int, default=100,
+                    help='vocabulary size')
+args = parser.parse_args()
+
+INPUT_DIM = 80
+
+
+def make_model():
+    model_args = ['--enc_type', args.enc_type, '--enc_n_layers', '4', '--enc_n_units', '256',
+                  '--subsample', '1_2_2_1', '--subsample_type', 'drop', '--ctc_weight', '1.0',
+                  '--recog_block_sync', 'true', '--recog_block_sync_size', '40',
+                  '--recog_beam_width', str(args.beam_width), '--recog_ctc_vad', 'true']
+    if args.enc_type == 'blstm':
+        model_args += ['--lc_chunk_size_left', '40', '--lc_chunk_size_right', '20']
+    if 'conv' in args.enc_type:
+        model_args += ['--subsample', '1_1_1_1', '--conv_channels', '32_32',
+                       '--conv_kernel_sizes', '(3,3)_(3,3)', '--conv_strides', '(1,1)_(1,1)',
+                       '--conv_poolings', '(2,2)_(2,2)']
+    if 'transformer' in args.enc_type:
+        model_args += ['--transformer_enc_d_model', '256', '--transformer_enc_d_ff', '1024']
+    p = build_parser()
+    model_conf = p.parse_known_args(model_args)[0]
+    p = register_args_encoder(p, model_conf, args.enc_type)
+    p = register_args_decoder(p, model_conf, model_conf.dec_type)
+    model_conf = p.parse_known_args(model_args)[0]
+    model_conf.input_dim = INPUT_DIM
+    model_conf.vocab = args.vocab
+    model_conf.vocab_sub1 = 0
+    model_conf.vocab_sub2 = 0
+    model = Speech2Text(model_conf)
+    model.eval()
+    return model, vars(model_conf)
+
+
+def decode_sequential(model, params, xs):
+    """Process the block of each stream one by one."""
+    sessions = [StreamingSession(model, params) for _ in xs]
+    for t in range(0, args.xlen, args.push_size):
+        for x, session in zip(xs, sessions):
+            session.push(x[t:t + args.push_size])
+    for session in sessions:
+        session.finish()
+    return [session.result() for session in sessions]
+
+
+def decode_batched(model, params, xs):
+    """Encode blocks of all streams ready for processing at once."""
+    scheduler = StreamingScheduler(model, params, max_batch_size=len(xs))
+    session_ids = [scheduler.open() for _ in xs]
+    for t in range(0, args.xlen, args.push_size):
+        for x, session_id in zip(xs, session_ids):
+            scheduler.push(session_id, x[t:t + args.push_size])
+        scheduler.run()
+    for session_id in session_ids:
+        scheduler.finish(session_id)
+    scheduler.run()
+    return [scheduler.close(session_id) for session_id in session_ids]
+
+
+def main():
+    torch.manual_seed(1)
+    np.random.seed(1)
+    model, params = make_model()
+    for n_streams in args.n_streams:
+        xs = [np.random.randn(args.xlen, INPUT_DIM).astype(np.float32) for _ in range(n_streams)]
+        elapsed_times = []
+        hyps = []
+        for decode in [decode_sequential, decode_batched]:
+            start_time = time.time()
+            hyps.append(decode(model, params, xs))
+            elapsed_times.append(time.time() - start_time)
+        match = all([np.array_equal(h1, h2) for h1, h2 in zip(*hyps)])
+        audio_sec = n_streams * args.xlen / 100  # 10ms/frame
+        print('streams: %d / sequential: %.3f sec (RTF %.3f) / batched: %.3f sec (RTF %.3f) (x%.2f) / same hyps: %s' % (
+            n_streams, elapsed_times[0], elapsed_times[0] / audio_sec,
+            elapsed_times[1], elapsed_times[1] / audio_sec,
+            elapsed_times[0] / elapsed_times[1], match))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for encoder subsampling layers."""
+
+import argparse
+import math
+import time
+import torch
+
+from neural_sp.models.seq2seq.encoders.subsampling import (
+    ConcatSubsampler,
+    DropSubsampler
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--batch_size', type=int, default=32,
+                    help='number of utterances in a mini-batch')
+parser.add_argument('--xmaxs', type=int, default=[250, 500, 1000], nargs='+',
+                    help='number of input frames')
+parser.add_argument('--factors', type=int, default=[2, 4, 8], nargs='+',
+                    help='subsampling factors')
+parser.add_argument('--n_units', type=int, default=320,
+                    help='number of units')
+parser.add_argument('--n_iters', type=int, default=20,
+                    help='number of iterations')
+parser.add_argument('--device', type=str, default='cpu',
+                    help='device')
+args = parser.parse_args()
+
+
+def concat_loop(subsampler, xs, xlens):
+    """Previous implementation with a loop over time steps (time-first)."""
+    xs = [torch.cat([xs[t - r:t - r + 1] for r in range(subsampler.factor - 1, -1, -1)], dim=-1)
+          for t in range(xs.size(0)) if (t + 1) % subsampler.factor == 0]
+    xs = torch.relu(subsampler.proj(torch.cat(xs, dim=0)))
+    xlens = torch.IntTensor([max(1, i.item() // subsampler.factor) for i in xlens])
+    return xs, xlens
+
+
+def drop_loop(subsampler, xs, xlens):
+    """Previous implementation with lengths computed per utterance."""
+    xs = xs[::subsampler.factor]
+    xlens = torch.IntTensor([max(1, math.ceil(i.item() / subsampler.factor)) for i in xlens])
+    return xs, xlens
+
+
+def measure(fn, *inputs):
+    fn(*inputs)  # warm up
+    if args.device != 'cpu':
+        torch.cuda.synchronize()
+    start_time = time.time()
+    for _ in range(args.n_iters):
+        fn(*inputs)
+    if args.device != 'cpu':
+        torch.cuda.synchronize()
+    return (time.time() - start_time) / args.n_iters * 1000
+
+
+def main():
+    torch.manual_seed(1)
+    with torch.no_grad():
+        for xmax in args.xmaxs:
+            xs = torch.randn(xmax, args.batch_size, args.n_units, device=args.device)
+            xlens = torch.IntTensor([xmax] * args.batch_size)
+            for factor in args.factors:
+                concat = ConcatSubsampler(factor, args.n_units).to(args.device)
+                drop = DropSubsampler(factor)
+                results = [
+                    ('concat', measure(concat_loop, concat, xs, xlens),
+                     measure(lambda *inputs: concat(*inputs, batch_first=False), xs, xlens)),
+                    ('drop', measure(drop_loop, drop, xs, xlens),
+                     measure(lambda *inputs: drop(*inputs, batch_first=False), xs, xlens)),
+                ]
+                for name, elapsed_loop, elapsed in results:
+                    print('T: %d / factor: %d / %s: loop %.3f ms / vectorized %.3f ms (x%.2f)' % (
+                        xmax, factor, name, elapsed_loop, elapsed, elapsed_loop / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for peak CPU memory of Transducer loss computation.
+
+With the default glibc allocator, freed chunks of the joint network are kept in the heap
+and inflate the peak RSS. Run with `MALLOC_MMAP_THRESHOLD_=1048576` to measure memory held by tensors.
+
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+import torch
+
+from neural_sp.models.seq2seq.decoders.rnn_transducer import RNNTransducer
+from neural_sp.models.torch_utils import pad_list
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--batch_size', type=int, default=8,
+                    help='number of utterances in a mini-batch')
+parser.add_argument('--xmax', type=int, default=200,
+                    help='number of encoder frames')
+parser.add_argument('--ymax', type=int, default=50,
+                    help='number of reference tokens')
+parser.add_argument('--vocab', type=int, default=5000,
+                    help='vocabulary size')
+parser.add_argument('--chunk_sizes', type=int, default=[4, 16, 64], nargs='+',
+                    help='chunk sizes of the native loss')
+args = parser.parse_args()
+
+
+def full_lattice_loss(dec, eouts, elens, ys):
+    """Same computation as the warp path, with the CPU Transducer loss of torchaudio.
+
+    This stands in for the warp path when neither warp-rnnt (GPU only) nor
+    warprnnt_pytorch is installed. The full `[B, T, L+1, vocab]` output is materialized in both.
+
+    """
+    from torchaudio.functional import rnnt_loss
+    ys = [torch.LongTensor(y) for y in ys]
+    ylens = torch.IntTensor([len(y) for y in ys])
+    eos = torch.LongTensor([dec.eos])
+    ys_in = pad_list([torch.cat([eos, y], dim=0) for y in ys], dec.pad)
+    ys_out = pad_list(ys, dec.blank)
+    dout, _ = dec.recurrency(dec.embed_token_id(ys_in), None)
+    log_probs = torch.log_softmax(dec.joint(eouts, dout), dim=-1)
+    return rnnt_loss(log_probs, ys_out.int(), elens, ylens, blank=dec.blank,
+                     reduction='mean', fused_log_softmax=False)
+
+
+def run(loss_impl, chunk_size, queue):
+    torch.manual_seed(1)
+    dec = RNNTransducer(special_symbols={'blank': 0, 'unk': 1, 'eos': 2, 'pad': 3},
+                        enc_n_units=256, rnn_type='lstm_transducer', n_units=256, n_projs=0, n_layers=1,
+                        bottleneck_dim=256, emb_dim=256, vocab=args.vocab,
+                        dropout=0., dropout_emb=0., ctc_weight=0., ctc_lsm_prob=0., ctc_fc_list='',
+                        external_lm=None, global_weight=1., mtl_per_batch=False, param_init=0.1,
+                        loss_impl='warp' if loss_impl == 'torchaudio' else loss_impl,
+                        loss_chunk_size=chunk_size)
+    if loss_impl == 'torchaudio':
+        loss_fn = full_lattice_loss
+    else:
+        def loss_fn(dec, eouts, elens, ys):
+            return dec.forward_transducer(eouts, elens, ys)
+    eouts = torch.randn(args.batch_size, args.xmax, 256, requires_grad=True)
+    elens = torch.IntTensor([args.xmax] * args.batch_size)
+    ys = [torch.randint(4, args.vocab, (args.ymax,)).tolist() for _ in range(args.batch_size)]
+    try:
+        # warm up with a tiny input so that lazily loaded kernels are not counted
+        loss_fn(dec, eouts[:1, :2].detach().requires_grad_(), elens[:1].clamp(max=2), [ys[0][:1]]).backward()
+    except ImportError as e:
+        queue.put((None, None, str(e)))
+        return
+    rss_init = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    loss = loss_fn(dec, eouts, elens, ys)
+    loss.backward()
+    elapsed_time = time.time() - start_time
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(((rss_peak - rss_init) / 1024, elapsed_time, None))  # KB -> MB
+
+
+def main():
+    settings = [('warp', 0), ('torchaudio', 0)] + [('native', chunk_size) for chunk_size in args.chunk_sizes]
+    for loss_impl, chunk_size in settings:
+        # measure each setting in a fresh process since peak RSS never decreases
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=run, args=(loss_impl, chunk_size, queue))
+        p.start()
+        peak_mb, elapsed_time, error = queue.get()
+        p.join()
+        name = loss_impl if loss_impl != 'native' else '%s (chunk: %d)' % (loss_impl, chunk_size)
+        if error is not None:
+            print('%s: not available (%s)' % (name, error))
+        else:
+            print('%s: peak memory increase %.1f MB / %.3f sec' % (name, peak_mb, elapsed_time))
+
+
+if __name__ == '__main__':
+    main()
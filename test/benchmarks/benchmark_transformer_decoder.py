@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmark for caching encoder-side keys/values in TransformerDecoder inference."""
+
+import argparse
+import time
+import torch
+
+from neural_sp.models.seq2seq.decoders.transformer import TransformerDecoder
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--elens', type=int, default=[250, 500, 1000], nargs='+',
+                    help='lengths of synthetic encoder outputs')
+parser.add_argument('--batch_size', type=int, default=4,
+                    help='number of utterances decoded at once')
+parser.add_argument('--beam_width', type=int, default=[1, 10], nargs='+',
+                    help='beam width (1 for greedy decoding)')
+parser.add_argument('--ylen', type=int, default=50,
+                    help='number of decoding steps')
+parser.add_argument('--d_model', type=int, default=256,
+                    help='dimension of decoder layers')
+parser.add_argument('--n_layers', type=int, default=6,
+                    help='number of decoder layers')
+parser.add_argument('--vocab', type=int, default=1000,
+                    help='vocabulary size')
+args = parser.parse_args()
+
+
+def make_decoder():
+    dec = TransformerDecoder(
+        special_symbols={'blank': 0, 'unk': 1, 'eos': 2, 'pad': 3},
+        enc_n_units=args.d_model, attn_type='scaled_dot', n_heads=4,
+        n_layers=args.n_layers, d_model=args.d_model, d_ff=args.d_model * 4, ffn_bottleneck_dim=0,
+        pe_type='add', layer_norm_eps=1e-12, ffn_activation='relu', vocab=args.vocab,
+        tie_embedding=False, dropout=0., dropout_emb=0., dropout_att=0., dropout_layer=0.,
+        dropout_head=0., lsm_prob=0., ctc_weight=0., ctc_lsm_prob=0., ctc_fc_list='',
+        backward=False, global_weight=1.0, mtl_per_batch=False, param_init='xavier_uniform',
+        mma_chunk_size=4, mma_n_heads_mono=1, mma_n_heads_chunk=1, mma_init_r=-4, mma_eps=1e-6,
+        mma_std=1.0, mma_no_denominator=False, mma_1dconv=False,
+        mma_quantity_loss_weight=0., mma_headdiv_loss_weight=0.,
+        latency_metric='', latency_loss_weight=0., mma_first_layer=1,
+        share_chunkwise_attention=False, external_lm=None, lm_fusion='')
+    # never emit <eos> so that every utterance is decoded for exactly `ylen` steps
+    dec.output.bias.data[dec.eos] = -1e4
+    return dec.eval()
+
+
+def decode(dec, eouts, elens, beam_width):
+    params = {'recog_beam_width': beam_width,
+              'recog_max_len_ratio': args.ylen / elens.min().item(),
+              'recog_min_len_ratio': 0.,
+              'recog_length_penalty': 0.,
+              'recog_length_norm': False,
+              'recog_eos_threshold': 1.5,
+              'recog_lm_weight': 0., 'recog_lm_second_weight': 0., 'recog_lm_bwd_weight': 0.,
+              'recog_ctc_weight': 0., 'recog_softmax_smoothing': 1., 'recog_cache_embedding': True,
+              'recog_mma_delay_threshold': -1,
+              'recog_asr_state_carry_over': False, 'recog_lm_state_carry_over': False}
+    if beam_width == 1:
+        dec.greedy(eouts, elens, params['recog_max_len_ratio'], idx2token=None)
+    else:
+        dec.batch_beam_search(eouts, elens, params, nbest=1)
+
+
+def main():
+    torch.manual_seed(1)
+    dec = make_decoder()
+    for elen in args.elens:
+        eouts = torch.randn(args.batch_size, elen, args.d_model)
+        elens = torch.IntTensor([elen] * args.batch_size)
+        for beam_width in args.beam_width:
+            elapsed_times = {}
+            for cache_src in [False, True]:
+                dec.cache_src = cache_src
+                with torch.no_grad():
+                    start_time = time.time()
+                    decode(dec, eouts, elens, beam_width)
+                    elapsed_times[cache_src] = time.time() - start_time
+            print('T: %d / beam: %d / w/o cache: %.3f sec / w/ cache: %.3f sec (x%.2f)' % (
+                elen, beam_width, elapsed_times[False], elapsed_times[True],
+                elapsed_times[False] / elapsed_times[True]))
+
+
+if __name__ == '__main__':
+    main()
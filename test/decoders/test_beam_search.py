@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for tensor-backed beam search state."""
+
+import argparse
+import pytest
+import torch
+
+from neural_sp.models.lm.rnnlm import RNNLM
+from neural_sp.models.seq2seq.decoders.beam_search import (
+    BeamSearch,
+    BeamState,
+    NEG_INF,
+    PrefixStateCache
+)
+
+VOCAB = 10
+SOS = 2
+
+
+@pytest.mark.parametrize("bs, beam_width", [(1, 1), (1, 4), (3, 4)])
+def test_beam_state(bs, beam_width):
+    ymax = 5
+    state = BeamState(bs, beam_width, ymax, SOS, "cpu")
+    assert state.n_rows == bs * beam_width
+    assert state.alive.sum().item() == bs
+    state.set_state('h', torch.arange(state.n_rows).float().unsqueeze(1))
+
+    for i in range(ymax):
+        scores = torch.randn(state.n_rows, VOCAB)
+        state.record('x', scores)
+        total_scores = state.score.unsqueeze(1) + scores
+        score, src_rows, cand_ids, tokens = state.topk(total_scores)
+        # candidates must be expanded from hypotheses of the same utterance
+        assert (src_rows // beam_width == torch.arange(bs).repeat_interleave(beam_width)).all()
+        assert torch.equal(total_scores.view(-1)[cand_ids], score)
+        assert torch.equal(src_rows * VOCAB + tokens, cand_ids)
+        h = state.get_state('h')
+        state.advance(src_rows, tokens, score, score)
+        assert torch.equal(state.get_state('h'), h.index_select(0, src_rows))
+        assert torch.equal(state.last_tokens().squeeze(1), tokens)
+
+    assert state.tokens().size() == (state.n_rows, ymax + 1)
+    assert (state.tokens()[:, 0] == SOS).all()
+
+    # the recorded scores of each step should sum up to the total score
+    for r in range(state.n_rows):
+        hyp = state.to_hyp(r)
+        assert len(hyp['hyp']) == ymax + 1
+        xs = hyp['x']
+        assert len(xs) == ymax
+        score_r = sum(xs[t][0, hyp['hyp'][t + 1]] for t in range(ymax))
+        assert abs(score_r.item() - hyp['score']) < 1e-4
+
+    # drop the first utterance
+    if bs > 1:
+        state.kill(torch.arange(state.n_rows) < beam_width)
+        assert (state.score[:beam_width] == NEG_INF).all()
+        hyp = state.to_hyp(beam_width)
+        state.keep_utterances(list(range(1, bs)))
+        assert state.utt_ids == list(range(1, bs))
+        assert state.n_rows == (bs - 1) * beam_width
+        assert state.to_hyp(0)['hyp'] == hyp['hyp']
+        assert state.to_hyp(0)['score'] == hyp['score']
+        assert state.repeat_rows(torch.arange(bs)).tolist() == \
+            torch.arange(1, bs).repeat_interleave(beam_width).tolist()
+
+
+@pytest.mark.parametrize("capacity", [0, 2])
+def test_prefix_state_cache(capacity):
+    cache = PrefixStateCache(capacity)
+    hyps = [[SOS], [SOS, 3], [SOS, 3, 4], [SOS, 4, 3]]
+    keys = [PrefixStateCache.prefix_key(hyp) for hyp in hyps]
+    assert len(set(keys)) == len(hyps)
+    # rolling keys should be consistent with keys computed from scratch
+    for hyp, key in zip(hyps[1:], keys[1:]):
+        assert PrefixStateCache.extend_key(PrefixStateCache.prefix_key(hyp[:-1]), hyp[-1]) == key
+
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, {'id': i})
+    assert cache.get(keys[3]) is None
+    if capacity == 0:
+        assert len(cache) == 3
+        assert cache.get(keys[0])['id'] == 0
+    else:
+        # the least recently used prefix is evicted
+        assert len(cache) == capacity
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[1])['id'] == 1
+        cache.put(keys[3], {'id': 3})
+        assert cache.get(keys[2]) is None
+        assert cache.get(keys[1])['id'] == 1
+    assert cache.n_hits + cache.n_misses == (2 if capacity == 0 else 5)
+
+
+def make_lm_args(**kwargs):
+    args = dict(
+        lm_type='lstm',
+        n_units=16,
+        n_projs=0,
+        n_layers=1,
+        residual=False,
+        use_glu=False,
+        n_units_null_context=0,
+        bottleneck_dim=16,
+        emb_dim=16,
+        vocab=VOCAB,
+        dropout_in=0.1,
+        dropout_hidden=0.1,
+        lsm_prob=0.0,
+        param_init=0.1,
+        adaptive_softmax=False,
+        tie_embedding=False,
+    )
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+@pytest.mark.parametrize("reverse, length_norm, batch_size",
+                         [(False, False, 100), (True, False, 100), (False, True, 100), (False, False, 2)])
+def test_lm_rescoring(reverse, length_norm, batch_size):
+    lm = RNNLM(make_lm_args())
+    lm.eval()
+    ylens = [0, 3, 1, 5, 4]
+    hyps = [{'hyp': [SOS] + torch.randint(0, VOCAB, (ylen,)).tolist(), 'score': 0.} for ylen in ylens]
+    with torch.no_grad():
+        hyps = BeamSearch.lm_rescoring(hyps, lm, 0.5, reverse=reverse, length_norm=length_norm,
+                                       tag='second', batch_size=batch_size)
+
+        # compare with scores of each hypothesis computed one by one
+        for hyp, ylen in zip(hyps, ylens):
+            ys = hyp['hyp'][::-1] if reverse else hyp['hyp']
+            score_lm = 0.
+            if ylen > 0:
+                _, _, log_probs = lm.predict(torch.tensor([ys[:-1]]), None)
+                score_lm = sum([log_probs[0, t, ys[t + 1]].item() for t in range(ylen)])
+                if length_norm:
+                    score_lm /= ylen
+            assert abs(hyp['score_lm_second'] - score_lm) < 1e-4
+            assert abs(hyp['score'] - score_lm * 0.5) < 1e-4
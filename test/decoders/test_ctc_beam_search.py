@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for tensor-backed CTC prefix beam search."""
+
+import argparse
+import itertools
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.lm.rnnlm import RNNLM
+from neural_sp.models.seq2seq.decoders.ctc import (
+    collapse_best_paths,
+    CTC
+)
+
+BLANK = 0
+EOS = 2
+ENC_N_UNITS = 16
+
+
+def make_params(**kwargs):
+    params = dict(
+        recog_beam_width=4,
+        recog_length_penalty=0.,
+        recog_cache_embedding=True,
+        recog_lm_weight=0.,
+        recog_lm_second_weight=0.,
+        recog_lm_bwd_weight=0.,
+        recog_softmax_smoothing=1.,
+    )
+    params.update(kwargs)
+    return params
+
+
+def make_lm_args(vocab):
+    args = dict(
+        lm_type='lstm',
+        n_units=16,
+        n_projs=0,
+        n_layers=1,
+        residual=False,
+        use_glu=False,
+        n_units_null_context=0,
+        bottleneck_dim=16,
+        emb_dim=16,
+        vocab=vocab,
+        dropout_in=0.1,
+        dropout_hidden=0.1,
+        lsm_prob=0.0,
+        param_init=0.1,
+        adaptive_softmax=False,
+        tie_embedding=False,
+    )
+    return argparse.Namespace(**args)
+
+
+def brute_force(log_probs):
+    """Log-probabilities of all label sequences by enumerating all paths."""
+    T, vocab = log_probs.shape
+    scores = {}
+    for path in itertools.product(range(vocab), repeat=T):
+        hyps, _, ylens = collapse_best_paths(torch.LongTensor([path]), [T], BLANK)
+        hyp = tuple(hyps[0, :ylens[0]].tolist())
+        score = sum(log_probs[t, path[t]] for t in range(T))
+        scores[hyp] = np.logaddexp(scores.get(hyp, -np.inf), score)
+    return scores
+
+
+def test_exact_search():
+    torch.manual_seed(1)
+    vocab, xmax = 4, 4
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=vocab)
+    ctc.eval()
+    eouts = torch.randn(1, xmax, ENC_N_UNITS)
+    # all prefixes are kept with a large beam, so that the search is exact
+    params = make_params(recog_beam_width=128)
+    with torch.no_grad():
+        log_probs = torch.log_softmax(ctc.output(eouts), dim=-1)[0].double().numpy()
+        nbest_hyps = ctc.batch_beam_search(eouts, torch.IntTensor([xmax]), params, nbest=10)[0]
+
+    scores = brute_force(log_probs)
+    scores_sorted = sorted([score / max(len(hyp), 1) for hyp, score in scores.items()], reverse=True)
+    for n, hyp in enumerate(nbest_hyps):
+        score = scores[tuple(hyp.tolist())] / max(len(hyp), 1)
+        assert abs(score - scores_sorted[n]) < 1e-4
+
+
+@pytest.mark.parametrize("lm_weight, lp_weight", [(0., 0.), (0., 0.5), (0.3, 0.), (0.3, 0.5)])
+def test_batch_consistency(lm_weight, lp_weight):
+    torch.manual_seed(1)
+    vocab = 10
+    xlens = [20, 13, 7]
+    bs = len(xlens)
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=vocab)
+    ctc.eval()
+    lm = None
+    if lm_weight > 0:
+        lm = RNNLM(make_lm_args(vocab))
+        lm.eval()
+    params = make_params(recog_lm_weight=lm_weight, recog_length_penalty=lp_weight)
+    eouts = torch.randn(bs, max(xlens), ENC_N_UNITS) * 3
+
+    with torch.no_grad():
+        nbest_hyps = ctc.batch_beam_search(eouts, torch.IntTensor(xlens), params, lm=lm, nbest=2)
+        for b in range(bs):
+            nbest_hyps_b = ctc.batch_beam_search(eouts[b:b + 1, :xlens[b]], torch.IntTensor(xlens[b:b + 1]),
+                                                 params, lm=lm, nbest=2)
+            for hyp, hyp_b in zip(nbest_hyps[b], nbest_hyps_b[0]):
+                assert np.array_equal(hyp, hyp_b)
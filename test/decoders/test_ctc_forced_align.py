@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for batched CTC forced alignment."""
+
+import numpy as np
+import pytest
+import shutil
+import torch
+
+from neural_sp.datasets.alignment import (
+    CTCAlignmentWriter,
+    load_ctc_alignment
+)
+from neural_sp.models.seq2seq.decoders.ctc import CTC
+
+VOCAB = 6
+BLANK = 0
+EOS = 2
+ENC_N_UNITS = 16
+
+
+def viterbi_reference(log_probs, labels, blank):
+    """Align a single utterance with loops and return the first frame of each label."""
+    path = [blank]
+    for y in labels:
+        path += [y, blank]
+    xlen, path_len = len(log_probs), len(path)
+    delta = np.full((xlen, path_len), -np.inf)
+    back_pointers = np.zeros((xlen, path_len), dtype=np.int64)
+    delta[0, :2] = log_probs[0, path[:2]]
+    for t in range(1, xlen):
+        for s in range(path_len):
+            cands = [(delta[t - 1, s], s)]
+            if s >= 1:
+                cands.append((delta[t - 1, s - 1], s - 1))
+            if s >= 2 and path[s] != path[s - 2]:
+                cands.append((delta[t - 1, s - 2], s - 2))
+            score, back_pointers[t, s] = max(cands)
+            delta[t, s] = score + log_probs[t, path[s]]
+
+    s = path_len - 1
+    if path_len > 1 and delta[-1, path_len - 2] > delta[-1, path_len - 1]:
+        s = path_len - 2
+    positions = [s]
+    for t in range(xlen - 1, 0, -1):
+        s = back_pointers[t, s]
+        positions.insert(0, s)
+    return [t for t, s in enumerate(positions) if s % 2 == 1 and (t == 0 or s != positions[t - 1])]
+
+
+@pytest.mark.parametrize("xlens", [[20], [20, 13, 7, 3], [9, 30, 4]])
+def test_forced_align(xlens):
+    torch.manual_seed(1)
+    bs = len(xlens)
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=VOCAB)
+    ctc.eval()
+    eouts = torch.randn(bs, max(xlens), ENC_N_UNITS) * 3
+    elens = torch.IntTensor(xlens)
+    # a small vocabulary yields repeated labels, which need a blank in between
+    ys = [torch.randint(1, 4, (xlen // 2,)).tolist() for xlen in xlens]
+    ylens = torch.IntTensor([len(y) for y in ys])
+
+    with torch.no_grad():
+        logits = ctc.output(eouts)
+        trigger_points = ctc.forced_aligner(logits.clone(), elens, ys, ylens)
+        log_probs = torch.log_softmax(logits, dim=-1)
+    assert trigger_points.size() == (bs, max(ylens) + 1)
+
+    for b in range(bs):
+        triggers_ref = viterbi_reference(log_probs[b, :xlens[b]].numpy(), ys[b], BLANK)
+        assert trigger_points[b, :ylens[b]].tolist() == triggers_ref
+        # <eos>
+        assert trigger_points[b, ylens[b]].item() == xlens[b] - 1
+
+        # padding does not affect alignment
+        with torch.no_grad():
+            trigger_points_b = ctc.forced_aligner(logits[b:b + 1, :xlens[b]].clone(), elens[b:b + 1],
+                                                  ys[b:b + 1], ylens[b:b + 1])
+        assert trigger_points_b[0].tolist() == trigger_points[b, :ylens[b] + 1].tolist()
+
+
+def test_binary_alignment(tmp_path):
+    rng = np.random.RandomState(1)
+    alignments = {('spk%d' % (i % 3), 'utt%d' % i): np.sort(rng.randint(0, 100, rng.randint(1, 10)))
+                  for i in range(10)}
+    alignments[('spk0', 'utt_empty')] = np.zeros(0, dtype=np.int32)
+
+    # text files
+    txt_dir = tmp_path / 'txt'
+    for (speaker, utt_id), boundaries in alignments.items():
+        (txt_dir / speaker).mkdir(parents=True, exist_ok=True)
+        with open(str(txt_dir / speaker / (utt_id + '.txt')), 'w') as f:
+            for p in boundaries:
+                f.write('a %d\n' % p)
+
+    # single binary file
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    writer = CTCAlignmentWriter(str(bin_dir))
+    for (speaker, utt_id), boundaries in alignments.items():
+        writer.add(speaker, utt_id, boundaries)
+    writer.close()
+    assert len(list(bin_dir.iterdir())) == 2
+
+    for (speaker, utt_id), boundaries in alignments.items():
+        for alignment_dir in [txt_dir, bin_dir]:
+            loaded = load_ctc_alignment(str(alignment_dir), speaker, utt_id)
+            assert loaded.dtype == np.int32
+            assert loaded.tolist() == boundaries.tolist()
+    for alignment_dir in [txt_dir, bin_dir]:
+        assert load_ctc_alignment(str(alignment_dir), 'spk0', 'utt_missing') is None
+
+
+def test_binary_alignment_rewritten(tmp_path):
+    # binary files written by another process
+    alignments = [[1, 2], [4, 5, 6], [7, 8, 9]]
+    for i, boundaries in enumerate(alignments):
+        other_dir = tmp_path / ('other%d' % i)
+        other_dir.mkdir()
+        writer = CTCAlignmentWriter(str(other_dir))
+        writer.add('spk0', 'utt0', boundaries)
+        writer.close()
+
+    # text file only
+    alignment_dir = tmp_path / 'align'
+    (alignment_dir / 'spk0').mkdir(parents=True)
+    with open(str(alignment_dir / 'spk0' / 'utt0.txt'), 'w') as f:
+        f.write('a 3\n')
+    assert load_ctc_alignment(str(alignment_dir), 'spk0', 'utt0').tolist() == [3]
+
+    # binary files are found once written and re-read when rewritten
+    for i, boundaries in enumerate(alignments):
+        for name in ['alignments.bin', 'alignments.idx']:
+            shutil.copy(str(tmp_path / ('other%d' % i) / name), str(alignment_dir / name))
+        assert load_ctc_alignment(str(alignment_dir), 'spk0', 'utt0').tolist() == boundaries
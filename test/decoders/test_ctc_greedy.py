@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for batched CTC greedy decoding and trigger point extraction."""
+
+from itertools import groupby
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.seq2seq.decoders.ctc import (
+    collapse_best_paths,
+    CTC
+)
+
+VOCAB = 6
+BLANK = 0
+EOS = 2
+ENC_N_UNITS = 16
+
+
+def greedy_reference(best_path, blank):
+    """Collapse with itertools.groupby and return (labels, trigger points)."""
+    hyp, triggers = [], []
+    t = 0
+    for label, group in groupby(best_path):
+        if label != blank:
+            hyp.append(label)
+            triggers.append(t)
+        t += len(list(group))
+    return hyp, triggers
+
+
+@pytest.mark.parametrize("xlens", [[1], [20], [20, 13, 7, 1], [5, 0, 8]])
+def test_collapse_best_paths(xlens):
+    torch.manual_seed(1)
+    bs = len(xlens)
+    # a small vocabulary yields many repeated labels and blanks
+    best_paths = torch.randint(0, 3, (bs, max(xlens)))
+    hyps, trigger_points, ylens = collapse_best_paths(best_paths, np.array(xlens), BLANK)
+    assert hyps.size() == trigger_points.size()
+    assert hyps.size(1) == ylens.max().item()
+    for b in range(bs):
+        hyp_ref, triggers_ref = greedy_reference(best_paths[b, :xlens[b]].tolist(), BLANK)
+        assert ylens[b].item() == len(hyp_ref)
+        assert hyps[b, :ylens[b]].tolist() == hyp_ref
+        assert trigger_points[b, :ylens[b]].tolist() == triggers_ref
+        assert (trigger_points[b, ylens[b]:] == 0).all()
+
+
+@pytest.mark.parametrize("xlens", [[20], [20, 13, 7, 1]])
+def test_greedy_and_trigger_points(xlens):
+    torch.manual_seed(1)
+    bs = len(xlens)
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=VOCAB)
+    ctc.eval()
+    eouts = torch.randn(bs, max(xlens), ENC_N_UNITS)
+    elens = torch.IntTensor(xlens)
+    with torch.no_grad():
+        best_paths = ctc.output(eouts).argmax(-1)
+        hyps = ctc.greedy(eouts, elens.numpy())
+        trigger_points = ctc.trigger_points(eouts, elens)
+
+    refs = [greedy_reference(best_paths[b, :xlens[b]].tolist(), BLANK) for b in range(bs)]
+    assert hyps == [[hyp_ref] for hyp_ref, _ in refs]
+    assert trigger_points.dtype == torch.int32
+    assert trigger_points.size() == (bs, max(len(hyp_ref) for hyp_ref, _ in refs) + 1)  # +1 for <eos>
+    for b, (hyp_ref, triggers_ref) in enumerate(refs):
+        assert trigger_points[b, :len(hyp_ref)].tolist() == triggers_ref
@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for lexicon-constrained CTC beam search with word-level LM."""
+
+from collections import OrderedDict
+import pytest
+import torch
+
+from neural_sp.datasets.token_converter.character import Idx2char
+from neural_sp.models.lm.ngram import NgramLM
+from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+from neural_sp.models.seq2seq.decoders.ctc import CTC
+from neural_sp.models.seq2seq.decoders.lexicon import LexiconTrie
+
+idx2token = Idx2char('test/decoders/dict.txt')
+VOCAB = idx2token.vocab
+BLANK = 0
+EOS = 2
+ENC_N_UNITS = 16
+
+WORDS = ['ab', 'abc', 'ba', 'c', 'dad']
+WORD2IDX = {w: i + 4 for i, w in enumerate(WORDS)}  # after <unk>, <eos> and <pad>
+ARPA = """
+\\data\\
+ngram 1=8
+ngram 2=4
+
+\\1-grams:
+-1.5\t<unk>
+-99\t<s>\t-0.3
+-0.9\t</s>
+-0.7\tab\t-0.2
+-1.1\tabc\t-0.4
+-0.8\tba\t-0.1
+-0.6\tc\t-0.5
+-1.3\tdad\t-0.2
+
+\\2-grams:
+-0.2\t<s> ab
+-0.4\tab c
+-0.3\tc </s>
+-0.5\tba dad
+
+\\end\\
+"""
+
+
+def make_lexicon(tmp_path):
+    dict_path = str(tmp_path / 'words.txt')
+    with open(dict_path, 'w') as f:
+        for w, idx in [('<unk>', 1), ('<eos>', 2), ('<pad>', 3)] + list(WORD2IDX.items()):
+            f.write('%s %d\n' % (w, idx))
+    return LexiconTrie(dict_path, idx2token), dict_path
+
+
+def make_wordlm(tmp_path, dict_path):
+    arpa_path = str(tmp_path / 'words.arpa')
+    with open(arpa_path, 'w') as f:
+        f.write(ARPA)
+    return NgramLM(arpa_path, dict_path)
+
+
+def make_params(**kwargs):
+    params = dict(
+        recog_beam_width=4,
+        recog_length_penalty=0.,
+        recog_cache_embedding=True,
+        recog_lm_weight=0.,
+        recog_lm_second_weight=0.,
+        recog_lm_bwd_weight=0.,
+        recog_lm_state_carry_over=False,
+        recog_softmax_smoothing=1.,
+        recog_wordlm=False,
+    )
+    params.update(kwargs)
+    return params
+
+
+def is_valid_prefix(text):
+    """Check whether all words but the last are in the lexicon and the last is a prefix of a word."""
+    words = text.split(' ')
+    if len(words) > 1 and words[0] == '':
+        return False
+    if any([w not in WORDS for w in words[:-1]]):
+        return False
+    return any([w.startswith(words[-1]) for w in WORDS])
+
+
+def test_successors(tmp_path):
+    lexicon, _ = make_lexicon(tmp_path)
+    token2idx = {token: idx for idx, token in idx2token.idx2token.items()}
+    assert lexicon.n_words == len(WORDS)
+
+    def follow(chars):
+        node = lexicon.root
+        for c in chars:
+            node = lexicon.children[node][token2idx[c]]
+        return node
+
+    token_ids, _, word_ids = lexicon.successors(lexicon.root)
+    assert sorted(token_ids.tolist()) == sorted([token2idx[c] for c in 'abcd'])
+    assert all([w == -1 for w in word_ids])
+
+    # partial word
+    token_ids, next_nodes, word_ids = lexicon.successors(follow('a'))
+    assert token_ids.tolist() == [token2idx['b']]
+    assert not lexicon.is_word_end(follow('a'))
+
+    # word which is also a prefix of another word
+    token_ids, next_nodes, word_ids = lexicon.successors(follow('ab'))
+    assert dict(zip(token_ids.tolist(), word_ids)) == {token2idx['c']: -1, lexicon.space: WORD2IDX['ab']}
+    assert next_nodes[token_ids.tolist().index(lexicon.space)] == lexicon.root
+    assert next_nodes[token_ids.tolist().index(token2idx['c'])] == follow('abc')
+
+    # leaf
+    token_ids, next_nodes, word_ids = lexicon.successors(follow('dad'))
+    assert token_ids.tolist() == [lexicon.space]
+    assert word_ids == [WORD2IDX['dad']]
+
+
+@pytest.mark.parametrize("wordlm", [False, True])
+def test_beam_search(tmp_path, wordlm):
+    torch.manual_seed(1)
+    lexicon, dict_path = make_lexicon(tmp_path)
+    lm = make_wordlm(tmp_path, dict_path) if wordlm else None
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=VOCAB)
+    ctc.eval()
+    params = make_params(recog_lm_weight=0.5 if wordlm else 0., recog_wordlm=wordlm)
+    assert not ctc.batch_beam_search_available(params, lexicon=lexicon)
+
+    xmax = 40
+    eouts = torch.randn(1, xmax, ENC_N_UNITS) * 3
+    with torch.no_grad():
+        nbest_hyps = ctc.beam_search(eouts, [xmax], params, None, lm=lm, nbest=2, lexicon=lexicon)
+    for hyp in nbest_hyps[0]:
+        assert is_valid_prefix(idx2token(hyp))
+
+
+def test_wordlm_scores(tmp_path):
+    torch.manual_seed(1)
+    lexicon, dict_path = make_lexicon(tmp_path)
+    wordlm = make_wordlm(tmp_path, dict_path)
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=VOCAB)
+    ctc.eval()
+
+    xmax = 40
+    eouts = torch.randn(1, xmax, ENC_N_UNITS) * 3
+    helper = BeamSearch(8, EOS, 1.0, 0.5, eouts.device)
+    with torch.no_grad():
+        log_probs = torch.log_softmax(ctc.output(eouts), dim=-1)[0]
+        hyps = ctc.initialize_beam([EOS], None, wordlm)
+        ctc.state_cache = OrderedDict()
+        ctc.wordlm_cache = {}
+        hyps, _ = ctc._beam_search(hyps, helper, log_probs, None, 0., lexicon, wordlm)
+        ctc._complete_words(hyps, helper, lexicon, wordlm)
+
+    n_checked = 0
+    for beam in hyps:
+        text = idx2token(beam['hyp'][1:])
+        assert is_valid_prefix(text)
+        if not lexicon.is_word_end(beam['lex_node']):
+            continue
+        # word-level LM score of the whole word sequence including </s>
+        ys = [EOS] + [WORD2IDX[w] for w in text.split()]
+        _, _, scores_lm = wordlm.predict(torch.LongTensor([ys]), None)
+        score_lm_ref = sum([scores_lm[0, i, ys[i + 1]].item() for i in range(len(ys) - 1)])
+        score_lm_ref += scores_lm[0, -1, EOS].item()
+        assert abs(beam['score_lm'] - score_lm_ref) < 1e-4
+        n_checked += 1
+    assert n_checked > 0
@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for batched CTC prefix scoring."""
+
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.seq2seq.decoders.ctc import (
+    CTCPrefixScore,
+    CTCPrefixScoreTH
+)
+
+VOCAB = 10
+BLANK = 0
+EOS = 2
+
+
+@pytest.mark.parametrize("xlens, beam_width", [([20], 1), ([20], 4), ([20, 13, 7], 4)])
+def test_ctc_prefix_score(xlens, beam_width):
+    torch.manual_seed(1)
+    np.random.seed(1)
+    bs = len(xlens)
+    n_steps = 6
+    log_probs = torch.log_softmax(torch.randn(bs, max(xlens), VOCAB), dim=-1)
+
+    scorers_np = [CTCPrefixScore(log_probs[b, :xlens[b]].numpy(), BLANK, EOS) for b in range(bs)]
+    scorer_th = CTCPrefixScoreTH(log_probs, BLANK, EOS, xlens=torch.IntTensor(xlens))
+    states_th = scorer_th.initial_state()
+    # hypothesis: (utterance index, prefix, NumPy CTC state, torch CTC state)
+    hyps = [(b, [EOS], scorers_np[b].initial_state(), states_th[b]) for b in range(bs)]
+    pool = []
+    for i in range(n_steps):
+        # candidates include <eos> and the last label
+        cs = torch.stack([torch.cat([torch.LongTensor([EOS, hyp[-1]]),
+                                     torch.randint(1, VOCAB, (beam_width,))])
+                          for _, hyp, _, _ in hyps])
+        utt_ids = torch.LongTensor([b for b, _, _, _ in hyps])
+        log_psi_th, new_states_th = scorer_th([hyp for _, hyp, _, _ in hyps], cs,
+                                              torch.stack([s for _, _, _, s in hyps]), utt_ids)
+        assert log_psi_th.size() == cs.size()
+        assert new_states_th.size() == (len(hyps), cs.size(1), max(xlens), 2)
+
+        new_hyps = []
+        for j, (b, hyp, state_np, _) in enumerate(hyps):
+            log_psi_np, new_states_np = scorers_np[b](hyp, cs[j].numpy(), state_np)
+            assert np.allclose(log_psi_np, log_psi_th[j].numpy(), atol=1e-3)
+            for k in range(2, cs.size(1)):
+                if cs[j, k].item() != EOS:
+                    new_hyps.append((b, hyp + [cs[j, k].item()], new_states_np[k], new_states_th[j, k]))
+        pool += new_hyps
+        hyps = [new_hyps[k] for k in np.random.permutation(len(new_hyps))[:bs * beam_width]]
+
+    # hypotheses of different lengths are scored at once
+    hyps = [pool[k] for k in np.random.permutation(len(pool))[:8]]
+    cs = torch.randint(1, VOCAB, (len(hyps), beam_width))
+    log_psi_th, _ = scorer_th([hyp for _, hyp, _, _ in hyps], cs,
+                              torch.stack([s for _, _, _, s in hyps]),
+                              torch.LongTensor([b for b, _, _, _ in hyps]))
+    for j, (b, hyp, state_np, _) in enumerate(hyps):
+        log_psi_np, _ = scorers_np[b](hyp, cs[j].numpy(), state_np)
+        assert np.allclose(log_psi_np, log_psi_th[j].numpy(), atol=1e-3)
+
+
+@pytest.mark.parametrize("margin", [1, 3, 100])
+def test_ctc_prefix_score_window(margin):
+    torch.manual_seed(1)
+    xlens = [30, 24]
+    bs = len(xlens)
+    log_probs = torch.log_softmax(torch.randn(bs, max(xlens), VOCAB) * 3, dim=-1)
+    scorer = CTCPrefixScoreTH(log_probs, BLANK, EOS, xlens=torch.IntTensor(xlens))
+    scorer_window = CTCPrefixScoreTH(log_probs, BLANK, EOS, xlens=torch.IntTensor(xlens), margin=margin)
+
+    hyps = [[EOS] for _ in range(bs)]
+    utt_ids = torch.arange(bs)
+    states = scorer.initial_state()
+    states_window = scorer_window.initial_state()
+    for i in range(5):
+        cs = torch.randint(1, VOCAB, (bs, 4))
+        cs[:, 0] = EOS
+        log_psi, new_states = scorer(hyps, cs, states, utt_ids)
+        log_psi_window, new_states_window = scorer_window(hyps, cs, states_window, utt_ids)
+        if margin >= max(xlens):
+            assert torch.allclose(log_psi, log_psi_window, atol=1e-4)
+        else:
+            # windowed scoring ignores some CTC paths
+            assert (log_psi_window <= log_psi + 1e-4).all()
+        hyps = [hyp + [cs[b, 1].item()] for b, hyp in enumerate(hyps)]
+        states = new_states[:, 1]
+        states_window = new_states_window[:, 1]
+
+
+@pytest.mark.parametrize("margin", [0, 5, 10, 20, 50])
+def test_ctc_prefix_score_window_silence(margin):
+    torch.manual_seed(1)
+    # 40 leading silent frames and a 54-frame pause between the 3rd and 4th labels
+    ys = [4, 5, 6, 7, 8]
+    spikes = [40, 48, 56, 110, 118]
+    xlen = 130
+    logits = torch.randn(1, xlen, VOCAB)
+    logits[:, :, BLANK] += 10.
+    logits[0, spikes, ys] += 15.
+    log_probs = torch.log_softmax(logits, dim=-1)
+    scorer = CTCPrefixScoreTH(log_probs, BLANK, EOS)
+    scorer_window = CTCPrefixScoreTH(log_probs, BLANK, EOS, margin=margin)
+
+    hyps = [[EOS]]
+    states = scorer.initial_state()
+    states_window = scorer_window.initial_state()
+    for y in ys:
+        cs = torch.LongTensor([[y] + [c for c in range(3, VOCAB) if c != y]])
+        log_psi, new_states = scorer(hyps, cs, states)
+        log_psi_window, new_states_window = scorer_window(hyps, cs, states_window)
+        # the reference label is the best candidate as with full scoring
+        assert log_psi_window.argmax(1).item() == 0
+        assert torch.allclose(log_psi[:, 0], log_psi_window[:, 0], atol=1e-2)
+        hyps = [hyps[0] + [y]]
+        states = new_states[:, 0]
+        states_window = new_states_window[:, 0]
@@ -476,3 +476,73 @@ def test_streaming_decoding(params):
             end_hyps, hyps, _ = out
             assert isinstance(end_hyps, list)
             assert isinstance(hyps, list)
+
+
+@pytest.mark.parametrize(
+    "backward, lm_fusion, params",
+    [
+        (False, '', {'recog_beam_width': 4}),
+        (False, '', {'recog_beam_width': 4, 'exclude_eos': True}),
+        (False, '', {'recog_beam_width': 4, 'nbest': 4}),
+        (False, '', {'recog_beam_width': 4, 'recog_length_penalty': 0.1}),
+        (False, '', {'recog_beam_width': 4, 'recog_length_penalty': 0.1, 'recog_gnmt_decoding': True}),
+        (False, '', {'recog_beam_width': 4, 'recog_length_norm': True}),
+        (False, '', {'recog_beam_width': 4, 'recog_lm_weight': 0.1}),
+        (False, '', {'recog_beam_width': 4, 'recog_lm_second_weight': 0.1}),
+        (False, 'cold', {'recog_beam_width': 4}),
+        (True, '', {'recog_beam_width': 4}),
+    ]
+)
+def test_batch_beam_search(backward, lm_fusion, params):
+    args = make_args()
+    args['backward'] = backward
+    args['lm_fusion'] = lm_fusion
+    params = make_decode_params(**params)
+    params['recog_batch_size'] = 4
+
+    batch_size = params['recog_batch_size']
+    device = "cpu"
+
+    xlens = [40, 35, 30, 20]
+    eouts = [np.random.randn(xlen, ENC_N_UNITS).astype(np.float32) for xlen in xlens]
+    elens = torch.IntTensor([len(x) for x in eouts])
+    eouts = pad_list([np2tensor(x, device).float() for x in eouts], 0.)
+
+    args_lm = make_args_rnnlm()
+    module_rnnlm = importlib.import_module('neural_sp.models.lm.rnnlm')
+    lm = None
+    lm_second = None
+    if params['recog_lm_weight'] > 0:
+        lm = module_rnnlm.RNNLM(args_lm).to(device)
+    if params['recog_lm_second_weight'] > 0:
+        lm_second = module_rnnlm.RNNLM(args_lm).to(device)
+    if args['lm_fusion']:
+        args['external_lm'] = module_rnnlm.RNNLM(args_lm).to(device)
+
+    module = importlib.import_module('neural_sp.models.seq2seq.decoders.las')
+    dec = module.RNNDecoder(**args)
+    dec = dec.to(device)
+
+    dec.eval()
+    with torch.no_grad():
+        out = dec.batch_beam_search(eouts, elens, params, idx2token,
+                                    lm, lm_second, None,
+                                    nbest=params['nbest'], exclude_eos=params['exclude_eos'])
+        assert len(out) == 3
+        nbest_hyps, aws, scores = out
+        assert isinstance(nbest_hyps, list)
+        assert len(nbest_hyps) == batch_size
+        assert len(nbest_hyps[0]) == params['nbest']
+        assert len(scores) == batch_size
+        assert len(scores[0]) == params['nbest']
+        assert len(aws) == batch_size
+
+        # should be consistent with decoding utterance by utterance
+        for b in range(batch_size):
+            nbest_hyps_b, aws_b, scores_b = dec.batch_beam_search(
+                eouts[b:b + 1, :xlens[b]], elens[b:b + 1], params, idx2token,
+                lm, lm_second, None,
+                nbest=params['nbest'], exclude_eos=params['exclude_eos'], store_aws=True)
+            assert np.array_equal(nbest_hyps[b][0], nbest_hyps_b[0][0])
+            assert np.allclose(scores[b][0], scores_b[0][0], atol=1e-4)
+            assert aws_b[0][0].shape == (args['attn_n_heads'], len(nbest_hyps_b[0][0]), xlens[b])
@@ -59,6 +59,10 @@ def make_args(**kwargs):
         ({'ctc_weight': 0.5}),
         ({'ctc_weight': 1.0}),
         ({'ctc_weight': 1.0, 'ctc_lsm_prob': 0.0}),
+        # native Transducer loss
+        ({'loss_impl': 'native', 'ctc_weight': 0.}),
+        ({'loss_impl': 'native', 'ctc_weight': 0., 'loss_chunk_size': 7}),
+        ({'loss_impl': 'native', 'ctc_weight': 0., 'loss_chunk_size': 0}),
     ]
 )
 def test_forward(args):
@@ -86,6 +90,120 @@ def test_forward(args):
     assert isinstance(observation, dict)
 
 
+def make_batch_transducer(device="cpu"):
+    torch.manual_seed(1)
+    xlens = [40, 33, 12, 25]
+    ylens = [4, 5, 3, 7]
+    eouts = torch.randn(len(xlens), max(xlens), ENC_N_UNITS, device=device, requires_grad=True)
+    elens = torch.IntTensor(xlens)
+    ys = [torch.randint(4, VOCAB, (ylen,)).tolist() for ylen in ylens]
+    return eouts, elens, ys
+
+
+def transducer_loss_full(dec, eouts, elens, ys):
+    """Native Transducer loss computed from the full output distribution without chunking."""
+    from neural_sp.models.criterion import transducer_loss
+
+    _ys = [torch.LongTensor(y) for y in ys]
+    ylens = torch.IntTensor([len(y) for y in ys])
+    eos = torch.LongTensor([dec.eos])
+    ys_in = pad_list([torch.cat([eos, y], dim=0) for y in _ys], dec.pad)
+    ys_out = pad_list(_ys, dec.blank)
+    dout, _ = dec.recurrency(dec.embed_token_id(ys_in), None)
+    log_probs = torch.log_softmax(dec.joint(eouts, dout), dim=-1)
+    log_probs_blank = log_probs[:, :, :, dec.blank]
+    index = ys_out[:, None, :, None].expand(-1, log_probs.size(1), -1, -1)
+    log_probs_label = torch.gather(log_probs[:, :, :-1], 3, index).squeeze(3)
+    return transducer_loss(log_probs_blank, log_probs_label, elens, ylens).mean()
+
+
+def check_same_loss_and_grads(dec, loss, dec_ref, loss_ref, eouts, eouts_ref):
+    assert torch.allclose(loss, loss_ref, rtol=1e-4)
+    assert torch.allclose(eouts.grad, eouts_ref.grad, atol=1e-5)
+    params_ref = dict(dec_ref.named_parameters())
+    for n, p in dec.named_parameters():
+        if p.grad is None:
+            assert params_ref[n].grad is None or (params_ref[n].grad == 0).all()
+        else:
+            assert torch.allclose(p.grad, params_ref[n].grad, atol=1e-5), n
+
+
+@pytest.mark.parametrize("loss_chunk_size", [0, 1, 7, 100])
+def test_native_transducer_loss(loss_chunk_size):
+    args = make_args(loss_impl='native', loss_chunk_size=loss_chunk_size,
+                     ctc_weight=0., dropout=0., dropout_emb=0.)
+    eouts, elens, ys = make_batch_transducer()
+    eouts_ref = eouts.detach().clone().requires_grad_()
+
+    module = importlib.import_module('neural_sp.models.seq2seq.decoders.rnn_transducer')
+    dec = module.RNNTransducer(**args)
+    dec_ref = module.RNNTransducer(**args)
+    dec_ref.load_state_dict(dec.state_dict())
+
+    # chunked joint network with checkpointing
+    loss = dec.forward_transducer(eouts, elens, ys)
+    loss.backward()
+    # whole output distribution
+    loss_ref = transducer_loss_full(dec_ref, eouts_ref, elens, ys)
+    loss_ref.backward()
+    check_same_loss_and_grads(dec, loss, dec_ref, loss_ref, eouts, eouts_ref)
+
+
+@pytest.mark.parametrize("loss_chunk_size", [0, 7])
+def test_native_vs_warp_transducer_loss(loss_chunk_size):
+    pytest.importorskip('warprnnt_pytorch')
+    args = make_args(ctc_weight=0., dropout=0., dropout_emb=0.)
+    eouts, elens, ys = make_batch_transducer()
+    eouts_ref = eouts.detach().clone().requires_grad_()
+
+    module = importlib.import_module('neural_sp.models.seq2seq.decoders.rnn_transducer')
+    dec = module.RNNTransducer(loss_impl='native', loss_chunk_size=loss_chunk_size, **args)
+    dec_ref = module.RNNTransducer(**args)  # default implementation
+    dec_ref.load_state_dict(dec.state_dict())
+
+    loss = dec.forward_transducer(eouts, elens, ys)
+    loss.backward()
+    loss_ref = dec_ref.forward_transducer(eouts_ref, elens, ys)
+    loss_ref.backward()
+    check_same_loss_and_grads(dec, loss, dec_ref, loss_ref, eouts, eouts_ref)
+
+
+def transducer_loss_naive(log_probs_blank, log_probs_label, xlen, ylen):
+    alpha = np.full((xlen, ylen + 1), -np.inf)
+    alpha[0, 0] = 0
+    for t in range(xlen):
+        for u in range(ylen + 1):
+            if t > 0:
+                alpha[t, u] = np.logaddexp(alpha[t, u], alpha[t - 1, u] + log_probs_blank[t - 1, u])
+            if u > 0:
+                alpha[t, u] = np.logaddexp(alpha[t, u], alpha[t, u - 1] + log_probs_label[t, u - 1])
+    return -(alpha[xlen - 1, ylen] + log_probs_blank[xlen - 1, ylen])
+
+
+def test_transducer_loss():
+    from neural_sp.models.criterion import transducer_loss
+
+    xlens = [12, 9, 5, 1]
+    ylens = [4, 5, 0, 2]
+    log_probs = torch.log_softmax(torch.randn(len(xlens), max(xlens), max(ylens) + 1, VOCAB), dim=-1)
+    log_probs_blank = log_probs[:, :, :, 0].clone().requires_grad_()
+    log_probs_label = log_probs[:, :, :-1, 1].clone().requires_grad_()
+
+    loss = transducer_loss(log_probs_blank, log_probs_label, torch.IntTensor(xlens), torch.IntTensor(ylens))
+    assert loss.size() == (len(xlens),)
+    for b in range(len(xlens)):
+        loss_b = transducer_loss_naive(log_probs_blank[b].detach().numpy(), log_probs_label[b].detach().numpy(),
+                                       xlens[b], ylens[b])
+        assert np.allclose(loss[b].item(), loss_b, rtol=1e-4)
+
+    loss.sum().backward()
+    assert torch.isfinite(log_probs_blank.grad).all()
+    assert torch.isfinite(log_probs_label.grad).all()
+    # padded frames/labels do not contribute to the loss
+    assert (log_probs_blank.grad[2, 5:] == 0).all()
+    assert (log_probs_label.grad[0, :, 4:] == 0).all()
+
+
 def make_decode_params(**kwargs):
     args = dict(
         recog_batch_size=1,
@@ -212,3 +330,32 @@ def test_decoding(params):
             assert len(nbest_hyps[0]) == params['nbest']
             assert aws is None
             assert scores is None
+
+
+@pytest.mark.parametrize("rnn_type", ['lstm_transducer', 'gru_transducer'])
+@pytest.mark.parametrize("max_symbols_per_frame", [1, 3])
+def test_batch_greedy(rnn_type, max_symbols_per_frame):
+    args = make_args(rnn_type=rnn_type)
+    device = "cpu"
+
+    xlens = [40, 35, 30, 20]
+    eouts = [np.random.randn(xlen, ENC_N_UNITS).astype(np.float32) for xlen in xlens]
+    elens = torch.IntTensor([len(x) for x in eouts])
+    eouts = pad_list([np2tensor(x, device).float() for x in eouts], 0.)
+
+    module = importlib.import_module('neural_sp.models.seq2seq.decoders.rnn_transducer')
+    dec = module.RNNTransducer(**args)
+    dec = dec.to(device)
+
+    dec.eval()
+    with torch.no_grad():
+        hyps, _ = dec.greedy(eouts, elens, max_len_ratio=1.0, idx2token=None,
+                             max_symbols_per_frame=max_symbols_per_frame)
+        # should be consistent with decoding utterance by utterance
+        for b in range(len(xlens)):
+            hyps_b, _ = dec.greedy(eouts[b:b + 1, :xlens[b]], elens[b:b + 1],
+                                   max_len_ratio=1.0, idx2token=None,
+                                   max_symbols_per_frame=max_symbols_per_frame)
+            assert hyps[b] == hyps_b[0]
+            if max_symbols_per_frame == 1:
+                assert len(hyps[b]) <= xlens[b]
@@ -0,0 +1,273 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for incremental streaming recognition sessions."""
+
+import numpy as np
+import pickle
+import pytest
+import torch
+
+from neural_sp.bin.args_asr import (
+    build_parser,
+    register_args_decoder,
+    register_args_encoder
+)
+from neural_sp.models.seq2seq.speech2text import Speech2Text
+from neural_sp.models.seq2seq import streaming_session
+from neural_sp.models.seq2seq.streaming_session import (
+    StreamingScheduler,
+    StreamingSession
+)
+
+INPUT_DIM = 8
+VOCAB = 10
+
+ENC_TYPES = ['lstm', 'blstm', 'conv_uni_transformer']
+
+_models = {}
+
+
+def make_utterance(rng, xlen, silences):
+    """Make a synthetic utterance whose first feature dimension indicates silence."""
+    x = rng.randn(xlen, INPUT_DIM).astype(np.float32)
+    x[:, 0] = -3.
+    for s, e in silences:
+        x[s:e] = 0.
+        x[s:e, 0] = 3.
+    return x
+
+
+def make_model(enc_type):
+    if enc_type in _models:
+        return _models[enc_type]
+
+    model_args = ['--enc_type', enc_type, '--enc_n_layers', '2', '--enc_n_units', '16',
+                  '--subsample', '1_2', '--subsample_type', 'drop', '--ctc_weight', '1.0',
+                  '--recog_block_sync', 'true', '--recog_block_sync_size', '8',
+                  '--recog_beam_width', '2', '--recog_ctc_vad', 'true',
+                  '--recog_ctc_vad_n_accum_frames', '16', '--recog_ctc_vad_blank_threshold', '8']
+    if enc_type == 'blstm':
+        model_args += ['--lc_chunk_size_left', '8', '--lc_chunk_size_right', '4']
+    if 'conv' in enc_type:
+        model_args += ['--subsample', '1_1', '--conv_channels', '4', '--conv_kernel_sizes', '(3,3)',
+                       '--conv_strides', '(1,1)', '--conv_poolings', '(2,2)']
+    if 'transformer' in enc_type:
+        model_args += ['--transformer_enc_d_model', '16', '--transformer_enc_d_ff', '32',
+                       '--transformer_enc_n_heads', '2']
+    p = build_parser()
+    model_conf = p.parse_known_args(model_args)[0]
+    p = register_args_encoder(p, model_conf, enc_type)
+    p = register_args_decoder(p, model_conf, model_conf.dec_type)
+    model_conf = p.parse_known_args(model_args)[0]
+    model_conf.input_dim = INPUT_DIM
+    model_conf.vocab = VOCAB
+    model_conf.vocab_sub1 = 0
+    model_conf.vocab_sub2 = 0
+    torch.manual_seed(1)
+    model = Speech2Text(model_conf)
+    model.eval()
+
+    # NOTE: CTC posteriors of a randomly initialized model do not depend on inputs.
+    # Fit the blank logit to the silence regions so that CTC-VAD is triggered by inputs.
+    rng = np.random.RandomState(0)
+    silences = [(50, 100), (200, 260), (330, 400)]
+    x = make_utterance(rng, 400, silences)
+    labels = -np.ones(400, dtype=np.float32)
+    for s, e in silences:
+        labels[s:e] = 1.
+    with torch.no_grad():
+        eout = model.encode([x], 'ys')['ys']['xs'][0].numpy()
+    labels = labels[::model.enc.subsampling_factor][:eout.shape[0]]
+    A = np.concatenate([eout, np.ones((eout.shape[0], 1), dtype=np.float32)], axis=1)
+    sol = np.linalg.lstsq(A, labels, rcond=None)[0] * 20
+    with torch.no_grad():
+        model.dec_fwd.ctc.output.weight[0] = torch.from_numpy(sol[:-1]).float()
+        model.dec_fwd.ctc.output.bias[0] = float(sol[-1])
+
+    _models[enc_type] = (model, vars(model_conf))
+    return _models[enc_type]
+
+
+def decode_whole(model, params, x):
+    session = StreamingSession(model, params)
+    results = session.push(x) + session.finish()
+    return session.result(), results
+
+
+def push_chunks(session, x, push_size):
+    results = []
+    for t in range(0, len(x), push_size):
+        results += session.push(x[t:t + push_size])
+    return results
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+@pytest.mark.parametrize("push_size", [1, 7, 16, 1000])
+def test_push(enc_type, push_size):
+    model, params = make_model(enc_type)
+    x = make_utterance(np.random.RandomState(1), 150, [(60, 90)])
+
+    best_hyps_id, _ = model.decode_streaming([x], params, None)
+    ref = best_hyps_id[0][0]
+
+    session = StreamingSession(model, params)
+    results = push_chunks(session, x, push_size)
+    results += session.finish()
+    assert session.is_done
+    assert len(session.result()) > 0
+    assert list(session.result()) == list(ref)
+    assert list(results[-1]['hyp']) == list(ref)
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+@pytest.mark.parametrize("n_frames_before", [8, 45, 100])
+def test_state_dict(enc_type, n_frames_before):
+    model, params = make_model(enc_type)
+    x = make_utterance(np.random.RandomState(1), 150, [(60, 90)])
+    ref, _ = decode_whole(model, params, x)
+
+    session = StreamingSession(model, params)
+    results = push_chunks(session, x[:n_frames_before], 5)
+
+    # save halfway through the stream
+    state = pickle.loads(pickle.dumps(session.state_dict()))
+
+    # the original session is not affected by saving
+    results_restored = list(results)
+    results += push_chunks(session, x[n_frames_before:], 5)
+    results += session.finish()
+    assert list(session.result()) == list(ref)
+
+    # restore after the model has been used by the other session
+    session_restored = StreamingSession(model, params)
+    session_restored.load_state_dict(state)
+    assert session_restored.latencies == session.latencies[:len(results_restored)]
+    results_restored += push_chunks(session_restored, x[n_frames_before:], 5)
+    results_restored += session_restored.finish()
+    assert list(session_restored.result()) == list(ref)
+    assert [(r['start'], r['end'], r['is_final']) for r in results] == \
+        [(r['start'], r['end'], r['is_final']) for r in results_restored]
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+def test_interleaved_sessions(enc_type):
+    model, params = make_model(enc_type)
+    rng = np.random.RandomState(1)
+    xs = [make_utterance(rng, 150, [(60, 90)]),
+          make_utterance(rng, 110, [])]
+    refs = [decode_whole(model, params, x)[0] for x in xs]
+
+    sessions = [StreamingSession(model, params) for _ in xs]
+    for t in range(0, max(len(x) for x in xs), 6):
+        for x, session in zip(xs, sessions):
+            if t < len(x):
+                session.push(x[t:t + 6])
+    for session in sessions:
+        session.finish()
+
+    for session, ref in zip(sessions, refs):
+        assert list(session.result()) == list(ref)
+    assert list(refs[0]) != list(refs[1])
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+def test_ctc_vad_reset(enc_type):
+    model, params = make_model(enc_type)
+    silences = [(30, 70), (140, 170)]
+    x = make_utterance(np.random.RandomState(1), 200, silences)
+    ref, results_ref = decode_whole(model, params, x)
+    resets_ref = [r['end'] for r in results_ref if r['is_final']]
+    assert len(resets_ref) > 0
+    # resets are triggered by the silence regions
+    for t in resets_ref:
+        assert any(s <= t <= e + params['recog_block_sync_size'] for s, e in silences)
+
+    # push fewer frames than a block at once so that blank counts are carried over
+    session = StreamingSession(model, params)
+    results = push_chunks(session, x, 3)
+    resets_online = [r['end'] for r in results if r['is_final']]
+    results += session.finish()
+    assert len(resets_online) > 0
+    assert [r['end'] for r in results if r['is_final']] == resets_ref
+    assert list(session.result()) == list(ref)
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+def test_latency(enc_type):
+    model, params = make_model(enc_type)
+    x = make_utterance(np.random.RandomState(1), 150, [(60, 90)])
+
+    session = StreamingSession(model, params)
+    results = push_chunks(session, x, 10)
+    results += session.finish()
+    assert len(results) > 1
+    assert len(session.latencies) == len(results)
+    for r, latency in zip(results, session.latencies):
+        assert r['latency'] == latency
+        assert latency >= 0
+    assert results[0]['start'] == 0
+    for r_prev, r in zip(results[:-1], results[1:]):
+        assert r['start'] == r_prev['end']
+
+
+@pytest.mark.parametrize("enc_type", ENC_TYPES)
+@pytest.mark.parametrize("max_batch_size", [2, 100])
+def test_scheduler(enc_type, max_batch_size, monkeypatch):
+    model, params = make_model(enc_type)
+    rng = np.random.RandomState(1)
+    # (length, silences, push size, number of steps before starting)
+    streams = [(150, [(60, 90)], 5, 0),
+               (200, [(30, 70), (140, 170)], 8, 0),
+               (90, [], 3, 4),
+               (170, [(100, 150)], 10, 2),
+               (120, [(20, 50)], 7, 9)]
+    xs = [make_utterance(rng, xlen, silences) for xlen, silences, _, _ in streams]
+
+    # decode each stream one after another
+    refs, resets_refs = [], []
+    for x in xs:
+        ref, results_ref = decode_whole(model, params, x)
+        refs.append(ref)
+        resets_refs.append([r['end'] for r in results_ref if r['is_final']])
+    assert len(set(tuple(resets) for resets in resets_refs)) == len(streams)
+
+    # decode all streams concurrently
+    batch_sizes = []
+    encode_blocks = streaming_session._encode_blocks
+
+    def _encode_blocks(model, sessions, blocks):
+        batch_sizes.append(len(sessions))
+        return encode_blocks(model, sessions, blocks)
+
+    monkeypatch.setattr(streaming_session, '_encode_blocks', _encode_blocks)
+    scheduler = StreamingScheduler(model, params, max_batch_size=max_batch_size)
+    session_ids = [None] * len(streams)
+    offsets = [0] * len(streams)
+    results = {}
+    step = 0
+    while True:
+        for i, (x, (_, _, push_size, start_step)) in enumerate(zip(xs, streams)):
+            if step < start_step or offsets[i] > len(x):
+                continue
+            if session_ids[i] is None:
+                session_ids[i] = scheduler.open()
+                results[session_ids[i]] = []
+            scheduler.push(session_ids[i], x[offsets[i]:offsets[i] + push_size])
+            offsets[i] += push_size
+            if offsets[i] >= len(x):
+                scheduler.finish(session_ids[i])
+                offsets[i] = len(x) + 1
+        for session_id, result in scheduler.step().items():
+            results[session_id].append(result)
+        step += 1
+        if all(offset > len(x) for offset, x in zip(offsets, xs)) and \
+                not any(session.ready() for session in scheduler.sessions.values()):
+            break
+
+    for session_id, ref, resets_ref in zip(session_ids, refs, resets_refs):
+        assert scheduler.sessions[session_id].is_done
+        assert [r['end'] for r in results[session_id] if r['is_final']] == resets_ref
+        assert list(scheduler.close(session_id)) == list(ref)
+    assert scheduler.n_active == 0
+    assert 1 < max(batch_sizes) <= max_batch_size
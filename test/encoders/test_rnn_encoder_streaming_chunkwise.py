@@ -193,3 +193,49 @@ def test_forward_streaming_chunkwise(args):
         assert eout_all.size() == eouts_chunk_cat.size()
         assert torch.allclose(eout_all, eouts_chunk_cat, atol=atol)
         assert torch.equal(elens_all, elens_chunk_cat), (elens_all, elens_chunk_cat)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'enc_type': 'lstm'}),
+        ({'enc_type': 'gru'}),
+        ({'enc_type': 'conv_lstm'}),
+        ({'enc_type': 'blstm', 'chunk_size_current': "16", 'chunk_size_right': "8"}),
+    ]
+)
+def test_forward_streaming_batched_cache(args):
+    args = make_args(**args)
+    module = importlib.import_module('neural_sp.models.seq2seq.encoders.rnn')
+    enc = module.RNNEncoder(**args)
+    enc.eval()
+
+    n_streams = 3
+    n_chunks = 4
+    chunk_size = 24  # including the right context
+    xs = torch.randn(n_streams, n_chunks, chunk_size, args['input_dim'])
+    xlens = torch.IntTensor([chunk_size] * n_streams)
+
+    caches = [None] * n_streams
+    cache_batch = None
+    with torch.no_grad():
+        for chunk_idx in range(n_chunks):
+            # encode each stream one by one
+            eouts = []
+            for b in range(n_streams):
+                enc.reset_cache()
+                if caches[b] is not None:
+                    enc.set_cache(caches[b])
+                eouts.append(enc(xs[b:b + 1, chunk_idx], xlens[b:b + 1], task='all',
+                                 streaming=True)['ys']['xs'])
+                caches[b] = enc.get_cache()
+
+            # encode all streams at once
+            enc.reset_cache()
+            if cache_batch is not None:
+                assert len(set([enc.cache_signature(cache) for cache in cache_batch])) == 1
+                enc.set_cache(enc.concat_cache(cache_batch))
+            eout_batch = enc(xs[:, chunk_idx], xlens, task='all', streaming=True)['ys']['xs']
+            cache_batch = [enc.select_cache(enc.get_cache(), b) for b in range(n_streams)]
+
+            assert torch.allclose(torch.cat(eouts, dim=0), eout_batch, atol=1e-05)
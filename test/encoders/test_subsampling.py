@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for subsampling layers."""
+
+import importlib
+import math
+import pytest
+import torch
+
+from neural_sp.models.torch_utils import make_pad_mask
+
+
+def make_args(**kwargs):
+    args = dict(
+        subsampling_factor=2,
+        n_units=16,
+    )
+    args.update(kwargs)
+    return args
+
+
+def concat_reference(module, xs):
+    """Frame-by-frame implementation used as reference (time-first)."""
+    xs = [torch.cat([xs[t - r:t - r + 1] for r in range(module.factor - 1, -1, -1)], dim=-1)
+          for t in range(xs.size(0)) if (t + 1) % module.factor == 0]
+    return torch.relu(module.proj(torch.cat(xs, dim=0)))
+
+
+def add_reference(xs):
+    xmax, bs, idim = xs.size()
+    xs_even = xs[::2]
+    if xmax % 2 == 0:
+        xs_odd = xs[1::2]
+    else:
+        xs_odd = torch.cat([xs, xs.new_zeros(1, bs, idim)], dim=0)[1::2]
+    return xs_odd + xs_even
+
+
+@pytest.mark.parametrize(
+    "subsample_type, args",
+    [
+        ('concat', {'subsampling_factor': 2}),
+        ('concat', {'subsampling_factor': 3}),
+        ('drop', {'subsampling_factor': 2}),
+        ('drop', {'subsampling_factor': 4}),
+        ('add', {'subsampling_factor': 2}),
+        ('max_pool', {'subsampling_factor': 2}),
+        ('max_pool', {'subsampling_factor': 3}),
+        ('1dconv', {'subsampling_factor': 2}),
+        ('1dconv', {'subsampling_factor': 4}),
+    ]
+)
+def test_forward(subsample_type, args):
+    args = make_args(**args)
+    factor = args['subsampling_factor']
+
+    batch_size = 4
+    device = "cpu"
+
+    module = importlib.import_module('neural_sp.models.seq2seq.encoders.subsampling')
+    if subsample_type == 'concat':
+        subsampler = module.ConcatSubsampler(factor, args['n_units'])
+    elif subsample_type == 'drop':
+        subsampler = module.DropSubsampler(factor)
+    elif subsample_type == 'add':
+        subsampler = module.AddSubsampler(factor)
+    elif subsample_type == 'max_pool':
+        subsampler = module.MaxpoolSubsampler(factor)
+    elif subsample_type == '1dconv':
+        subsampler = module.Conv1dSubsampler(factor, args['n_units'])
+    subsampler = subsampler.to(device)
+
+    for xmax in [39, 40, 41]:
+        xlens = torch.IntTensor([xmax - i for i in range(batch_size)])
+        xs = torch.randn(batch_size, xmax, args['n_units'], device=device)
+        xs = xs.masked_fill(~make_pad_mask(xlens).unsqueeze(2), 0)
+
+        out, out_lens = subsampler(xs, xlens, batch_first=True)
+        out_tf, out_lens_tf = subsampler(xs.transpose(1, 0).contiguous(), xlens, batch_first=False)
+        assert torch.allclose(out, out_tf.transpose(1, 0), atol=1e-6)
+        assert torch.equal(out_lens, out_lens_tf)
+        assert out_lens.dtype == torch.int32
+
+        if subsample_type == 'concat':
+            assert out.size(1) == xmax // factor
+            assert torch.allclose(out_tf, concat_reference(subsampler, xs.transpose(1, 0)), atol=1e-6)
+            assert out_lens.tolist() == [max(1, xlen // factor) for xlen in xlens.tolist()]
+        elif subsample_type in ['drop', 'add']:
+            assert out.size(1) == math.ceil(xmax / factor)
+            assert out_lens.tolist() == [max(1, math.ceil(xlen / factor)) for xlen in xlens.tolist()]
+            if subsample_type == 'add':
+                assert torch.equal(out_tf, add_reference(xs.transpose(1, 0)))
+        else:
+            assert out.size(1) == math.ceil(xmax / factor)
+            assert out_lens.tolist() == [math.ceil(xlen / factor) for xlen in xlens.tolist()]
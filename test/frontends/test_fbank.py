@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for on-the-fly log-mel filterbank features and CMVN."""
+
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.seq2seq.frontends.cmvn import CMVN
+from neural_sp.models.seq2seq.frontends.fbank import (
+    LogMelFbank,
+    StreamingFbank,
+    WavFrontend
+)
+
+SAMPLE_RATE = 16000
+
+
+def make_wav(n_samples):
+    np.random.seed(1)
+    return (np.random.randn(n_samples) * 3000).astype(np.float32)
+
+
+@pytest.mark.parametrize("n_mels", [40, 80])
+def test_mel_banks(n_mels):
+    fbank = LogMelFbank(n_mels, SAMPLE_RATE)
+    assert fbank.mel_banks.size() == (fbank.n_fft // 2 + 1, n_mels)
+    assert (fbank.mel_banks[-1] == 0).all()
+    assert (fbank.mel_banks.sum(0) > 0).all()
+
+    for n_samples in [0, 399, 400, 559, 560, 16000]:
+        wav = make_wav(n_samples)
+        xs, xlens = fbank(torch.from_numpy(wav).unsqueeze(0))
+        assert xs.size() == (1, fbank.n_frames(n_samples), n_mels)
+        assert xlens.tolist() == [fbank.n_frames(n_samples)]
+
+
+def test_kaldi_compatibility():
+    kaldi = pytest.importorskip("torchaudio.compliance.kaldi")
+    wav = make_wav(SAMPLE_RATE)
+    fbank = LogMelFbank(80, SAMPLE_RATE)
+    xs, _ = fbank(torch.from_numpy(wav).unsqueeze(0))
+    xs_ref = kaldi.fbank(torch.from_numpy(wav).unsqueeze(0), num_mel_bins=80, dither=0.,
+                         sample_frequency=SAMPLE_RATE)
+    assert xs[0].size() == xs_ref.size()
+    assert torch.allclose(xs[0], xs_ref, atol=1e-3)
+
+
+def test_batch_extraction():
+    frontend = WavFrontend(80, cmvn='utterance')
+    wavs = [make_wav(n_samples) for n_samples in [16000, 8000, 12345]]
+    xlens = torch.IntTensor([len(wav) for wav in wavs])
+    xs_pad = torch.zeros(len(wavs), max(xlens))
+    for b, wav in enumerate(wavs):
+        xs_pad[b, :len(wav)] = torch.from_numpy(wav)
+    xs, xlens = frontend(xs_pad, xlens)
+
+    # padded samples must not affect features (and statistics) of shorter utterances
+    for b, wav in enumerate(wavs):
+        x = frontend.extract(wav)
+        assert x.shape[0] == xlens[b]
+        assert np.allclose(xs[b, :xlens[b]].numpy(), x, atol=1e-4)
+
+
+@pytest.mark.parametrize("cmvn", ['none', 'global'])
+def test_streaming_extraction(cmvn):
+    wav = make_wav(SAMPLE_RATE * 2)
+    frontend = WavFrontend(80, cmvn='none')
+    if cmvn == 'global':
+        frontend.cmvn = CMVN(80)
+        frontend.cmvn.set_stats(CMVN.compute_stats([frontend.extract(wav)]))
+    x_whole = frontend.extract(wav)
+
+    np.random.seed(0)
+    stream = StreamingFbank(frontend)
+    xs = []
+    offset = 0
+    while offset < len(wav):
+        chunk_size = np.random.randint(1, 1000)
+        xs.append(stream(wav[offset:offset + chunk_size]))
+        offset += chunk_size
+    x_stream = np.concatenate(xs, axis=0)
+    assert x_stream.shape == x_whole.shape
+    assert np.allclose(x_stream, x_whole, atol=1e-4)
+
+
+@pytest.mark.parametrize("norm_means, norm_vars", [(True, True), (True, False)])
+def test_cmvn(norm_means, norm_vars):
+    np.random.seed(1)
+    xs = [(np.random.randn(xlen, 10) * 3 + 5).astype(np.float32) for xlen in [100, 200, 50]]
+    stats = CMVN.compute_stats(xs)
+    assert stats[0, -1] == 350
+
+    cmvn = CMVN(10, norm_means, norm_vars)
+    cmvn.set_stats(stats)
+    x_all = torch.from_numpy(np.concatenate(xs, axis=0)).unsqueeze(0)
+    x_norm = cmvn(x_all)[0]
+    assert torch.allclose(x_norm.mean(0), torch.zeros(10), atol=1e-4)
+    std = x_norm.std(0, unbiased=False)
+    if norm_vars:
+        assert torch.allclose(std, torch.ones(10), atol=1e-4)
+    else:
+        assert torch.allclose(std, x_all[0].std(0, unbiased=False), atol=1e-4)
+
+    # utterance CMVN with padding
+    cmvn = CMVN(10, norm_means, norm_vars, utterance=True)
+    xs_pad = torch.zeros(len(xs), 200, 10)
+    for b, x in enumerate(xs):
+        xs_pad[b, :len(x)] = torch.from_numpy(x)
+    xs_norm = cmvn(xs_pad, torch.IntTensor([len(x) for x in xs]))
+    for b, x in enumerate(xs):
+        assert torch.allclose(xs_norm[b, :len(x)].mean(0), torch.zeros(10), atol=1e-4)
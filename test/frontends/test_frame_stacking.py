@@ -7,6 +7,7 @@ import importlib
 import math
 import numpy as np
 import pytest
+import torch
 
 from neural_sp.models.torch_utils import np2tensor
 from neural_sp.models.torch_utils import pad_list
@@ -50,3 +51,67 @@ def test_forward(args):
     assert out_pad.size(0) == xs_pad.size(0)
     assert out_pad.size(1) == math.ceil(xs_pad.size(1) / args['n_skips'])
     assert out_pad.size(2) == xs_pad.size(2) * args['n_stacks']
+
+
+def stack_frame_reference(x, n_stacks, n_skips):
+    """Frame-by-frame implementation used as reference."""
+    T, input_dim = x.shape
+    T_new = T // n_skips if T % n_stacks == 0 else (T // n_skips) + 1
+
+    stacked_feat = np.zeros((T_new, input_dim * n_stacks), dtype=np.float32)
+    stack_count = 0
+    stack = []
+    for t, frame_t in enumerate(x):
+        if t == len(x) - 1:  # final frame
+            stack.append(frame_t)
+            while stack_count != int(T_new):
+                for i in range(len(stack)):
+                    stacked_feat[stack_count][input_dim * i:input_dim * (i + 1)] = stack[i]
+                stack_count += 1
+                for _ in range(n_skips):
+                    if len(stack) != 0:
+                        stack.pop(0)
+        elif len(stack) < n_stacks:  # first & middle frames
+            stack.append(frame_t)
+
+        if len(stack) == n_stacks:
+            for i in range(n_stacks):
+                stacked_feat[stack_count][input_dim * i:input_dim * (i + 1)] = stack[i]
+            stack_count += 1
+            for _ in range(n_skips):
+                stack.pop(0)
+
+    return stacked_feat
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'n_stacks': 2, 'n_skips': 2}),
+        ({'n_stacks': 3, 'n_skips': 3}),
+        ({'n_stacks': 3, 'n_skips': 1}),
+        ({'n_stacks': 4, 'n_skips': 2}),
+        ({'n_stacks': 6, 'n_skips': 4}),
+    ]
+)
+def test_equivalence(args):
+    args = make_args(**args)
+
+    input_dim = 8
+    device = "cpu"
+    xlens = [1, 2, 5, 6, 7, 12, 13, 23]
+
+    xs = [np.random.randn(xlen, input_dim).astype(np.float32) for xlen in xlens]
+    refs = [stack_frame_reference(x, args['n_stacks'], args['n_skips']) for x in xs]
+
+    module = importlib.import_module('neural_sp.models.seq2seq.frontends.frame_stacking')
+    for x, ref in zip(xs, refs):
+        assert np.array_equal(module.stack_frame(x, args['n_stacks'], args['n_skips']), ref)
+
+    # padded mini-batch
+    xs_pad = pad_list([np2tensor(x, device).float() for x in xs], 1.)  # padding must be ignored
+    out_pad, out_lens = module.stack_frame_batch(xs_pad, torch.IntTensor(xlens),
+                                                 args['n_stacks'], args['n_skips'])
+    ref_pad = pad_list([np2tensor(ref, device).float() for ref in refs], 0.)
+    assert out_lens.tolist() == [len(ref) for ref in refs]
+    assert torch.equal(out_pad, ref_pad)
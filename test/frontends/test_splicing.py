@@ -7,6 +7,7 @@ import importlib
 import math
 import numpy as np
 import pytest
+import torch
 
 from neural_sp.models.torch_utils import np2tensor
 from neural_sp.models.torch_utils import pad_list
@@ -63,3 +64,60 @@ def test_forward(args):
     assert out_pad.size(0) == xs_pad.size(0)
     assert out_pad.size(1) == math.ceil(xs_pad.size(1) / args['n_stacks'])
     assert out_pad.size(2) == xs_pad.size(2) * args['n_splices'] * args['n_stacks']
+
+
+def splice_reference(x, n_splices, n_stacks):
+    """Frame-by-frame implementation used as reference."""
+    is_delta = ((x.shape[-1] // n_stacks) % 3 == 0)
+    n_delta = 3 if is_delta else 1
+
+    T, input_dim = x.shape
+    F = (input_dim // n_delta) // n_stacks
+    feat_splice = np.zeros((T, F * (n_splices * n_stacks) * n_delta), dtype=np.float32)
+
+    for i_time in range(T):
+        spliced_frames = np.zeros((n_splices * n_stacks, F, n_delta))
+        for i_splice in range(0, n_splices, 1):
+            if i_time <= n_splices - 1 and i_splice < n_splices - i_time:
+                copy_frame = x[0]
+            elif T - n_splices <= i_time and i_time + (i_splice - n_splices) > T - 1:
+                copy_frame = x[-1]
+            else:
+                copy_frame = x[i_time + (i_splice - n_splices)]
+            copy_frame = copy_frame.reshape((F, n_delta, n_stacks))
+            copy_frame = np.transpose(copy_frame, (2, 0, 1))
+            spliced_frames[i_splice: i_splice + n_stacks] = copy_frame
+        spliced_frames = np.transpose(spliced_frames, (1, 0, 2))
+        feat_splice[i_time] = spliced_frames.reshape((F * (n_splices * n_stacks) * n_delta))
+
+    return feat_splice
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'n_splices': 2, 'n_stacks': 1, 'input_dim': 8}),
+        ({'n_splices': 5, 'n_stacks': 1, 'input_dim': 8}),
+        ({'n_splices': 5, 'n_stacks': 3, 'input_dim': 24}),
+        ({'n_splices': 3, 'n_stacks': 2, 'input_dim': 12}),
+        ({'n_splices': 11, 'n_stacks': 1, 'input_dim': 12}),
+    ]
+)
+def test_equivalence(args):
+    args = make_args(**args)
+
+    device = "cpu"
+    xlens = [1, 3, 7, 12, 20]
+
+    xs = [np.random.randn(xlen, args['input_dim']).astype(np.float32) for xlen in xlens]
+    refs = [splice_reference(x, args['n_splices'], args['n_stacks']) for x in xs]
+
+    module = importlib.import_module('neural_sp.models.seq2seq.frontends.splicing')
+    for x, ref in zip(xs, refs):
+        assert np.array_equal(module.splice(x, args['n_splices'], args['n_stacks']), ref)
+
+    # padded mini-batch
+    xs_pad = pad_list([np2tensor(x, device).float() for x in xs], 1.)  # padding must be ignored
+    out_pad = module.splice_batch(xs_pad, torch.IntTensor(xlens), args['n_splices'], args['n_stacks'])
+    ref_pad = pad_list([np2tensor(ref, device).float() for ref in refs], 0.)
+    assert torch.equal(out_pad, ref_pad)
@@ -121,33 +121,28 @@ def make_decode_params(**kwargs):
     return args
 
 
-@pytest.mark.parametrize(
-    "args",
-    [
-        # no CNN, UniLSTM, LC-BLSTM
-        ({'enc_type': 'lstm'}),  # unidirectional
-        ({'enc_type': 'blstm', 'chunk_size_current': "20", 'chunk_size_right': "20"}),
-        # no CNN, Transformer
-        ({'enc_type': 'uni_transformer'}),
-        ({'enc_type': 'transformer', 'streaming_type': 'reshape',
-          'chunk_size_left': "16", 'chunk_size_current': "16", 'chunk_size_right': "16"}),
-        ({'enc_type': 'transformer', 'streaming_type': 'mask',
-          'chunk_size_left': "16", 'chunk_size_current': "16"}),
-        # w/ CNN
-        ({'enc_type': 'conv_lstm'}),  # unidirectional
-        ({'enc_type': 'conv_blstm', 'chunk_size_current': "20", 'chunk_size_right': "20"}),
-        ({'enc_type': 'conv_uni_transformer'}),
-        ({'enc_type': 'conv_transformer', 'streaming_type': 'reshape',
-          'chunk_size_left': "16", 'chunk_size_current': "16", 'chunk_size_right': "16"}),
-        ({'enc_type': 'conv_transformer', 'streaming_type': 'mask',
-          'chunk_size_left': "16", 'chunk_size_current': "16"}),
-    ]
-)
-def test_feature_extraction(args):
-
-    xmaxs = [t for t in range(80, 96, 3)]
-    device = "cpu"
-
+ENCODER_ARGS = [
+    # no CNN, UniLSTM, LC-BLSTM
+    ({'enc_type': 'lstm'}),  # unidirectional
+    ({'enc_type': 'blstm', 'chunk_size_current': "20", 'chunk_size_right': "20"}),
+    # no CNN, Transformer
+    ({'enc_type': 'uni_transformer'}),
+    ({'enc_type': 'transformer', 'streaming_type': 'reshape',
+      'chunk_size_left': "16", 'chunk_size_current': "16", 'chunk_size_right': "16"}),
+    ({'enc_type': 'transformer', 'streaming_type': 'mask',
+      'chunk_size_left': "16", 'chunk_size_current': "16"}),
+    # w/ CNN
+    ({'enc_type': 'conv_lstm'}),  # unidirectional
+    ({'enc_type': 'conv_blstm', 'chunk_size_current': "20", 'chunk_size_right': "20"}),
+    ({'enc_type': 'conv_uni_transformer'}),
+    ({'enc_type': 'conv_transformer', 'streaming_type': 'reshape',
+      'chunk_size_left': "16", 'chunk_size_current': "16", 'chunk_size_right': "16"}),
+    ({'enc_type': 'conv_transformer', 'streaming_type': 'mask',
+      'chunk_size_left': "16", 'chunk_size_current': "16"}),
+]
+
+
+def build_encoder(args, device="cpu"):
     if 'lstm' in args['enc_type']:
         args = make_rnn_args(**args)
         enc_module = importlib.import_module('neural_sp.models.seq2seq.encoders.rnn')
@@ -156,10 +151,16 @@ def test_feature_extraction(args):
         args = make_transformer_args(**args)
         enc_module = importlib.import_module('neural_sp.models.seq2seq.encoders.transformer')
         enc = enc_module.TransformerEncoder(**args).to(device)
+    return enc
+
+
+@pytest.mark.parametrize("args", ENCODER_ARGS)
+def test_feature_extraction(args):
+
+    xmaxs = [t for t in range(80, 96, 3)]
+
+    enc = build_encoder(args)
     decode_args = make_decode_params()
-    if args['enc_type'] in ['lstm', 'conv_lstm', 'uni_transformer', 'conv_uni_transformer']:
-        args['chunk_size_current'] = 4
-        # NOTE: do not set before model definition
 
     streaming_module = importlib.import_module('neural_sp.models.seq2seq.frontends.streaming')
 
@@ -195,3 +196,49 @@ def test_feature_extraction(args):
         xs_cat = np.concatenate(xs_cat, axis=0)
         # assert len(xs) == len(xs_cat)
         assert np.array_equal(xs, xs_cat[:len(xs)]), (xs - xs_cat)
+
+
+@pytest.mark.parametrize("args", ENCODER_ARGS)
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_online_feature_extraction(args, chunk_size):
+
+    xmax = 91
+    enc = build_encoder(args)
+    decode_args = make_decode_params()
+
+    streaming_module = importlib.import_module('neural_sp.models.seq2seq.frontends.streaming')
+
+    xs = np.arange(xmax)[:, None].astype(np.float32)
+    streaming = streaming_module.Streaming(xs, decode_args, enc)
+    blocks = []
+    while True:
+        blocks.append(streaming.extract_feature())
+        streaming.next_block()
+        if blocks[-1][1]:
+            break
+
+    # features arrive chunk by chunk
+    streaming = streaming_module.Streaming(xs[:0], decode_args, enc, is_finished=False)
+    blocks_online = []
+    for t in range(0, xmax, chunk_size):
+        streaming.append_feature(xs[t:t + chunk_size])
+        while streaming.block_ready():
+            blocks_online.append(streaming.extract_feature())
+            streaming.next_block()
+        # resume from the saved states
+        state = streaming.state_dict()
+        streaming = streaming_module.Streaming(xs[:0], decode_args, enc, is_finished=False)
+        streaming.load_state_dict(state)
+    streaming.finish()
+    while True:
+        blocks_online.append(streaming.extract_feature())
+        streaming.next_block()
+        if blocks_online[-1][1]:
+            break
+
+    assert len(blocks) == len(blocks_online)
+    for block, block_online in zip(blocks, blocks_online):
+        assert np.array_equal(block[0], block_online[0])
+        assert block[1:] == block_online[1:]
+    # old frames are released
+    assert len(streaming.x_whole) < xmax
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for GatedConvLM."""
+
+import argparse
+import importlib
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
+
+
+VOCAB = 100  # large for adaptive softmax
+
+
+def make_args(**kwargs):
+    args = dict(
+        lm_type='gated_conv_custom',
+        n_units=16,
+        n_projs=0,
+        n_layers=2,
+        kernel_size=4,
+        emb_dim=16,
+        vocab=VOCAB,
+        dropout_in=0.1,
+        dropout_hidden=0.1,
+        lsm_prob=0.0,
+        param_init=0.1,
+        adaptive_softmax=False,
+        tie_embedding=False,
+    )
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+@pytest.mark.parametrize(
+    "args", [
+        ({'n_layers': 1}),
+        ({'n_layers': 2}),
+        ({'kernel_size': 2}),
+        # projection
+        ({'n_projs': 8}),
+        # regularization
+        ({'lsm_prob': 0.1}),
+        # embedding
+        ({'adaptive_softmax': True}),
+        ({'tie_embedding': True}),
+    ]
+)
+def test_forward(args):
+    args = make_args(**args)
+
+    ylens = [4, 5, 3, 7] * 200
+    ys = [np.random.randint(0, VOCAB, ylen).astype(np.int64) for ylen in ylens]
+    device = "cpu"
+
+    module = importlib.import_module('neural_sp.models.lm.gated_convlm')
+    lm = module.GatedConvLM(args)
+    lm = lm.to(device)
+    loss, state, observation = lm(ys, state=None, n_caches=0)
+    assert loss.item() >= 0
+    assert isinstance(observation, dict)
+
+
+def test_predict():
+    args = make_args()
+    bs, ylen = 3, 6
+    ys = torch.randint(0, VOCAB, (bs, ylen), dtype=torch.int64)
+
+    module = importlib.import_module('neural_sp.models.lm.gated_convlm')
+    lm = module.GatedConvLM(args)
+    lm.eval()
+    with torch.no_grad():
+        _, _, log_probs = lm.predict(ys, None)
+
+        # incremental decoding from the token history
+        state = None
+        for t in range(ylen):
+            _, state, log_probs_t = lm.predict(ys[:, t:t + 1], state)
+            assert log_probs_t.size() == (bs, 1, VOCAB)
+            assert torch.allclose(log_probs_t[:, 0], log_probs[:, t], atol=1e-5)
+        assert lm.state_length(state) == ylen
+
+        # reorder/split/concat
+        y = torch.randint(0, VOCAB, (bs, 1), dtype=torch.int64)
+        index = torch.arange(bs - 1, -1, -1)
+        _, _, log_probs_ref = lm.predict(y, state)
+        _, _, log_probs_sel = lm.predict(y[index], lm.select_state(state, index))
+        state_cat = lm.concat_state([lm.select_state(state, j) for j in index.tolist()])
+        _, _, log_probs_cat = lm.predict(y[index], state_cat)
+        assert torch.allclose(log_probs_sel, log_probs_ref[index], atol=1e-5)
+        assert torch.allclose(log_probs_cat, log_probs_ref[index], atol=1e-5)
+
+        # hypotheses with token histories of different lengths are grouped
+        hyps = [{'lmstate': lm.select_state(state, 0)},
+                {'lmstate': None},
+                {'lmstate': lm.select_state(state, 1)}]
+        _, lmstates, scores_lm = BeamSearch.update_lm_state_batch(lm, hyps, y)
+        assert [lm.state_length(s) for s in lmstates] == [ylen + 1, 1, ylen + 1]
+        for j, beam in enumerate(hyps):
+            _, _, scores_lm_j = lm.predict(y[j:j + 1], beam['lmstate'])
+            assert torch.allclose(scores_lm[j:j + 1], scores_lm_j, atol=1e-5)
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for n-gram LM loaded from an ARPA file."""
+
+import gzip
+import numpy as np
+import pytest
+import torch
+
+from neural_sp.models.lm.ngram import (
+    load_arpa,
+    NgramLM
+)
+from neural_sp.models.seq2seq.decoders.ctc import CTC
+
+ARPA = """
+\\data\\
+ngram 1=6
+ngram 2=5
+ngram 3=4
+
+\\1-grams:
+-1.0\t<unk>\t0.0
+-99\t<s>\t-0.5
+-0.8\t</s>
+-0.6\ta\t-0.3
+-0.7\tb\t-0.2
+-0.9\tc\t-0.4
+
+\\2-grams:
+-0.3\t<s> a\t-0.1
+-0.4\ta b\t-0.2
+-0.5\tb a
+-0.2\tb </s>
+-0.6\tc b\t-0.25
+
+\\3-grams:
+-0.1\t<s> a b
+-0.2\ta b a
+-0.15\ta b </s>
+-0.35\tc b a
+
+\\end\\
+"""
+# <blank>: 0, "d" is not in the ARPA file
+TOKENS = ['<unk>', '<eos>', '<pad>', 'a', 'b', 'c', 'd']
+BLANK = 0
+EOS = 2
+PAD = 3
+LOG_10 = np.log(10.)
+ENC_N_UNITS = 16
+
+
+def make_lm(tmp_path, gz=False):
+    arpa_path = str(tmp_path / ('lm.arpa.gz' if gz else 'lm.arpa'))
+    with (gzip.open(arpa_path, 'wt', encoding='utf-8') if gz else open(arpa_path, 'w')) as f:
+        f.write(ARPA)
+    dict_path = str(tmp_path / 'dict.txt')
+    with open(dict_path, 'w') as f:
+        for idx, token in enumerate(TOKENS):
+            f.write('%s %d\n' % (token, idx + 1))
+    return NgramLM(arpa_path, dict_path), arpa_path
+
+
+def reference(arpa_path, ys):
+    """Compute log-probabilities of all tokens after `ys` with dictionaries."""
+    ngrams = load_arpa(arpa_path)
+    order = len(ngrams)
+    logps = {tuple(ws): p for n in range(order) for ws, p, _ in ngrams[n]}
+    bows = {tuple(ws): b for n in range(order) for ws, _, b in ngrams[n]}
+
+    def backoff(history, w):
+        if history + (w,) in logps:
+            return logps[history + (w,)]
+        return bows.get(history, 0.) + backoff(history[1:], w)
+
+    def to_word(y):
+        w = '</s>' if y == EOS else TOKENS[y - 1]
+        return w if (w,) in logps else '<unk>'
+
+    history = ()
+    for y in ys:
+        history = ('<s>',) if y == EOS else history + (to_word(y),)
+    history = history[len(history) - (order - 1):] if len(history) > order - 1 else history
+
+    scores = np.zeros(len(TOKENS) + 1)
+    for v in range(len(TOKENS) + 1):
+        if v in [BLANK, PAD]:
+            scores[v] = -1e10
+            continue
+        scores[v] = backoff(history, to_word(v)) * LOG_10
+    return scores
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_load(tmp_path, gz):
+    lm, _ = make_lm(tmp_path, gz)
+    assert lm.order == 3
+    assert lm.n_words == 6
+    assert lm.vocab == len(TOKENS) + 1
+    assert [len(keys) for keys in lm.keys[1:]] == [5, 4]
+    for keys in lm.keys[1:]:
+        assert (np.diff(keys) > 0).all()
+
+
+def test_predict(tmp_path):
+    lm, arpa_path = make_lm(tmp_path)
+    ys = torch.LongTensor([[EOS, 4, 5, 4, 5, 2, 7, 6, 5, 4, 1, 5, 4],
+                           [EOS, 6, 5, 4, 4, 5, 2, 4, 5, 6, 7, 5, 5]])
+
+    _, state, log_probs = lm.predict(ys, None)
+    assert log_probs.size() == (ys.size(0), ys.size(1), lm.vocab)
+    for b in range(ys.size(0)):
+        for i in range(ys.size(1)):
+            scores_ref = reference(arpa_path, ys[b, :i + 1].tolist())
+            assert np.allclose(log_probs[b, i].numpy(), scores_ref, atol=1e-4)
+
+    # incremental prediction with LM states
+    state = None
+    for i in range(ys.size(1)):
+        _, state, log_probs_i = lm.predict(ys[:, i:i + 1], state)
+        assert torch.allclose(log_probs_i[:, 0], log_probs[:, i])
+
+
+def test_forward(tmp_path):
+    lm, _ = make_lm(tmp_path)
+    ys = [np.array([4, 5, 4], dtype=np.int64)]
+    with pytest.raises(NotImplementedError, match='inference-only'):
+        lm(ys)
+
+
+def test_state(tmp_path):
+    lm, _ = make_lm(tmp_path)
+    ys = torch.LongTensor([[EOS, 4, 5], [EOS, 6, 5], [EOS, 7, 7]])
+    _, state, log_probs = lm.predict(ys, None)
+
+    states = [lm.select_state(state, b) for b in range(ys.size(0))]
+    assert lm.state_length(states[0]) == lm.state_length(state)
+    state_concat = lm.concat_state(states[::-1])
+    state_index = lm.select_state(state, torch.LongTensor([2, 1, 0]))
+    assert np.array_equal(state_concat['nodes'], state_index['nodes'])
+
+    y = torch.LongTensor([[4], [4], [4]])
+    _, _, log_probs_next = lm.predict(y, state_concat)
+    _, _, log_probs_next_ref = lm.predict(torch.cat([ys, y], dim=1).flip(0), None)
+    assert torch.allclose(log_probs_next[:, 0], log_probs_next_ref[:, -1])
+
+
+def test_ctc_batch_beam_search(tmp_path):
+    torch.manual_seed(1)
+    lm, _ = make_lm(tmp_path)
+    vocab = lm.vocab
+    xlens = [20, 13, 7]
+    bs = len(xlens)
+    ctc = CTC(eos=EOS, blank=BLANK, enc_n_units=ENC_N_UNITS, vocab=vocab)
+    ctc.eval()
+    params = {'recog_beam_width': 4,
+              'recog_length_penalty': 0.,
+              'recog_cache_embedding': True,
+              'recog_lm_weight': 0.3,
+              'recog_lm_second_weight': 0.,
+              'recog_lm_bwd_weight': 0.,
+              'recog_softmax_smoothing': 1.}
+    eouts = torch.randn(bs, max(xlens), ENC_N_UNITS) * 3
+
+    with torch.no_grad():
+        nbest_hyps = ctc.batch_beam_search(eouts, torch.IntTensor(xlens), params, lm=lm, nbest=2)
+        for b in range(bs):
+            nbest_hyps_b = ctc.batch_beam_search(eouts[b:b + 1, :xlens[b]], torch.IntTensor(xlens[b:b + 1]),
+                                                 params, lm=lm, nbest=2)
+            for hyp, hyp_b in zip(nbest_hyps[b], nbest_hyps_b[0]):
+                assert np.array_equal(hyp, hyp_b)
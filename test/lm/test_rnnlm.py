@@ -7,6 +7,7 @@ import argparse
 import importlib
 import numpy as np
 import pytest
+import torch
 
 
 VOCAB = 100  # large for adaptive softmax
@@ -72,3 +73,31 @@ def test_forward(args):
     # assert loss.size(0) == 1
     assert loss.item() >= 0
     assert isinstance(observation, dict)
+
+
+@pytest.mark.parametrize("lm_type", ['lstm', 'gru'])
+def test_predict(lm_type):
+    args = make_args(lm_type=lm_type)
+    bs, ylen = 3, 6
+    ys = torch.randint(0, VOCAB, (bs, ylen), dtype=torch.int64)
+
+    module = importlib.import_module('neural_sp.models.lm.rnnlm')
+    lm = module.RNNLM(args)
+    lm.eval()
+    with torch.no_grad():
+        _, _, log_probs = lm.predict(ys, None)
+
+        state = lm.zero_state(bs)
+        for t in range(ylen):
+            _, state, log_probs_t = lm.predict(ys[:, t:t + 1], state)
+            assert torch.allclose(log_probs_t[:, 0], log_probs[:, t], atol=1e-5)
+
+        # reorder/split/concat
+        y = torch.randint(0, VOCAB, (bs, 1), dtype=torch.int64)
+        index = torch.arange(bs - 1, -1, -1)
+        _, _, log_probs_ref = lm.predict(y, state)
+        _, _, log_probs_sel = lm.predict(y[index], lm.select_state(state, index))
+        state_cat = lm.concat_state([lm.select_state(state, j) for j in index.tolist()])
+        _, _, log_probs_cat = lm.predict(y[index], state_cat)
+        assert torch.allclose(log_probs_sel, log_probs_ref[index], atol=1e-5)
+        assert torch.allclose(log_probs_cat, log_probs_ref[index], atol=1e-5)
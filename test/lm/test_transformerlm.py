@@ -7,6 +7,9 @@ import argparse
 import importlib
 import numpy as np
 import pytest
+import torch
+
+from neural_sp.models.seq2seq.decoders.beam_search import BeamSearch
 
 
 VOCAB = 100  # large for adaptive softmax
@@ -79,3 +82,43 @@ def test_forward(args):
     # assert loss.size(0) == 1
     assert loss.item() >= 0
     assert isinstance(observation, dict)
+
+
+def test_predict():
+    args = make_args()
+    bs, ylen = 3, 6
+    ys = torch.randint(0, VOCAB, (bs, ylen), dtype=torch.int64)
+
+    module = importlib.import_module('neural_sp.models.lm.transformerlm')
+    lm = module.TransformerLM(args)
+    lm.eval()
+    with torch.no_grad():
+        _, _, log_probs = lm.predict(ys, None)
+
+        # incremental decoding with cache
+        state = None
+        for t in range(ylen):
+            _, state, log_probs_t = lm.predict(ys[:, t:t + 1], state)
+            assert log_probs_t.size() == (bs, 1, VOCAB)
+            assert torch.allclose(log_probs_t[:, 0], log_probs[:, t], atol=1e-5)
+        assert lm.state_length(state) == ylen
+
+        # reorder/split/concat
+        y = torch.randint(0, VOCAB, (bs, 1), dtype=torch.int64)
+        index = torch.arange(bs - 1, -1, -1)
+        _, _, log_probs_ref = lm.predict(y, state)
+        _, _, log_probs_sel = lm.predict(y[index], lm.select_state(state, index))
+        state_cat = lm.concat_state([lm.select_state(state, j) for j in index.tolist()])
+        _, _, log_probs_cat = lm.predict(y[index], state_cat)
+        assert torch.allclose(log_probs_sel, log_probs_ref[index], atol=1e-5)
+        assert torch.allclose(log_probs_cat, log_probs_ref[index], atol=1e-5)
+
+        # hypotheses with token histories of different lengths are grouped
+        hyps = [{'lmstate': lm.select_state(state, 0)},
+                {'lmstate': None},
+                {'lmstate': lm.select_state(state, 1)}]
+        _, lmstates, scores_lm = BeamSearch.update_lm_state_batch(lm, hyps, y)
+        assert [lm.state_length(s) for s in lmstates] == [ylen + 1, 1, ylen + 1]
+        for j, beam in enumerate(hyps):
+            _, _, scores_lm_j = lm.predict(y[j:j + 1], beam['lmstate'])
+            assert torch.allclose(scores_lm[j:j + 1], scores_lm_j, atol=1e-5)
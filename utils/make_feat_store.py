@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Kyoto University (Hirofumi Inaguma)
+#  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Convert Kaldi features (feats.scp) into a sharded feature store.
+   The output <store_dir>/feats.scp can be passed to make_tsv.py via --feat."""
+
+import argparse
+import kaldiio
+from tqdm import tqdm
+
+from neural_sp.datasets.feature_store import FeatureStoreWriter
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--feat', type=str,
+                    help='feats.scp file')
+parser.add_argument('--store_dir', type=str,
+                    help='output directory of the feature store')
+parser.add_argument('--dtype', type=str, default='float32',
+                    choices=['float16', 'float32'],
+                    help='data type of features in the store')
+parser.add_argument('--shard_size_gb', type=float, default=4.0,
+                    help='maximum size of each shard in GB')
+args = parser.parse_args()
+
+
+def main():
+    writer = FeatureStoreWriter(args.store_dir, dtype=args.dtype,
+                                shard_size=int(args.shard_size_gb * (1 << 30)))
+    for utt_id, feat in tqdm(kaldiio.load_scp_sequential(args.feat)):
+        writer.write(utt_id, feat)
+    writer.close()
+
+
+if __name__ == '__main__':
+    main()
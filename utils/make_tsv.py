@@ -9,12 +9,18 @@
 import argparse
 import codecs
 from distutils.util import strtobool
-import kaldiio
 import os
 import re
 import sentencepiece as spm
 from tqdm import tqdm
 
+from neural_sp.datasets.feature_store import load_feat
+from neural_sp.models.seq2seq.frontends.fbank import (
+    is_wav_path,
+    LogMelFbank,
+    wav_n_samples
+)
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--feat', type=str, default='', nargs='?',
                     help='feats.scp file')
@@ -43,6 +49,10 @@ parser.add_argument('--wp_nbest', type=int, default=1, nargs='?',
                     help='')
 parser.add_argument('--update', action='store_true',
                     help='')
+parser.add_argument('--fbank_dim', type=int, default=80,
+                    help='number of mel bins for wav files in the feats.scp file')
+parser.add_argument('--sample_rate', type=int, default=16000,
+                    help='sampling rate of wav files in the feats.scp file')
 args = parser.parse_args()
 
 
@@ -90,6 +100,9 @@ def main():
     if not args.update:
         print('utt_id\tspeaker\tfeat_path\txlen\txdim\ttext\ttoken_id\tylen\tydim\tprev_utt')
 
+    # for features extracted from wav files on-the-fly
+    fbank = LogMelFbank(n_mels=args.fbank_dim, sample_rate=args.sample_rate)
+
     xdim = None
     pbar = tqdm(total=len(codecs.open(args.text, 'r', encoding="utf-8").readlines()))
 
@@ -118,8 +131,10 @@ def main():
             feat_path = utt2featpath[utt_id]
             if utt_id in utt2num_frames.keys():
                 xlen = utt2num_frames[utt_id]
+            elif is_wav_path(feat_path):
+                xlen = fbank.n_frames(wav_n_samples(feat_path))
             else:
-                xlen = kaldiio.load_mat(feat_path).shape[-2]
+                xlen = load_feat(feat_path).shape[-2]
             speaker = utt2spk[utt_id]
 
             if not os.path.isfile(feat_path.split(':')[0]):
@@ -187,8 +202,10 @@ def main():
         ylen = len(token_ids)
 
         if xdim is None:
-            if args.feat:
-                xdim = kaldiio.load_mat(feat_path).shape[-1]
+            if args.feat and is_wav_path(feat_path):
+                xdim = args.fbank_dim
+            elif args.feat:
+                xdim = load_feat(feat_path).shape[-1]
             else:
                 xdim = 0
         ydim = len(token2idx.keys())